@@ -0,0 +1,276 @@
+"""
+admission.py
+
+Admission control for the analysis endpoints (/api/chat, /api/analyze-emotion):
+- AdmissionController: a concurrency limit in front of the handlers plus a
+  bounded wait queue (queued requests are served in arrival order)
+- the limit adapts to observed latency, queue wait included (AIMD over
+  windows of `window` completed requests, degraded ones too): when the
+  window's `percentile` latency (0.9 by default; use the percentile of the
+  latency objective) is over target_ms the limit shrinks by `backoff`; when
+  it is under target and the limit was fully used during the window, the
+  limit grows by one
+- when the limit and the queue are full, or a queued request waits longer
+  than queue_timeout_ms, the request is served on the cheap degraded path
+  (overload="degrade", without waiting) or rejected (overload="reject").
+  Degraded requests use the same CPU as the admitted ones, so at most half
+  the current limit (and never more than max_degraded) run at once: the
+  degraded budget shrinks with the limit
+- outcomes are counted in metrics.Counters ("admission.*"); settings are
+  runtime-tunable via configure() (/api/admin/admission)
+
+Every request the controller holds - running (up to max_limit), queued (up to
+queue_size) or degraded (up to max_degraded) - occupies a server thread. With
+fewer threads than that the overflow waits in the server's own queue, where
+the controller neither sees it nor counts its wait. handler_threads
+(ADMISSION_HANDLER_THREADS, set by gunicorn.conf.py) is that thread budget:
+configure() refuses settings that need more (required_threads).
+
+State is per worker process, like the metrics.
+"""
+
+import os
+import time
+import threading
+from typing import Any, Dict, List, Optional
+
+from metrics import Counters
+
+FULL, DEGRADED = "full", "degraded"
+OVERLOAD_MODES = ("degrade", "reject")
+# default latency percentile compared with target_ms at the end of each window
+WINDOW_PERCENTILE = 0.9
+
+
+class Ticket:
+    """One admitted request; hand it back to AdmissionController.release()."""
+    __slots__ = ("mode", "started", "waited_ms", "limited")
+
+    def __init__(self, mode: str, started: float, waited_ms: float = 0.0, limited: bool = True):
+        self.mode = mode
+        self.started = started
+        self.waited_ms = waited_ms
+        self.limited = limited
+
+    @property
+    def degraded(self) -> bool:
+        return self.mode == DEGRADED
+
+
+class AdmissionController:
+    def __init__(self, enabled: bool = True, initial_limit: int = 8, min_limit: int = 1, max_limit: int = 64,
+                 queue_size: int = 32, queue_timeout_ms: float = 100.0, target_ms: float = 250.0,
+                 backoff: float = 0.75, window: int = 20, overload: str = "degrade", max_degraded: int = 4,
+                 handler_threads: int = 0, percentile: float = WINDOW_PERCENTILE,
+                 metrics: Optional[Counters] = None):
+        self.metrics = metrics if metrics is not None else Counters()
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._waiting = 0
+        self._degraded = 0
+        self._samples: List[float] = []
+        self._saturated = False
+        self._last_window_ms: Optional[float] = None
+        self.enabled = True
+        self.min_limit = 1
+        self.max_limit = 64
+        self.queue_size = 0
+        self.max_degraded = 0
+        # server threads available to the analysis handlers; 0 = not bounded (e.g. the threaded dev server)
+        self.handler_threads = max(0, int(handler_threads))
+        self._limit = float(initial_limit)
+        self.configure(enabled=enabled, min_limit=min_limit, max_limit=max_limit, limit=initial_limit,
+                       queue_size=queue_size, queue_timeout_ms=queue_timeout_ms, target_ms=target_ms,
+                       backoff=backoff, window=window, overload=overload, max_degraded=max_degraded,
+                       percentile=percentile)
+
+    @classmethod
+    def from_env(cls, metrics: Optional[Counters] = None) -> "AdmissionController":
+        return cls(
+            enabled=os.environ.get("ADMISSION_ENABLED", "1") == "1",
+            initial_limit=int(os.environ.get("ADMISSION_LIMIT", 8)),
+            min_limit=int(os.environ.get("ADMISSION_MIN_LIMIT", 1)),
+            max_limit=int(os.environ.get("ADMISSION_MAX_LIMIT", 64)),
+            queue_size=int(os.environ.get("ADMISSION_QUEUE", 32)),
+            queue_timeout_ms=float(os.environ.get("ADMISSION_QUEUE_TIMEOUT_MS", 100)),
+            target_ms=float(os.environ.get("ADMISSION_TARGET_MS", 250)),
+            backoff=float(os.environ.get("ADMISSION_BACKOFF", 0.75)),
+            window=int(os.environ.get("ADMISSION_WINDOW", 20)),
+            overload=os.environ.get("ADMISSION_OVERLOAD", "degrade"),
+            max_degraded=int(os.environ.get("ADMISSION_MAX_DEGRADED", 4)),
+            handler_threads=int(os.environ.get("ADMISSION_HANDLER_THREADS", 0)),
+            percentile=float(os.environ.get("ADMISSION_PERCENTILE", WINDOW_PERCENTILE)),
+            metrics=metrics,
+        )
+
+    # -------------------------
+    # Runtime configuration
+    # -------------------------
+    def configure(self, **options) -> Dict[str, Any]:
+        """
+        Update settings in place. Unknown keys, an unknown overload mode or a
+        non-boolean `enabled` raise ValueError.
+        """
+        allowed = {"enabled", "limit", "min_limit", "max_limit", "queue_size", "queue_timeout_ms",
+                   "target_ms", "backoff", "window", "overload", "max_degraded", "percentile"}
+        unknown = set(options) - allowed
+        if unknown:
+            raise ValueError(f"unknown admission option(s): {', '.join(sorted(unknown))}")
+        if "overload" in options and options["overload"] not in OVERLOAD_MODES:
+            raise ValueError(f"overload must be one of {', '.join(OVERLOAD_MODES)}")
+        if "enabled" in options and not isinstance(options["enabled"], bool):
+            raise ValueError("enabled must be true or false")
+
+        with self._cond:
+            if self.handler_threads:
+                min_limit = max(1, int(options.get("min_limit", self.min_limit)))
+                needed = (max(min_limit, int(options.get("max_limit", self.max_limit)))
+                          + max(0, int(options.get("queue_size", self.queue_size)))
+                          + max(0, int(options.get("max_degraded", self.max_degraded))))
+                if needed > self.handler_threads:
+                    raise ValueError(f"max_limit + queue_size + max_degraded = {needed} exceeds the "
+                                     f"{self.handler_threads} handler threads (ADMISSION_HANDLER_THREADS)")
+            if "enabled" in options:
+                self.enabled = options["enabled"]
+            if "min_limit" in options:
+                self.min_limit = max(1, int(options["min_limit"]))
+            if "max_limit" in options:
+                self.max_limit = max(self.min_limit, int(options["max_limit"]))
+            if "limit" in options:
+                self._limit = float(options["limit"])
+            self._limit = min(float(self.max_limit), max(float(self.min_limit), self._limit))
+            if "queue_size" in options:
+                self.queue_size = max(0, int(options["queue_size"]))
+            if "queue_timeout_ms" in options:
+                self.queue_timeout_ms = max(0.0, float(options["queue_timeout_ms"]))
+            if "target_ms" in options:
+                self.target_ms = max(1.0, float(options["target_ms"]))
+            if "backoff" in options:
+                self.backoff = min(0.99, max(0.1, float(options["backoff"])))
+            if "window" in options:
+                self.window = max(1, int(options["window"]))
+            if "percentile" in options:
+                self.percentile = min(1.0, max(0.5, float(options["percentile"])))
+            if "overload" in options:
+                self.overload = options["overload"]
+            if "max_degraded" in options:
+                self.max_degraded = max(0, int(options["max_degraded"]))
+            # a raised limit (or a disabled controller) frees slots for queued requests
+            self._cond.notify_all()
+        return self.config()
+
+    def config(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "enabled": self.enabled,
+                "limit": round(self._limit, 2),
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "queue_size": self.queue_size,
+                "queue_timeout_ms": self.queue_timeout_ms,
+                "target_ms": self.target_ms,
+                "backoff": self.backoff,
+                "window": self.window,
+                "percentile": self.percentile,
+                "overload": self.overload,
+                "max_degraded": self.max_degraded,
+                "degraded_limit": self.degraded_limit,
+                "handler_threads": self.handler_threads,
+                "inflight": self._inflight,
+                "waiting": self._waiting,
+                "degraded_inflight": self._degraded,
+                "last_window_ms": None if self._last_window_ms is None else round(self._last_window_ms, 2),
+            }
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def degraded_limit(self) -> int:
+        """Degraded requests allowed at once: half the current limit, at most max_degraded."""
+        return min(self.max_degraded, int(self._limit) // 2)
+
+    @property
+    def required_threads(self) -> int:
+        """Server threads needed so every request the controller can hold has one."""
+        return self.max_limit + self.queue_size + self.max_degraded
+
+    # -------------------------
+    # Admission
+    # -------------------------
+    def acquire(self) -> Optional[Ticket]:
+        """A Ticket (full or degraded) for the caller, or None when the request should be rejected."""
+        start = time.perf_counter()
+        if not self.enabled:
+            return Ticket(FULL, start, limited=False)
+        with self._cond:
+            # new arrivals queue behind waiting requests instead of taking a freed slot first
+            if self._inflight < int(self._limit) and not self._waiting:
+                return self._admit(start, start, "admission.full")
+            self._saturated = True
+            if self._waiting < self.queue_size:
+                self._waiting += 1
+                deadline = start + self.queue_timeout_ms / 1000.0
+                try:
+                    while self.enabled and self._inflight >= int(self._limit):
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        return self._admit(start, time.perf_counter(), "admission.queued")
+                finally:
+                    self._waiting -= 1
+                self.metrics.incr("admission.queue_timeout")
+            else:
+                self.metrics.incr("admission.queue_full")
+            if self.overload == "degrade" and self._degraded < self.degraded_limit:
+                self._degraded += 1
+                self.metrics.incr("admission.degraded")
+                now = time.perf_counter()
+                return Ticket(DEGRADED, now, (now - start) * 1000.0)
+            self.metrics.incr("admission.rejected")
+            return None
+
+    def _admit(self, start: float, now: float, counter: str) -> Ticket:
+        self._inflight += 1
+        self.metrics.incr(counter)
+        return Ticket(FULL, now, (now - start) * 1000.0)
+
+    def release(self, ticket: Ticket):
+        """Return the slot; every admitted request feeds its latency into the limit."""
+        if not ticket.limited:
+            return
+        # what the client sees: the queue wait counts, or a long queue would hide behind a fast handler
+        latency_ms = (time.perf_counter() - ticket.started) * 1000.0 + ticket.waited_ms
+        with self._cond:
+            if ticket.degraded:
+                self._degraded -= 1
+                self._adapt(latency_ms)
+                return
+            if self._inflight >= int(self._limit):
+                self._saturated = True
+            self._inflight -= 1
+            self._adapt(latency_ms)
+            free = int(self._limit) - self._inflight
+            if free > 0:
+                self._cond.notify(free)
+
+    def _adapt(self, latency_ms: float):
+        samples = self._samples
+        samples.append(latency_ms)
+        if len(samples) < self.window:
+            return
+        samples.sort()
+        observed = samples[int(self.percentile * (len(samples) - 1))]
+        self._last_window_ms = observed
+        if observed > self.target_ms:
+            self._limit = max(float(self.min_limit), self._limit * self.backoff)
+            self.metrics.incr("admission.limit_decreased")
+        elif self._saturated:
+            # the limit was fully used and requests still met the target
+            self._limit = min(float(self.max_limit), self._limit + 1.0)
+            self.metrics.incr("admission.limit_increased")
+        samples.clear()
+        self._saturated = False
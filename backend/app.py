@@ -3,14 +3,35 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import re
 import nltk
-from textblob import TextBlob
 import random
 import json
 from datetime import datetime
 import sqlite3
 import os
+import hmac
+import functools
+import contextlib
 from typing import Dict, List, Tuple
 
+from profiling import RequestProfiler
+from trends import TrendEngine
+import retention
+import storage
+from datastore import LiveData, load_data, install_reload_signal, reload_all, versions
+from shloka_selector import ShlokaSelector, StoredRotationState
+from recommender import RelevanceIndex, Recommender
+from calibration import default_calibrator
+from context import ContextRules
+from text_pipeline import AnalysisDocument, as_document
+from sentiment import AveragedSignals, LibrarySentiment, SentimentSignals, VaderOnlySignals, default_sentiment
+from metrics import Counters, ratios
+from admission import AdmissionController
+from serialization import ShlokaFragments, json_response
+from sessions import Session, SessionStore, new_id, valid_id
+from similarity import SimilarMoments
+from warmup import Readiness, freeze_heap, memory_usage, warmup_mode
+from chunking import iter_windows, ScoreAccumulator
+
 # -----------------------------
 # NLTK data bootstrap (safe)
 # -----------------------------
@@ -34,27 +55,78 @@ from nltk.sentiment import SentimentIntensityAnalyzer
 app = Flask(__name__)
 CORS(app)
 
+# Opt-in request profiler (PROFILE_* env vars; tunable via /api/admin/profiling)
+PROFILER = RequestProfiler.from_env()
+PROFILER.init_app(app)
+
 # ------------------------------------
 # Initialize sentiment analyzer & DB
 # ------------------------------------
 SIA = SentimentIntensityAnalyzer()
+# Fused VADER + TextBlob scorer (sentiment.py); SENTIMENT_ENGINE=library calls both libraries instead
+SENTIMENT = LibrarySentiment(SIA) if os.environ.get('SENTIMENT_ENGINE', 'fused') == 'library' else default_sentiment()
+
+# Per-process request counters (/api/admin/metrics)
+METRICS = Counters()
+
+# Concurrency limit + wait queue for the analysis endpoints; overflow is degraded or rejected
+# (ADMISSION_* env vars; tunable via /api/admin/admission)
+ADMISSION = AdmissionController.from_env(METRICS)
+
+# Warm-up state behind /ready; WARMUP_MODE picks when it runs (see the end of this module and gunicorn.conf.py)
+WARMUP_MODE = warmup_mode()
+READINESS = Readiness()
+
+# Per-conversation state for /api/chat (rolling emotion vector, recent topics / verses), stored in SQLite
+SESSIONS = SessionStore.from_env(METRICS)
+
+# SQLite database file; DB_PATH overrides it (the benchmarks point it at a temp dir)
+DB_PATH = os.environ.get('DB_PATH', 'user_data.db')
+
+# Negation / contrast / intensity weights applied to keyword hits (see context.py)
+CONTEXT = ContextRules()
+
+# Offline-fitted confidence calibration, opt-in via CALIBRATION_FILE (see calibration.py), hot-reloadable
+CALIBRATION = default_calibrator()
+
+# Long-input guardrails: requests above MAX_INPUT_CHARS are rejected (413);
+# texts above ANALYSIS_WINDOW_CHARS are analyzed window by window with early exit.
+MAX_INPUT_CHARS = int(os.environ.get('MAX_INPUT_CHARS', 20000))
+ANALYSIS_WINDOW_CHARS = int(os.environ.get('ANALYSIS_WINDOW_CHARS', 2000))
+CHUNK_MARGIN = float(os.environ.get('CHUNK_MARGIN', 0.5))
+CHUNK_MIN_WINDOWS = int(os.environ.get('CHUNK_MIN_WINDOWS', 3))
 
-DB_PATH = 'user_data.db'
+# Incremental dashboard aggregates, updated by insert_emotion_row (see trends.py)
+TRENDS = TrendEngine()
 
 def db_connect():
-    return sqlite3.connect(DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES)
+    return sqlite3.connect(DB_PATH)
+
+@contextlib.contextmanager
+def write_transaction():
+    """
+    A connection inside BEGIN IMMEDIATE, committed when the block exits. Taking
+    the write lock up front serializes every read-modify-write of shared state
+    (trends, sessions, rotations, profiles) across workers.
+    """
+    conn = db_connect()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        yield conn
+        conn.commit()
+    except Exception:
+        storage.labels(conn).clear()
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
 def init_db():
     conn = db_connect()
+    retention.configure_new_database(conn)
+    # user_emotions (schema v2: label ids, integer timestamps, deduplicated texts); v1 databases are migrated here
+    storage.ensure_schema(conn)
     c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS user_emotions
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  emotion TEXT,
-                  confidence REAL,
-                  input_text TEXT,
-                  sentiment TEXT,
-                  compound REAL,
-                  timestamp DATETIME)''')
     c.execute('''CREATE TABLE IF NOT EXISTS user_progress
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
                   user_id TEXT DEFAULT 'default',
@@ -62,339 +134,88 @@ def init_db():
                   streak_days INTEGER DEFAULT 0,
                   emotional_balance REAL DEFAULT 50.0,
                   last_updated DATETIME)''')
+    TrendEngine.init_schema(conn)
+    SessionStore.init_schema(conn)
+    StoredRotationState.init_schema(conn)
+    Recommender.init_schema(conn)
+    retention.init_schema(conn)
     conn.commit()
     conn.close()
 
 init_db()
 
-# ------------------------------------
-# Gita Shlokas (your provided content)
-# ------------------------------------
-GITA_SHLOKAS = {
-    "joy": [
-        {
-            "sanskrit": "योगस्थः कुरु कर्माणि सङ्गं त्यक्त्वा धनञ्जय। सिद्ध्यसिद्ध्योः समो भूत्वा समत्वं योग उच्यते॥",
-            "translation": "Perform your duty equipoised, O Arjuna, abandoning all attachment to success or failure. Such equanimity is called yoga.",
-            "chapter": 2, "verse": 48,
-            "explanation": "True joy comes from performing our duties without attachment to results...",
-            "practical_advice": "Today, choose one important task and perform it with complete dedication..."
-        },
-        {
-            "sanskrit": "सुखदुःखे समे कृत्वा लाभालाभौ जयाजयौ। ततो युद्धाय युज्यस्व नैवं पापमवाप्स्यसि॥",
-            "translation": "Fight for the sake of duty, treating alike happiness and distress, loss and gain, victory and defeat...",
-            "chapter": 2, "verse": 38,
-            "explanation": "True joy comes from doing our duty without being affected by dualities...",
-            "practical_advice": "Practice seeing both pleasant and unpleasant experiences as opportunities for growth..."
-        }
-    ],
-    "sadness": [
-        {
-            "sanskrit": "न त्वेवाहं जातु नासं न त्वं नेमे जनाधिपाः। न चैव न भविष्यामः सर्वे वयमतः परम्॥",
-            "translation": "Never was there a time when I did not exist, nor you, nor all these kings...",
-            "chapter": 2, "verse": 12,
-            "explanation": "This fundamental truth about the eternal nature of the soul provides comfort...",
-            "practical_advice": "When sadness overwhelms you, remember that your true self is eternal..."
-        },
-        {
-            "sanskrit": "मात्रास्पर्शास्तु कौन्तेय शीतोष्णसुखदुःखदाः। आगमापायिनोऽनित्यास्तांस्तितिक्षस्व भारत॥",
-            "translation": "O son of Kunti, the contact between the senses and their objects gives rise to happiness and distress...",
-            "chapter": 2, "verse": 14,
-            "explanation": "Sadness, like happiness, arises from the contact of our senses with the external world...",
-            "practical_advice": "Acknowledge your sadness without judgment, but remember it's temporary..."
-        }
-    ],
-    "anxiety": [
-        {
-            "sanskrit": "कर्मण्येवाधिकारस्ते मा फलेषु कदाचन। मा कर्मफलहेतुर्भूर्मा ते सङ्गोऽस्त्वकर्मणि॥",
-            "translation": "You have the right to perform your prescribed duties, but never to the fruits of action...",
-            "chapter": 2, "verse": 47,
-            "explanation": "This is the most fundamental teaching for overcoming anxiety...",
-            "practical_advice": "Make a clear list of what's within your control versus what isn't..."
-        },
-        {
-            "sanskrit": "यत्र योगेश्वरः कृष्णो यत्र पार्थो धनुर्धरः। तत्र श्रीर्विजयो भूतिर्ध्रुवा नीतिर्मतिर्मम॥",
-            "translation": "Wherever there is Krishna... there will certainly be opulence, victory, extraordinary power, and morality.",
-            "chapter": 18, "verse": 78,
-            "explanation": "When we align our actions with divine consciousness and perform our duties with skill...",
-            "practical_advice": "Before making any decision, connect with your inner wisdom through prayer or meditation..."
-        }
-    ],
-    "anger": [
-        {
-            "sanskrit": "क्रोधाद्भवति सम्मोहः सम्मोहात्स्मृतिविभ्रमः। स्मृतिभ्रंशाद् बुद्धिनाशो बुद्धिनाशात्प्रणश्यति॥",
-            "translation": "From anger comes delusion...",
-            "chapter": 2, "verse": 63,
-            "explanation": "This verse reveals the destructive chain reaction that begins with anger...",
-            "practical_advice": "When you feel anger rising, immediately pause and take three deep breaths..."
-        },
-        {
-            "sanskrit": "अहिंसा सत्यमक्रोधस्त्यागः शान्तिरपैशुनम्...",
-            "translation": "Non-violence, truthfulness, freedom from anger...",
-            "chapter": 16, "verse": 2,
-            "explanation": "Freedom from anger is listed among the divine qualities that lead to liberation...",
-            "practical_advice": "Practice compassion today, especially toward the person or situation that triggered your anger..."
-        }
-    ],
-    "confusion": [
-        {
-            "sanskrit": "यदा ते मोहकलिलं बुद्धिर्व्यतितरिष्यति...",
-            "translation": "When your intelligence crosses the mire of confusion...",
-            "chapter": 2, "verse": 52,
-            "explanation": "Confusion often precedes clarity...",
-            "practical_advice": "When confused, sit quietly for 10-15 minutes without trying to solve anything..."
-        },
-        {
-            "sanskrit": "तत्त्ववित्तु महाबाहो गुणकर्मविभागयोः...",
-            "translation": "One who is in knowledge of the Absolute Truth does not engage in the senses...",
-            "chapter": 3, "verse": 28,
-            "explanation": "True knowledge brings clarity about what actions to take and why...",
-            "practical_advice": "Seek knowledge from reliable sources..."
-        }
-    ],
-    "gratitude": [
-        {
-            "sanskrit": "यज्ञार्थात्कर्मणोऽन्यत्र लोकोऽयं कर्मबन्धनः...",
-            "translation": "Work done as a sacrifice for Vishnu has to be performed...",
-            "chapter": 3, "verse": 9,
-            "explanation": "When we perform all actions as offerings to the divine, work becomes worship...",
-            "practical_advice": "Begin each task today with gratitude and the intention to serve..."
-        },
-        {
-            "sanskrit": "अन्नाद्भवन्ति भूतानि पर्जन्यादन्नसम्भवः...",
-            "translation": "All living beings subsist on food grains... Rains are produced by performance of yajna...",
-            "chapter": 3, "verse": 14,
-            "explanation": "This verse reveals the interconnectedness of all existence...",
-            "practical_advice": "Before eating today, take a moment to appreciate all the elements that brought this food..."
-        }
-    ],
-    "self_realization": [
-        {
-            "sanskrit": "न जायते म्रियते वा कदाचिन्...",
-            "translation": "For the soul there is neither birth nor death at any time...",
-            "chapter": 2, "verse": 20,
-            "explanation": "This verse points to the eternal Self beyond the body...",
-            "practical_advice": "When overwhelmed, remember your deeper, unchanging identity..."
-        }
-    ],
-    "discipline": [
-        {
-            "sanskrit": "यतते चिरं तदाग्रे चित्तस्य ब्रह्मचर्ये स्थितः...",
-            "translation": "One who regulates eating, sleeping, recreation and work is fit for yoga...",
-            "chapter": 6, "verse": 17,
-            "explanation": "Moderation and disciplined habits protect practice...",
-            "practical_advice": "Make a tiny daily routine: 20 minutes of focused practice..."
-        }
-    ],
-    "self_mastery": [
-        {
-            "sanskrit": "उद्धरेदात्मनात्मानं नात्मानमवसादयेत्...",
-            "translation": "Elevate yourself through the power of your mind...",
-            "chapter": 6, "verse": 5,
-            "explanation": "Practical instruction emphasizing that inner mastery is the key...",
-            "practical_advice": "When negative thoughts rise, practice 'mind-lift'..."
-        }
-    ],
-    "humility": [
-        {
-            "sanskrit": "अमानित्वमदम्भित्वमहिंसा क्षान्तिरार्जवम्...",
-            "translation": "Humbleness, lack of hypocrisy, non-violence, tolerance...",
-            "chapter": 13, "verse": 8,
-            "explanation": "A practical list of virtues — humility and modesty...",
-            "practical_advice": "Practice one small act of anonymous service today..."
-        }
-    ],
-    "steadiness": [
-        {
-            "sanskrit": "दुःखेष्वनुद्विग्नमनाः सुखेषु विगतस्पृहः...",
-            "translation": "One who is steady-minded in sorrow and pleasure...",
-            "chapter": 2, "verse": 56,
-            "explanation": "Describes inner balance—steady wisdom remains unmoved...",
-            "practical_advice": "When you react strongly, pause and ask: 'Is this permanent?'"
-        }
-    ],
-    "attachment_awareness": [
-        {
-            "sanskrit": "ध्यायतो विषयान्पुंसः सङ्गस्तेषूपजायते...",
-            "translation": "When one dwells on sense objects, attachment is born...",
-            "chapter": 2, "verse": 62,
-            "explanation": "Maps how small mental habits escalate...",
-            "practical_advice": "Notice the first five seconds of desire..."
-        }
-    ],
-    "anger_warning": [
-        {
-            "sanskrit": "क्रोधाद्भवति सम्मोहः सम्मोहात्स्मृतिविभ्रमः...",
-            "translation": "From anger comes delusion...",
-            "chapter": 2, "verse": 63,
-            "explanation": "A strong caution: anger triggers a chain leading to bad decisions...",
-            "practical_advice": "When anger surfaces, count to ten with slow exhalations..."
-        }
-    ],
-    "surrender": [
-        {
-            "sanskrit": "सर्वधर्मान्परित्यज्य मामेकं शरणं व्रज...",
-            "translation": "Abandon all varieties of dharma and surrender unto Me alone...",
-            "chapter": 18, "verse": 66,
-            "explanation": "An invitation to radical surrender...",
-            "practical_advice": "If anxiety swamps you, practice a brief surrender..."
-        }
-    ],
-    "divine_intervention": [
-        {
-            "sanskrit": "यदा यदा हि धर्मस्य ग्लानिर्भवति भारत...",
-            "translation": "Whenever there is a decline of righteousness...",
-            "chapter": 4, "verse": 7,
-            "explanation": "Gives hope that a higher principle intervenes...",
-            "practical_advice": "When you feel powerless, look for one corrective action..."
-        }
-    ],
-    "duty": [
-        {
-            "sanskrit": "यज्ञार्थात्कर्मणोऽन्यत्र लोकोऽयं कर्मबन्धनः...",
-            "translation": "Work done as a sacrifice for the Divine frees one from bondage...",
-            "chapter": 3, "verse": 9,
-            "explanation": "Emphasizes right attitude toward work...",
-            "practical_advice": "Before starting work, dedicate the effort to a purpose larger than self..."
-        }
-    ],
-    "fear": [
-        {
-            "sanskrit": "सर्वधर्मान्परित्यज्य मामेकं शरणं व्रज...",
-            "translation": "Abandon all varieties of dharma and surrender unto Me alone. Do not fear.",
-            "chapter": 18, "verse": 66,
-            "explanation": "This is Krishna's ultimate assurance...",
-            "practical_advice": "When fear arises, remember you are not facing challenges alone..."
-        },
-        {
-            "sanskrit": "न मे भक्तः प्रणश्यति।",
-            "translation": "My devotee never perishes.",
-            "chapter": 9, "verse": 31,
-            "explanation": "Those who dedicate their lives to divine service are always protected...",
-            "practical_advice": "Dedicate your actions today to serving something greater than yourself..."
-        }
-    ]
-}
+# Old rows are rolled up / text-truncated / archived in small batches (RETENTION_* env vars);
+# set RETENTION_INTERVAL_S to run it on a background thread, or trigger via /api/admin/retention.
+RETENTION = retention.RetentionJob.from_env(db_connect)
+RETENTION_INTERVAL_S = float(os.environ.get('RETENTION_INTERVAL_S', 0) or 0)
+# a preloading master must not fork with the thread running; workers start it in after_fork()
+if RETENTION_INTERVAL_S > 0 and WARMUP_MODE != 'preload':
+    RETENTION.start(RETENTION_INTERVAL_S)
 
 # ------------------------------------
-# Emotion Lexicon (regex-ready)
+# Gita shlokas + emotion lexicon (data/*.json, hot-reloadable)
 # ------------------------------------
-# Tip: use \b word boundaries where possible; keep some multi-word phrases as-is.
-RAW_EMOTION_KEYWORDS: Dict[str, List[str]] = {
-    "joy": [
-        "happy","happiness","joyful","delighted","glad","content","contented",
-        "cheerful","elated","ecstatic","pleased","overjoyed","bliss","blissful",
-        "satisfied","uplifted","buoyant","hopeful","optimistic","relieved",
-        "feeling good","i feel good","i'm happy","really happy","so happy",
-        "this is great","that's wonderful","made my day","i'm thrilled"
-    ],
-    "sadness": [
-        "sad","sadness","depressed","depression","down","downcast","unhappy",
-        "melancholy","grief","grieving","sorrow","sorrowful","heartbroken",
-        "tearful","tear up","lonely","loneliness","lost","hopeless","despair",
-        "homesick","blue","i miss","missing you","can't cope","can't handle this"
-    ],
-    "anxiety": [
-        "anxious","anxiety","worried","worry","nervous","stressed","stress",
-        "panic","panicking","overthinking","ruminating","tense","restless",
-        "uneasy","dread","apprehensive","on edge","freaking out","can't sleep",
-        "insomnia","heart racing","i'm worried about","i'm anxious about","too much on my mind"
-    ],
-    "anger": [
-        "angry","anger","mad","furious","irate","resentful","resentment",
-        "irritated","annoyed","outraged","fuming","heated","rage","ranting",
-        "hate","disgusted at someone","sore","i'm furious","i'm mad at"
-    ],
-    "fear": [
-        "afraid","fear","scared","terror","terrified","phobia",
-        "fearful","dread","panic attack","i'm scared","i'm terrified","i'm afraid",
-        "safety","unsafe","threat","threatened","danger"
-    ],
-    "confusion": [
-        "confused","confusion","uncertain","uncertainty","undecided",
-        "doubt","doubting","puzzled","bewildered","not sure","which way","what should i do",
-        "help me choose","i don't know what to do","direction","purpose","lost"
-    ],
-    "gratitude": [
-        "grateful","gratefulness","thankful","thanks","appreciative","blessed",
-        "thank you","much obliged","i'm grateful","i appreciate"
-    ],
-    "guilt": [
-        "guilty","guilt","remorse","remorseful","regret","regretful","sorry",
-        "apologize","i'm sorry","i regret","i did wrong","shame","shameful"
-    ],
-    "shame": [
-        "ashamed","embarrassed","humiliated","mortified","cringe","deep shame",
-        "i'm ashamed","i feel ashamed","losing face"
-    ],
-    "loneliness": [
-        "lonely","isolated","alone","no one cares","no friends","nobody","left out",
-        "isolated at home","socially isolated"
-    ],
-    # your advanced / spiritual states
-    "self_realization": [
-        "soul","eternal","immortal","self","i am not the body","who am i",
-        "true self","atman","i feel like more than body","spiritual awakening",
-        "seeking truth","existential","realize self","i am consciousness"
-    ],
-    "discipline": [
-        "routine","discipline","practice","consistent","habit","schedule",
-        "self-discipline","self control","willpower","staying consistent","daily practice",
-        "commitment","i can't keep routine","need a routine"
-    ],
-    "self_mastery": [
-        "mind","master","control","self control","willpower","overcome",
-        "control my thoughts","train my mind","dominate my mind","mind discipline",
-        "conquer mind","mindfulness practice"
-    ],
-    "humility": [
-        "humble","humility","modest","unassuming","servant","lack of ego",
-        "i want to be humble","let go of pride","stop boasting","humble myself"
-    ],
-    "steadiness": [
-        "steady","calm","balanced","even-minded","equanimity","steady mind",
-        "stable","unshakable","composed","centered","grounded","remain calm"
-    ],
-    "attachment_awareness": [
-        "attachment","craving","desire","longing","cling","clinging","neediness",
-        "want too much","can't let go","obsessed with","addicted to","attached to"
-    ],
-    "surrender": [
-        "surrender","let go","i give up","i can't control","i surrender",
-        "accept","acceptance","offer it to god","let it be","release control"
-    ],
-    "divine_intervention": [
-        "help","miracle","save me","save","restore","intervene","divine help",
-        "i need a sign","divine will","god help","i need guidance","miracle please"
-    ],
-    "duty": [
-        "duty","work","karma","responsibility","svadharma","dharma",
-        "my role","i have a duty","responsible for","obligation","should i do my duty"
-    ]
-}
-
-# Compile regex patterns for speed & better matching
-# We use word boundaries for single words; keep phrase search case-insensitive.
-COMPILED_LEXICON: Dict[str, List[re.Pattern]] = {}
-for emotion, phrases in RAW_EMOTION_KEYWORDS.items():
-    compiled = []
-    for p in phrases:
-        if ' ' in p or "'" in p:
-            # phrase match - escape & use simple search
-            compiled.append(re.compile(re.escape(p), re.IGNORECASE))
-        else:
-            # word boundary match
-            compiled.append(re.compile(rf'\b{re.escape(p)}\b', re.IGNORECASE))
-    COMPILED_LEXICON[emotion] = compiled
+# Tip: keywords use \b word boundaries; entries with spaces/apostrophes are matched as phrases.
+def compile_keywords(raw_keywords: Dict[str, List[str]]) -> Dict[str, List[re.Pattern]]:
+    """Compile regex patterns for speed & better matching."""
+    compiled: Dict[str, List[re.Pattern]] = {}
+    for emotion, phrases in raw_keywords.items():
+        patterns = []
+        for p in phrases:
+            if ' ' in p or "'" in p:
+                # phrase match - escape & use simple search
+                patterns.append(re.compile(re.escape(p), re.IGNORECASE))
+            else:
+                # word boundary match
+                patterns.append(re.compile(rf'\b{re.escape(p)}\b', re.IGNORECASE))
+        compiled[emotion] = patterns
+    return compiled
+
+# Per-user shloka rotation cursors in SQLite; shared by every snapshot and worker, so reloads keep each user's place
+ROTATIONS = StoredRotationState(db_connect)
+
+class AppData:
+    """One immutable version of the keyword lexicon and shlokas served by the API."""
+    __slots__ = ("version", "keywords", "lexicon", "shlokas", "all_shlokas", "selector", "relevance", "fragments")
+
+    def __init__(self, version: str, keywords: Dict[str, List[str]], shlokas: Dict[str, List[Dict]]):
+        # raises if the 'confusion' fallback bucket is missing
+        self.selector = ShlokaSelector(shlokas, fallback="confusion", state=ROTATIONS)
+        self.version = version
+        self.keywords = keywords
+        self.lexicon = compile_keywords(keywords)
+        self.shlokas = shlokas
+        self.all_shlokas = list(self.selector.verses)
+        self.relevance = RelevanceIndex(shlokas, keywords, version)
+        # each verse's response JSON, encoded once per snapshot and spliced into responses
+        self.fragments = ShlokaFragments(self.selector.verses)
+
+def load_app_data() -> AppData:
+    (keywords, shlokas), version = load_data('emotion_keywords.json', 'gita_shlokas.json')
+    return AppData(version, keywords, shlokas)
+
+# Requests read DATA.current once and use that snapshot throughout; reloads swap it
+# (POST /api/admin/reload or SIGHUP) without a restart.
+DATA = LiveData('app', load_app_data)
+install_reload_signal()
+
+# Per-user emotion vectors (SQLite) + per-process cached verse rankings for /api/recommendations
+RECOMMENDER = Recommender(alpha=float(os.environ.get('RECOMMEND_ALPHA', 0.2)),
+                          recent_size=int(os.environ.get('RECOMMEND_RECENT', 5)))
+RECOMMEND_SEED_ROWS = int(os.environ.get('RECOMMEND_SEED_ROWS', 50))
+
+# per-user TF-IDF index over past entries (/api/similar-moments); catches up with user_emotions on each query
+SIMILAR = SimilarMoments.from_env()
 
 # ------------------------------------
 # Sentiment helpers
 # ------------------------------------
-def vader_sentiment(text: str) -> Dict[str, float]:
-    return SIA.polarity_scores(text)
-
-def blob_sentiment(text: str) -> Tuple[float, float]:
-    blob = TextBlob(text)
-    return blob.sentiment.polarity, blob.sentiment.subjectivity
+def document_sentiment(doc: AnalysisDocument) -> SentimentSignals:
+    """
+    Lazy sentiment signals for the document: VADER runs when compound/pos/neu/neg
+    is first read, the TextBlob (pattern) pass only when polarity/subjectivity is.
+    """
+    return SENTIMENT.signals(doc)
 
 def label_sentiment(vader_compound: float) -> str:
     if vader_compound >= 0.05:
@@ -406,21 +227,31 @@ def label_sentiment(vader_compound: float) -> str:
 # ------------------------------------
 # Emotion analysis
 # ------------------------------------
-def score_emotions(text: str) -> Dict[str, float]:
+def score_emotions(text, compound: float = None, data: AppData = None) -> Dict[str, float]:
     """
-    Score each emotion by regex hits (count) and lightly weight by sentiment.
+    Score each emotion by regex hits and lightly weight by sentiment. Each hit
+    counts its token's context weight (negated hits count 0, hits before "but"
+    count half, "very"/"a bit" scale the next word).
+    `text` may be a str or an AnalysisDocument (reused: lowercasing, token
+    offsets and context weights are not recomputed).
+    Pass `compound` when VADER has already run on this text to skip a second pass.
+    `data` pins the lexicon snapshot (defaults to the live one).
     Returns a dict {emotion: score}
     """
-    if not text.strip():
+    doc = as_document(text)
+    if not doc.words and not doc.text.strip():
         return {}
 
-    text_lower = text.lower()
-    hits: Dict[str, int] = {}
-    for emotion, patterns in COMPILED_LEXICON.items():
-        count = 0
+    data = data or DATA.current
+    text_lower = doc.lower
+    weight_at = CONTEXT.weigh(doc).weight_at
+    hits: Dict[str, float] = {}
+    for emotion, patterns in data.lexicon.items():
+        count = 0.0
         for pat in patterns:
-            # count number of matches (non-overlapping)
-            count += len(pat.findall(text_lower))
+            # non-overlapping matches, each weighted by the context of the word it starts on
+            for m in pat.finditer(text_lower):
+                count += weight_at(m.start())
         if count > 0:
             hits[emotion] = count
 
@@ -430,8 +261,7 @@ def score_emotions(text: str) -> Dict[str, float]:
 
     # Optional: weight by sentiment direction
     # Positive push up joy/gratitude/steadiness; negative push up sadness/anger/fear/anxiety.
-    vader = vader_sentiment(text)
-    comp = vader.get('compound', 0.0)
+    comp = document_sentiment(doc).compound if compound is None else compound
 
     pos_bias = {"joy","gratitude","steadiness","self_realization","humility","discipline","self_mastery","surrender","duty","divine_intervention"}
     neg_bias = {"sadness","anger","fear","anxiety","guilt","shame","loneliness","confusion","attachment_awareness","anger_warning"}
@@ -447,7 +277,7 @@ def score_emotions(text: str) -> Dict[str, float]:
 
     return scores
 
-def analyze_emotion(text: str) -> Dict:
+def analyze_emotion(text, data: AppData = None, include_signals: bool = True, degraded: bool = False) -> Dict:
     """
     Full emotion + sentiment analysis with fallbacks and confidence.
     Returns:
@@ -458,22 +288,96 @@ def analyze_emotion(text: str) -> Dict:
         sentiment: {label, compound, pos, neu, neg, blob_polarity, blob_subjectivity},
         details: {...}
       }
+    Texts longer than ANALYSIS_WINDOW_CHARS go through analyze_emotion_windowed.
+    `text` may be an AnalysisDocument built by the caller; it is shared by
+    sentiment and keyword scoring (and can be reused for intent routing).
+    include_signals=False leaves blob_polarity / blob_subjectivity out of the
+    result, so the TextBlob pass only runs if the no-keyword fallback needs it.
+    degraded=True (admission overload path) never runs the TextBlob pass and
+    analyzes only the first window of a long input.
     """
+    doc = text if isinstance(text, AnalysisDocument) else None
+    text = doc.text if doc is not None else text
     if not text or not text.strip():
+        sentiment = {"label": "neutral", "compound": 0.0, "pos":0.0, "neu":1.0, "neg":0.0}
+        if include_signals:
+            sentiment.update(blob_polarity=0.0, blob_subjectivity=0.0)
         return {
             "emotion": "confusion",
             "confidence": 0.4,
             "top_emotions": [],
-            "sentiment": {"label": "neutral", "compound": 0.0, "pos":0.0, "neu":1.0, "neg":0.0,
-                          "blob_polarity": 0.0, "blob_subjectivity": 0.0},
+            "sentiment": sentiment,
             "details": {}
         }
+    details = {}
+    if degraded:
+        include_signals = False
+        details["degraded"] = True
+        if len(text) > ANALYSIS_WINDOW_CHARS:
+            _, text = next(iter_windows(text, ANALYSIS_WINDOW_CHARS, MAX_INPUT_CHARS))
+            doc = None
+            details["analyzed_chars"] = len(text)
+    elif len(text) > ANALYSIS_WINDOW_CHARS:
+        return analyze_emotion_windowed(text, data, include_signals)
+
+    doc = doc or AnalysisDocument(text)
+    signals = document_sentiment(doc)
+    if degraded:
+        signals = VaderOnlySignals(signals)
+    lex_scores = score_emotions(doc, signals.compound, data)
+    details["negated_words"] = CONTEXT.weigh(doc).negated
+    return _compose_analysis(signals, lex_scores, details, include_signals)
+
+def analyze_emotion_windowed(text: str, data: AppData = None, include_signals: bool = True) -> Dict:
+    """
+    Long-input analysis: text beyond MAX_INPUT_CHARS is ignored, the rest is
+    streamed in sentence-packed windows. Lexical scores are summed, sentiment
+    is averaged (weighted by window length), and scanning stops once the
+    leading emotion is ahead by CHUNK_MARGIN. details.windows holds one short
+    summary per analyzed window.
+    """
+    data = data or DATA.current
+    acc = ScoreAccumulator(margin=CHUNK_MARGIN, min_windows=CHUNK_MIN_WINDOWS)
+    parts = []  # (window signals, window length)
+    windows = []
+    analyzed_chars = 0
+    negated_words = 0
+    early_exit = False
+
+    for index, (start, chunk) in enumerate(iter_windows(text, ANALYSIS_WINDOW_CHARS, MAX_INPUT_CHARS)):
+        if not chunk.strip():
+            continue
+        doc = AnalysisDocument(chunk)
+        signals = document_sentiment(doc)
+        n = len(chunk)
+        parts.append((signals, n))
 
-    vader = vader_sentiment(text)
-    blob_pol, blob_subj = blob_sentiment(text)
-    sent_label = label_sentiment(vader.get('compound', 0.0))
+        scores = score_emotions(doc, signals.compound, data)
+        acc.add(scores)
+        negated_words += CONTEXT.weigh(doc).negated
+        analyzed_chars = start + n
+        top = max(scores.items(), key=lambda kv: kv[1], default=(None, 0.0))
+        windows.append({"index": index, "start": start, "chars": n,
+                        "top_emotion": top[0], "top_score": round(top[1], 3), "emotions_hit": len(scores)})
+        if acc.decided():
+            early_exit = True
+            break
+
+    details = {
+        "windowed": True,
+        "windows": windows,
+        "analyzed_chars": analyzed_chars,
+        "input_chars": len(text),
+        "truncated": len(text) > MAX_INPUT_CHARS,
+        "early_exit": early_exit,
+        "negated_words": negated_words,
+    }
+    return _compose_analysis(AveragedSignals(parts), dict(acc.totals), details, include_signals)
 
-    lex_scores = score_emotions(text)
+def _compose_analysis(signals: SentimentSignals, lex_scores: Dict[str, float], details: Dict,
+                      include_signals: bool = True) -> Dict:
+    comp = signals.compound
+    sent_label = label_sentiment(comp)
     top_list = sorted(lex_scores.items(), key=lambda x: x[1], reverse=True)[:3]
 
     # Determine primary emotion
@@ -489,16 +393,21 @@ def analyze_emotion(text: str) -> Dict:
         if primary_emotion in {"sadness","anger","fear","anxiety","guilt","shame","loneliness","confusion","attachment_awareness","anger_warning"} and sent_label == "negative":
             kw_conf = min(0.95, kw_conf + 0.05)
         confidence = round(kw_conf, 3)
+        # lead of the top emotion over the runner-up, relative to its score (1.0: a single emotion hit)
+        runner_up = top_list[1][1] if len(top_list) > 1 else 0.0
+        details["lexical_margin"] = round((max_score - runner_up) / max_score, 3) if max_score > 0 else 0.0
     else:
-        # Fallback: sentiment-only mapping
-        comp = vader.get('compound', 0.0)
-        if comp >= 0.25 or blob_pol > 0.3:
+        # Fallback: sentiment-only mapping (the only branch that reads the TextBlob signals).
+        # TextBlob ignores negation ("I don't feel happy" is +0.8): once the context pass
+        # negated a word, only VADER's compound, which does handle it, decides the direction
+        polarity = 0.0 if details.get("negated_words") else signals.polarity
+        if comp >= 0.25 or polarity > 0.3:
             primary_emotion = "joy"
-        elif comp <= -0.25 or blob_pol < -0.3:
+        elif comp <= -0.25 or polarity < -0.3:
             # pick between sadness/anxiety/fear based on neg vs neu and subjectivity
-            if vader.get('neg', 0.0) > 0.4:
+            if signals.neg > 0.4:
                 primary_emotion = "sadness"
-            elif blob_subj > 0.55:
+            elif signals.subjectivity > 0.55:
                 primary_emotion = "anxiety"
             else:
                 primary_emotion = "fear"
@@ -507,110 +416,165 @@ def analyze_emotion(text: str) -> Dict:
         confidence = round(min(0.8, 0.5 + abs(comp) * 0.5), 3)
         top_list = [(primary_emotion, 1.0)]
 
+    # map the heuristic score to an observed accuracy (the CALIBRATION_FILE table; identity when unset)
+    details["raw_confidence"] = confidence
+    confidence = round(CALIBRATION.apply("app", primary_emotion, confidence), 3)
+
+    # signal usage: what scoring needed vs what the response added (see /api/admin/metrics)
+    counted = ["analysis.total"] + [f"sentiment.{name}.scoring" for name in signals.computed()]
+    sentiment = {
+        "label": sent_label,
+        "compound": round(comp, 4),
+        "pos": signals.pos,
+        "neu": signals.neu,
+        "neg": signals.neg,
+    }
+    if include_signals:
+        sentiment["blob_polarity"] = round(signals.polarity, 4)
+        sentiment["blob_subjectivity"] = round(signals.subjectivity, 4)
+    else:
+        counted.append("analysis.signals_omitted")
+    if details.get("degraded"):
+        counted.append("analysis.degraded")
+    METRICS.incr_many(counted + [f"sentiment.{name}.computed" for name in signals.computed()])
+
     return {
         "emotion": primary_emotion,
         "confidence": confidence,
         "top_emotions": [{"emotion": e, "score": round(s, 3)} for e, s in top_list],
-        "sentiment": {
-            "label": sent_label,
-            "compound": round(vader.get('compound', 0.0), 4),
-            "pos": vader.get('pos', 0.0),
-            "neu": vader.get('neu', 0.0),
-            "neg": vader.get('neg', 0.0),
-            "blob_polarity": round(blob_pol, 4),
-            "blob_subjectivity": round(blob_subj, 4),
-        },
-        "details": {}
+        "sentiment": sentiment,
+        "details": details
     }
 
-def get_relevant_shloka(emotion: str) -> Dict:
-    if emotion in GITA_SHLOKAS:
-        return random.choice(GITA_SHLOKAS[emotion])
-    # fallback
-    return random.choice(GITA_SHLOKAS["confusion"])
+def get_relevant_shloka(emotion: str, data: AppData = None, user: str = "default") -> Dict:
+    # aliases resolve to their bucket, unknown emotions to "confusion"; rotates without repeats per user
+    return (data or DATA.current).selector.next(emotion, user)
+
+def conversation_shloka(emotion: str, session: Session, data: AppData = None, conn=None) -> Dict:
+    """The next shloka in rotation, skipping verses served in the conversation's remembered turns."""
+    selector = (data or DATA.current).selector
+    recent = set(session.recent_verses())
+    index = selector.next_index(emotion, conn=conn)
+    # bounded: a small bucket may hold nothing but recent verses
+    for _ in range(len(recent)):
+        if verse_key(selector.verses[index]) not in recent:
+            break
+        index = selector.next_index(emotion, conn=conn)
+    return selector.verses[index]
+
+def verse_key(shloka: Dict) -> Tuple:
+    return shloka.get('chapter'), shloka.get('verse')
+
+def insert_emotion_row(conn, emotion: str, confidence: float, input_text: str, sentiment_label: str,
+                       compound: float):
+    """Trend + recommender update and row insert inside the caller's write transaction."""
+    now = datetime.now()
+    TRENDS.record(conn, emotion, compound, now)
+    storage.insert_row(conn, emotion, float(confidence), input_text, sentiment_label, float(compound), now)
+    RECOMMENDER.observe(conn, "default", emotion, confidence)
 
 def save_emotion_row(emotion: str, confidence: float, input_text: str, sentiment_label: str, compound: float):
-    conn = db_connect()
-    c = conn.cursor()
-    c.execute(
-        '''INSERT INTO user_emotions (emotion, confidence, input_text, sentiment, compound, timestamp)
-           VALUES (?, ?, ?, ?, ?, ?)''',
-        (emotion, float(confidence), input_text, sentiment_label, float(compound), datetime.now())
-    )
-    conn.commit()
-    conn.close()
+    with write_transaction() as conn:
+        insert_emotion_row(conn, emotion, confidence, input_text, sentiment_label, compound)
 
 # ------------------------------------
 # Krishna-style response generator
 # ------------------------------------
-def generate_krishna_response(message: str, emotion: str) -> str:
-    ml = message.lower()
-
+# Intent routing: the first topic with a cue in the (lowercased) message wins.
+# Cues are substrings, as before; each topic's cues are compiled into one alternation.
+_INTENTS: List[Tuple[str, List[str], str]] = [
     # Work & career
-    if any(w in ml for w in ['job','work','career','office','boss','colleague','manager','promotion']):
-        return ("प्रिय कर्मयोगी, I understand your workplace challenges.\n\n"
-                "“कर्मण्येवाधिकारस्ते मा फलेषु कदाचन। मा कर्मफलहेतुर्भूर्मा ते सङ्गोऽस्त्वकर्मणि॥” (2.47)\n\n"
-                "You have the right to perform your prescribed duties, but never to the fruits of action.\n\n"
-                "🎯 Practical: Focus on excellence in action; release outcomes.")
-
+    ("work", ['job','work','career','office','boss','colleague','manager','promotion'],
+     ("प्रिय कर्मयोगी, I understand your workplace challenges.\n\n"
+      "“कर्मण्येवाधिकारस्ते मा फलेषु कदाचन। मा कर्मफलहेतुर्भूर्मा ते सङ्गोऽस्त्वकर्मणि॥” (2.47)\n\n"
+      "You have the right to perform your prescribed duties, but never to the fruits of action.\n\n"
+      "🎯 Practical: Focus on excellence in action; release outcomes.")),
     # Relationships
-    if any(w in ml for w in ['relationship','marriage','family','parents','love','breakup','divorce','partner','wife','husband']):
-        return ("प्रिय आत्मा, relationships are mirrors for growth.\n\n"
-                "“सर्वभूतस्थमात्मानं ... सर्वत्र समदर्शनः॥” (6.29)\n\n"
-                "A true yogi sees the Divine in all beings.\n\n"
-                "💕 Practical: Practice forgiveness and see the divine spark in the other.")
-
+    ("relationships", ['relationship','marriage','family','parents','love','breakup','divorce','partner','wife','husband'],
+     ("प्रिय आत्मा, relationships are mirrors for growth.\n\n"
+      "“सर्वभूतस्थमात्मानं ... सर्वत्र समदर्शनः॥” (6.29)\n\n"
+      "A true yogi sees the Divine in all beings.\n\n"
+      "💕 Practical: Practice forgiveness and see the divine spark in the other.")),
     # Money
-    if any(w in ml for w in ['money','financial','debt','poor','rich','salary','income','bills']):
-        return ("वत्स, financial concerns are real—remember this promise:\n\n"
-                "“अनन्याश्चिन्तयन्तो मां ... योगक्षेमं वहाम्यहम्॥” (9.22)\n\n"
-                "Align with dharma; your needs are carried.\n\n"
-                "💰 Practical: Serve through your skills; be diligent and content.")
-
+    ("money", ['money','financial','debt','poor','rich','salary','income','bills'],
+     ("वत्स, financial concerns are real—remember this promise:\n\n"
+      "“अनन्याश्चिन्तयन्तो मां ... योगक्षेमं वहाम्यहम्॥” (9.22)\n\n"
+      "Align with dharma; your needs are carried.\n\n"
+      "💰 Practical: Serve through your skills; be diligent and content.")),
     # Health
-    if any(w in ml for w in ['health','disease','sick','pain','illness','doctor','injury']):
-        return ("प्रिय मित्र, the body is temporary; you are eternal.\n\n"
-                "“वासांसि जीर्णानि ... देही॥” (2.22)\n\n"
-                "Care for the body as a temple, but don’t identify with it.\n\n"
-                "🏥 Practical: Sattvic food, breathwork, gentle movement, steady mind.")
-
+    ("health", ['health','disease','sick','pain','illness','doctor','injury'],
+     ("प्रिय मित्र, the body is temporary; you are eternal.\n\n"
+      "“वासांसि जीर्णानि ... देही॥” (2.22)\n\n"
+      "Care for the body as a temple, but don’t identify with it.\n\n"
+      "🏥 Practical: Sattvic food, breathwork, gentle movement, steady mind.")),
     # Fear/Anxiety
-    if any(w in ml for w in ['fear','afraid','scared','anxiety','panic','worry','worried']):
-        return ("वत्स, fear fades with remembrance of your true nature.\n\n"
-                "“सर्वधर्मान्परित्यज्य ... मा शुचः॥” (18.66)\n\n"
-                "🛡️ Practical: Breathe, pray, surrender the outcome, act with courage.")
-
+    ("fear", ['fear','afraid','scared','anxiety','panic','worry','worried'],
+     ("वत्स, fear fades with remembrance of your true nature.\n\n"
+      "“सर्वधर्मान्परित्यज्य ... मा शुचः॥” (18.66)\n\n"
+      "🛡️ Practical: Breathe, pray, surrender the outcome, act with courage.")),
     # Anger
-    if any(w in ml for w in ['anger','angry','mad','frustrated','hate','irritated','rage','furious']):
-        return ("मित्र, anger clouds wisdom.\n\n"
-                "“क्रोधाद्भवति सम्मोहः ... प्रणश्यति॥” (2.63)\n\n"
-                "🔥 Practical: Pause, exhale slowly, choose one constructive action.")
-
+    ("anger", ['anger','angry','mad','frustrated','hate','irritated','rage','furious'],
+     ("मित्र, anger clouds wisdom.\n\n"
+      "“क्रोधाद्भवति सम्मोहः ... प्रणश्यति॥” (2.63)\n\n"
+      "🔥 Practical: Pause, exhale slowly, choose one constructive action.")),
     # Sadness
-    if any(w in ml for w in ['sad','depression','lonely','grief','cry','sorrow','heartbroken']):
-        return ("प्रिय आत्मा, your pain is seen.\n\n"
-                "“न त्वेवाहं जातु नासं ... परम्॥” (2.12)\n\n"
-                "🌅 Practical: Gentle self-care, connection, and remember—this too shall pass.")
-
+    ("sadness", ['sad','depression','lonely','grief','cry','sorrow','heartbroken'],
+     ("प्रिय आत्मा, your pain is seen.\n\n"
+      "“न त्वेवाहं जातु नासं ... परम्॥” (2.12)\n\n"
+      "🌅 Practical: Gentle self-care, connection, and remember—this too shall pass.")),
     # Stress
-    if any(w in ml for w in ['stress','pressure','overwhelm','burden','tension','burnout','stressed']):
-        return ("प्रिय मित्र, release attachment to outcomes.\n\n"
-                "“योगस्थः कुरु कर्माणि ... उच्यते॥” (2.48)\n\n"
-                "⚖️ Practical: Focus on effort; meditate daily for equanimity.")
-
+    ("stress", ['stress','pressure','overwhelm','burden','tension','burnout','stressed'],
+     ("प्रिय मित्र, release attachment to outcomes.\n\n"
+      "“योगस्थः कुरु कर्माणि ... उच्यते॥” (2.48)\n\n"
+      "⚖️ Practical: Focus on effort; meditate daily for equanimity.")),
     # Confusion / Purpose
-    if any(w in ml for w in ['confused','lost','direction','purpose','meaning','which way','what should i do']):
-        return ("वत्स, confusion precedes clarity.\n\n"
-                "“यदा ते मोहकलिलं ... च॥” (2.52)\n\n"
-                "🧭 Practical: Quiet the mind; seek knowledge; your dharma will reveal itself.")
+    ("purpose", ['confused','lost','direction','purpose','meaning','which way','what should i do'],
+     ("वत्स, confusion precedes clarity.\n\n"
+      "“यदा ते मोहकलिलं ... च॥” (2.52)\n\n"
+      "🧭 Practical: Quiet the mind; seek knowledge; your dharma will reveal itself.")),
+]
+INTENT_ROUTES: List[Tuple[str, re.Pattern, str]] = [
+    (topic, re.compile('|'.join(re.escape(c) for c in cues)), response) for topic, cues, response in _INTENTS
+]
+
+def message_topics(message_lower: str) -> List[str]:
+    """Every intent topic with a cue in the message, in routing order (the first one is the route taken)."""
+    return [topic for topic, cue_re, _ in INTENT_ROUTES if cue_re.search(message_lower)]
+
+def generate_krishna_response(message: str, emotion: str, data: AppData = None,
+                              doc: AnalysisDocument = None, shloka: Dict = None) -> str:
+    """Intent reply when a topic cue matches, else the emotion reply with `shloka` (default: the next in rotation)."""
+    ml = doc.lower if doc is not None else message.lower()
+    for _, cue_re, response in INTENT_ROUTES:
+        if cue_re.search(ml):
+            return response
 
     # Default: tie to detected emotion
-    shloka = get_relevant_shloka(emotion)
+    shloka = shloka or get_relevant_shloka(emotion, data)
     return (f"प्रिय, I sense **{emotion.replace('_',' ')}**.\n\n"
             f"{shloka['sanskrit']}\n\n"
             f"{shloka['translation']}\n\n"
             f"Practical: {shloka['practical_advice']}")
 
+# ------------------------------------
+# Admission control
+# ------------------------------------
+def admission_controlled(view):
+    """
+    Run the view under ADMISSION. The view gets degraded=True when it was
+    admitted on the overload path; rejected requests get a 503 with Retry-After.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        ticket = ADMISSION.acquire()
+        if ticket is None:
+            return jsonify({"error": "Server is busy, please retry shortly"}), 503, {"Retry-After": "1"}
+        try:
+            return view(*args, degraded=ticket.degraded, **kwargs)
+        finally:
+            ADMISSION.release(ticket)
+    return wrapper
+
 # ------------------------------------
 # API Endpoints
 # ------------------------------------
@@ -618,63 +582,105 @@ def generate_krishna_response(message: str, emotion: str) -> str:
 def health_check():
     return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat()})
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness (/health is liveness): 503 until warm-up inference has run in this process or its master."""
+    if WARMUP_MODE == 'lazy':
+        READINESS.run(warm_up)
+    status = READINESS.status()
+    status["mode"] = WARMUP_MODE
+    status["memory"] = memory_usage()
+    if not status["ready"]:
+        return jsonify(status), 503, {"Retry-After": "1"}
+    return jsonify(status)
+
 @app.route('/api/analyze-emotion', methods=['POST'])
-def analyze_emotion_endpoint():
+@admission_controlled
+def analyze_emotion_endpoint(degraded: bool = False):
     try:
         data = request.get_json(force=True) or {}
         text = data.get('text', '')
         if not text.strip():
             return jsonify({"error": "Text input is required"}), 400
+        if len(text) > MAX_INPUT_CHARS:
+            return jsonify({"error": f"Text exceeds {MAX_INPUT_CHARS} characters"}), 413
+        # {"include_signals": false} drops blob_polarity / blob_subjectivity (skips the TextBlob pass)
+        include_signals = data.get('include_signals', True)
+        if not isinstance(include_signals, bool):
+            return jsonify({"error": "include_signals must be true or false"}), 400
 
-        result = analyze_emotion(text)
-        shloka = get_relevant_shloka(result['emotion'])
+        snapshot = DATA.current
+        result = analyze_emotion(text, snapshot, include_signals=include_signals, degraded=degraded)
 
-        # persist
-        save_emotion_row(
-            result['emotion'],
-            result['confidence'],
-            text,
-            result['sentiment']['label'],
-            result['sentiment']['compound']
-        )
+        # rotation, recently shown verse and the row itself are committed together
+        with write_transaction() as conn:
+            shloka_index = snapshot.selector.next_index(result['emotion'], conn=conn)
+            RECOMMENDER.mark_shown(conn, "default", [snapshot.all_shlokas[shloka_index]])
+            insert_emotion_row(
+                conn,
+                result['emotion'],
+                result['confidence'],
+                text,
+                result['sentiment']['label'],
+                result['sentiment']['compound']
+            )
 
-        return jsonify({
+        return json_response({
             "emotion": result['emotion'],
             "confidence": result['confidence'],
             "top_emotions": result['top_emotions'],
             "sentiment": result['sentiment'],
-            "shloka": {
-                "sanskrit": shloka['sanskrit'],
-                "translation": shloka['translation'],
-                "chapter": shloka['chapter'],
-                "verse": shloka['verse'],
-                "explanation": shloka['explanation'],
-                "practical_advice": shloka['practical_advice']
-            },
+            # sanskrit, translation, chapter, verse, explanation, practical_advice (pre-encoded)
+            "shloka": snapshot.fragments.cards[shloka_index],
+            "data_version": snapshot.version,
+            "degraded": degraded,
             "timestamp": datetime.now().isoformat()
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/chat', methods=['POST'])
-def chat_endpoint():
+@admission_controlled
+def chat_endpoint(degraded: bool = False):
     try:
         data = request.get_json(force=True) or {}
         message = data.get('message', '')
         if not message.strip():
             return jsonify({"error": "Message is required"}), 400
+        if len(message) > MAX_INPUT_CHARS:
+            return jsonify({"error": f"Message exceeds {MAX_INPUT_CHARS} characters"}), 413
+        # the client echoes the id it got back; a missing one starts a new conversation
+        conversation_id = data.get('conversation_id') or new_id()
+        if not valid_id(conversation_id):
+            return jsonify({"error": "conversation_id must be 1-64 characters of A-Z, a-z, 0-9, _ or -"}), 400
+        include_signals = data.get('include_signals', True)
+        if not isinstance(include_signals, bool):
+            return jsonify({"error": "include_signals must be true or false"}), 400
 
-        emotion_result = analyze_emotion(message)
-        response_text = generate_krishna_response(message, emotion_result['emotion'])
+        snapshot = DATA.current
+        # one tokenization for analysis and intent routing (long inputs are tokenized per window instead)
+        doc = AnalysisDocument(message) if len(message) <= ANALYSIS_WINDOW_CHARS else None
+        emotion_result = analyze_emotion(doc or message, snapshot, include_signals=include_signals,
+                                         degraded=degraded)
+        emotion = emotion_result['emotion']
+        confidence = emotion_result['confidence']
+        compound = emotion_result['sentiment']['compound']
+        topics = message_topics(doc.lower if doc is not None else message.lower())
 
-        # persist
-        save_emotion_row(
-            emotion_result['emotion'],
-            emotion_result['confidence'],
-            message,
-            emotion_result['sentiment']['label'],
-            emotion_result['sentiment']['compound']
-        )
+        # session turn + emotion row in one write transaction: workers share the conversation through SQLite
+        with write_transaction() as conn:
+            session = SESSIONS.open(conn, conversation_id)
+            # a message without a clear keyword lead is answered for the conversation's mood so far
+            margin = emotion_result['details'].get('lexical_margin')
+            reply_emotion = SESSIONS.reply_emotion(session, emotion, margin)
+            # topic replies quote a fixed verse; emotion replies avoid the conversation's recent ones
+            shloka = None if topics else conversation_shloka(reply_emotion, session, snapshot, conn)
+            # O(1) per message: the turn is folded into the rolling state, earlier turns are not re-read
+            conversation = SESSIONS.save(conn, session, emotion, confidence, compound,
+                                         [(e['emotion'], e['score']) for e in emotion_result['top_emotions']],
+                                         topics, verse_key(shloka) if shloka else None, margin)
+            insert_emotion_row(conn, emotion, confidence, message, emotion_result['sentiment']['label'], compound)
+        response_text = generate_krishna_response(message, reply_emotion, snapshot, doc, shloka)
 
         return jsonify({
             "response": response_text,
@@ -682,6 +688,10 @@ def chat_endpoint():
             "confidence": emotion_result['confidence'],
             "sentiment": emotion_result['sentiment'],
             "top_emotions": emotion_result['top_emotions'],
+            "reply_emotion": reply_emotion,
+            "conversation": conversation,
+            "data_version": snapshot.version,
+            "degraded": degraded,
             "timestamp": datetime.now().isoformat()
         })
     except Exception as e:
@@ -690,13 +700,12 @@ def chat_endpoint():
 @app.route('/api/daily-quote', methods=['GET'])
 def daily_quote():
     try:
-        all_shlokas = []
-        for arr in GITA_SHLOKAS.values():
-            all_shlokas.extend(arr)
-        daily_shloka = random.choice(all_shlokas)
-        return jsonify({
-            "shloka": daily_shloka,
-            "date": datetime.now().date().isoformat()
+        snapshot = DATA.current
+        index = random.randrange(len(snapshot.all_shlokas))
+        return json_response({
+            "shloka": snapshot.fragments.full[index],
+            "date": datetime.now().date().isoformat(),
+            "data_version": snapshot.version
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -704,29 +713,29 @@ def daily_quote():
 @app.route('/api/user-progress', methods=['GET'])
 def get_user_progress():
     try:
+        # fixed-cost read of the incremental trend state (no scan of user_emotions)
         conn = db_connect()
-        c = conn.cursor()
-        c.execute('''SELECT emotion, COUNT(*) as count 
-                     FROM user_emotions 
-                     WHERE datetime(timestamp) >= datetime('now', '-30 days')
-                     GROUP BY emotion''')
-        emotion_stats = dict(c.fetchall())
-
-        positive_emotions = sum(emotion_stats.get(k, 0) for k in ['joy','gratitude','steadiness'])
-        negative_emotions = sum(emotion_stats.get(k, 0) for k in ['sadness','anger','fear','anxiety','guilt','shame'])
-        total_emotions = sum(emotion_stats.values())
-        emotional_balance = 50.0
-        if total_emotions > 0:
-            emotional_balance = (positive_emotions / total_emotions) * 100.0
-
-        conn.close()
+        try:
+            summary = TRENDS.summary(conn)
+            conn.commit()  # persists a one-time backfill if this was the first read
+        finally:
+            conn.close()
 
+        total_emotions = summary['window_total']
         return jsonify({
             "karma_points": 150 + (total_emotions * 10),
-            "streak_days": 7,
-            "emotional_balance": round(emotional_balance, 1),
-            "emotion_distribution": emotion_stats,
-            "total_sessions": total_emotions
+            "streak_days": summary['streak']['current'],
+            "emotional_balance": summary['emotional_balance'],
+            "emotion_distribution": summary['emotion_distribution'],
+            "total_sessions": total_emotions,
+            "trends": {
+                "streak": summary['streak'],
+                "mood": summary['mood'],
+                "daily": summary['series']['daily'],
+                "weekly": summary['series']['weekly'],
+                "monthly": summary['series']['monthly'],
+                "all_time_sessions": summary['all_time_total'],
+            }
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -735,39 +744,316 @@ def get_user_progress():
 def get_user_journey():
     try:
         conn = db_connect()
-        c = conn.cursor()
-        c.execute('''SELECT emotion, confidence, input_text, sentiment, compound, timestamp 
-                     FROM user_emotions 
-                     ORDER BY timestamp DESC 
-                     LIMIT 10''')
-        rows = c.fetchall()
-        conn.close()
+        try:
+            rows = storage.select_rows(conn, order="e.ts_us DESC", limit=10)
+        finally:
+            conn.close()
 
+        snapshot = DATA.current
+        selector = snapshot.selector
         entries = []
-        for emotion, confidence, input_text, sentiment, compound, ts in rows:
-            shloka = get_relevant_shloka(emotion)
+        for row_id, emotion, confidence, input_text, sentiment, compound, ts in rows:
+            # keyed by row id: the same entry always previews the same verse
             entries.append({
                 "emotion": emotion,
                 "confidence": confidence,
                 "input_text": (input_text[:100] + "...") if len(input_text) > 100 else input_text,
-                "timestamp": ts,
+                "timestamp": storage.format_ts(ts),
                 "sentiment": {"label": sentiment, "compound": compound},
-                "shloka_preview": shloka['translation'][:120] + "...",
+                "shloka_preview": selector.preview(emotion, row_id),
                 "mood_score": int(round(confidence * 10))
             })
 
-        return jsonify({"entries": entries})
+        # gzip when the client accepts it and the body is large enough (JSON_GZIP_MIN_BYTES)
+        return json_response({"entries": entries, "data_version": snapshot.version}, compress=True)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/similar-moments', methods=['GET', 'POST'])
+def similar_moments():
+    """
+    Past entries most similar to `text` (or to entry `id`, which is left out
+    of the results), best first with their emotions. k: 1-20, default 5.
+    """
+    try:
+        data = (request.get_json(silent=True) if request.method == 'POST' else request.args) or {}
+        k = max(1, min(int(data.get('k', 5)), 20))
+        text = data.get('text') or ''
+        if not isinstance(text, str):
+            return jsonify({"error": "text must be a string"}), 400
+        entry_id = int(data['id']) if data.get('id') is not None else None
+        if entry_id is None and not text.strip():
+            return jsonify({"error": "text or id is required"}), 400
+        if len(text) > MAX_INPUT_CHARS:
+            return jsonify({"error": f"Text exceeds {MAX_INPUT_CHARS} characters"}), 413
+
+        conn = db_connect()
+        try:
+            if entry_id is not None:
+                found = storage.select_rows(conn, "e.id = ?", (entry_id,))
+                if not found:
+                    return jsonify({"error": "Entry not found"}), 404
+                text = found[0][3] or ''
+            # a few spare matches cover rows retention has removed since they were indexed
+            matches = SIMILAR.search(conn, text, k + 5, exclude=(entry_id,) if entry_id is not None else ())
+            ids = [row_id for row_id, _ in matches]
+            rows = {r[0]: r for r in storage.select_rows(conn, f"e.id IN ({','.join('?' * len(ids))})", ids)} \
+                if ids else {}
+        finally:
+            conn.close()
+        missing = [row_id for row_id in ids if row_id not in rows]
+        if missing:
+            SIMILAR.forget(missing)
+
+        entries = []
+        for row_id, similarity in matches:
+            if row_id not in rows:
+                continue
+            _, emotion, confidence, input_text, sentiment, compound, ts = rows[row_id]
+            input_text = input_text or ''
+            entries.append({
+                "id": row_id,
+                "similarity": round(similarity, 4),
+                "emotion": emotion,
+                "confidence": confidence,
+                "input_text": (input_text[:100] + "...") if len(input_text) > 100 else input_text,
+                "timestamp": storage.format_ts(ts),
+                "sentiment": {"label": sentiment, "compound": compound},
+            })
+            if len(entries) >= k:
+                break
+        return jsonify({"entries": entries, "query": {"id": entry_id, "k": k}})
+    except ValueError:
+        return jsonify({"error": "k and id must be integers"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def _seed_recommender(user: str):
+    """One-time seed of a user's profile from the latest history; later saves update it incrementally."""
+    with write_transaction() as conn:
+        if not RECOMMENDER.has_user(conn, user):  # another worker may have seeded it meanwhile
+            rows = [(r[1], r[2]) for r in storage.select_rows(conn, order="e.id DESC", limit=RECOMMEND_SEED_ROWS,
+                                                              text=False)]
+            RECOMMENDER.seed(conn, user, reversed(rows))
+
+@app.route('/api/recommendations', methods=['GET'])
+def get_recommendations():
+    """
+    Top-k verses for the user's profile. A read: prefetches and retries see
+    the same verses; the client reports what it displayed through
+    POST /api/recommendations/shown. k: 1-10, default 3.
+    """
+    try:
+        k = max(1, min(int(request.args.get('k', 3)), 10))
+        user = "default"
+        snapshot = DATA.current
+        conn = db_connect()
+        try:
+            if not RECOMMENDER.has_user(conn, user):
+                _seed_recommender(user)
+            recommendations = RECOMMENDER.recommend(conn, snapshot.relevance, user, k, mark=False)
+            profile = RECOMMENDER.profile(conn, user)
+        finally:
+            conn.close()
+        return jsonify({
+            "recommendations": recommendations,
+            "profile": profile,
+            "data_version": snapshot.version
+        })
+    except ValueError:
+        return jsonify({"error": "k must be an integer"}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/recommendations/shown', methods=['POST'])
+def recommendations_shown():
+    """
+    Record verses the client displayed ({"shlokas": [{"chapter", "verse"}, ...]},
+    at most 10); they are left out of the next recommendations.
+    """
+    data = request.get_json(silent=True) or {}
+    shlokas = data.get('shlokas')
+    if (not isinstance(shlokas, list) or not 0 < len(shlokas) <= 10
+            or not all(isinstance(s, dict) and isinstance(s.get('chapter'), int) and isinstance(s.get('verse'), int)
+                       for s in shlokas)):
+        return jsonify({"error": "shlokas must be a list of 1-10 {chapter, verse} objects with integer fields"}), 400
+    try:
+        with write_transaction() as conn:
+            RECOMMENDER.mark_shown(conn, "default", shlokas)
+        return jsonify({"recorded": len(shlokas)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# -------- Admin: runtime controls --------
+_LOOPBACK = ('127.0.0.1', '::1')
+
+def _admin_authorized() -> bool:
+    """
+    With ADMIN_TOKEN set, the X-Admin-Token header must match it. Without one
+    the admin API is read-only and only open to direct (unproxied) loopback
+    requests: retention runs, reloads, resets and re-tuning (every POST)
+    always need a configured token.
+    """
+    token = os.environ.get('ADMIN_TOKEN')
+    if token:
+        return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+    return (request.method == 'GET' and request.remote_addr in _LOOPBACK
+            and 'X-Forwarded-For' not in request.headers)
+
+@app.route('/api/admin/profiling', methods=['GET', 'POST'])
+def profiling_admin():
+    if not _admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    if request.method == 'GET':
+        return jsonify(PROFILER.config())
+    try:
+        data = request.get_json(force=True) or {}
+        return jsonify(PROFILER.configure(**data))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/admin/retention', methods=['GET', 'POST'])
+def retention_admin():
+    """GET: config, last report and table stats. POST: run one pass now ({"dry_run": true} only counts)."""
+    if not _admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    if request.method == 'GET':
+        conn = db_connect()
+        try:
+            table = retention.table_report(conn)
+        finally:
+            conn.close()
+        return jsonify({"config": RETENTION.config(), "last_report": RETENTION.last_report, "table": table})
+    data = request.get_json(silent=True) or {}
+    return jsonify(RETENTION.dry_run() if data.get('dry_run') else RETENTION.run())
+
+@app.route('/api/admin/reload', methods=['GET', 'POST'])
+def reload_admin():
+    """GET: live data versions. POST: rebuild every data snapshot from data/*.json and swap it in."""
+    if not _admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    if request.method == 'GET':
+        return jsonify({"versions": versions()})
+    results = reload_all()
+    status = 200 if all(r['ok'] for r in results) else 500
+    return jsonify({"results": results, "versions": versions()}), status
+
+@app.route('/api/admin/metrics', methods=['GET', 'POST'])
+def metrics_admin():
+    """GET: this worker's counters and derived ratios. POST: reset them."""
+    if not _admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    if request.method == 'POST':
+        METRICS.reset()
+    snap = METRICS.snapshot()
+    snap["ratios"] = ratios(snap["counters"], [
+        ("pattern_needed_for_scoring", "sentiment.pattern.scoring", "analysis.total"),
+        ("pattern_computed", "sentiment.pattern.computed", "analysis.total"),
+        ("signals_omitted", "analysis.signals_omitted", "analysis.total"),
+        ("degraded", "analysis.degraded", "analysis.total"),
+    ])
+    snap["admission"] = ADMISSION.config()
+    conn = db_connect()
+    try:
+        snap["sessions"] = SESSIONS.stats(conn)
+    finally:
+        conn.close()
+    snap["similarity"] = SIMILAR.stats()
+    return jsonify(snap)
+
+@app.route('/api/admin/admission', methods=['GET', 'POST'])
+def admission_admin():
+    """GET: limiter settings and live state. POST: update settings ({"limit": 16, "overload": "reject", ...})."""
+    if not _admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    if request.method == 'GET':
+        return jsonify(ADMISSION.config())
+    try:
+        data = request.get_json(force=True) or {}
+        return jsonify(ADMISSION.configure(**data))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
 # -------- Optional: inspect emotions/keywords --------
 @app.route('/api/emotions', methods=['GET'])
 def list_emotions():
+    snapshot = DATA.current
     return jsonify({
-        "emotions": sorted(list(GITA_SHLOKAS.keys())),
-        "lexicon_counts": {k: len(v) for k, v in RAW_EMOTION_KEYWORDS.items()}
+        "emotions": sorted(list(snapshot.shlokas.keys())),
+        "lexicon_counts": {k: len(v) for k, v in snapshot.keywords.items()},
+        "data_version": snapshot.version
     })
 
+# ------------------------------------
+# Warm-up and preloading
+# ------------------------------------
+WARMUP_TEXTS = (
+    "I feel anxious about my exam tomorrow, but I'm not angry and grateful for my friends",  # hits + context rules
+    "nothing much happened today",  # no keyword hits: the sentiment-only fallback (TextBlob pass)
+    "my boss at work keeps piling on pressure",  # intent route
+)
+
+def warm_up() -> Dict:
+    """
+    Run every analysis path once, without side effects on user state (no rows
+    saved, no rotation advanced, no session recorded): short, windowed and
+    degraded analysis, both reply kinds, response encoding and Flask routing.
+    Also loads the similar-moments index (checkpoint + rows newer than it).
+    """
+    snapshot = DATA.current
+    long_text = " ".join(WARMUP_TEXTS * (ANALYSIS_WINDOW_CHARS // len(" ".join(WARMUP_TEXTS)) + 2))
+    analyses = 0
+    for text in WARMUP_TEXTS + (long_text,):
+        doc = AnalysisDocument(text) if len(text) <= ANALYSIS_WINDOW_CHARS else None
+        result = analyze_emotion(doc or text, snapshot)
+        analyze_emotion(text, snapshot, include_signals=False, degraded=True)
+        message_topics(text.lower())
+        generate_krishna_response(text, result['emotion'], snapshot, doc, snapshot.selector.pick(result['emotion'], 0))
+        analyses += 2
+    with app.test_request_context(headers={"Accept-Encoding": "gzip"}):
+        json_response({"shloka": snapshot.fragments.cards[0], "entries": [snapshot.fragments.full[0]] * 8},
+                      compress=True)
+    client = app.test_client()
+    for path in ('/health', '/api/emotions'):
+        client.get(path)
+    # load (or build) the similar-moments index, so the first query only catches up on new rows
+    conn = db_connect()
+    try:
+        similar_entries = len(SIMILAR.sync(conn))
+    finally:
+        conn.close()
+    return {"analyses": analyses, "similar_entries": similar_entries, "data_version": snapshot.version}
+
+_PROFILER_PAUSED = False
+
+def prepare_for_fork() -> Dict:
+    """
+    Master side of preloading (gunicorn.conf.py): warm up, stop the threads
+    that must not cross a fork, then freeze the heap so workers share it.
+    """
+    global _PROFILER_PAUSED
+    READINESS.run(warm_up)
+    METRICS.reset()  # warm-up analyses are not traffic
+    if PROFILER.enabled:
+        PROFILER.configure(enabled=False)
+        _PROFILER_PAUSED = True
+    READINESS.frozen = freeze_heap()
+    return READINESS.status()
+
+def after_fork():
+    """Worker side of preloading: per-process state the master could not hand over."""
+    random.seed()  # otherwise every worker replays the master's random sequence
+    install_reload_signal()  # the server resets SIGHUP in its workers
+    if RETENTION_INTERVAL_S > 0:
+        RETENTION.start(RETENTION_INTERVAL_S)
+    if _PROFILER_PAUSED:
+        PROFILER.configure(enabled=True)
+
+if WARMUP_MODE == 'sync':
+    READINESS.run(warm_up)
+elif WARMUP_MODE == 'background':
+    READINESS.start_background(warm_up)
+
 # ------------------------------------
 # Run
 # ------------------------------------
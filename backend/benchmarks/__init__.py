@@ -0,0 +1,21 @@
+"""
+Benchmark suite for the analysis and persistence hot paths.
+
+Run from the backend/ directory:
+    python -m benchmarks.run --update-baseline  # store this run as the baseline (once per machine)
+    python -m benchmarks.run                    # full run, compare against baseline.json (status 2 without one)
+    python -m benchmarks.run --quick            # smaller corpus, fewer repeats
+    python -m benchmarks.run --only detect      # substring filter on case names
+    python -m benchmarks.run --no-baseline      # time only, no comparison
+    python -m benchmarks.memory                 # lexicon memory footprint (RSS / traced bytes)
+    python -m benchmarks.calibration            # confidence calibration error (ECE) before/after
+    python -m benchmarks.context                # negation / contrast accuracy + latency vs previous scoring
+    python -m benchmarks.sentiment              # fused sentiment parity with VADER + TextBlob, signal usage, throughput
+    python -m benchmarks.cascade                # cascaded analyzer: accuracy / latency per margin and deadline
+    python -m benchmarks.overload               # admission control under closed-loop HTTP overload (p50 / p99, shed share)
+    python -m benchmarks.serialization          # response encode time + bytes on the wire per endpoint (jsonify vs fragments)
+    python -m benchmarks.sessions               # chat session store: cost per message by depth, bytes per session, memory cap
+    python -m benchmarks.preload                # per-worker RSS / PSS and cold-request latency, per-worker import vs preloaded fork
+    python -m benchmarks.storage                # user_emotions schema v1 vs v2: file size, journey / scan / trend rebuild reads, migration rate
+    python -m benchmarks.similarity             # similar moments: TF-IDF index build, query p50 / p95 by history size, checkpoint, exact top-k agreement
+"""
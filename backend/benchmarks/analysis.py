@@ -0,0 +1,31 @@
+"""Analyzer hot paths: app.score_emotions / analyze_emotion and EnhancedEmotionAnalyzer."""
+
+from typing import Dict, List
+
+from benchmarks.common import Case, load_app, analyzer
+from text_pipeline import AnalysisDocument
+
+
+def cases(corpus: Dict[str, List[str]]) -> List[Case]:
+    app_module = load_app()
+    plain = analyzer(expand_wordnet=False)
+    expanded = analyzer(expand_wordnet=True)
+
+    out: List[Case] = []
+    for shape, texts in corpus.items():
+        out.append(Case(f"app.score_emotions[{shape}]", app_module.score_emotions, texts))
+        out.append(Case(f"app.analyze_emotion[{shape}]", app_module.analyze_emotion, texts))
+        out.append(Case(f"detect_emotion.plain[{shape}]", plain.detect_emotion, texts))
+        out.append(Case(f"detect_emotion.wordnet[{shape}]", expanded.detect_emotion, texts))
+        out.append(Case(f"detect_emotion.lean[{shape}]", lambda t: plain.detect_emotion(t, lean=True), texts))
+
+    # lexical stages alone (phrase / keyword / fuzzy accumulation into the score vector)
+    for shape in ("short_chat", "adversarial"):
+        # fresh documents per call so cached context weights do not hide the pass
+        out.append(Case(f"lexical_scores[{shape}]", lambda t: plain._lexical_scores(AnalysisDocument(t)), corpus[shape]))
+
+    # fuzzy fallback in isolation, on tokenized inputs
+    for shape in ("short_chat", "adversarial"):
+        token_lists = [expanded._tokenize(t) for t in corpus[shape]]
+        out.append(Case(f"fuzzy_matches[{shape}]", expanded._fuzzy_matches, token_lists))
+    return out
@@ -0,0 +1,28 @@
+"""End-to-end /api/* endpoints through Flask's test client."""
+
+from typing import Dict, List
+
+from benchmarks.common import Case, test_client
+
+
+def _check(resp):
+    if resp.status_code >= 400:
+        raise RuntimeError(f"{resp.request.path} -> {resp.status_code}: {resp.get_data(as_text=True)[:200]}")
+    return resp
+
+
+def cases(corpus: Dict[str, List[str]]) -> List[Case]:
+    client = test_client()
+    short = corpus["short_chat"]
+
+    out: List[Case] = []
+    for shape, texts in corpus.items():
+        out.append(Case(f"POST /api/analyze-emotion[{shape}]",
+                        lambda t: _check(client.post("/api/analyze-emotion", json={"text": t})), texts))
+        out.append(Case(f"POST /api/chat[{shape}]",
+                        lambda t: _check(client.post("/api/chat", json={"message": t})), texts))
+
+    # read endpoints: one request per item so counts line up with the write cases
+    for path in ("/api/daily-quote", "/api/user-progress", "/api/journey", "/api/emotions"):
+        out.append(Case(f"GET {path}", lambda _t, p=path: _check(client.get(p)), short[:20]))
+    return out
@@ -0,0 +1,86 @@
+"""
+Confidence calibration: expected calibration error before/after the lookup
+tables, and the cost of the lookup itself.
+
+    python -m benchmarks.calibration --table calibration.json    # held-out ECE report (both models)
+    python -m benchmarks.calibration --table calibration.json --labelled held_out.jsonl --bins 15
+
+Without --table it evaluates CALIBRATION_FILE (unset: no calibration, so raw
+and calibrated agree). As a suite (benchmarks.run) it times lookups through a
+fixed 32-knot curve per value and per batch.
+"""
+
+import sys
+import json
+import argparse
+from typing import Dict, List, Optional
+
+from benchmarks.common import Case
+
+
+def cases(corpus: Dict[str, List[str]]) -> List[Case]:
+    from calibration import CalibrationTable
+
+    # no table ships with the repo: time the lookup itself on a monotone curve of the fitted size
+    xs = [0.3 + i * 0.65 / 31 for i in range(32)]
+    table = CalibrationTable(xs, [0.1 + 0.8 * (x - 0.3) / 0.65 for x in xs])
+    values = [i / 997.0 for i in range(997)]
+    batches = [values[i:i + 100] for i in range(0, len(values), 100)]
+    return [
+        Case("calibration.apply", table, values),
+        Case("calibration.apply_many[100]", lambda b: table.apply_many(b, 0.01, 0.99), batches),
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Expected calibration error of raw vs calibrated confidence")
+    parser.add_argument("--n", type=int, default=1000, help="labelled samples")
+    parser.add_argument("--seed", type=int, default=9, help="synthetic corpus seed (`calibration.py fit` uses 4)")
+    parser.add_argument("--labelled", help="JSON lines of {\"text\", \"emotion\"} instead of the synthetic corpus")
+    parser.add_argument("--table", help="table under data/ (or a path) to evaluate (default: CALIBRATION_FILE)")
+    parser.add_argument("--bins", type=int, default=10)
+    parser.add_argument("--output", "-o", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    from benchmarks.corpus import labelled
+    from calibration import (MODELS, POOLED, collect_samples, expected_calibration_error, group_by_emotion,
+                             load_calibration_set, read_labelled)
+
+    table_set = load_calibration_set(args.table)
+    for reason in table_set.rejected:
+        print(f"rejected {reason}", file=sys.stderr)
+    pairs = read_labelled(args.labelled) if args.labelled else labelled(args.n, args.seed)
+    results = []
+    for model in MODELS:
+        samples = collect_samples(model, pairs)
+        raw = [s for _, s, _ in samples]
+        correct = [y for _, _, y in samples]
+        calibrated = list(raw)
+        curves = table_set.models.get(model, {})
+        for emo, idx in group_by_emotion(samples).items():
+            table = curves[emo] if emo in curves else curves.get(POOLED)
+            if table is not None:
+                for i, v in zip(idx, table.apply_many([raw[i] for i in idx], 0.01, 0.99)):
+                    calibrated[i] = v
+        r = {
+            "model": model,
+            "n": len(samples),
+            "accuracy": round(sum(correct) / max(1, len(correct)), 4),
+            "mean_raw": round(sum(raw) / max(1, len(raw)), 4),
+            "mean_calibrated": round(sum(calibrated) / max(1, len(calibrated)), 4),
+            "ece_raw": round(expected_calibration_error(raw, correct, args.bins), 4),
+            "ece_calibrated": round(expected_calibration_error(calibrated, correct, args.bins), 4),
+            "table_version": table_set.version,
+        }
+        results.append(r)
+        print(f"{model:<9} n={r['n']}  accuracy {r['accuracy']:.3f}   mean conf {r['mean_raw']:.3f} -> "
+              f"{r['mean_calibrated']:.3f}   ECE {r['ece_raw']:.4f} -> {r['ece_calibrated']:.4f}  "
+              f"[{r['table_version']}]", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Cascaded analysis: accuracy and latency of EnhancedEmotionAnalyzer with the
+TextBlob pass gated on the lexical margin, and under per-call deadlines.
+
+    python -m benchmarks.cascade                       # margin and deadline curves
+    python -m benchmarks.cascade --n 600 --margins 0.9,0.5,0.2 --budgets-us 2000,500,0
+
+"margin off" is the full pipeline; a margin of 0 never escalates. For every
+point the report gives accuracy on the labelled and contextual corpora, the
+share of texts that ran the TextBlob pass, and median / p95 latency. As a
+suite (benchmarks.run) it times detect_emotion with the cascade at 0.5.
+"""
+
+import sys
+import json
+import time
+import argparse
+import statistics
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.common import Case, analyzer
+
+DEFAULT_MARGINS = "off,0.9,0.75,0.5,0.3,0.1,0"
+DEFAULT_BUDGETS_US = "off,5000,1000,250,0"
+
+
+def _detect(a, margin: Optional[float], budget_us: Optional[float] = None, **kwargs) -> Callable[[str], Dict[str, Any]]:
+    """detect_emotion with a given cascade margin and per-call budget (restores the analyzer's margin)."""
+    def run(text: str) -> Dict[str, Any]:
+        previous, a.cascade_margin = a.cascade_margin, margin
+        try:
+            deadline = None if budget_us is None else time.monotonic() + budget_us / 1e6
+            return a.detect_emotion(text, deadline=deadline, **kwargs)
+        finally:
+            a.cascade_margin = previous
+    return run
+
+
+def cases(corpus: Dict[str, List[str]]) -> List[Case]:
+    a = analyzer(expand_wordnet=True)
+    return [Case(f"cascade.detect_lean[{shape}]", _detect(a, 0.5, lean=True), texts)
+            for shape, texts in corpus.items()]
+
+
+def curves(points: List[Tuple[str, Optional[float], Callable[[str], Dict[str, Any]]]],
+           pairs: List[Tuple[str, str]], repeat: int) -> List[Dict[str, Any]]:
+    """
+    Accuracy and TextBlob share per point from the first run. Points are
+    interleaved per text (in rotating order) so host noise hits all of them
+    alike; per-text latency is the best of `repeat`.
+    """
+    correct = [0] * len(points)
+    pattern = [0] * len(points)
+    times = [[float("inf")] * len(pairs) for _ in points]
+    for rep in range(repeat):
+        for k, (text, label) in enumerate(pairs):
+            # rotate the starting point so no configuration always runs first on a text
+            for j in range(len(points)):
+                p = (k + j) % len(points)
+                detect = points[p][2]
+                t0 = time.perf_counter()
+                r = detect(text)
+                times[p][k] = min(times[p][k], (time.perf_counter() - t0) * 1e6)
+                if rep == 0:
+                    correct[p] += r["top_emotion"] == label
+                    cascade = r.get("details", {}).get("cascade")
+                    pattern[p] += cascade is None or "pattern" not in cascade["skipped"]
+    n = max(1, len(pairs))
+    out = []
+    for p, (kind, value, _) in enumerate(points):
+        ts = sorted(times[p])
+        out.append({
+            "kind": kind,
+            "value": value,
+            "accuracy": round(correct[p] / n, 4),
+            "pattern_share": round(pattern[p] / n, 3),
+            "median_us": round(statistics.median(ts), 1) if ts else 0.0,
+            "p95_us": round(ts[int(0.95 * (len(ts) - 1))], 1) if ts else 0.0,
+        })
+    return out
+
+
+def _parse(values: str) -> List[Optional[float]]:
+    return [None if v.strip() == "off" else float(v) for v in values.split(",") if v.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Accuracy / latency curves of the cascaded analyzer")
+    parser.add_argument("--n", type=int, default=500, help="labelled / contextual samples")
+    parser.add_argument("--seed", type=int, default=21)
+    parser.add_argument("--margins", default=DEFAULT_MARGINS, help="comma-separated cascade margins ('off' = full)")
+    parser.add_argument("--budgets-us", default=DEFAULT_BUDGETS_US, help="comma-separated per-call budgets in µs")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", "-o", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    from benchmarks.corpus import contextual, labelled
+
+    pairs = labelled(args.n, args.seed) + [(t, label) for t, label, _ in contextual(args.n, args.seed + 1)]
+    a = analyzer(expand_wordnet=True)
+    # warm the token / sentiment memos so every curve point sees the same cache state
+    warm = _detect(a, None)
+    for text, _ in pairs:
+        warm(text)
+
+    points = [("margin", m, _detect(a, m)) for m in _parse(args.margins)]
+    points += [("budget_us", b, _detect(a, None, b)) for b in _parse(args.budgets_us)]
+    results = curves(points, pairs, args.repeat)
+    for r in results:
+        value = "off" if r["value"] is None else f"{r['value']:g}"
+        print(f"{r['kind']:<9} {value:<5} accuracy {r['accuracy']:.3f}   TextBlob pass {r['pattern_share']:>6.1%}   "
+              f"median {r['median_us']:>7.1f}µs   p95 {r['p95_us']:>7.1f}µs", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
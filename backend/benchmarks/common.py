@@ -0,0 +1,58 @@
+"""Shared fixtures for benchmark suites (cached so each is built once per run)."""
+
+import os
+import atexit
+import shutil
+import tempfile
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, NamedTuple
+
+_TMP_DIR = tempfile.mkdtemp(prefix="bench-")
+atexit.register(shutil.rmtree, _TMP_DIR, True)
+
+
+class Case(NamedTuple):
+    name: str
+    fn: Callable[[Any], Any]
+    items: List[Any]
+
+
+def temp_path(name: str) -> str:
+    """A path inside the run's temp dir (removed at exit)."""
+    return os.path.join(_TMP_DIR, name)
+
+
+def app_env() -> Dict[str, str]:
+    """Environment that sends everything app.py writes (database, indexes, profiles, archive) into a temp dir."""
+    return {
+        "DB_PATH": os.path.join(_TMP_DIR, "bench.db"),
+        "SIMILARITY_DIR": os.path.join(_TMP_DIR, "similarity_index"),
+        "PROFILE_DIR": os.path.join(_TMP_DIR, "profiles"),
+        "RETENTION_ARCHIVE_DIR": os.path.join(_TMP_DIR, "archive"),
+    }
+
+
+@lru_cache(maxsize=None)
+def load_app():
+    """
+    Import the Flask app with everything it writes redirected into a temp dir.
+
+    app.py opens (and migrates) its database and may start the warm-up at
+    import time, so the environment is set before the import. WARMUP_MODE
+    defaults to lazy; suites that measure the warm-up set it themselves.
+    """
+    os.environ.update(app_env())
+    os.environ.setdefault("WARMUP_MODE", "lazy")
+    import app as app_module
+    return app_module
+
+
+@lru_cache(maxsize=None)
+def test_client():
+    return load_app().app.test_client()
+
+
+@lru_cache(maxsize=None)
+def analyzer(expand_wordnet: bool):
+    from emotion_analyzer import EnhancedEmotionAnalyzer
+    return EnhancedEmotionAnalyzer(expand_wordnet=expand_wordnet)
@@ -0,0 +1,81 @@
+"""
+Negation / contrast / modifier handling: accuracy and latency of the context
+stage against the previous scoring (ContextRules.legacy for the analyzer,
+plain hit counting for app.score_emotions).
+
+    python -m benchmarks.context                 # both analyzers, both modes
+    python -m benchmarks.context --n 600 --output context.json
+
+As a suite (benchmarks.run) it times the context scan alone.
+"""
+
+import sys
+import json
+import time
+import argparse
+import statistics
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.common import Case, load_app, analyzer
+
+
+def cases(corpus: Dict[str, List[str]]) -> List[Case]:
+    from context import ContextRules
+    rules = ContextRules()
+    return [Case(f"context.scan[{shape}]", lambda t: rules.scan(t.lower()), texts)
+            for shape, texts in corpus.items() if shape != "adversarial"]
+
+
+def _run(predict: Callable[[str], str], pairs: List[Tuple[str, str, str]]) -> Dict[str, Any]:
+    by_kind: Dict[str, List[int]] = {}
+    times = []
+    for text, label, kind in pairs:
+        t0 = time.perf_counter()
+        pred = predict(text)
+        times.append((time.perf_counter() - t0) * 1e6)
+        by_kind.setdefault(kind, []).append(int(pred == label))
+    out: Dict[str, Any] = {k: round(sum(v) / len(v), 3) for k, v in sorted(by_kind.items())}
+    out["median_us"] = round(statistics.median(times), 1)
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Accuracy / latency of context-aware lexical scoring")
+    parser.add_argument("--n", type=int, default=300, help="samples per corpus")
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--output", "-o", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    from benchmarks.corpus import contextual, labelled
+    from context import ContextRules
+
+    pairs = contextual(args.n, args.seed) + [(t, label, "plain") for t, label in labelled(args.n, args.seed + 1)]
+    app_module = load_app()
+    a = analyzer(expand_wordnet=True)
+    current_app, current_analyzer = app_module.CONTEXT, a.context_rules
+    modes = {
+        "previous": (ContextRules.disabled(), ContextRules.legacy(a.intensity_modifiers)),
+        "context": (current_app, current_analyzer),
+    }
+    results = []
+    try:
+        for mode, (app_rules, analyzer_rules) in modes.items():
+            app_module.CONTEXT, a.context_rules = app_rules, analyzer_rules
+            for model, predict in (("app", lambda t: app_module.analyze_emotion(t)["emotion"]),
+                                   ("analyzer", lambda t: a.detect_emotion(t, lean=True)["top_emotion"])):
+                predict(pairs[0][0])  # warm caches
+                r = {"model": model, "mode": mode, **_run(predict, pairs)}
+                results.append(r)
+                scores = "  ".join(f"{k} {r[k]:.3f}" for k in ("negation", "contrast", "modifier", "plain"))
+                print(f"{model:<9} {mode:<9} {scores}   median {r['median_us']:>8.1f} us", file=sys.stderr)
+    finally:
+        app_module.CONTEXT, a.context_rules = current_app, current_analyzer
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
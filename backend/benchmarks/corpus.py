@@ -0,0 +1,189 @@
+"""
+Synthetic, seeded corpus generator for benchmarks.
+
+The vocabulary is kept local (instead of being read from the analyzers) so the
+corpus - and therefore the baseline - does not shift when the lexicon changes.
+
+Shapes:
+- short_chat:    1-2 sentence chat messages
+- long_journal:  multi-paragraph journal entries (~300-600 words)
+- adversarial:   long inputs that force slow paths (misspellings -> fuzzy
+                 fallback, no lexicon hits, punctuation storms, giant tokens)
+- labelled:      (text, emotion) pairs for accuracy / calibration, with
+                 distractor sentences, misspellings and cue-free texts so the
+                 analyzers are right only some of the time
+- contextual:    (text, emotion, kind) triples where the cue word that is not
+                 the answer is negated, sits before a contrast word or is
+                 softened by a multi-word modifier
+"""
+
+import random
+from typing import Dict, List, Tuple
+
+EMOTION_WORDS: Dict[str, List[str]] = {
+    "joy": ["happy", "elated", "delighted", "cheerful", "thrilled", "made my day", "so happy"],
+    "sadness": ["sad", "lonely", "depressed", "heartbroken", "hopeless", "feeling down", "grief"],
+    "anxiety": ["anxious", "worried", "nervous", "stressed", "panic attack", "can't sleep", "overthinking"],
+    "anger": ["angry", "furious", "annoyed", "livid", "rage", "irritated"],
+    "frustration": ["frustrated", "fed up", "stuck", "blocked", "exasperated"],
+    "fear": ["afraid", "scared", "terrified", "i'm afraid of", "phobia"],
+    "confusion": ["confused", "uncertain", "puzzled", "i don't know what to do", "lost"],
+    "gratitude": ["grateful", "thankful", "blessed", "thank you so much"],
+    "love": ["love", "adore", "cherish", "i care deeply"],
+    "hope": ["hopeful", "optimistic", "fingers crossed", "faith"],
+    "guilt": ["guilty", "regret", "remorse", "sorry"],
+    "duty": ["responsible", "obligated", "duty-bound", "dutiful", "bound by my responsibilities"],
+    "self_mastery": ["in control of my mind", "self-controlled", "disciplined", "determined to master my mind",
+                     "focused"],
+}
+
+FILLER = (
+    "today at work the meeting ran long and then i walked home through the park "
+    "my sister called about the weekend plans we talked for a while about school "
+    "the weather was grey and the train was late again so i read a book on my phone "
+    "dinner was simple rice and lentils and afterwards i tried to write in this journal "
+    "tomorrow there is a deadline for the project and a call with my manager"
+).split()
+
+TEMPLATES = [
+    "I feel {w} about {topic}.",
+    "Honestly I'm {w} right now, {topic} is on my mind.",
+    "Why am I so {w}? It's {topic} again.",
+    "{topic} makes me {w}.",
+    "I have been {w} since {topic} happened.",
+]
+
+TOPICS = ["my job", "the exam", "my family", "money", "my health", "the future", "my partner", "this week"]
+
+# Near-miss spellings that defeat exact/stem matching and land in the fuzzy fallback
+MISSPELLINGS = ["anxiuos", "worrid", "depresed", "frustated", "grateful1", "lonley", "terified",
+                "confussed", "thankfull", "hopefull", "angy", "elatted", "nervus", "stresed"]
+MISSPELLING_LABELS = ["anxiety", "anxiety", "sadness", "frustration", "gratitude", "sadness", "fear",
+                      "confusion", "gratitude", "hope", "anger", "joy", "anxiety", "anxiety"]
+
+
+def _sentence(rng: random.Random, emotion: str) -> str:
+    w = rng.choice(EMOTION_WORDS[emotion])
+    return rng.choice(TEMPLATES).format(w=w, topic=rng.choice(TOPICS))
+
+
+def _filler(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(FILLER) for _ in range(n))
+
+
+def short_chat(n: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    emotions = sorted(EMOTION_WORDS)
+    out = []
+    for _ in range(n):
+        parts = [_sentence(rng, rng.choice(emotions)) for _ in range(rng.randint(1, 2))]
+        out.append(" ".join(parts))
+    return out
+
+
+def long_journal(n: int, seed: int = 2, words: Tuple[int, int] = (300, 600)) -> List[str]:
+    rng = random.Random(seed)
+    emotions = sorted(EMOTION_WORDS)
+    out = []
+    for _ in range(n):
+        target = rng.randint(*words)
+        parts: List[str] = []
+        count = 0
+        while count < target:
+            if rng.random() < 0.3:
+                s = _sentence(rng, rng.choice(emotions))
+            else:
+                s = _filler(rng, rng.randint(8, 20)).capitalize() + "."
+            parts.append(s)
+            count += len(s.split())
+            if rng.random() < 0.1:
+                parts.append("\n\n")
+        out.append(" ".join(parts))
+    return out
+
+
+def adversarial(n: int, seed: int = 3, words: int = 2000) -> List[str]:
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        kind = i % 4
+        if kind == 0:
+            # misspellings only: no direct hits, every token goes through fuzzy matching
+            text = " ".join(rng.choice(MISSPELLINGS + FILLER) for _ in range(words))
+        elif kind == 1:
+            # no lexicon hits at all: sentiment-only fallback on a long string
+            text = _filler(rng, words)
+        elif kind == 2:
+            # punctuation storm around emotion words
+            text = " ".join(f"!!!{rng.choice(EMOTION_WORDS['anxiety'])}???..." for _ in range(words // 2))
+        else:
+            # very long tokens defeat substring heuristics
+            text = " ".join("a" * rng.randint(50, 200) for _ in range(words // 10))
+        out.append(text)
+    return out
+
+
+def labelled(n: int, seed: int = 4) -> List[Tuple[str, str]]:
+    """Short messages with a known primary emotion (the first sentence's)."""
+    rng = random.Random(seed)
+    emotions = sorted(EMOTION_WORDS)
+    out = []
+    for _ in range(n):
+        label = rng.choice(emotions)
+        kind = rng.random()
+        if kind < 0.45:
+            text = _sentence(rng, label)
+        elif kind < 0.65:
+            # a weaker second emotion competes with the labelled one
+            other = rng.choice([e for e in emotions if e != label])
+            text = _sentence(rng, label) + " " + rng.choice(TEMPLATES).format(
+                w="a little " + rng.choice(EMOTION_WORDS[other]), topic=rng.choice(TOPICS))
+        elif kind < 0.8:
+            # the labelled cue is buried in filler
+            text = f"{_filler(rng, rng.randint(10, 30)).capitalize()}. {_sentence(rng, label)}"
+        elif kind < 0.92:
+            i = rng.randrange(len(MISSPELLINGS))
+            text = rng.choice(TEMPLATES).format(w=MISSPELLINGS[i], topic=rng.choice(TOPICS))
+            label = MISSPELLING_LABELS[i]
+        else:
+            # no cue at all: the sentiment fallback has to guess
+            text = _filler(rng, rng.randint(6, 16)).capitalize() + "."
+            label = "confusion"
+        out.append((text, label))
+    return out
+
+
+CONTEXT_TEMPLATES = {
+    "negation": ["I'm not {a} about {topic}, just {b}.", "I don't feel {a} at all. I feel {b}.",
+                 "Never {a}, only {b} when I think of {topic}."],
+    "contrast": ["I was {a} at first, but now I'm {b}.", "{topic} made me {a}. However, mostly I am {b}.",
+                 "Although I was {a}, I ended up {b} about {topic}."],
+    "modifier": ["I'm a little bit {a} and extremely {b} about {topic}.",
+                 "Kind of {a} today, but really {b}.", "{topic} makes me a bit {a} and so {b}."],
+}
+
+
+def contextual(n: int, seed: int = 5) -> List[Tuple[str, str, str]]:
+    """(text, label, kind): the label is the emotion that is asserted, not negated or discounted."""
+    rng = random.Random(seed)
+    emotions = sorted(EMOTION_WORDS)
+    kinds = sorted(CONTEXT_TEMPLATES)
+    out = []
+    for i in range(n):
+        kind = kinds[i % len(kinds)]
+        a, b = rng.sample(emotions, 2)
+        # single words keep "not X" meaningful (multi-word cues read oddly after a negator)
+        wa = rng.choice([w for w in EMOTION_WORDS[a] if " " not in w])
+        wb = rng.choice([w for w in EMOTION_WORDS[b] if " " not in w])
+        text = rng.choice(CONTEXT_TEMPLATES[kind]).format(a=wa, b=wb, topic=rng.choice(TOPICS))
+        out.append((text[0].upper() + text[1:], b, kind))
+    return out
+
+
+def build(quick: bool = False, seed: int = 0) -> Dict[str, List[str]]:
+    scale = 1 if quick else 4
+    return {
+        "short_chat": short_chat(50 * scale, seed + 1),
+        "long_journal": long_journal(5 * scale, seed + 2),
+        "adversarial": adversarial(4, seed + 3, words=500 if quick else 2000),
+    }
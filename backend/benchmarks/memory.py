@@ -0,0 +1,127 @@
+"""
+Lexicon memory footprint: the nested-dict form the analyzer used to keep
+(lexicon + stem_lookup + keyword_owners + fuzzy index) vs CompiledLexicon.
+
+Each variant is built in a fresh subprocess so RSS deltas do not share arenas:
+    python -m benchmarks.memory               # WordNet-expanded lexicon
+    python -m benchmarks.memory --no-wordnet
+
+Reports traced bytes held by the structure (tracemalloc) and the RSS growth
+of the process while building it.
+"""
+
+import gc
+import sys
+import copy
+import json
+import argparse
+import subprocess
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+VARIANTS = ("nested", "compiled")
+
+
+def _rss_kib() -> int:
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _build_nested(source, normalize, stem, norm, cutoff):
+    # mirrors the pre-compiled analyzer state
+    from fuzzy_index import FuzzyIndex
+    lexicon = copy.deepcopy(source)
+    stem_lookup = defaultdict(list)
+    for emo, group in lexicon.items():
+        for kw in group["keywords"]:
+            stem_lookup[stem.pin(kw)].append((emo, kw))
+            stem.pin(norm.pin(kw))
+        for ph in group["phrases"]:
+            norm.pin(ph)
+            for token in ph.split():
+                stem_lookup[stem.pin(token)].append((emo, ph))
+    owners = defaultdict(list)
+    for emo, group in lexicon.items():
+        for kw, w in group["keywords"].items():
+            owners[kw].append((emo, w))
+    return lexicon, stem_lookup, owners, FuzzyIndex(owners.keys(), cutoff=cutoff), stem, norm
+
+
+def measure_variant(variant: str, expand_wordnet: bool) -> Dict[str, Any]:
+    from memo import BoundedMemo
+    from lexicon_index import CompiledLexicon
+    from emotion_analyzer import EnhancedEmotionAnalyzer
+
+    analyzer = EnhancedEmotionAnalyzer(expand_wordnet=expand_wordnet)
+    source = analyzer.lexicon
+    normalize, stemmer, cutoff = analyzer._normalize_text, analyzer.stemmer, analyzer.fuzzy_cutoff
+    del analyzer
+    gc.collect()
+
+    stem = BoundedMemo(stemmer.stem, name="stem")
+    norm = BoundedMemo(normalize, name="normalize")
+    rss_before = _rss_kib()
+    tracemalloc.start()
+    if variant == "nested":
+        held = _build_nested(source, normalize, stem, norm, cutoff)
+    else:
+        held = CompiledLexicon(source, normalize, stem, fuzzy_cutoff=cutoff)
+    gc.collect()
+    traced, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = _rss_kib()
+
+    keywords = sum(len(g["keywords"]) for g in source.values())
+    phrases = sum(len(g["phrases"]) for g in source.values())
+    del held
+    return {
+        "variant": variant,
+        "wordnet": expand_wordnet,
+        "keywords": keywords,
+        "phrases": phrases,
+        "traced_kib": round(traced / 1024, 1),
+        "rss_delta_kib": rss_after - rss_before,
+        "rss_kib": rss_after,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare lexicon memory footprints")
+    parser.add_argument("--no-wordnet", action="store_true", help="measure the base lexicon only")
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    parser.add_argument("--output", "-o", help="write results JSON here")
+    args = parser.parse_args(argv)
+    expand = not args.no_wordnet
+
+    if args.variant:
+        print(json.dumps(measure_variant(args.variant, expand)))
+        return 0
+
+    results = []
+    for variant in VARIANTS:
+        cmd = [sys.executable, "-m", "benchmarks.memory", "--variant", variant]
+        if not expand:
+            cmd.append("--no-wordnet")
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    for r in results:
+        print(f"{r['variant']:<10} keywords {r['keywords']:>5}  phrases {r['phrases']:>4}   "
+              f"traced {r['traced_kib']:>9.1f} KiB   rss +{r['rss_delta_kib']:>6} KiB   rss {r['rss_kib']:>8} KiB",
+              file=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
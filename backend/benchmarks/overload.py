@@ -0,0 +1,209 @@
+"""
+Overload test for admission control: the app served the way it is deployed
+(gunicorn with gunicorn.conf.py, in a child process), hammered by
+closed-loop clients at rising concurrency, with the limiter off, in reject
+mode and in degrade mode.
+
+    python -m benchmarks.overload                          # 4 / 16 / 64 clients, 5 s each
+    python -m benchmarks.overload --clients 8,32,128 --duration 10 --target-ms 40
+    python -m benchmarks.overload --server werkzeug        # threaded dev server, one thread per connection
+    python -m benchmarks.overload --workers 4              # WEB_CONCURRENCY: one limiter per worker
+
+Per step it reports throughput, p50 / p99 latency of served (200) responses,
+and the share of degraded and rejected (503) responses. Clients honour the
+Retry-After header of a 503 (or pause --retry-ms). With the limiter on, p99 of
+served requests should stay near the latency target however many clients are
+added; with it off, latency grows with the client count.
+
+Exits with status 1 when, in a mode with the limiter on, p99 of served
+requests exceeds --max-p99-ratio x --target-ms at any step. Client-side
+latency includes the admission queue wait (up to ADMISSION_QUEUE_TIMEOUT_MS)
+and any wait in gunicorn before a thread picks the request up, which the
+limiter itself does not see.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import subprocess
+import threading
+import statistics
+import urllib.error
+import urllib.request
+import multiprocessing
+from typing import Any, Dict, List, Optional
+
+MODES = {
+    "off": {"ADMISSION_ENABLED": "0"},
+    "reject": {"ADMISSION_ENABLED": "1", "ADMISSION_OVERLOAD": "reject"},
+    "degrade": {"ADMISSION_ENABLED": "1", "ADMISSION_OVERLOAD": "degrade"},
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_gunicorn(port: int, env: Dict[str, str]) -> subprocess.Popen:
+    from benchmarks.common import app_env
+
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--log-level", "warning", "app:app"],
+        cwd=backend, env={**os.environ, **app_env(), **env, "BIND": f"127.0.0.1:{port}"})
+
+
+def _serve(port: int, env: Dict[str, str]):
+    os.environ.update(env)
+    import logging
+    from werkzeug.serving import make_server
+    from benchmarks.common import load_app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    make_server("127.0.0.1", port, load_app().app, threaded=True).serve_forever()
+
+
+def _wait_ready(url: str, timeout: float = 60.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        try:
+            with urllib.request.urlopen(url + "/health", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server at {url} did not start")
+
+
+def _client(url: str, texts: List[str], offset: int, stop: threading.Event, retry_s: Optional[float],
+            out: List[Dict[str, Any]]):
+    i = offset
+    while not stop.is_set():
+        body = json.dumps({"text": texts[i % len(texts)]}).encode()
+        i += 1
+        req = urllib.request.Request(url + "/api/analyze-emotion", data=body,
+                                     headers={"Content-Type": "application/json"})
+        t0 = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                degraded = bool(json.loads(resp.read()).get("degraded"))
+                status = resp.status
+        except urllib.error.HTTPError as e:
+            status, degraded = e.code, False
+            retry = float(e.headers.get("Retry-After") or 0) if retry_s is None else retry_s
+        except OSError:
+            status, degraded = 0, False
+        out.append({"status": status, "degraded": degraded, "ms": (time.perf_counter() - t0) * 1000.0})
+        if status == 503:
+            stop.wait(retry)
+
+
+def _step(url: str, texts: List[str], clients: int, duration: float, retry_s: Optional[float]) -> Dict[str, Any]:
+    stop = threading.Event()
+    per_client: List[List[Dict[str, Any]]] = [[] for _ in range(clients)]
+    threads = [threading.Thread(target=_client, args=(url, texts, k * 7, stop, retry_s, per_client[k]), daemon=True)
+               for k in range(clients)]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    samples = [s for c in per_client for s in c]
+    served = sorted(s["ms"] for s in samples if s["status"] == 200)
+    n = max(1, len(samples))
+
+    def pct(p: float) -> float:
+        return round(served[min(len(served) - 1, int(p * len(served)))], 1) if served else 0.0
+
+    return {
+        "clients": clients,
+        "requests": len(samples),
+        "served_per_s": round(len(served) / duration, 1),
+        "p50_ms": round(statistics.median(served), 1) if served else 0.0,
+        "p99_ms": pct(0.99),
+        "degraded": round(sum(s["degraded"] for s in samples) / n, 3),
+        "rejected": round(sum(s["status"] == 503 for s in samples) / n, 3),
+        "errors": sum(s["status"] not in (200, 503) for s in samples),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Closed-loop overload test of /api/analyze-emotion")
+    parser.add_argument("--clients", default="4,16,64", help="comma-separated client counts")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per step")
+    parser.add_argument("--modes", default="off,reject,degrade")
+    parser.add_argument("--target-ms", type=float, default=50.0, help="ADMISSION_TARGET_MS for the server")
+    parser.add_argument("--limit", type=int, default=4, help="initial ADMISSION_LIMIT")
+    parser.add_argument("--percentile", type=float, default=0.99,
+                        help="ADMISSION_PERCENTILE for the server: the limiter holds the percentile the test checks")
+    parser.add_argument("--queue-timeout-ms", type=float,
+                        help="ADMISSION_QUEUE_TIMEOUT_MS for the server (default: --target-ms)")
+    parser.add_argument("--retry-ms", type=float, help="client pause after a 503 (default: the Retry-After header)")
+    parser.add_argument("--server", choices=("gunicorn", "werkzeug"), default="gunicorn")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="gunicorn WEB_CONCURRENCY; each worker has its own limiter, the reported limit is one "
+                             "worker's")
+    parser.add_argument("--max-p99-ratio", type=float, default=4.0,
+                        help="fail when p99 of served requests exceeds this multiple of --target-ms (limiter on)")
+    parser.add_argument("--seed", type=int, default=17)
+    parser.add_argument("--output", "-o", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    from benchmarks.corpus import long_journal, short_chat
+
+    # mostly chat-sized messages with a few journal entries, the costly ones
+    texts = short_chat(300, args.seed) + long_journal(15, args.seed + 1)
+    texts = [texts[(k * 37) % len(texts)] for k in range(len(texts))]
+    results: List[Dict[str, Any]] = []
+    ctx = multiprocessing.get_context("spawn")
+    for mode in args.modes.split(","):
+        # a served request may wait out the queue timeout first, so it is part of the latency budget
+        queue_timeout_ms = args.target_ms if args.queue_timeout_ms is None else args.queue_timeout_ms
+        env = dict(MODES[mode], ADMISSION_TARGET_MS=str(args.target_ms), ADMISSION_LIMIT=str(args.limit),
+                   ADMISSION_QUEUE_TIMEOUT_MS=str(queue_timeout_ms), ADMISSION_PERCENTILE=str(args.percentile),
+                   WEB_CONCURRENCY=str(args.workers))
+        port = _free_port()
+        if args.server == "gunicorn":
+            server = _start_gunicorn(port, env)
+        else:
+            server = ctx.Process(target=_serve, args=(port, env), daemon=True)
+            server.start()
+        url = f"http://127.0.0.1:{port}"
+        try:
+            _wait_ready(url)
+            retry_s = None if args.retry_ms is None else args.retry_ms / 1000.0
+            _step(url, texts, 2, 1.0, retry_s)  # warm-up
+            for clients in (int(c) for c in args.clients.split(",")):
+                r = {"mode": mode, **_step(url, texts, clients, args.duration, retry_s)}
+                with urllib.request.urlopen(url + "/api/admin/admission", timeout=5) as resp:
+                    state = json.loads(resp.read())
+                r["limit"] = state["limit"]
+                results.append(r)
+                print(f"{mode:<8} clients {r['clients']:>4}   served {r['served_per_s']:>7.1f}/s   "
+                      f"p50 {r['p50_ms']:>7.1f}ms   p99 {r['p99_ms']:>8.1f}ms   degraded {r['degraded']:>6.1%}   "
+                      f"rejected {r['rejected']:>6.1%}   limit {r['limit']:>5}   errors {r['errors']}", file=sys.stderr)
+        finally:
+            server.terminate()
+            if args.server == "gunicorn":
+                server.wait()
+            else:
+                server.join()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    bound = args.max_p99_ratio * args.target_ms
+    failed = [r for r in results if r["mode"] != "off" and r["p99_ms"] > bound]
+    for r in failed:
+        print(f"FAIL {r['mode']} clients {r['clients']}: p99 {r['p99_ms']}ms > {bound:g}ms "
+              f"({args.max_p99_ratio:g} x target)", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
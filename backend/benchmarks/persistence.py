@@ -0,0 +1,14 @@
+"""Persistence hot path: app.save_emotion_row against a throwaway SQLite file."""
+
+from typing import Dict, List
+
+from benchmarks.common import Case, load_app
+
+
+def cases(corpus: Dict[str, List[str]]) -> List[Case]:
+    app_module = load_app()
+
+    def save(text: str):
+        app_module.save_emotion_row("anxiety", 0.72, text, "negative", -0.41)
+
+    return [Case(f"save_emotion_row[{shape}]", save, texts) for shape, texts in corpus.items()]
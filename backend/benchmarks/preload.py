@@ -0,0 +1,194 @@
+"""
+Preloading for multi-worker servers: per-worker memory and cold-request
+latency with the app imported in every worker (the previous deployment)
+versus imported once in a master that forks the workers, as
+gunicorn.conf.py does.
+
+    python -m benchmarks.preload                   # 4 workers x 200 requests per variant
+    python -m benchmarks.preload --workers 8 --requests 500
+
+Each variant runs in a fresh process that plays the server master and
+forks the workers itself (gunicorn is not needed):
+- per-worker:       master forks, each worker imports app.py (no warm-up)
+- per-worker+warm:  the same, with WARMUP_MODE=sync
+- preload:          master imports app.py, then forks
+- preload+freeze:   master imports, runs app.prepare_for_fork() (warm-up +
+                    gc.freeze), then forks; workers call app.after_fork()
+
+Workers start one at a time (the next is forked once the previous one has
+timed its first requests) and then serve their remaining requests one at a
+time, so no latency is shared with another worker's CPU time. While every worker is still alive after its requests, the
+report gives per-worker Rss, Pss (shared pages split between the processes
+that map them) and private KiB, the Pss total of master + workers, the
+worker's startup time and its first / warm request latency.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from typing import Any, Dict, List, Optional
+
+VARIANTS = {
+    "per-worker": {"preload": False, "env": {"WARMUP_MODE": "lazy"}},
+    "per-worker+warm": {"preload": False, "env": {"WARMUP_MODE": "sync"}},
+    "preload": {"preload": True, "env": {"WARMUP_MODE": "preload"}, "prepare": False},
+    "preload+freeze": {"preload": True, "env": {"WARMUP_MODE": "preload"}, "prepare": True},
+}
+
+
+def _worker(spec: Dict[str, Any], texts: List[str], n_requests: int, offset: int, out, go: int) -> Dict[str, Any]:
+    """Start up and time the first requests; report on `out`, wait for a byte on `go`, then serve the rest."""
+    from benchmarks.common import load_app
+
+    t0 = time.perf_counter()
+    app_module = load_app()  # imports app.py unless the master already did
+    if spec["preload"]:
+        app_module.after_fork()
+    startup_ms = (time.perf_counter() - t0) * 1000.0
+    # a database per worker: first requests would otherwise queue on one sqlite write lock
+    app_module.DB_PATH = f"{app_module.DB_PATH}.{os.getpid()}"
+    app_module.init_db()
+    client = app_module.app.test_client()
+
+    def post(k: int) -> float:
+        text = texts[(offset + k) % len(texts)]
+        t = time.perf_counter()
+        if k % 2:
+            resp = client.post("/api/chat", json={"message": text})
+        else:
+            resp = client.post("/api/analyze-emotion", json={"text": text})
+        if resp.status_code != 200:
+            raise RuntimeError(f"request failed: {resp.status_code} {resp.get_data(as_text=True)[:200]}")
+        return (time.perf_counter() - t) * 1000.0
+
+    first_ms = post(0)
+    first_chat_ms = post(1)
+    out.write("started\n")
+    out.flush()
+    os.read(go, 1)
+    warm = [post(k) for k in range(2, n_requests)]
+    return {"pid": os.getpid(), "startup_ms": round(startup_ms, 1), "first_ms": round(first_ms, 2),
+            "first_chat_ms": round(first_chat_ms, 2),
+            "warm_median_ms": round(statistics.median(warm), 2) if warm else 0.0}
+
+
+def run_variant(name: str, workers: int, n_requests: int) -> Dict[str, Any]:
+    spec = VARIANTS[name]
+    os.environ.update(spec["env"])
+    from benchmarks.corpus import short_chat
+    from warmup import memory_usage
+
+    texts = short_chat(max(50, n_requests * workers), seed=23)
+    master_ms = 0.0
+    if spec["preload"]:
+        from benchmarks.common import load_app
+        t0 = time.perf_counter()
+        app_module = load_app()
+        if spec["prepare"]:
+            app_module.prepare_for_fork()
+        master_ms = (time.perf_counter() - t0) * 1000.0
+
+    children = []
+    for w in range(workers):
+        r_out, w_out = os.pipe()
+        r_stop, w_stop = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(r_out)
+            os.close(w_stop)
+            for _, _, other_stop in children:  # inherited: would keep the earlier workers from seeing EOF
+                os.close(other_stop)
+            code = 0
+            with os.fdopen(w_out, "w") as f:
+                try:
+                    result = _worker(spec, texts, n_requests, w * n_requests, f, r_stop)
+                except Exception as e:
+                    result, code = {"error": f"{type(e).__name__}: {e}"}, 1
+                    f.write("started\n")
+                f.write(json.dumps(result) + "\n")
+            os.read(r_stop, 1)  # stay mapped until the master has measured everyone
+            os._exit(code)
+        os.close(w_out)
+        os.close(r_stop)
+        out = os.fdopen(r_out)
+        # cold starts one at a time (as a rolling restart would), so first requests do not share the CPU
+        out.readline()
+        children.append((pid, out, w_stop))
+
+    # then each worker's remaining requests, one worker at a time, for the same reason
+    results = []
+    for pid, out, w_stop in children:
+        os.write(w_stop, b"g")
+        results.append(json.loads(out.readline()))
+        out.close()
+    errors = [r["error"] for r in results if "error" in r]
+    for r in results:
+        r.update(memory_usage(r.get("pid")))
+    master_mem = memory_usage()
+    for pid, _, w_stop in children:
+        os.close(w_stop)
+        os.waitpid(pid, 0)
+    if errors:
+        raise RuntimeError(errors[0])
+
+    def avg(key: str) -> float:
+        return round(statistics.mean(r.get(key, 0) for r in results), 1)
+
+    return {
+        "variant": name,
+        "workers": workers,
+        "requests": n_requests,
+        "master_startup_ms": round(master_ms, 1),
+        "master_rss_kib": master_mem.get("rss_kib", 0),
+        "startup_ms": avg("startup_ms"),
+        "first_ms": avg("first_ms"),
+        "first_chat_ms": avg("first_chat_ms"),
+        "warm_median_ms": avg("warm_median_ms"),
+        "rss_kib": avg("rss_kib"),
+        "pss_kib": avg("pss_kib"),
+        "private_kib": round(statistics.mean(r.get("private_clean_kib", 0) + r.get("private_dirty_kib", 0)
+                                             for r in results), 1),
+        "total_pss_kib": sum(r.get("pss_kib", 0) for r in results) + master_mem.get("pss_kib", 0),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Per-worker memory and cold latency with and without preloading")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200, help="requests per worker")
+    parser.add_argument("--variants", default=",".join(VARIANTS))
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    parser.add_argument("--output", "-o", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, args.workers, args.requests)))
+        return 0
+    if not hasattr(os, "fork"):
+        print("preload benchmark needs os.fork", file=sys.stderr)
+        return 1
+
+    results = []
+    for variant in args.variants.split(","):
+        cmd = [sys.executable, "-m", "benchmarks.preload", "--variant", variant,
+               "--workers", str(args.workers), "--requests", str(args.requests)]
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    for r in results:
+        print(f"{r['variant']:<16} startup {r['startup_ms']:>7.1f}ms   first {r['first_ms']:>6.2f}ms   "
+              f"first chat {r['first_chat_ms']:>6.2f}ms   warm {r['warm_median_ms']:>5.2f}ms   "
+              f"rss {r['rss_kib']:>8.0f}   pss {r['pss_kib']:>8.0f}   private {r['private_kib']:>8.0f} KiB/worker   "
+              f"total pss {r['total_pss_kib']:>7} KiB", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
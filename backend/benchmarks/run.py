@@ -0,0 +1,187 @@
+"""
+Benchmark runner: times every registered case, writes machine-readable JSON
+and flags regressions against a stored baseline. No baseline is committed:
+timings only compare on the machine that recorded them, so without one the
+run exits with status 2 unless --update-baseline or --no-baseline is given.
+
+Each suite module exposes `cases(corpus) -> List[Case]`. A case is timed per
+input item; results report median/p95/mean microseconds per item. With
+--allocations, an extra tracemalloc pass reports allocated blocks and peak
+bytes per item.
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import tracemalloc
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from benchmarks import corpus as corpus_mod
+from benchmarks.common import Case
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+
+SUITES = ["benchmarks.analysis", "benchmarks.persistence", "benchmarks.api", "benchmarks.calibration", "benchmarks.context",
+          "benchmarks.sentiment", "benchmarks.cascade", "benchmarks.serialization", "benchmarks.sessions",
+          "benchmarks.storage", "benchmarks.similarity"]
+
+
+def measure(case: Case, repeat: int, warmup: int = 1) -> Dict[str, float]:
+    for _ in range(warmup):
+        for item in case.items:
+            case.fn(item)
+
+    samples: List[float] = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            for item in case.items:
+                t0 = time.perf_counter()
+                case.fn(item)
+                samples.append((time.perf_counter() - t0) * 1e6)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    samples.sort()
+    return {
+        "n": len(samples),
+        "median_us": round(statistics.median(samples), 3),
+        "p95_us": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "mean_us": round(statistics.fmean(samples), 3),
+        "min_us": round(samples[0], 3),
+    }
+
+
+def measure_allocations(case: Case) -> Dict[str, float]:
+    """Median allocated blocks and peak traced bytes per item (one pass, tracemalloc on)."""
+    blocks: List[int] = []
+    peaks: List[int] = []
+    tracemalloc.start()
+    try:
+        for item in case.items:
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            result = case.fn(item)
+            _, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            # blocks still alive after the call, including the returned result
+            blocks.append(sum(s.count_diff for s in after.compare_to(before, "traceback") if s.count_diff > 0))
+            peaks.append(peak - base)
+            del result
+    finally:
+        tracemalloc.stop()
+    return {"alloc_blocks": statistics.median(blocks), "alloc_peak_bytes": statistics.median(peaks)}
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> List[Dict[str, Any]]:
+    regressions = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("median_us"):
+            continue
+        ratio = cur["median_us"] / base["median_us"]
+        cur["baseline_median_us"] = base["median_us"]
+        cur["ratio"] = round(ratio, 3)
+        if ratio > 1.0 + tolerance:
+            regressions.append({"case": name, "ratio": round(ratio, 3),
+                                "median_us": cur["median_us"], "baseline_median_us": base["median_us"]})
+    return regressions
+
+
+def collect_cases(corpus: Dict[str, List[str]], only: Optional[str]) -> List[Case]:
+    import importlib
+    cases: List[Case] = []
+    for mod_name in SUITES:
+        mod = importlib.import_module(mod_name)
+        cases.extend(mod.cases(corpus))
+    if only:
+        cases = [c for c in cases if only in c.name]
+    return cases
+
+
+def _environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": datetime.now().isoformat(),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run analysis/persistence benchmarks")
+    parser.add_argument("--quick", action="store_true", help="smaller corpus and fewer repeats")
+    parser.add_argument("--only", help="substring filter on case names")
+    parser.add_argument("--repeat", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", "-o", help="write results JSON here (the summary table goes to stderr)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--no-baseline", action="store_true",
+                        help="only time the cases; without it a missing baseline is an error")
+    parser.add_argument("--allocations", action="store_true", help="also record allocations per item (slow)")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown vs baseline median before flagging (0.25 = +25%%)")
+    args = parser.parse_args(argv)
+    # no baseline ships with the repo (timings only compare on one machine): a missing one must not pass silently
+    if not (args.update_baseline or args.no_baseline or os.path.exists(args.baseline)):
+        print(f"no baseline at {args.baseline}; run with --update-baseline on this machine to create one, "
+              f"or --no-baseline to only time the cases", file=sys.stderr)
+        return 2
+
+    repeat = args.repeat or (2 if args.quick else 5)
+    corpus = corpus_mod.build(quick=args.quick, seed=args.seed)
+    cases = collect_cases(corpus, args.only)
+
+    results: Dict[str, Dict[str, float]] = {}
+    for case in cases:
+        results[case.name] = measure(case, repeat)
+        if args.allocations:
+            results[case.name].update(measure_allocations(case))
+        r = results[case.name]
+        alloc = f"   blocks {r['alloc_blocks']:>8.0f}   peak {r['alloc_peak_bytes'] / 1024:>9.1f} KiB" if args.allocations else ""
+        print(f"{case.name:<48} median {r['median_us']:>11.1f} us   p95 {r['p95_us']:>11.1f} us   n={r['n']}{alloc}",
+              file=sys.stderr)
+
+    baseline: Dict[str, Dict[str, float]] = {}
+    if not (args.update_baseline or args.no_baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+    regressions = compare(results, baseline, args.tolerance)
+
+    report = {
+        "environment": _environment(),
+        "config": {"quick": args.quick, "repeat": repeat, "seed": args.seed, "tolerance": args.tolerance},
+        "results": results,
+        "regressions": regressions,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"environment": report["environment"], "config": report["config"], "results": results},
+                      f, indent=2)
+        print(f"baseline updated: {args.baseline}", file=sys.stderr)
+
+    for reg in regressions:
+        print(f"REGRESSION {reg['case']}: {reg['median_us']:.1f} us vs {reg['baseline_median_us']:.1f} us "
+              f"(x{reg['ratio']})", file=sys.stderr)
+    return 1 if regressions and not args.update_baseline else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+Fused sentiment scorer: parity with NLTK VADER + TextBlob and throughput.
+
+    python -m benchmarks.sentiment                       # parity, usage + throughput on the benchmark corpora
+    python -m benchmarks.sentiment --n 2000 --tolerance 1e-6 --output sentiment.json
+
+The parity run exits with status 1 when any score differs from the libraries
+by more than --tolerance. The usage report counts how often each analyzer
+actually evaluates the VADER and TextBlob (pattern) passes per corpus shape,
+with and without the signals in the response. As a suite (benchmarks.run) it
+times the library calls against the fused scorer, with a warm and a disabled
+chunk memo.
+"""
+
+import sys
+import json
+import time
+import argparse
+from typing import Any, Dict, List, Optional
+
+from benchmarks.common import Case, load_app, analyzer
+
+FIELDS = ("compound", "pos", "neu", "neg", "polarity", "subjectivity")
+
+
+def cases(corpus: Dict[str, List[str]]) -> List[Case]:
+    from sentiment import FusedSentiment, default_sentiment, reference
+
+    fused = default_sentiment()
+    cold = FusedSentiment(fused.tables, memo_size=0)
+    out: List[Case] = []
+    for shape, texts in corpus.items():
+        out.append(Case(f"sentiment.library[{shape}]", reference, texts))
+        out.append(Case(f"sentiment.fused[{shape}]", fused.score, texts))
+        out.append(Case(f"sentiment.fused_nomemo[{shape}]", cold.score, texts))
+    return out
+
+
+def parity(texts: List[str], tolerance: float) -> Dict[str, Any]:
+    from sentiment import default_sentiment, reference
+
+    fused = default_sentiment()
+    worst = {k: 0.0 for k in FIELDS}
+    mismatches: List[Dict[str, Any]] = []
+    for text in texts:
+        a, b = fused.score(text).as_dict(), reference(text).as_dict()
+        diff = {k: abs(a[k] - b[k]) for k in FIELDS}
+        for k, d in diff.items():
+            worst[k] = max(worst[k], d)
+        if max(diff.values()) > tolerance:
+            mismatches.append({"text": text[:200], "fused": a, "library": b})
+    return {"n": len(texts), "tolerance": tolerance, "max_abs_diff": worst,
+            "mismatches": len(mismatches), "examples": mismatches[:5]}
+
+
+def throughput(texts: List[str], repeat: int) -> Dict[str, float]:
+    from sentiment import FusedSentiment, default_sentiment, reference
+
+    fused = default_sentiment()
+    cold = FusedSentiment(fused.tables, memo_size=0)
+    chars = sum(len(t) for t in texts)
+    out: Dict[str, float] = {}
+    for name, fn in (("library", reference), ("fused", fused.score), ("fused_nomemo", cold.score)):
+        fn(texts[0])
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            for t in texts:
+                fn(t)
+            best = min(best, time.perf_counter() - t0)
+        out[f"{name}_texts_per_s"] = round(len(texts) / best, 1)
+        out[f"{name}_mb_per_s"] = round(chars / best / 1e6, 3)
+    return out
+
+
+def usage(corpus: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+    """Share of analyses (windows for long inputs) that evaluated each pass."""
+    from sentiment import SentimentEngine, default_sentiment
+
+    class CountingEngine(SentimentEngine):
+        # signals are lazy, so the passes that reach the engine are the ones a caller needed
+        def __init__(self, engine: SentimentEngine):
+            self.engine = engine
+            self.calls = {"vader": 0, "pattern": 0}
+
+        def vader_scores(self, doc):
+            self.calls["vader"] += 1
+            return self.engine.vader_scores(doc)
+
+        def pattern_scores(self, doc):
+            self.calls["pattern"] += 1
+            return self.engine.pattern_scores(doc)
+
+    app_module = load_app()
+    a = analyzer(expand_wordnet=True)
+    previous = app_module.SENTIMENT, a.sentiment
+    modes = [
+        ("app", "response", lambda t: app_module.analyze_emotion(t)),
+        ("app", "omitted", lambda t: app_module.analyze_emotion(t, include_signals=False)),
+        ("analyzer", "details", lambda t: a.detect_emotion(t)),
+        ("analyzer", "lean", lambda t: a.detect_emotion(t, lean=True)),
+    ]
+    rows = []
+    try:
+        for model, mode, fn in modes:
+            for shape, texts in corpus.items():
+                counter = CountingEngine(default_sentiment())
+                app_module.SENTIMENT = a.sentiment = counter
+                for t in texts:
+                    fn(t)
+                docs = max(1, counter.calls["vader"])
+                rows.append({"model": model, "mode": mode, "shape": shape, "texts": len(texts),
+                             "vader_passes": counter.calls["vader"], "pattern_passes": counter.calls["pattern"],
+                             "pattern_share": round(counter.calls["pattern"] / docs, 3)})
+    finally:
+        app_module.SENTIMENT, a.sentiment = previous
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Parity, throughput and signal usage of the fused sentiment scorer")
+    parser.add_argument("--n", type=int, default=1000, help="labelled / contextual samples")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--tolerance", type=float, default=1e-6)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", "-o", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    from benchmarks.corpus import build, contextual, labelled
+
+    corpus = build(quick=False, seed=args.seed)
+    texts = [t for shape in corpus.values() for t in shape]
+    texts += [t for t, _ in labelled(args.n, args.seed + 1)]
+    texts += [t for t, _, _ in contextual(args.n, args.seed + 2)]
+
+    report = parity(texts, args.tolerance)
+    worst = "  ".join(f"{k} {v:.2g}" for k, v in report["max_abs_diff"].items())
+    print(f"parity  n={report['n']}  mismatches {report['mismatches']} (> {args.tolerance:g})   max |diff|: {worst}",
+          file=sys.stderr)
+    for ex in report["examples"]:
+        print(f"  {ex['text']!r}\n    fused   {ex['fused']}\n    library {ex['library']}", file=sys.stderr)
+
+    results: Dict[str, Any] = {"parity": report, "throughput": {}, "usage": usage(corpus)}
+    for r in results["usage"]:
+        print(f"{r['model']:<9} {r['mode']:<9} {r['shape']:<13} pattern pass needed in {r['pattern_share']:>6.1%} "
+              f"of {r['vader_passes']} analyses", file=sys.stderr)
+
+    for shape, shape_texts in corpus.items():
+        r = throughput(shape_texts, args.repeat)
+        results["throughput"][shape] = r
+        print(f"{shape:<13} library {r['library_texts_per_s']:>9.1f}/s   fused {r['fused_texts_per_s']:>9.1f}/s   "
+              f"fused (no memo) {r['fused_nomemo_texts_per_s']:>9.1f}/s", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 1 if report["mismatches"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
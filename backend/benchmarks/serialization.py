@@ -0,0 +1,144 @@
+"""
+Response serialization: encode time and bytes on the wire for
+/api/analyze-emotion, /api/daily-quote and /api/journey, comparing jsonify
+on field-by-field dicts (previous) with serialization.json_response and
+pre-encoded shloka fragments (analyze-emotion, daily-quote), under orjson
+and the stdlib encoder.
+
+    python -m benchmarks.serialization                 # per-endpoint table
+    python -m benchmarks.serialization --repeat 2000 --output serialization.json
+
+Bytes are the response body as sent: identity, and gzip where the endpoint
+negotiates it (journey). As a suite (benchmarks.run) it times both paths per
+endpoint with the encoder the app picked.
+"""
+
+import sys
+import gzip
+import json
+import time
+import argparse
+import random
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.common import Case, load_app
+
+ENDPOINTS = ("analyze-emotion", "daily-quote", "journey")
+
+
+def payloads(n: int = 20, seed: int = 3) -> Dict[str, List[Tuple[Dict[str, Any], Dict[str, Any]]]]:
+    """(previous, fragment) payload pairs per endpoint, built from the live data snapshot."""
+    from benchmarks.corpus import short_chat
+
+    app_module = load_app()
+    snapshot = app_module.DATA.current
+    selector, fragments = snapshot.selector, snapshot.fragments
+    rng = random.Random(seed)
+    texts = short_chat(n, seed)
+    out: Dict[str, List[Tuple[Dict[str, Any], Dict[str, Any]]]] = {e: [] for e in ENDPOINTS}
+    for k, text in enumerate(texts):
+        result = app_module.analyze_emotion(text, snapshot)
+        i = selector.index_for(result["emotion"], k)
+        shloka = snapshot.all_shlokas[i]
+        base = {"emotion": result["emotion"], "confidence": result["confidence"],
+                "top_emotions": result["top_emotions"], "sentiment": result["sentiment"],
+                "data_version": snapshot.version, "degraded": False, "timestamp": "2024-01-01T12:00:00.000000"}
+        card = {f: shloka[f] for f in ("sanskrit", "translation", "chapter", "verse", "explanation",
+                                       "practical_advice")}
+        out["analyze-emotion"].append(({**base, "shloka": card}, {**base, "shloka": fragments.cards[i]}))
+
+        j = rng.randrange(len(snapshot.all_shlokas))
+        day = {"date": "2024-01-01", "data_version": snapshot.version}
+        out["daily-quote"].append(({**day, "shloka": snapshot.all_shlokas[j]}, {**day, "shloka": fragments.full[j]}))
+
+        entries = []
+        for row_id in range(k * 10, k * 10 + 10):
+            emotion = selector.emotions[row_id % len(selector.emotions)]
+            entry = {"emotion": emotion, "confidence": 0.8, "input_text": texts[row_id % len(texts)][:100],
+                     "timestamp": "2024-01-01 12:00:00.000000", "sentiment": {"label": "neutral", "compound": 0.0},
+                     "mood_score": 8}
+            entries.append({**entry, "shloka_preview": selector.preview(emotion, row_id)})
+        # journey has no fragments: the difference is the encoder and gzip
+        payload = {"entries": entries, "data_version": snapshot.version}
+        out["journey"].append((payload, payload))
+    return out
+
+
+def _encoders() -> Dict[str, Callable[[Any], bytes]]:
+    from serialization import ENCODERS, dumps
+    return {name: (lambda v, _name=name: dumps(v, _name)) for name in ENCODERS}
+
+
+def cases(corpus: Dict[str, List[str]]) -> List[Case]:
+    from flask import jsonify
+    from serialization import json_response
+
+    app = load_app().app
+    pairs = payloads()
+    out: List[Case] = []
+    for endpoint, items in pairs.items():
+        compress = endpoint == "journey"
+
+        def previous(p, _app=app):
+            with _app.test_request_context(headers={"Accept-Encoding": "gzip"}):
+                return jsonify(p[0]).get_data()
+
+        def fragments(p, _app=app, _compress=compress):
+            with _app.test_request_context(headers={"Accept-Encoding": "gzip"}):
+                return json_response(p[1], compress=_compress).get_data()
+
+        out.append(Case(f"serialize.jsonify[{endpoint}]", previous, items))
+        out.append(Case(f"serialize.json_response[{endpoint}]", fragments, items))
+    return out
+
+
+def _best_us(fn: Callable[[Any], Any], items: List[Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(3):
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            for item in items:
+                fn(item)
+        best = min(best, time.perf_counter() - t0)
+    return best / (repeat * len(items)) * 1e6
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serialization time and response bytes per endpoint")
+    parser.add_argument("--n", type=int, default=20, help="payloads per endpoint")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", "-o", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    app = load_app().app
+    pairs = payloads(args.n)
+    encoders = _encoders()
+    results = []
+    for endpoint, items in pairs.items():
+        old_payloads = [p[0] for p in items]
+        new_payloads = [p[1] for p in items]
+        for old, new in zip(old_payloads, new_payloads):
+            if json.loads(encoders["stdlib"](new)) != json.loads(app.json.dumps(old)):
+                print(f"{endpoint}: fragment payload differs from the previous one", file=sys.stderr)
+                return 1
+        rows = {"jsonify (previous)": (lambda p: app.json.dumps(p).encode() + b"\n", old_payloads)}
+        for name, enc in encoders.items():
+            rows[f"json_response [{name}]"] = (enc, new_payloads)
+        for label, (fn, data) in rows.items():
+            sizes = [len(fn(p)) for p in data]
+            gz = [len(gzip.compress(fn(p), compresslevel=6)) for p in data]
+            r = {"endpoint": endpoint, "path": label,
+                 "encode_us": round(_best_us(fn, data, args.repeat), 2),
+                 "bytes": round(sum(sizes) / len(sizes)), "gzip_bytes": round(sum(gz) / len(gz))}
+            results.append(r)
+            print(f"{endpoint:<16} {label:<22} {r['encode_us']:>8.2f}µs   {r['bytes']:>6} B   gzip {r['gzip_bytes']:>6} B",
+                  file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
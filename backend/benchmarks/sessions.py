@@ -0,0 +1,221 @@
+"""
+Conversation sessions (/api/chat): cost of folding a message into its
+stored session as the conversation grows, stored bytes per session,
+eviction past SESSION_MAX, and two worker processes sharing conversations.
+
+    python -m benchmarks.sessions                      # depth table + storage + cap + shared check
+    python -m benchmarks.sessions --depths 1,100,10000 --max-sessions 500
+
+For each depth the report gives the per-message cost of SessionStore.record
+(read, fold, write back and commit on a WAL database) and, up to
+--reanalyze-max turns, of re-analyzing the joined history (the alternative
+to keeping state). The shared check interleaves the turns of several
+conversations over two stores with their own connections, as two gunicorn
+workers would, and compares the stored turn counts and vectors with a
+single store fed the same turns. As a suite (benchmarks.run) it times
+record() on sessions 1 and 1000 turns deep.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.common import Case, load_app, temp_path
+
+TOPICS = ("work", "relationships", "money", "health", "fear", "anger", "sadness", "stress", "purpose")
+
+
+def turns(n: int, seed: int = 5) -> List[Tuple[str, float, float, List[Tuple[str, float]], List[str], Tuple[int, int]]]:
+    """Synthetic analyzed messages: (emotion, confidence, compound, top_emotions, topics, verse)."""
+    from benchmarks.corpus import EMOTION_WORDS
+
+    emotions = sorted(EMOTION_WORDS)
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        top = rng.sample(emotions, 3)
+        scores = sorted((round(rng.uniform(0.5, 3.0), 3) for _ in top), reverse=True)
+        topics = rng.sample(TOPICS, rng.choice((0, 0, 1, 2)))
+        out.append((top[0], round(rng.uniform(0.4, 0.95), 3), round(rng.uniform(-1, 1), 4),
+                    list(zip(top, scores)), topics, (rng.randint(1, 18), rng.randint(1, 72))))
+    return out
+
+
+_DB_SEQ = iter(range(1 << 30))
+
+
+def _db(path: Optional[str] = None) -> Tuple[sqlite3.Connection, str]:
+    """A fresh WAL database with the chat_sessions table (or a new connection to `path`)."""
+    import retention
+    from sessions import SessionStore
+
+    path = path or temp_path(f"sessions-{next(_DB_SEQ)}.db")
+    conn = sqlite3.connect(path)
+    retention.configure_new_database(conn)
+    SessionStore.init_schema(conn)
+    conn.commit()
+    return conn, path
+
+
+def _store(**kwargs):
+    from sessions import SessionStore
+    return SessionStore(**kwargs)
+
+
+def _record(store, conn: sqlite3.Connection, cid: str):
+    def run(t):
+        conn.execute('BEGIN IMMEDIATE')
+        summary = store.record(conn, cid, t[0], t[1], t[2], top_emotions=t[3], topics=t[4], verse=t[5])
+        conn.commit()
+        return summary
+    return run
+
+
+def cases(corpus: Dict[str, List[str]]) -> List[Case]:
+    items = turns(200)
+    out: List[Case] = []
+    for depth in (1, 1000):
+        store = _store()
+        fill = _record(store, _db()[0], "c")
+        for t in turns(depth, seed=depth):
+            fill(t)
+        out.append(Case(f"sessions.record[depth {depth}]", fill, items))
+    return out
+
+
+def _per_message_us(fn, items: List[Any], repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(items) * 1e6
+
+
+def depth_table(depths: List[int], reanalyze_max: int) -> List[Dict[str, Any]]:
+    from benchmarks.corpus import short_chat
+
+    app_module = load_app()
+    snapshot = app_module.DATA.current
+    messages = short_chat(max(depths) + 50, seed=9)
+    probe = turns(50, seed=11)
+    rows = []
+    for depth in depths:
+        store = _store()
+        fill = _record(store, _db()[0], "c")
+        for t in turns(depth, seed=depth):
+            fill(t)
+        row = {"depth": depth, "record_us": round(_per_message_us(fill, probe), 2), "reanalyze_us": None}
+        if depth <= reanalyze_max:
+            history = " ".join(messages[:depth])
+
+            def reanalyze(msg, _h=history):
+                return app_module.analyze_emotion(_h + " " + msg, snapshot, include_signals=False)
+
+            row["reanalyze_us"] = round(_per_message_us(reanalyze, messages[depth:depth + 10], 1), 1)
+        rows.append(row)
+    return rows
+
+
+def storage(n_sessions: int, ring_size: int) -> Dict[str, Any]:
+    """Stored state and database file bytes for `n_sessions` sessions with full rings."""
+    items = turns(ring_size * 2, seed=13)
+    store = _store(max_sessions=n_sessions, ring_size=ring_size)
+    conn, path = _db()
+    for s in range(n_sessions):
+        fill = _record(store, conn, f"conversation-{s:06d}")
+        for t in items:
+            fill(t)
+    stats = store.stats(conn)
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+    file_bytes = os.path.getsize(path)
+    return {"sessions": n_sessions, "ring_size": ring_size, "state_bytes": stats["bytes"],
+            "state_per_session": stats["avg_bytes"], "file_bytes": file_bytes,
+            "file_per_session": round(file_bytes / n_sessions)}
+
+
+def cap_check(n_sessions: int, max_sessions: int) -> Dict[str, Any]:
+    from metrics import Counters
+
+    metrics = Counters()
+    store = _store(max_sessions=max_sessions, metrics=metrics)
+    conn = _db()[0]
+    items = turns(4, seed=17)
+    for s in range(n_sessions):
+        fill = _record(store, conn, f"c{s}")
+        for t in items:
+            fill(t)
+    stats = store.stats(conn)
+    return {"inserted": n_sessions, "max_sessions": max_sessions, "sessions": stats["sessions"],
+            "evicted": metrics.get("sessions.evicted"), "within_cap": stats["sessions"] <= max_sessions}
+
+
+def shared_check(conversations: int = 20, per_conversation: int = 40) -> Dict[str, Any]:
+    """Turns spread over two stores ("workers") on one database end up as if one store saw them all."""
+    rng = random.Random(19)
+    items = turns(conversations * per_conversation, seed=23)
+    owners = [f"c{i % conversations}" for i in range(len(items))]
+
+    conn_a, path = _db()
+    conn_b = _db(path)[0]
+    workers = [(_store(), conn_a), (_store(), conn_b)]
+    single = (_store(), _db()[0])
+    for cid, t in zip(owners, items):
+        _record(*rng.choice(workers), cid)(t)
+        _record(*single, cid)(t)
+
+    mismatched = 0
+    for i in range(conversations):
+        cid = f"c{i}"
+        shared = workers[0][0].load(conn_b, cid)
+        alone = single[0].load(single[1], cid)
+        if (shared.turns != alone.turns or shared.recent_verses() != alone.recent_verses()
+                or any(abs(shared.weights[e] - w) > 1e-9 for e, w in alone.weights.items())):
+            mismatched += 1
+    return {"conversations": conversations, "turns": len(items), "mismatched": mismatched}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Conversation session store: cost per message, storage, cap")
+    parser.add_argument("--depths", default="1,10,100,1000,10000", help="comma-separated conversation lengths")
+    parser.add_argument("--reanalyze-max", type=int, default=100, help="deepest history to re-analyze for comparison")
+    parser.add_argument("--sessions", type=int, default=2000, help="sessions for the storage estimate")
+    parser.add_argument("--ring", type=int, default=8)
+    parser.add_argument("--max-sessions", type=int, default=1000, help="SESSION_MAX for the eviction check")
+    parser.add_argument("--output", "-o", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    depths = [int(d) for d in args.depths.split(",")]
+    results: Dict[str, Any] = {"depths": depth_table(depths, args.reanalyze_max)}
+    for r in results["depths"]:
+        reanalyze = "-" if r["reanalyze_us"] is None else f"{r['reanalyze_us']:.1f}µs"
+        print(f"depth {r['depth']:>6}   record {r['record_us']:>7.2f}µs   re-analyze history {reanalyze:>10}",
+              file=sys.stderr)
+
+    results["storage"] = m = storage(args.sessions, args.ring)
+    print(f"storage  {m['sessions']} sessions x {m['ring_size']} turns   state {m['state_per_session']} B/session"
+          f"   file {m['file_per_session']} B/session", file=sys.stderr)
+
+    results["cap"] = c = cap_check(args.max_sessions * 3, args.max_sessions)
+    print(f"cap      {c['inserted']} sessions into SESSION_MAX {c['max_sessions']}   kept {c['sessions']}"
+          f"   evicted {c['evicted']}   within cap {c['within_cap']}", file=sys.stderr)
+
+    results["shared"] = w = shared_check()
+    print(f"shared   {w['turns']} turns over {w['conversations']} conversations, 2 stores"
+          f"   mismatched {w['mismatched']}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0 if c["within_cap"] and not w["mismatched"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Similar moments (similarity.py): TF-IDF index build, incremental catch-up,
+top-k query latency and checkpoint size / load time as a user's history
+grows, plus agreement with an exact brute-force cosine ranking.
+
+    python -m benchmarks.similarity                     # 1000, 10000, 50000 entries
+    python -m benchmarks.similarity --sizes 1000,100000 --queries 500 --exact-max 5000
+
+Histories come from benchmarks.storage.build_v1 (chat messages and journal
+entries, 30% repeated), migrated to schema v2. Queries are fresh chat
+messages. Up to --exact-max entries, every query's top k is compared with a
+brute-force scan over all entry vectors (ids must match). As a suite
+(benchmarks.run) it times queries against a 5000-entry index.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import atexit
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.common import Case
+
+
+def _history(directory: str, n: int) -> sqlite3.Connection:
+    import storage
+    from benchmarks.storage import build_v1
+
+    conn = sqlite3.connect(build_v1(os.path.join(directory, f"history-{n}.db"), n), check_same_thread=False)
+    storage.migrate(conn)
+    return conn
+
+
+def exact_top(conn: sqlite3.Connection, text: str, k: int) -> List[Tuple[int, float]]:
+    """Brute force: every entry's full TF-IDF vector, cosine with the query, best k."""
+    import storage
+    from similarity import _idf, terms
+
+    docs = [(r[0], terms(r[3] or "")) for rows in storage.iter_rows(conn, text=True) for r in rows]
+    n = len(docs)
+    df: Dict[str, int] = {}
+    for _, counts in docs:
+        for t in counts:
+            df[t] = df.get(t, 0) + 1
+    q = {t: (1 + math.log(tf)) * _idf(df.get(t, 0), n) for t, tf in terms(text).items()}
+    q_norm = math.sqrt(sum(w * w for w in q.values()))
+    scored = []
+    for row_id, counts in docs:
+        vec = {t: (1 + math.log(tf)) * _idf(df[t], n) for t, tf in counts.items()}
+        dot = sum(w * vec[t] for t, w in q.items() if t in vec)
+        if dot:
+            scored.append((dot / (math.sqrt(sum(w * w for w in vec.values())) * q_norm), row_id))
+    scored.sort(key=lambda s: (-s[0], -s[1]))
+    return [(row_id, sim) for sim, row_id in scored[:k]]
+
+
+def measure_size(directory: str, n: int, queries: List[str], k: int, exact_max: int) -> Dict[str, Any]:
+    import storage
+    from similarity import SimilarMoments
+
+    conn = _history(directory, n)
+    store = SimilarMoments(directory=os.path.join(directory, f"idx-{n}"), save_every=10 ** 9)
+
+    t0 = time.perf_counter()
+    index = store.sync(conn)
+    build_ms = (time.perf_counter() - t0) * 1000
+    # memory in a second build: tracemalloc would inflate the timing above
+    tracemalloc.start()
+    probe = SimilarMoments(directory=None)
+    probe.sync(conn)
+    traced = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del probe
+
+    t0 = time.perf_counter()
+    store.save(index)
+    save_ms = (time.perf_counter() - t0) * 1000
+    size = os.path.getsize(store._path("default"))
+    t0 = time.perf_counter()
+    reloaded = SimilarMoments(directory=store.directory).sync(conn)
+    load_ms = (time.perf_counter() - t0) * 1000
+    assert len(reloaded) == len(index)
+
+    # catch-up: one new row, then a query (sync + search), vs a query with nothing new
+    conn.execute('BEGIN IMMEDIATE')
+    storage.insert_row(conn, "joy", 0.8, queries[0], "positive", 0.5, storage.from_us(index.last_ts + 1))
+    conn.commit()
+    t0 = time.perf_counter()
+    store.search(conn, queries[1], k)
+    catch_up_ms = (time.perf_counter() - t0) * 1000
+
+    latencies = []
+    for text in queries:
+        t0 = time.perf_counter()
+        store.search(conn, text, k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+
+    agree = None
+    if n <= exact_max:
+        sample = queries[:20]
+        agree = sum([r for r, _ in store.search(conn, text, k)] == [r for r, _ in exact_top(conn, text, k)]
+                    for text in sample) / len(sample)
+    conn.close()
+    return {
+        "entries": len(index), "terms": len(index.term_ids), "postings": index.postings(),
+        "build_ms": round(build_ms, 1), "traced_bytes": traced, "checkpoint_bytes": size,
+        "save_ms": round(save_ms, 2), "load_ms": round(load_ms, 2), "catch_up_ms": round(catch_up_ms, 3),
+        "query_p50_ms": round(statistics.median(latencies), 3),
+        "query_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        "exact_agreement": agree,
+    }
+
+
+def cases(corpus: Dict[str, List[str]]) -> List[Case]:
+    from benchmarks.corpus import short_chat
+    from similarity import SimilarMoments
+
+    tmp = tempfile.mkdtemp(prefix="bench-similarity-")
+    atexit.register(shutil.rmtree, tmp, True)
+    conn = _history(tmp, 5000)
+    store = SimilarMoments(directory=None)
+    store.sync(conn)
+    return [Case("similarity.search[5000 entries]", lambda text: store.search(conn, text, 5), short_chat(50, seed=31))]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from benchmarks.corpus import short_chat
+    from similarity import np
+
+    parser = argparse.ArgumentParser(description="Similar moments: TF-IDF index build / query / checkpoint cost")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="comma-separated history sizes")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--exact-max", type=int, default=10000, help="largest history checked against brute force")
+    parser.add_argument("--output", "-o", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    queries = short_chat(args.queries, seed=31)
+    tmp = tempfile.mkdtemp(prefix="bench-similarity-")
+    try:
+        results = [measure_size(tmp, int(n), queries, args.k, args.exact_max) for n in args.sizes.split(",")]
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    print(f"numpy: {np is not None}", file=sys.stderr)
+    for r in results:
+        agree = "-" if r["exact_agreement"] is None else f"{r['exact_agreement']:.0%}"
+        print(f"{r['entries']:>7} entries   {r['terms']:>6} terms   build {r['build_ms']:>8.1f}ms   "
+              f"query p50 {r['query_p50_ms']:>7.3f}ms p95 {r['query_p95_ms']:>7.3f}ms   "
+              f"catch-up {r['catch_up_ms']:>6.3f}ms   checkpoint {r['checkpoint_bytes'] / 1024:>7.0f} KiB "
+              f"(save {r['save_ms']:.1f}ms, load {r['load_ms']:.1f}ms)   traced {r['traced_bytes'] / 1024:>7.0f} KiB   "
+              f"exact top-{args.k} {agree}", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0 if all(r["exact_agreement"] in (None, 1.0) for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Storage schema v2 (storage.py) against the v1 user_emotions table: file
+size, read cost, and migration throughput on a synthetic history.
+
+    python -m benchmarks.storage                       # 50000 rows, 30% repeated messages
+    python -m benchmarks.storage --rows 200000 --repeat-share 0.5 --batch-size 2000
+
+The v1 database is built with the previous schema (TEXT labels, DATETIME
+timestamps read through PARSE_DECLTYPES, inline input_text) and then
+migrated in place on a copy, once with compression and once without.
+The report covers:
+- size: bytes after VACUUM
+- journey: the latest 10 rows with texts
+- scan: every row's labels, scores and timestamp in microseconds, in
+  id-ordered chunks (emotion_export)
+- rebuild: replaying every row into a fresh trend state (TrendEngine.rebuild)
+
+As a suite (benchmarks.run) it times the v2 journey read and a 1000-row
+scan chunk.
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.common import Case
+
+_V1_SCHEMA = '''CREATE TABLE user_emotions
+                (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 emotion TEXT,
+                 confidence REAL,
+                 input_text TEXT,
+                 sentiment TEXT,
+                 compound REAL,
+                 timestamp DATETIME)'''
+
+
+def build_v1(path: str, n: int, repeat_share: float = 0.3, seed: int = 7) -> str:
+    """A v1 database with `n` rows over two years; `repeat_share` of the messages repeat earlier ones."""
+    from benchmarks.corpus import EMOTION_WORDS, long_journal, short_chat
+
+    rng = random.Random(seed)
+    emotions = sorted(EMOTION_WORDS)
+    fresh = short_chat(int(n * 0.9) + 1, seed=seed) + long_journal(max(1, n // 10), seed=seed)
+    rng.shuffle(fresh)
+    start = datetime(2024, 1, 1)
+    step = timedelta(days=730) / n
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute(_V1_SCHEMA)
+    conn.execute('CREATE INDEX idx_user_emotions_timestamp ON user_emotions(timestamp)')
+    seen: List[str] = []
+    rows = []
+    for i in range(n):
+        if seen and rng.random() < repeat_share:
+            text = rng.choice(seen[-500:])
+        else:
+            text = fresh[i % len(fresh)]
+            seen.append(text)
+        compound = round(rng.uniform(-1, 1), 4)
+        sentiment = "positive" if compound >= 0.05 else "negative" if compound <= -0.05 else "neutral"
+        rows.append((rng.choice(emotions), round(rng.uniform(0.3, 0.95), 3), text, sentiment, compound,
+                     start + step * i + timedelta(microseconds=rng.randint(0, 999999))))
+    conn.executemany('''INSERT INTO user_emotions (emotion, confidence, input_text, sentiment, compound, timestamp)
+                        VALUES (?, ?, ?, ?, ?, ?)''', rows)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _vacuumed_bytes(path: str) -> int:
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.execute('VACUUM')
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+    return os.path.getsize(path)
+
+
+# -------- reads, v1 (as the previous app / trends / retention code did) --------
+def _v1_connect(path: str) -> sqlite3.Connection:
+    return sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
+
+
+def v1_journey(conn: sqlite3.Connection) -> List[tuple]:
+    return conn.execute('''SELECT id, emotion, confidence, input_text, sentiment, compound, timestamp
+                           FROM user_emotions ORDER BY timestamp DESC LIMIT 10''').fetchall()
+
+
+def v1_export_scan(conn: sqlite3.Connection) -> int:
+    """emotion_export's previous read loop: id-ordered chunks, timestamps parsed to microseconds."""
+    import storage
+    last, n = 0, 0
+    while True:
+        rows = conn.execute('''SELECT id, emotion, sentiment, confidence, compound, timestamp
+                               FROM user_emotions WHERE id > ? ORDER BY id LIMIT 5000''', (last,)).fetchall()
+        if not rows:
+            return n
+        n += sum(storage.to_us(r[5]) > 0 for r in rows)
+        last = rows[-1][0]
+
+
+def v1_rebuild(conn: sqlite3.Connection):
+    """TrendEngine.rebuild's previous replay."""
+    from trends import TrendEngine
+    engine = TrendEngine()
+    state = engine._new_state()
+    for emotion, compound, ts in conn.execute("SELECT emotion, compound, timestamp FROM user_emotions ORDER BY id"):
+        if isinstance(ts, str):
+            ts = datetime.fromisoformat(ts)
+        if ts is not None:
+            state.add(emotion, compound, ts)
+    return state
+
+
+# -------- reads, v2 --------
+def v2_journey(conn: sqlite3.Connection) -> List[tuple]:
+    import storage
+    return storage.select_rows(conn, order="e.ts_us DESC", limit=10)
+
+
+def v2_export_scan(conn: sqlite3.Connection) -> int:
+    import storage
+    return sum(sum(r[6] > 0 for r in rows) for rows in storage.iter_rows(conn))
+
+
+def v2_rebuild(conn: sqlite3.Connection):
+    from trends import TrendEngine
+    return TrendEngine().rebuild(conn)
+
+
+def _best_ms(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return round(best * 1000, 3)
+
+
+def _reads(conn: sqlite3.Connection, v2: bool, repeat: int) -> Dict[str, float]:
+    journey, scan, rebuild = (v2_journey, v2_export_scan, v2_rebuild) if v2 else \
+        (v1_journey, v1_export_scan, v1_rebuild)
+    return {"journey_ms": _best_ms(lambda: journey(conn), repeat * 20),
+            "scan_ms": _best_ms(lambda: scan(conn), repeat),
+            "rebuild_ms": _best_ms(lambda: rebuild(conn), repeat)}
+
+
+def compare(n: int, repeat_share: float, batch_size: int, repeat: int) -> Dict[str, Any]:
+    import storage
+
+    tmp = tempfile.mkdtemp(prefix="bench-storage-")
+    try:
+        v1 = build_v1(os.path.join(tmp, "v1.db"), n, repeat_share)
+        results: Dict[str, Any] = {"rows": n, "repeat_share": repeat_share}
+        conn = _v1_connect(v1)
+        expected = [list(r) for r in v1_journey(conn)]
+        results["v1"] = {"bytes": _vacuumed_bytes(v1), **_reads(conn, False, repeat)}
+        conn.close()
+
+        for name, compress in (("v2", True), ("v2-plain", False)):
+            path = os.path.join(tmp, f"{name}.db")
+            shutil.copy(v1, path)
+            conn = sqlite3.connect(path)
+            report = storage.migrate(conn, batch_size=batch_size, compress=compress)
+            conn.execute(f'PRAGMA user_version = {storage.SCHEMA_VERSION}')
+            got = [[r[0], r[1], r[2], r[3], r[4], r[5], storage.format_ts(r[6])] for r in v2_journey(conn)]
+            info = storage.info(conn)
+            results[name] = {"bytes": _vacuumed_bytes(path), **_reads(conn, True, repeat),
+                             "migrate_ms": report["duration_ms"],
+                             "migrate_rows_per_s": round(n / (report["duration_ms"] / 1000.0)),
+                             "texts": info["texts"], "compressed_texts": info["compressed_texts"],
+                             "journey_identical": got == expected}
+            conn.close()
+        return results
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def cases(corpus: Dict[str, List[str]]) -> List[Case]:
+    import storage
+
+    tmp = tempfile.mkdtemp(prefix="bench-storage-")
+    atexit.register(shutil.rmtree, tmp, True)
+    path = build_v1(os.path.join(tmp, "suite.db"), 5000)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    storage.migrate(conn)
+
+    def chunk(after_id: int):
+        return storage.select_rows(conn, "e.id > ?", (after_id,), limit=1000, text=False)
+
+    return [Case("storage.journey[v2]", lambda _: v2_journey(conn), list(range(50))),
+            Case("storage.scan_chunk[v2, 1000 rows]", chunk, [0, 1000, 2000, 3000])]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="user_emotions schema v1 vs v2: size, reads, migration")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--repeat-share", type=float, default=0.3, help="share of messages that repeat earlier ones")
+    parser.add_argument("--batch-size", type=int, default=1000, help="migration batch size")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", "-o", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    r = compare(args.rows, args.repeat_share, args.batch_size, args.repeat)
+    for name in ("v1", "v2", "v2-plain"):
+        v = r[name]
+        extra = "" if name == "v1" else (f"   migrate {v['migrate_rows_per_s']:>7} rows/s   texts {v['texts']}"
+                                         f" ({v['compressed_texts']} zlib)   journey identical {v['journey_identical']}")
+        print(f"{name:<9} {v['bytes'] / 1024:>9.0f} KiB   journey {v['journey_ms']:>6.3f}ms   scan {v['scan_ms']:>8.1f}ms"
+              f"   trend rebuild {v['rebuild_ms']:>7.1f}ms{extra}", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(r, f, indent=2)
+    return 0 if r["v2"]["journey_identical"] and r["v2-plain"]["journey_identical"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,410 @@
+"""
+calibration.py
+
+Confidence calibration, fitted offline and applied as a lookup table.
+
+Both analyzers compute confidence from hand-set weights (app: 0.6-0.95 keyword
+formula, EnhancedEmotionAnalyzer: weighted sum of dominance, coverage,
+sentiment, uniqueness and length). Here the raw value is mapped to the observed
+probability that the predicted emotion is correct:
+- fit_isotonic: pool-adjacent-violators (monotone, non-parametric)
+- fit_platt: logistic fit on the raw confidence, tabulated on a fixed grid
+- curves are kept per model ("app", "analyzer") and per predicted emotion,
+  plus a pooled "*" curve for emotions with too few samples or none in the
+  corpus labels, as compact (x, y) knot lists in data/calibration.json
+- CalibrationTable: bisect + linear interpolation per value; apply_many()
+  maps a batch with numpy.interp when NumPy is installed
+- Calibrator: hot-reloadable via datastore.LiveData. Opt-in: only the table
+  named by CALIBRATION_FILE (under data/, or an absolute path) is applied;
+  unset, confidences pass through unchanged
+- a curve that cannot reflect accuracy is rejected at load and its emotion
+  passes through unchanged: a flat curve (one y over its whole x range) or
+  one that reaches 0.0 or 1.0 (a step fitted on too few samples)
+
+No table ships with the repo: the synthetic corpus (benchmarks.corpus.labelled)
+labels text with its own generator's vocabulary, so curves fitted on it encode
+the generator, not the analyzers' accuracy. Fit on real labelled messages
+(--labelled, JSON lines of {"text": ..., "emotion": ...}) before enabling one.
+
+Usage (CLI, from backend/):
+    python calibration.py fit --labelled labelled.jsonl        # writes data/calibration.json
+    python calibration.py fit --n 3000                          # synthetic corpus (experiments only)
+    python calibration.py report --table calibration.json       # ECE of a table on a sample
+    CALIBRATION_FILE=calibration.json gunicorn -c gunicorn.conf.py app:app
+"""
+
+import os
+import sys
+import json
+import math
+import argparse
+from array import array
+from bisect import bisect_right
+from datetime import datetime
+from typing import Any, Collection, Dict, List, Optional, Sequence, Tuple
+
+from datastore import LiveData, data_path, load_data
+
+try:
+    import numpy as np
+except ImportError:  # optional: apply_many falls back to a bisect loop
+    np = None
+
+CALIBRATION_FILE = "calibration.json"  # where `fit` writes by default; applied only via the env var
+MODELS = ("app", "analyzer")
+POOLED = "*"
+
+
+# ------------------------------------
+# Lookup
+# ------------------------------------
+class CalibrationTable:
+    """Piecewise-linear map through sorted knots; clamps outside the fitted range."""
+    __slots__ = ("xs", "ys", "_np_xs", "_np_ys")
+
+    def __init__(self, xs: Sequence[float], ys: Sequence[float]):
+        if not xs or len(xs) != len(ys):
+            raise ValueError("calibration table needs matching, non-empty x and y knots")
+        self.xs = array("d", xs)
+        self.ys = array("d", ys)
+        self._np_xs = np.frombuffer(self.xs, dtype=np.float64) if np is not None else None
+        self._np_ys = np.frombuffer(self.ys, dtype=np.float64) if np is not None else None
+
+    def __call__(self, x: float) -> float:
+        xs, ys = self.xs, self.ys
+        i = bisect_right(xs, x)
+        if i == 0:
+            return ys[0]
+        if i == len(xs):
+            return ys[-1]
+        x0, x1 = xs[i - 1], xs[i]
+        return ys[i - 1] + (ys[i] - ys[i - 1]) * (x - x0) / (x1 - x0)
+
+    def apply_many(self, values: Sequence[float], lo: float = 0.0, hi: float = 1.0) -> List[float]:
+        if self._np_xs is not None:
+            mapped = np.interp(np.asarray(values, dtype=np.float64), self._np_xs, self._np_ys)
+            return np.clip(mapped, lo, hi).tolist()
+        return [min(hi, max(lo, self(v))) for v in values]
+
+    def to_json(self) -> Dict[str, List[float]]:
+        return {"x": [round(v, 4) for v in self.xs], "y": [round(v, 4) for v in self.ys]}
+
+    def __len__(self) -> int:
+        return len(self.xs)
+
+
+def degenerate(table: CalibrationTable) -> Optional[str]:
+    """Why the curve cannot be trusted as an accuracy map, or None."""
+    if len(set(table.ys)) == 1:
+        return f"flat at {table.ys[0]:g}"
+    if min(table.ys) <= 0.0 or max(table.ys) >= 1.0:
+        return "reaches 0.0 or 1.0"
+    return None
+
+
+class CalibrationSet:
+    """
+    One version of a calibration table: {model: {emotion | "*": CalibrationTable}}.
+    A rejected curve is kept as None (its emotion passes through unchanged) and
+    listed in `rejected` as "model/emotion: reason".
+    """
+    __slots__ = ("version", "method", "models", "rejected")
+
+    def __init__(self, version: str, method: str, models: Dict[str, Dict[str, Optional[CalibrationTable]]],
+                 rejected: Optional[List[str]] = None):
+        self.version = version
+        self.method = method
+        self.models = models
+        self.rejected = rejected or []
+
+
+def active_file() -> str:
+    """The table the app applies (CALIBRATION_FILE); empty when calibration is off."""
+    return os.environ.get("CALIBRATION_FILE", "")
+
+
+def load_calibration_set(name: Optional[str] = None) -> CalibrationSet:
+    name = active_file() if name is None else name
+    if not name:
+        return CalibrationSet("none", "identity", {})
+    (raw,), version = load_data(name)  # an explicitly named table that is missing is an error
+    models: Dict[str, Dict[str, Optional[CalibrationTable]]] = {}
+    rejected: List[str] = []
+    for model, curves in raw.get("models", {}).items():
+        models[model] = {}
+        for emo, c in curves.items():
+            table = CalibrationTable(c["x"], c["y"])
+            reason = degenerate(table)
+            if reason:
+                rejected.append(f"{model}/{emo}: {reason}")
+                table = None
+            models[model][emo] = table
+    return CalibrationSet(version, raw.get("method", "isotonic"), models, rejected)
+
+
+class Calibrator:
+    def __init__(self):
+        self._live = LiveData("calibration", load_calibration_set)
+
+    @property
+    def version(self) -> str:
+        return self._live.version
+
+    @property
+    def rejected(self) -> List[str]:
+        return self._live.current.rejected
+
+    def table(self, model: str, emotion: str) -> Optional[CalibrationTable]:
+        curves = self._live.current.models.get(model)
+        if not curves:
+            return None
+        # an emotion whose own curve was rejected passes through; it does not borrow the pooled one
+        return curves[emotion] if emotion in curves else curves.get(POOLED)
+
+    def apply(self, model: str, emotion: str, raw: float) -> float:
+        table = self.table(model, emotion)
+        if table is None:
+            return raw
+        # a finite sample never justifies 0 or 1
+        return min(0.99, max(0.01, table(raw)))
+
+    def apply_many(self, model: str, emotion: str, raws: Sequence[float]) -> List[float]:
+        """apply() over a batch predicted as the same emotion (one numpy.interp call when NumPy is installed)."""
+        table = self.table(model, emotion)
+        if table is None:
+            return list(raws)
+        return table.apply_many(raws, 0.01, 0.99)
+
+    def reload(self) -> Dict[str, Any]:
+        return self._live.reload()
+
+
+_DEFAULT: Optional[Calibrator] = None
+
+
+def default_calibrator() -> Calibrator:
+    """Process-wide calibrator shared by the app and the analyzers."""
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = Calibrator()
+    return _DEFAULT
+
+
+# ------------------------------------
+# Fitting
+# ------------------------------------
+def _thin(xs: List[float], ys: List[float], max_knots: int) -> Tuple[List[float], List[float]]:
+    # evenly spaced subset (endpoints kept); interpolation stays monotone if the input was
+    if len(xs) <= max_knots:
+        return xs, ys
+    step = (len(xs) - 1) / (max_knots - 1)
+    idx = sorted({round(i * step) for i in range(max_knots)})
+    return [xs[i] for i in idx], [ys[i] for i in idx]
+
+
+def fit_isotonic(scores: Sequence[float], labels: Sequence[int], max_knots: int = 32) -> CalibrationTable:
+    """Pool-adjacent-violators: the non-decreasing step fit, with knots at each pooled block's x range."""
+    pairs = sorted(zip(scores, labels))
+    # blocks of [x_min, x_max, sum_y, weight]
+    blocks: List[List[float]] = []
+    for x, y in pairs:
+        blocks.append([x, x, float(y), 1.0])
+        while len(blocks) > 1 and (blocks[-2][1] == blocks[-1][0]
+                                   or blocks[-2][2] / blocks[-2][3] >= blocks[-1][2] / blocks[-1][3]):
+            _, hi, sy, w = blocks.pop()
+            b = blocks[-1]
+            b[1], b[2], b[3] = hi, b[2] + sy, b[3] + w
+    xs: List[float] = []
+    ys: List[float] = []
+    for lo, hi, sy, w in blocks:
+        for x in ((lo,) if lo == hi else (lo, hi)):
+            xs.append(x)
+            ys.append(sy / w)
+    xs, ys = _thin(xs, ys, max_knots)
+    return CalibrationTable(xs, ys)
+
+
+def fit_platt(scores: Sequence[float], labels: Sequence[int], grid: int = 21,
+              iterations: int = 50) -> CalibrationTable:
+    """Logistic P(correct) = 1 / (1 + exp(-(a*x + b))) by Newton's method, with Platt's smoothed targets."""
+    n_pos = sum(1 for y in labels if y)
+    n_neg = len(labels) - n_pos
+    hi, lo = (n_pos + 1.0) / (n_pos + 2.0), 1.0 / (n_neg + 2.0)
+    targets = [hi if y else lo for y in labels]
+    a, b = 1.0, 0.0
+    for _ in range(iterations):
+        g_a = g_b = h_aa = h_ab = h_bb = 0.0
+        for x, t in zip(scores, targets):
+            p = 1.0 / (1.0 + math.exp(-(a * x + b)))
+            d = p - t
+            w = max(p * (1.0 - p), 1e-12)
+            g_a += d * x
+            g_b += d
+            h_aa += w * x * x
+            h_ab += w * x
+            h_bb += w
+        det = h_aa * h_bb - h_ab * h_ab
+        if abs(det) < 1e-12:
+            break
+        da = (h_bb * g_a - h_ab * g_b) / det
+        db = (h_aa * g_b - h_ab * g_a) / det
+        a, b = a - da, b - db
+        if abs(da) < 1e-9 and abs(db) < 1e-9:
+            break
+    xs = [i / (grid - 1) for i in range(grid)]
+    return CalibrationTable(xs, [1.0 / (1.0 + math.exp(-(a * x + b))) for x in xs])
+
+
+FITTERS = {"isotonic": fit_isotonic, "platt": fit_platt}
+
+
+def fit_curves(samples: List[Tuple[str, float, int]], method: str = "isotonic", min_samples: int = 40,
+               labels: Optional[Collection[str]] = None) -> Dict[str, CalibrationTable]:
+    """
+    samples: (predicted emotion, raw confidence, correct 0/1). Emotions below min_samples use the pooled curve.
+
+    `labels` are the emotions the corpus can assign. A prediction outside them
+    is never counted as correct, whatever the text said, so those samples get
+    no curve of their own and stay out of the pooled one; at apply time such
+    emotions fall back to the pooled curve.
+    """
+    if labels is not None:
+        samples = [s for s in samples if s[0] in labels]
+    fitter = FITTERS[method]
+    curves = {POOLED: fitter([s for _, s, _ in samples], [y for _, _, y in samples])}
+    by_emotion: Dict[str, List[Tuple[float, int]]] = {}
+    for emo, s, y in samples:
+        by_emotion.setdefault(emo, []).append((s, y))
+    for emo, pairs in sorted(by_emotion.items()):
+        if len(pairs) >= min_samples:
+            curves[emo] = fitter([s for s, _ in pairs], [y for _, y in pairs])
+    return curves
+
+
+def expected_calibration_error(confidences: Sequence[float], correct: Sequence[int], bins: int = 10) -> float:
+    """Equal-width ECE: sum over bins of |accuracy - mean confidence| weighted by bin size."""
+    if not confidences:
+        return 0.0
+    totals = [[0, 0.0, 0] for _ in range(bins)]  # count, confidence sum, correct
+    for c, y in zip(confidences, correct):
+        b = totals[min(bins - 1, max(0, int(c * bins)))]
+        b[0] += 1
+        b[1] += c
+        b[2] += y
+    n = len(confidences)
+    return sum(abs(k / cnt - s / cnt) * cnt / n for cnt, s, k in totals if cnt)
+
+
+# ------------------------------------
+# Offline pipeline (labelled synthetic corpus -> samples -> curves)
+# ------------------------------------
+def collect_samples(model: str, pairs: List[Tuple[str, str]]) -> List[Tuple[str, float, int]]:
+    """Run one model over (text, label) pairs; uses the uncalibrated details.raw_confidence."""
+    from benchmarks.common import load_app, analyzer
+    out = []
+    if model == "app":
+        app_module = load_app()
+        for text, label in pairs:
+            r = app_module.analyze_emotion(text)
+            out.append((r["emotion"], r["details"]["raw_confidence"], int(r["emotion"] == label)))
+    else:
+        a = analyzer(expand_wordnet=True)
+        for text, label in pairs:
+            r = a.detect_emotion(text)
+            out.append((r["top_emotion"], r["details"]["raw_confidence"], int(r["top_emotion"] == label)))
+    return out
+
+
+def group_by_emotion(samples: List[Tuple[str, float, int]]) -> Dict[str, List[int]]:
+    """Sample indices grouped by predicted emotion, so each curve is applied to its batch at once."""
+    groups: Dict[str, List[int]] = {}
+    for i, (emo, _, _) in enumerate(samples):
+        groups.setdefault(emo, []).append(i)
+    return groups
+
+
+def evaluate(curves: Dict[str, Optional[CalibrationTable]],
+             samples: List[Tuple[str, float, int]]) -> Dict[str, float]:
+    raw = [s for _, s, _ in samples]
+    correct = [y for _, _, y in samples]
+    calibrated = raw
+    if curves:
+        calibrated = list(raw)
+        for emo, idx in group_by_emotion(samples).items():
+            # as Calibrator.table: a rejected (None) curve passes through, a missing one uses the pooled curve
+            table = curves[emo] if emo in curves else curves.get(POOLED)
+            if table is None:
+                continue
+            for i, v in zip(idx, table.apply_many([raw[i] for i in idx])):
+                calibrated[i] = v
+    return {
+        "n": len(samples),
+        "accuracy": round(sum(correct) / max(1, len(correct)), 4),
+        "mean_raw_confidence": round(sum(raw) / max(1, len(raw)), 4),
+        "ece_raw": round(expected_calibration_error(raw, correct), 4),
+        "ece_calibrated": round(expected_calibration_error(calibrated, correct), 4),
+    }
+
+
+def read_labelled(path: str) -> List[Tuple[str, str]]:
+    """(text, emotion) pairs from JSON lines of {"text": ..., "emotion": ...}."""
+    pairs = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                item = json.loads(line)
+                pairs.append((item["text"], item["emotion"]))
+    return pairs
+
+
+def _main(argv: Optional[List[str]] = None) -> int:
+    from benchmarks.corpus import labelled
+
+    p = argparse.ArgumentParser(description="Fit / evaluate confidence calibration tables.")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    f = sub.add_parser("fit", help="fit curves on labelled messages and write the JSON table")
+    f.add_argument("--method", choices=sorted(FITTERS), default="isotonic")
+    f.add_argument("--min-samples", type=int, default=40, help="per-emotion curve threshold")
+    f.add_argument("--out", default=data_path(CALIBRATION_FILE))
+    r = sub.add_parser("report", help="ECE of a table on a (held-out) sample")
+    r.add_argument("--table", help="table under data/ (or a path) to evaluate (default: CALIBRATION_FILE)")
+    for sp in (f, r):
+        sp.add_argument("--labelled", help="JSON lines of {\"text\", \"emotion\"} (default: the synthetic corpus)")
+        sp.add_argument("--n", type=int, default=3000 if sp is f else 1000, help="synthetic samples")
+        sp.add_argument("--seed", type=int, default=4 if sp is f else 9, help="synthetic corpus seed")
+        sp.add_argument("--model", choices=MODELS + ("all",), default="all")
+    args = p.parse_args(argv)
+
+    models = MODELS if args.model == "all" else (args.model,)
+    pairs = read_labelled(args.labelled) if args.labelled else labelled(args.n, args.seed)
+    if args.cmd == "fit":
+        labels = sorted({label for _, label in pairs})
+        source = ({"file": os.path.basename(args.labelled), "n": len(pairs)} if args.labelled else
+                  {"generator": "benchmarks.corpus.labelled", "n": args.n, "seed": args.seed})
+        doc: Dict[str, Any] = {"method": args.method, "fitted_at": datetime.now().isoformat(timespec="seconds"),
+                               "corpus": {**source, "labels": labels}, "models": {}, "report": {}}
+        for model in models:
+            samples = collect_samples(model, pairs)
+            curves = fit_curves(samples, args.method, args.min_samples, labels)
+            doc["models"][model] = {emo: t.to_json() for emo, t in curves.items()}
+            doc["report"][model] = evaluate(curves, samples)
+            print(f"{model}: {len(curves) - 1} emotion curves + pooled; {doc['report'][model]}")
+            for emo, t in curves.items():
+                reason = degenerate(t)
+                if reason:
+                    print(f"  {model}/{emo}: {reason} - rejected when loaded (passes through)")
+        with open(args.out + ".tmp", "w", encoding="utf-8") as fh:
+            json.dump(doc, fh, indent=1)
+        os.replace(args.out + ".tmp", args.out)
+        print(f"wrote {args.out}; apply it with CALIBRATION_FILE={os.path.basename(args.out)}")
+    else:
+        current = load_calibration_set(args.table)
+        for reason in current.rejected:
+            print(f"rejected {reason}")
+        for model in models:
+            print(f"{model} [{current.version}]: {evaluate(current.models.get(model, {}), collect_samples(model, pairs))}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -0,0 +1,94 @@
+"""
+chunking.py
+
+Bounded-cost analysis of long inputs:
+- iter_windows: lazily split text into sentence-packed windows of at most N chars
+- ScoreAccumulator: running per-emotion totals with an early-exit decision
+
+Both analyzers stream windows through these so memory stays proportional to
+one window plus a fixed-size score vector, regardless of input length.
+"""
+
+import re
+from collections import defaultdict
+from typing import Dict, Iterator, Optional, Tuple
+
+# a sentence is a run of non-terminators followed by terminators / newlines / end of text
+_SENTENCE_RE = re.compile(r"[^.!?\n]+(?:[.!?]+|\n+|$)|[.!?\n]+")
+
+
+def _split_oversized(text: str, start: int, end: int, window_chars: int) -> Iterator[Tuple[int, str]]:
+    # prefer cutting on whitespace in the back half of the window
+    while end - start > window_chars:
+        cut = text.rfind(" ", start + window_chars // 2, start + window_chars)
+        if cut <= start:
+            cut = start + window_chars
+        yield start, text[start:cut]
+        start = cut
+    if end > start:
+        yield start, text[start:end]
+
+
+def iter_windows(text: str, window_chars: int = 2000, max_chars: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (start_offset, window_text) pairs covering text[:max_chars].
+    Whole sentences are packed into each window; a sentence longer than
+    `window_chars` is split on whitespace (or hard-split if it has none).
+    """
+    if window_chars <= 0:
+        raise ValueError("window_chars must be positive")
+    limit = len(text) if max_chars is None else min(len(text), max_chars)
+
+    buf_start = buf_end = -1
+    for m in _SENTENCE_RE.finditer(text, 0, limit):
+        s, e = m.span()
+        if e - s > window_chars:
+            if buf_start >= 0:
+                yield buf_start, text[buf_start:buf_end]
+                buf_start = -1
+            yield from _split_oversized(text, s, e, window_chars)
+            continue
+        if buf_start < 0:
+            buf_start, buf_end = s, e
+        elif e - buf_start <= window_chars:
+            buf_end = e
+        else:
+            yield buf_start, text[buf_start:buf_end]
+            buf_start, buf_end = s, e
+    if buf_start >= 0:
+        yield buf_start, text[buf_start:buf_end]
+
+
+class ScoreAccumulator:
+    """
+    Sums per-window emotion scores. `decided()` turns true once at least
+    `min_windows` have been added and the leader beats the runner-up by
+    `margin` of its own score, i.e. (top - second) / top >= margin.
+    """
+
+    def __init__(self, margin: float = 0.5, min_windows: int = 3):
+        self.margin = margin
+        self.min_windows = min_windows
+        self.totals: Dict[str, float] = defaultdict(float)
+        self.windows = 0
+
+    def add(self, scores: Dict[str, float]):
+        for emo, v in scores.items():
+            if v > 0:
+                self.totals[emo] += v
+        self.windows += 1
+
+    def leader(self) -> Tuple[Optional[str], float, float]:
+        top, first, second = None, 0.0, 0.0
+        for emo, v in self.totals.items():
+            if v > first:
+                top, first, second = emo, v, first
+            elif v > second:
+                second = v
+        return top, first, second
+
+    def decided(self) -> bool:
+        if self.windows < self.min_windows:
+            return False
+        top, first, second = self.leader()
+        return top is not None and (first - second) / first >= self.margin
@@ -0,0 +1,212 @@
+"""
+context.py
+
+Context weights for lexical matching, computed in one left-to-right pass over
+the tokens of a text:
+- intensity modifiers, single- or multi-word ("very", "a bit", "kind of"),
+  scale the next word
+- negators ("not", "never", "don't", ...) zero the next few words, up to a
+  clause boundary or contrast word; after "never", "can't" / "cannot",
+  "couldn't" or "can / could not", a comparative ("happier", "better",
+  "more ...") lifts the negation instead ("never been happier", "couldn't be
+  more grateful" intensify, they do not negate)
+- contrast words ("but", "however", ...) discount the clause before them (or
+  the previous sentence when they open a sentence)
+
+Both analyzers read token weights from here instead of looking only at the
+previous token: app.score_emotions maps each regex match offset to its token
+weight, and EnhancedEmotionAnalyzer uses the weights in its keyword and
+phrase stages. The pass runs over an AnalysisDocument's words
+(text_pipeline.py) and its result is cached on the document. Lookahead is bounded by the longest multi-word modifier, and
+contrast rescaling touches each token at most once per boundary, so the cost
+stays linear in the text length.
+"""
+
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from text_pipeline import AnalysisDocument, SENTENCE
+
+DEFAULT_MODIFIERS: Dict[str, float] = {
+    "extremely": 2.0, "incredibly": 1.9, "very": 1.6, "so": 1.5,
+    "really": 1.4, "quite": 1.25, "somewhat": 0.85, "slightly": 0.7,
+    "a bit": 0.7, "barely": 0.6, "totally": 1.6, "utterly": 1.8,
+    "a little": 0.7, "a little bit": 0.65, "kind of": 0.8, "sort of": 0.8,
+    "a lot": 1.4, "so much": 1.6,
+}
+
+NEGATORS = frozenset((
+    "not", "no", "never", "nor", "neither", "nothing", "nobody", "without", "cannot",
+    "dont", "doesnt", "didnt", "isnt", "wasnt", "arent", "werent", "cant", "couldnt",
+    "wont", "wouldnt", "shouldnt", "havent", "hasnt", "hadnt", "aint",
+))
+# negators that do not negate what follows ("not only", "no doubt")
+NEGATION_EXCEPTIONS = frozenset(("only", "just", "doubt", "matter"))
+# negators whose scope a comparative lifts; "not" only after can / could ("I don't feel better" stays negated)
+IDIOM_NEGATORS = frozenset(("never", "cannot", "can't", "cant", "couldn't", "couldnt"))
+IDIOM_NOT_AFTER = frozenset(("can", "could"))
+# comparatives besides the "-ier" forms (happier, angrier, ...); "-er" alone would catch anger, never, over
+COMPARATIVES = frozenset((
+    "better", "worse", "more", "less", "greater", "stronger", "calmer", "prouder", "sadder", "gladder",
+    "madder", "closer", "lighter", "freer", "safer", "braver", "wiser", "kinder",
+))
+
+
+def is_comparative(word: str) -> bool:
+    return word in COMPARATIVES or (len(word) > 4 and word.endswith("ier"))
+
+CONTRAST = frozenset(("but", "however", "although", "though", "yet", "nevertheless", "nonetheless", "whereas"))
+
+class TokenContext:
+    """Per-word weights for one text; `starts` are the words' character offsets."""
+    __slots__ = ("words", "starts", "weights", "negated")
+
+    def __init__(self, words: List[str], starts: List[int], weights: List[float], negated: int):
+        self.words = words
+        self.starts = starts
+        self.weights = weights
+        self.negated = negated
+
+    def weight_at(self, offset: int) -> float:
+        """Weight of the word containing (or nearest before) a character offset."""
+        i = bisect_right(self.starts, offset) - 1
+        return self.weights[i] if i >= 0 else 1.0
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+
+class ContextRules:
+    __slots__ = ("single", "multi", "negators", "contrast", "negation_scope", "contrast_before",
+                 "negated_weight", "boundaries")
+
+    def __init__(self, modifiers: Optional[Dict[str, float]] = None, negators: Iterable[str] = NEGATORS,
+                 contrast: Iterable[str] = CONTRAST, negation_scope: int = 3,
+                 contrast_before: float = 0.5, negated_weight: float = 0.0, boundaries: bool = True):
+        modifiers = DEFAULT_MODIFIERS if modifiers is None else modifiers
+        self.single: Dict[str, float] = {}
+        # first word -> [(following words, multiplier)], longest first
+        self.multi: Dict[str, List[Tuple[Tuple[str, ...], float]]] = {}
+        for phrase, mult in modifiers.items():
+            words = phrase.split()
+            if len(words) == 1:
+                self.single[words[0]] = mult
+            elif words:
+                self.multi.setdefault(words[0], []).append((tuple(words[1:]), mult))
+        for options in self.multi.values():
+            options.sort(key=lambda o: -len(o[0]))
+        self.negators = frozenset(negators)
+        self.contrast = frozenset(contrast)
+        self.negation_scope = negation_scope
+        self.contrast_before = contrast_before
+        self.negated_weight = negated_weight
+        # punctuation ends modifier / negation reach (the legacy matcher saw punctuation-free tokens)
+        self.boundaries = boundaries
+
+    @classmethod
+    def legacy(cls, modifiers: Optional[Dict[str, float]] = None) -> "ContextRules":
+        """Previous behaviour: single-word modifiers on the next word only, no negation or contrast."""
+        single = {k: v for k, v in (DEFAULT_MODIFIERS if modifiers is None else modifiers).items() if " " not in k}
+        return cls(single, negators=(), contrast=(), boundaries=False)
+
+    @classmethod
+    def disabled(cls) -> "ContextRules":
+        """Every word weighs 1.0 (plain hit counting)."""
+        return cls({}, negators=(), contrast=(), boundaries=False)
+
+    def _is_negator(self, word: str) -> bool:
+        return word in self.negators or (bool(self.negators) and word.endswith("n't"))
+
+    def scan(self, text: str) -> TokenContext:
+        """Tokenize `text` and weigh it (callers holding an AnalysisDocument use weigh())."""
+        return self.weigh(AnalysisDocument(text))
+
+    def weigh(self, doc: AnalysisDocument) -> TokenContext:
+        """One pass over the document's words; cached on the document per rule set."""
+        return doc.memo(("context", self), self._weigh)
+
+    def _weigh(self, doc: AnalysisDocument) -> TokenContext:
+        words = doc.words
+        boundaries = doc.boundaries if self.boundaries else None
+        n = len(words)
+        weights = [1.0] * n
+
+        pending = 1.0         # modifier waiting for the next word
+        negate_left = 0       # words still inside a negation scope
+        scope_start = 0       # first word of the current negation scope
+        scope_negated = 0     # `negated` before it
+        idiom = False         # the scope's negator is one a comparative lifts
+        clause_start = 0      # first word of the current clause
+        sentence_start = 0    # first word of the current sentence
+        prev_sentence = 0     # first word of the previous sentence
+        negated = 0
+        multi = self.multi
+        single = self.single
+        contrast = self.contrast
+        negated_weight = self.negated_weight
+        i = 0
+        while i < n:
+            tok = words[i]
+            if boundaries is not None and boundaries[i]:
+                # punctuation before this word: clause boundary, sentence boundary on . ! ?
+                negate_left = 0
+                pending = 1.0
+                clause_start = i
+                if boundaries[i] == SENTENCE:
+                    prev_sentence, sentence_start = sentence_start, i
+
+            if tok in contrast:
+                lo = prev_sentence if clause_start == sentence_start == i else clause_start
+                f = self.contrast_before
+                for j in range(lo, i):
+                    weights[j] *= f
+                negate_left = 0
+                pending = 1.0
+                clause_start = i + 1
+                i += 1
+                continue
+
+            # multi-word modifier starting here (not across punctuation): consume it, remember the multiplier
+            options = multi.get(tok)
+            if options:
+                matched = None
+                for tail, mult in options:
+                    end = i + 1 + len(tail)
+                    if end <= n and all(words[i + 1 + k] == w and not (boundaries and boundaries[i + 1 + k])
+                                        for k, w in enumerate(tail)):
+                        matched = (end, mult)
+                        break
+                if matched is not None:
+                    end, mult = matched
+                    # modifiers do not use up the negation scope ("not a bit happy")
+                    if negate_left:
+                        for k in range(i, end):
+                            weights[k] = negated_weight
+                    pending = mult
+                    i = end
+                    continue
+
+            w = pending
+            mult = single.get(tok)
+            pending = 1.0 if mult is None else mult
+            if negate_left and idiom and is_comparative(tok):
+                # "never been happier": undo the scope so far, the comparative keeps its weight
+                for k in range(scope_start, i):
+                    weights[k] = 1.0
+                negated = scope_negated
+                negate_left = 0
+            if negate_left:
+                w = negated_weight
+                if mult is None:
+                    negate_left -= 1
+                    negated += 1
+            if self._is_negator(tok):
+                nxt = words[i + 1] if i + 1 < n else ""
+                if nxt not in NEGATION_EXCEPTIONS:
+                    negate_left = self.negation_scope
+                    scope_start, scope_negated = i + 1, negated
+                    idiom = tok in IDIOM_NEGATORS or (tok == "not" and i > 0 and words[i - 1] in IDIOM_NOT_AFTER)
+                w = 1.0
+            weights[i] = w
+            i += 1
+        return TokenContext(words, doc.offsets, weights, negated)
@@ -0,0 +1,122 @@
+"""
+datastore.py
+
+External data files and hot reload.
+
+Lexicons and shlokas live as JSON under backend/data/ (override with the
+DATA_DIR env var) instead of Python literals, so they can change without a
+restart:
+- load_data(*names): parse data files and tag them with a content hash (the
+  `data_version` returned to clients)
+- LiveData: holds one immutable snapshot built by a loader; reload() builds a
+  replacement while requests keep reading the current one, then swaps the
+  reference in a single assignment. A request that already took `.current`
+  finishes on the old snapshot.
+- reload_all() / install_reload_signal(): one trigger (admin endpoint or
+  SIGHUP) for every LiveData in the process.
+"""
+
+import os
+import json
+import time
+import signal
+import hashlib
+import threading
+import weakref
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+DATA_DIR = os.environ.get("DATA_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+_REGISTRY: "weakref.WeakSet[LiveData]" = weakref.WeakSet()
+
+
+def data_path(name: str) -> str:
+    return os.path.join(DATA_DIR, name)
+
+
+def load_data(*names: str) -> Tuple[List[Any], str]:
+    """Parse each data file; the version is hashed from the same bytes that were parsed."""
+    digest = hashlib.sha1()
+    objects = []
+    for name in names:
+        with open(data_path(name), "rb") as f:
+            raw = f.read()
+        digest.update(name.encode("utf-8") + b"\0" + raw)
+        objects.append(json.loads(raw.decode("utf-8")))
+    return objects, digest.hexdigest()[:12]
+
+
+class LiveData:
+    """
+    An atomically swappable snapshot. `builder()` returns the snapshot and
+    must expose a `version` attribute. The first build runs in the
+    constructor (and raises on bad data); later reloads keep the current
+    snapshot if the builder fails.
+    """
+
+    def __init__(self, name: str, builder: Callable[[], Any]):
+        self.name = name
+        self._builder = builder
+        self._lock = threading.Lock()
+        self._current = builder()
+        self.last_reload: Dict[str, Any] = {"name": name, "ok": True, "version": self._current.version,
+                                            "loaded_at": datetime.now().isoformat()}
+        _REGISTRY.add(self)
+
+    @property
+    def current(self) -> Any:
+        return self._current
+
+    @property
+    def version(self) -> str:
+        return self._current.version
+
+    def reload(self) -> Dict[str, Any]:
+        # one rebuild at a time; readers are never blocked
+        with self._lock:
+            previous = self._current.version
+            t0 = time.perf_counter()
+            status: Dict[str, Any] = {"name": self.name, "previous_version": previous}
+            try:
+                snapshot = self._builder()
+            except Exception as e:
+                status.update({"ok": False, "version": previous, "error": f"{type(e).__name__}: {e}"})
+            else:
+                self._current = snapshot
+                status.update({"ok": True, "version": snapshot.version, "changed": snapshot.version != previous})
+            status["duration_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            status["loaded_at"] = datetime.now().isoformat()
+            self.last_reload = status
+            return status
+
+
+def live_sources() -> List[LiveData]:
+    return sorted(_REGISTRY, key=lambda d: d.name)
+
+
+def versions() -> Dict[str, str]:
+    # several analyzer instances may share a name; the last one listed wins
+    return {d.name: d.version for d in live_sources()}
+
+
+def reload_all() -> List[Dict[str, Any]]:
+    return [d.reload() for d in live_sources()]
+
+
+def reload_all_async() -> threading.Thread:
+    t = threading.Thread(target=reload_all, name="data-reload", daemon=True)
+    t.start()
+    return t
+
+
+def install_reload_signal(signum: Optional[int] = None) -> bool:
+    """Reload every LiveData on SIGHUP (in a background thread). Returns False where unsupported."""
+    signum = signum if signum is not None else getattr(signal, "SIGHUP", None)
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+    try:
+        signal.signal(signum, lambda _signum, _frame: reload_all_async())
+    except (ValueError, OSError):
+        return False
+    return True
@@ -5,24 +5,36 @@ Advanced Emotion Analyzer:
 - Large lexicon (phrases + keywords)
 - WordNet expansion + stemming + fuzzy fallback
 - Intensity modifiers and multi-word phrase handling
-- VADER + TextBlob sentiment signals
+- VADER + TextBlob sentiment signals (fused single-pass scorer, sentiment.py)
 - Robust confidence calculation and detailed debug info
+- Optional cascade: fuzzy / TextBlob stages only when the lexical margin is
+  small, and a per-call deadline after which costly stages are skipped
 - Animation hints for UI per emotion
 """
 
 import re
 import math
 import json
-from typing import Dict, List, Tuple, Any
+import time
+import heapq
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple, Any
 from collections import defaultdict, Counter
-from difflib import get_close_matches
 
 import nltk
-from textblob import TextBlob
 from nltk.sentiment import SentimentIntensityAnalyzer
 from nltk.stem.porter import PorterStemmer
 from nltk.corpus import wordnet as wn
 
+from lexicon_index import CompiledLexicon, ScoreVector
+from datastore import LiveData, load_data
+from memo import BoundedMemo
+from chunking import iter_windows, ScoreAccumulator
+from calibration import default_calibrator
+from context import ContextRules, DEFAULT_MODIFIERS
+from text_pipeline import AnalysisDocument
+from sentiment import AveragedSignals, LibrarySentiment, SentimentSignals, VaderOnlySignals, default_sentiment
+
 # Ensure NLTK resources (downloads silently if missing)
 def _ensure_nltk_resources():
     try:
@@ -46,28 +58,41 @@ _ensure_nltk_resources()
 
 
 class EnhancedEmotionAnalyzer:
-    def __init__(self, expand_wordnet: bool = True, fuzzy_cutoff: float = 0.86):
+    def __init__(self, expand_wordnet: bool = True, fuzzy_cutoff: float = 0.86, memo_size: int = 50000,
+                 max_input_chars: int = 20_000, window_chars: int = 2000,
+                 chunk_margin: float = 0.5, chunk_min_windows: int = 3, calibrate: bool = True,
+                 fused_sentiment: bool = True, cascade_margin: Optional[float] = None):
         self.sia = SentimentIntensityAnalyzer()
+        # one-pass VADER + TextBlob tables (sentiment.py); False calls the libraries per text
+        self.sentiment = default_sentiment() if fused_sentiment else LibrarySentiment(self.sia)
         self.stemmer = PorterStemmer()
         self.fuzzy_cutoff = fuzzy_cutoff
         self.expand_wordnet = expand_wordnet
 
-        # Intensity multipliers that amplify nearby emotion words
-        self.intensity_modifiers = {
-            "extremely": 2.0, "incredibly": 1.9, "very": 1.6, "so": 1.5,
-            "really": 1.4, "quite": 1.25, "somewhat": 0.85, "slightly": 0.7,
-            "a bit": 0.7, "barely": 0.6, "totally": 1.6, "utterly": 1.8
-        }
+        # Long-input guardrails: hard cap on analyzed chars, window size and early-exit margin
+        self.max_input_chars = max_input_chars
+        self.window_chars = window_chars
+        self.chunk_margin = chunk_margin
+        self.chunk_min_windows = chunk_min_windows
 
-        # Build lexicon (phrases + keywords). See _build_lexicon for details.
-        self.lexicon = self._build_lexicon()
+        # Cascade: when the lexical leader is ahead by at least this share of its score
+        # ((top - second) / top), the TextBlob pass is skipped; None runs every stage
+        self.cascade_margin = cascade_margin
 
-        # optionally expand keywords via WordNet to capture synonyms
-        if self.expand_wordnet:
-            self._apply_wordnet_expansion()
+        # Memo tables: lexicon entries are pinned at build time, input tokens fill in lazily (bounded)
+        self.memo_size = memo_size
+        self._stem = BoundedMemo(self.stemmer.stem, max_size=memo_size, name="stem")
 
-        # Build stems lookup to speed matching
-        self._build_stem_lookup()
+        # Intensity multipliers (single- and multi-word) that scale the next word; together with
+        # negators and contrast words they give each token a weight in one pass (context.py)
+        self.intensity_modifiers = dict(DEFAULT_MODIFIERS)
+        self.context_rules = ContextRules(self.intensity_modifiers)
+
+        # Confidence calibration table (CALIBRATION_FILE, off by default); calibrate=False reports the raw score
+        self.calibrator = default_calibrator() if calibrate else None
+
+        # Lexicon snapshot: built from data/analyzer_lexicon.json, swapped atomically by reload_lexicon()
+        self._live = LiveData("analyzer_lexicon", self._load_lexicon)
 
         # Phrase bonus multiplier (phrases are stronger signal than single keywords)
         self.PHRASE_BONUS = 1.6
@@ -104,134 +129,38 @@ class EnhancedEmotionAnalyzer:
     # -------------------------
     # Lexicon construction
     # -------------------------
-    def _build_lexicon(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+    @staticmethod
+    def _build_lexicon(source: Dict[str, Dict[str, Dict[str, float]]]) -> Dict[str, Dict[str, Dict[str, float]]]:
         # Each emotion: phrases (multi-word) and keywords (single words) with base weights
         L: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for emo, d in source.items():
+            L[emo] = {"phrases": dict(d.get("phrases", {})), "keywords": dict(d.get("keywords", {}))}
+        return L
 
-        # Core emotions (expanded)
-        L["joy"] = {
-            "phrases": {"i feel good": 2.0, "made my day": 2.2, "so happy": 1.8, "very happy": 1.9},
-            "keywords": {
-                "happy": 1.8, "joy": 1.6, "elated": 1.9, "ecstatic": 2.0, "delighted": 1.6,
-                "bliss": 1.7, "thrilled": 1.8, "grinning": 1.2, "cheerful": 1.2, "content": 1.1,
-                "satisfied": 1.0, "relieved": 1.2,"win":1.0,"winning":1.0
-            }
-        }
-
-        L["sadness"] = {
-            "phrases": {"i am heartbroken": 2.3, "feeling down": 1.7, "can't cope": 2.0, "i miss you": 1.8},
-            "keywords": {
-                "sad": 1.7, "unhappy": 1.5, "lonely": 1.6, "depressed": 2.2, "grief": 2.0,
-                "sorrow": 1.8, "hopeless": 1.9, "tearful": 1.6, "mournful": 1.4
-            }
-        }
-
-        L["anxiety"] = {
-            "phrases": {"i am anxious about": 2.2, "can't sleep": 2.2, "panic attack": 2.7, "i'm worried about": 2.0},
-            "keywords": {
-                "anxious": 1.9, "anxiety": 2.1, "worried": 1.7, "panic": 2.4, "nervous": 1.5,
-                "stressed": 1.7, "overthinking": 1.8, "restless": 1.3, "dread": 1.6
-            }
-        }
-
-        L["anger"] = {
-            "phrases": {"i am furious": 2.5, "i'm so mad": 2.0, "i want to hurt": 3.0, "i can't forgive": 2.0},
-            "keywords": {
-                "angry": 2.0, "rage": 2.5, "furious": 2.5, "irate": 2.1, "resentful": 1.8,
-                "hostile": 1.7, "annoyed": 1.1, "frustrated": 1.5
-            }
-        }
-
-        L["confusion"] = {
-            "phrases": {"i don't know what to do": 2.0, "which way to go": 1.9, "help me choose": 2.1, "i'm not sure": 1.5},
-            "keywords": {"confused": 1.8, "uncertain": 1.5, "undecided": 1.3, "puzzled": 1.2, "lost": 1.3, "doubt": 1.3}
-        }
-
-        L["fear"] = {
-            "phrases": {"i'm really scared": 2.2, "i am terrified": 2.5, "i'm afraid of": 2.0},
-            "keywords": {"afraid": 1.8, "scared": 1.8, "fear": 1.9, "phobia": 1.8, "panic": 2.3}
-        }
-
-        L["gratitude"] = {
-            "phrases": {"thank you so much": 2.2, "i am truly grateful": 2.0},
-            "keywords": {"grateful": 1.8, "thankful": 1.7, "appreciative": 1.4, "blessed": 1.5}
-        }
-
-        L["love"] = {
-            "phrases": {"i love you": 2.6, "i miss you dearly": 2.2, "i care deeply": 2.0},
-            "keywords": {"love": 2.1, "adore": 1.9, "cherish": 1.7, "affection": 1.5, "devotion": 1.6}
-        }
-
-        L["hope"] = {
-            "phrases": {"i hope so": 1.6, "i am hopeful": 1.8, "fingers crossed": 1.5},
-            "keywords": {"hope": 1.4, "hopeful": 1.3, "optimistic": 1.2, "faith": 1.5, "trust": 1.2}
-        }
-
-        # additional nuanced emotions
-        L["guilt"] = {
-            "phrases": {"i feel guilty": 2.2, "i regret doing": 2.0},
-            "keywords": {"guilty": 2.0, "regret": 1.8, "remorse": 1.9, "sorry": 1.6}
-        }
-
-        L["shame"] = {
-            "phrases": {"i am ashamed": 2.2, "so embarrassed": 1.8},
-            "keywords": {"ashamed": 1.9, "embarrassed": 1.7, "humiliated": 1.8}
-        }
-
-        L["boredom"] = {
-            "phrases": {"i am bored": 1.8, "this is boring": 1.6},
-            "keywords": {"bored": 1.6, "meh": 1.2, "uninterested": 1.4, "apathetic": 1.5}
-        }
-
-        L["curiosity"] = {
-            "phrases": {"i wonder": 1.6, "tell me more": 1.8, "what is": 1.3},
-            "keywords": {"curious": 1.6, "intrigued": 1.4, "interested": 1.3, "inquisitive": 1.5}
-        }
-
-        L["awe"] = {
-            "phrases": {"i am in awe": 2.0, "this is amazing": 1.8},
-            "keywords": {"awe": 1.9, "amazed": 1.7, "astonished": 1.6, "wonder": 1.5}
-        }
-
-        L["jealousy"] = {
-            "phrases": {"i am jealous": 1.9, "i envy": 1.8},
-            "keywords": {"jealous": 1.8, "envy": 1.7, "resentful": 1.5}
-        }
-
-        L["relief"] = {
-            "phrases": {"what a relief": 2.0, "i am relieved": 1.9},
-            "keywords": {"relief": 1.8, "relieved": 1.7, "phew": 1.2}
-        }
-
-        L["nostalgia"] = {
-            "phrases": {"remember when": 1.8, "back in the day": 1.6},
-            "keywords": {"nostalgia": 1.6, "nostalgic": 1.6, "memories": 1.2}
-        }
-
-        L["frustration"] = {
-            "phrases": {"i am frustrated": 2.0, "this is infuriating": 2.1},
-            "keywords": {"frustrated": 1.8, "annoyed": 1.3, "blocked": 1.4}
-        }
+    def _load_lexicon(self) -> CompiledLexicon:
+        (source,), version = load_data("analyzer_lexicon.json")
+        lexicon = self._build_lexicon(source)
 
-        L["loneliness"] = {
-            "phrases": {"i feel alone": 1.9, "no one cares": 2.0},
-            "keywords": {"alone": 1.6, "isolated": 1.7, "lonely": 1.9}
-        }
+        # optionally expand keywords via WordNet to capture synonyms
+        if self.expand_wordnet:
+            self._apply_wordnet_expansion(lexicon)
 
-        # ensure structure
-        for emo, d in list(L.items()):
-            d.setdefault("phrases", {})
-            d.setdefault("keywords", {})
+        # Flatten into the array-backed form used for scoring; the nested dict is not kept
+        compiled = self._compile_lexicon(lexicon)
+        compiled.version = version
+        return compiled
 
-        return L
+    def reload_lexicon(self) -> Dict[str, Any]:
+        """Rebuild from data/analyzer_lexicon.json; in-flight calls finish on the old lexicon."""
+        return self._live.reload()
 
     # -------------------------
     # WordNet expansion (optional)
     # -------------------------
-    def _apply_wordnet_expansion(self):
+    def _apply_wordnet_expansion(self, lexicon: Dict[str, Dict[str, Dict[str, float]]]):
         # For each keyword, add top few synonyms (lemma names) to that emotion's keywords with smaller weight
         # keep weights conservative (0.9 * base)
-        for emo, group in self.lexicon.items():
+        for emo, group in lexicon.items():
             new_synonyms = {}
             for kw, base_w in list(group["keywords"].items()):
                 try:
@@ -257,20 +186,26 @@ class EnhancedEmotionAnalyzer:
                     group["keywords"][s] = round(w, 3)
 
     # -------------------------
-    # Stem lookup
+    # Compiled lexicon
     # -------------------------
-    def _build_stem_lookup(self):
-        # build stems for all keywords to match morphological variants
-        self.stem_lookup: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
-        for emo, group in self.lexicon.items():
-            for kw in group["keywords"].keys():
-                stem = self.stemmer.stem(kw)
-                self.stem_lookup[stem].append((emo, kw))
-            for ph in group["phrases"].keys():
-                # also index phrase words
-                for token in ph.split():
-                    st = self.stemmer.stem(token)
-                    self.stem_lookup[st].append((emo, ph))
+    def _compile_lexicon(self, lexicon: Dict[str, Dict[str, Dict[str, float]]]) -> CompiledLexicon:
+        # parallel weight / emotion-id arrays, exact + stem + fuzzy lookup tables;
+        # also pins the stems of every keyword in the stem memo
+        return CompiledLexicon(lexicon, self._normalize_text, self._stem,
+                               fuzzy_cutoff=self.fuzzy_cutoff, memo_size=self.memo_size)
+
+    @property
+    def compiled(self) -> CompiledLexicon:
+        return self._live.current
+
+    @property
+    def lexicon(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Nested {emotion: {"phrases", "keywords"}} view rebuilt from the compiled form."""
+        return self.compiled.as_nested()
+
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {"stem": self._stem.stats(), "token_entries": self.compiled.token_entries.stats(),
+                "lexicon": self.compiled.stats()}
 
     # -------------------------
     # Normalization & tokenization
@@ -290,165 +225,195 @@ class EnhancedEmotionAnalyzer:
     # -------------------------
     # Matching helpers
     # -------------------------
-    def _phrase_hits(self, text_norm: str, phrases: Dict[str, float]) -> List[Tuple[str, float, int]]:
-        hits = []
-        for phrase, weight in phrases.items():
-            ph = self._normalize_text(phrase)
-            if ph in text_norm:
-                count = text_norm.count(ph)
-                hits.append((phrase, weight, count))
-        return hits
-
-    def _keyword_hits(self, tokens: List[str], keywords: Dict[str, float]) -> List[Tuple[str, float, int, float]]:
-        # return (keyword, base_weight, count, avg_intensity_multiplier)
-        hits = []
-        for kw, base_w in keywords.items():
-            kw_norm = self._normalize_text(kw)
-            count = 0
-            intensity_acc = 0.0
-            for i, t in enumerate(tokens):
-                # direct match or substring (for 'overthinking' matching 'overthink')
-                if kw_norm == t or kw_norm in t:
-                    count += 1
-                    mult = 1.0
-                    if i > 0:
-                        prev = tokens[i - 1]
-                        if prev in self.intensity_modifiers:
-                            mult = self.intensity_modifiers[prev]
-                    intensity_acc += mult
-                else:
-                    # try stem match
-                    if self.stemmer.stem(kw_norm) == self.stemmer.stem(t):
-                        count += 1
-                        mult = 1.0
-                        if i > 0 and tokens[i - 1] in self.intensity_modifiers:
-                            mult = self.intensity_modifiers[tokens[i - 1]]
-                        intensity_acc += mult
-            if count > 0:
-                avg_intensity = intensity_acc / count if count else 1.0
-                hits.append((kw, base_w, count, avg_intensity))
-        return hits
-
     # fallback fuzzy token match for unseen words
-    def _fuzzy_matches(self, token_list: List[str], all_keywords: List[str]) -> List[Tuple[str, str, float]]:
+    def _fuzzy_matches(self, token_list: List[str], lex: CompiledLexicon = None) -> List[Tuple[str, str, float]]:
         # returns triples (token, matched_keyword, match_ratio)
+        fuzzy_index = (lex if lex is not None else self.compiled).fuzzy
         matches = []
         for t in token_list:
             # ignore short tokens
             if len(t) < 3:
                 continue
-            close = get_close_matches(t, all_keywords, n=2, cutoff=self.fuzzy_cutoff)
+            close = fuzzy_index.close_matches(t, n=2)
             for c in close:
                 # compute a crude similarity ratio (difflib was used)
                 matches.append((t, c, 1.0))  # we treat existence as hit
         return matches
 
     # -------------------------
-    # Main detection method
+    # Scoring stages
     # -------------------------
-    def detect_emotion(self, text: str, top_k: int = 4) -> Dict[str, Any]:
+    def _sentiment(self, doc: AnalysisDocument) -> SentimentSignals:
+        """VADER + TextBlob signals for the document, each pass evaluated on first read."""
+        return self.sentiment.signals(doc)
+
+    @staticmethod
+    def _sentiment_details(sentiment: SentimentSignals) -> Dict[str, float]:
+        return {"textblob_polarity": sentiment.polarity, "textblob_subjectivity": sentiment.subjectivity,
+                "vader_compound": sentiment.compound}
+
+    def _lexical_scores(self, doc: AnalysisDocument, evidence: Dict[str, List[Dict[str, Any]]] = None,
+                        matched: set = None, lex: CompiledLexicon = None, fuzzy: bool = True) -> ScoreVector:
         """
-        Returns:
-          - top_emotion: str
-          - confidence: float (0..1)
-          - candidates: list of (emotion, normalized_score)
-          - animation: UI hint for top emotion
-          - details: debugging info (raw_scores, evidence, sentiment, matches)
+        Phrase, keyword and fuzzy stages over one AnalysisDocument. Evidence
+        entries are appended to `evidence` only when one is passed (lean mode
+        passes None); matched token fragments for coverage are added to
+        `matched` as hits happen. `lex` pins the lexicon snapshot for
+        multi-call analyses. Token weights (negation, contrast, intensity)
+        come from the document's context pass. fuzzy=False skips the fuzzy
+        fallback (expired deadline).
         """
-        if not text or not text.strip():
-            return {
-                "top_emotion": "neutral",
-                "confidence": 0.5,
-                "candidates": [],
-                "animation": self.animation_map.get("steadiness"),
-                "details": {"reason": "empty_input"}
-            }
-
-        text_norm = self._normalize_text(text)
-        tokens = self._tokenize(text_norm)
-        total_tokens = max(1, len(tokens))
-
-        # sentiment signals
-        tb = TextBlob(text)
-        tb_polarity = tb.sentiment.polarity
-        tb_subjectivity = tb.sentiment.subjectivity
-        vader = self.sia.polarity_scores(text)
-        vader_compound = vader["compound"]
-
-        raw_scores = defaultdict(float)
-        evidence = defaultdict(list)
-
-        # 1) phrases
-        for emo, group in self.lexicon.items():
-            hits = self._phrase_hits(text_norm, group.get("phrases", {}))
-            for phrase, weight, count in hits:
-                inc = weight * self.PHRASE_BONUS * count * self.KEYWORD_WEIGHT
-                raw_scores[emo] += inc
-                evidence[emo].append({"type": "phrase", "phrase": phrase, "count": count, "inc": round(inc, 3)})
-
-        # 2) keywords
-        all_keywords = []
-        for emo, group in self.lexicon.items():
-            kw_hits = self._keyword_hits(tokens, group.get("keywords", {}))
-            for kw, base_w, count, avg_intensity in kw_hits:
-                inc = base_w * count * avg_intensity * self.KEYWORD_WEIGHT
-                raw_scores[emo] += inc
-                evidence[emo].append({"type": "keyword", "keyword": kw, "count": count, "avg_intensity": round(avg_intensity, 3), "inc": round(inc, 3)})
-            all_keywords.extend(list(group.get("keywords", {}).keys()))
+        if lex is None:
+            lex = self.compiled
+        emotions = lex.emotions
+        scores = lex.new_vector()
+        values = scores.values
+        if matched is None:
+            matched = set()
+        text_norm = doc.norm
+        tokens = doc.words
+        weights = self.context_rules.weigh(doc).weights
+
+        # 1) phrases: each occurrence weighs what its first word weighs
+        starts = None
+        for pid, ph in enumerate(lex.ph_norm):
+            if ph in text_norm:
+                if starts is None:
+                    starts = doc.norm_offsets
+                count = 0
+                weight = 0.0
+                at = text_norm.find(ph)
+                while at != -1:
+                    count += 1
+                    weight += weights[max(0, bisect_right(starts, at) - 1)]
+                    at = text_norm.find(ph, at + len(ph))
+                if weight <= 0:
+                    continue
+                eid = lex.ph_emotion[pid]
+                inc = lex.ph_weight[pid] * self.PHRASE_BONUS * weight * self.KEYWORD_WEIGHT
+                values[eid] += inc
+                phrase = lex.ph_text[pid]
+                matched.update(phrase.split())
+                if evidence is not None:
+                    evidence[emotions[eid]].append({"type": "phrase", "phrase": phrase, "count": count, "inc": round(inc, 3)})
+
+        # 2) keywords: resolve each token to the entries it hits, then sum per entry
+        hits: Dict[int, List[float]] = {}
+        token_entries = lex.token_entries
+        for i, t in enumerate(tokens):
+            ids = token_entries(t)
+            if not ids:
+                continue
+            mult = weights[i]
+            for kid in ids:
+                h = hits.get(kid)
+                if h is None:
+                    hits[kid] = [1, mult]
+                else:
+                    h[0] += 1
+                    h[1] += mult
+        # entry-id order == lexicon order, so sums match the nested-dict walk exactly
+        for kid in sorted(hits):
+            count, intensity_acc = hits[kid]
+            if intensity_acc <= 0:
+                # every occurrence negated
+                if evidence is not None:
+                    evidence[emotions[lex.kw_emotion[kid]]].append({"type": "negated", "keyword": lex.kw_text[kid], "count": count})
+                continue
+            avg_intensity = intensity_acc / count
+            eid = lex.kw_emotion[kid]
+            inc = lex.kw_weight[kid] * count * avg_intensity * self.KEYWORD_WEIGHT
+            values[eid] += inc
+            kw = lex.kw_text[kid]
+            matched.add(kw)
+            if evidence is not None:
+                evidence[emotions[eid]].append({"type": "keyword", "keyword": kw, "count": count, "avg_intensity": round(avg_intensity, 3), "inc": round(inc, 3)})
 
         # 3) fuzzy fallback if few hits
-        any_hits = any(v > 0 for v in raw_scores.values())
-        if not any_hits:
-            fuzzy = self._fuzzy_matches(tokens, all_keywords)
+        if fuzzy and not scores.any_positive():
+            # negated words stay out of the fuzzy fallback too
+            fuzzy = self._fuzzy_matches([t for t, w in zip(tokens, weights) if w > 0], lex)
             for token, matched_kw, _score in fuzzy:
-                # find which emotion owns matched_kw
-                for emo, group in self.lexicon.items():
-                    if matched_kw in group.get("keywords", {}):
-                        base_w = group["keywords"][matched_kw]
-                        inc = base_w * 0.8  # fuzzy less than direct
-                        raw_scores[emo] += inc
-                        evidence[emo].append({"type": "fuzzy", "token": token, "matched_kw": matched_kw, "inc": round(inc, 3)})
+                for kid in lex.owners.get(matched_kw, ()):
+                    eid = lex.kw_emotion[kid]
+                    inc = lex.kw_weight[kid] * 0.8  # fuzzy less than direct
+                    values[eid] += inc
+                    matched.add(token)
+                    if evidence is not None:
+                        evidence[emotions[eid]].append({"type": "fuzzy", "token": token, "matched_kw": matched_kw, "inc": round(inc, 3)})
+
+        return scores
+
+    def _cascade(self, scores: ScoreVector, sentiment: SentimentSignals, deadline: Optional[float],
+                 skipped: List[str]) -> Tuple[SentimentSignals, Dict[str, Any]]:
+        """
+        Decide whether the TextBlob pass runs: only when the lexical margin is
+        below `cascade_margin` and the deadline has not passed. Otherwise the
+        confidence is computed from VADER alone (polarity reads 0.0).
+        """
+        margin = scores.margin()
+        escalated = self.cascade_margin is None or margin < self.cascade_margin
+        if not escalated or (deadline is not None and time.monotonic() >= deadline):
+            sentiment = VaderOnlySignals(sentiment)
+            skipped.append("pattern")
+        return sentiment, {"margin": round(margin, 4), "threshold": self.cascade_margin,
+                           "escalated": escalated, "skipped": skipped}
+
+    @staticmethod
+    def _negative_cue(text_norm: str) -> str:
+        # which emotion the negative-sentiment fallback should prefer for this text
+        if "panic" in text_norm or "can't sleep" in text_norm or "panic attack" in text_norm:
+            return "anxiety"
+        if "angry" in text_norm or "furious" in text_norm or "rage" in text_norm:
+            return "anger"
+        return "sadness"
+
+    def _finalize(self, raw_scores: ScoreVector, evidence: Dict[str, List[Dict[str, Any]]],
+                  sentiment: SentimentSignals, negative_cue: str, matched_tokens: set, total_tokens: int,
+                  top_k: int = None) -> Dict[str, Any]:
+        """
+        Sentiment bump, fallback, normalization and confidence. With
+        evidence=None (lean mode) no evidence is recorded, candidates are the
+        top_k via a partial sort, and no details payload is built.
+        """
+        lean = evidence is None
+        emotions = raw_scores.emotions
+        values = raw_scores.values
+        compound = sentiment.compound
 
         # 4) sentiment alignment bump
         emotion_valence = {
             "joy": 1, "gratitude": 1, "hope": 1, "love": 1, "awe": 1,
             "sadness": -1, "anxiety": -1, "fear": -1, "anger": -1, "frustration": -1, "guilt": -1, "shame": -1
         }
-        compound = vader_compound
-        polarity = tb_polarity
 
-        for emo in list(self.lexicon.keys()):
+        for eid, emo in enumerate(emotions):
             val = emotion_valence.get(emo, 0)
             if val != 0:
                 aligned = (val > 0 and compound > 0.25) or (val < 0 and compound < -0.25)
                 if aligned:
-                    bump = abs(compound) * self.SENTIMENT_WEIGHT * (1 + 0.5 * abs(polarity))
-                    raw_scores[emo] += bump
-                    evidence[emo].append({"type": "sentiment_bump", "bump": round(bump, 4), "compound": compound})
+                    bump = abs(compound) * self.SENTIMENT_WEIGHT * (1 + 0.5 * abs(sentiment.polarity))
+                    values[eid] += bump
+                    if not lean:
+                        evidence[emo].append({"type": "sentiment_bump", "bump": round(bump, 4), "compound": compound})
 
         # 5) fallback mapping if still nothing: map sentiment to one of common emotions
-        if not any(v > 0 for v in raw_scores.values()):
-            if compound >= 0.3 or polarity >= 0.35:
-                raw_scores["joy"] += 1.0 + abs(compound)
-                evidence["joy"].append({"type": "fallback_sentiment", "compound": compound})
-            elif compound <= -0.3 or polarity <= -0.35:
-                # negative select: prefer anxiety if panic language present otherwise sadness
-                if "panic" in text_norm or "can't sleep" in text_norm or "panic attack" in text_norm:
-                    raw_scores["anxiety"] += 1.3
-                    evidence["anxiety"].append({"type": "fallback_sentiment", "compound": compound})
-                elif "angry" in text_norm or "furious" in text_norm or "rage" in text_norm:
-                    raw_scores["anger"] += 1.3
-                    evidence["anger"].append({"type": "fallback_sentiment", "compound": compound})
-                else:
-                    raw_scores["sadness"] += 1.2
-                    evidence["sadness"].append({"type": "fallback_sentiment", "compound": compound})
+        if not raw_scores.any_positive():
+            if compound >= 0.3 or sentiment.polarity >= 0.35:
+                fallback, inc = "joy", 1.0 + abs(compound)
+            elif compound <= -0.3 or sentiment.polarity <= -0.35:
+                # negative select: prefer anxiety if panic language present, anger if anger language, otherwise sadness
+                fallback, inc = negative_cue, (1.2 if negative_cue == "sadness" else 1.3)
             else:
-                raw_scores["confusion"] += 0.7
-                evidence["confusion"].append({"type": "fallback_sentiment", "compound": compound})
+                fallback, inc = "confusion", 0.7
+            if fallback in emotions:
+                values[emotions.index(fallback)] += inc
+            if not lean:
+                evidence[fallback].append({"type": "fallback_sentiment", "compound": compound})
 
         # 6) normalize into candidate probabilities (softmax-like)
         # convert raw dict into list consistent order
-        score_items = [(emo, max(0.0, raw_scores.get(emo, 0.0))) for emo in self.lexicon.keys()]
+        score_items = [(emo, max(0.0, v)) for emo, v in zip(emotions, values)]
         max_raw = max((v for _, v in score_items), default=0.0)
 
         candidates: List[Tuple[str, float]] = []
@@ -457,6 +422,7 @@ class EnhancedEmotionAnalyzer:
             candidates = [("confusion", 0.5)]
             top = "confusion"
             top_score = 0.5
+            uniqueness = 1.0
         else:
             # compute exponentials for smoothing but keep scale controlled
             exps = []
@@ -464,29 +430,26 @@ class EnhancedEmotionAnalyzer:
                 val = raw
                 exps.append((emo, math.exp(val / (max_raw + 1e-9))))
             total = sum(v for _, v in exps) or 1.0
-            normalized = [(emo, v / total) for emo, v in exps]
-            normalized.sort(key=lambda x: x[1], reverse=True)
-            candidates = [(emo, round(score, 4)) for emo, score in normalized[:max(4, len(normalized))]]
+            if lean:
+                # partial sort: only the top_k candidates are ordered
+                above = sum(1 for _, v in exps if round(v / total, 4) > 0.05)
+                uniqueness = 1.0 if above == 1 else 0.0
+                best = heapq.nlargest(max(1, top_k), exps, key=lambda x: x[1])
+                candidates = [(emo, round(v / total, 4)) for emo, v in best]
+            else:
+                normalized = [(emo, v / total) for emo, v in exps]
+                normalized.sort(key=lambda x: x[1], reverse=True)
+                candidates = [(emo, round(score, 4)) for emo, score in normalized[:max(4, len(normalized))]]
+                uniqueness = 1.0 if len([c for c in candidates if c[1] > 0.05]) == 1 else 0.0
             top, top_score = candidates[0]
 
         # 7) compute confidence:
         # factors: top_score (dominance) + token_coverage + sentiment_strength + uniqueness_bonus + length_factor
         # token coverage: how many matched tokens / total tokens
-        matched_tokens = set()
-        for emo in evidence:
-            for ev in evidence[emo]:
-                if ev.get("type") in ("keyword", "phrase", "fuzzy"):
-                    # gather token fragments
-                    if ev.get("type") == "keyword":
-                        matched_tokens.add(ev.get("keyword", ""))
-                    if ev.get("type") == "phrase":
-                        matched_tokens.update(ev.get("phrase", "").split())
-                    if ev.get("type") == "fuzzy":
-                        matched_tokens.add(ev.get("token", ""))
-        token_coverage = min(1.0, len([t for t in matched_tokens if t]) / float(total_tokens))
-
-        sentiment_strength = min(1.0, abs(compound) + abs(polarity)) / 2.0  # scale to 0..1
-        uniqueness = 1.0 if len([c for c in candidates if c[1] > 0.05]) == 1 else 0.0
+        matched_count = len(matched_tokens) - (1 if "" in matched_tokens else 0)
+        token_coverage = min(1.0, matched_count / float(total_tokens))
+
+        sentiment_strength = min(1.0, abs(compound) + abs(sentiment.polarity)) / 2.0  # scale to 0..1
         length_factor = min(1.0, total_tokens / 25.0)
 
         # weights for confidence components
@@ -498,28 +461,182 @@ class EnhancedEmotionAnalyzer:
 
         confidence = (w_top * top_score) + (w_token * token_coverage) + (w_sent * sentiment_strength) + (w_uni * uniqueness) + (w_len * length_factor)
         confidence = max(0.0, min(0.99, confidence))
+        raw_confidence = confidence
+        if self.calibrator is not None:
+            confidence = self.calibrator.apply("analyzer", top, confidence)
 
         animation = self.animation_map.get(top, {"name": "none", "color": "#CCCCCC", "duration_ms": 700})
 
-        details = {
-            "raw_scores": {emo: float(raw_scores.get(emo, 0.0)) for emo in self.lexicon.keys()},
-            "evidence": {emo: evidence.get(emo, []) for emo in self.lexicon.keys()},
-            "sentiment": {"textblob_polarity": tb_polarity, "textblob_subjectivity": tb_subjectivity, "vader_compound": vader_compound},
+        result = {
+            "top_emotion": top,
+            "confidence": round(confidence, 3),
+            "candidates": candidates,
+            "animation": animation,
+        }
+        if lean:
+            return result
+
+        result["details"] = {
+            "raw_scores": {emo: float(v) for emo, v in zip(emotions, values)},
+            "evidence": {emo: evidence.get(emo, []) for emo in emotions},
+            "sentiment": self._sentiment_details(sentiment),
             "matched_tokens_count": len(matched_tokens),
             "token_coverage": round(token_coverage, 3),
             "sentiment_strength": round(sentiment_strength, 3),
             "uniqueness": uniqueness,
             "length_factor": round(length_factor, 3),
-            "total_tokens": total_tokens
+            "total_tokens": total_tokens,
+            "raw_confidence": round(raw_confidence, 3)
         }
+        return result
 
-        return {
-            "top_emotion": top,
-            "confidence": round(confidence, 3),
-            "candidates": candidates,
-            "animation": animation,
-            "details": details
-        }
+    # -------------------------
+    # Main detection method
+    # -------------------------
+    def detect_emotion(self, text: str, top_k: int = 4, lean: bool = False,
+                       deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Returns:
+          - top_emotion: str
+          - confidence: float (0..1)
+          - candidates: list of (emotion, normalized_score)
+          - animation: UI hint for top emotion
+          - details: debugging info (raw_scores, evidence, sentiment, matches)
+
+        lean=True skips evidence and the details payload and returns only the
+        top_k candidates (same scores and confidence as the full mode).
+        Inputs longer than `window_chars` are analyzed window by window
+        (see _detect_emotion_windowed); details then carry per-window
+        summaries instead of full evidence.
+
+        Cascade: with `cascade_margin` set, phrases, keywords and VADER run
+        first and the TextBlob pass only when the top two emotions are
+        closer than the margin. `deadline` is a time.monotonic() value; once
+        it has passed, the fuzzy fallback, the TextBlob pass and further
+        windows are skipped. details["cascade"] records the margin and what
+        was skipped.
+        """
+        if not text or not text.strip():
+            result = {
+                "top_emotion": "neutral",
+                "confidence": 0.5,
+                "candidates": [],
+                "animation": self.animation_map.get("steadiness"),
+            }
+            if not lean:
+                result["details"] = {"reason": "empty_input"}
+            return result
+        if len(text) > self.window_chars:
+            return self._detect_emotion_windowed(text, top_k, lean, deadline)
+
+        # one tokenization shared by every stage below
+        doc = AnalysisDocument(text)
+        total_tokens = max(1, len(doc.words))
+        sentiment = self._sentiment(doc)
+
+        lex = self.compiled
+        evidence = None if lean else defaultdict(list)
+        matched_tokens: set = set()
+        staged = self.cascade_margin is not None or deadline is not None
+        if not staged:
+            raw_scores = self._lexical_scores(doc, evidence, matched_tokens, lex)
+        else:
+            fuzzy = deadline is None or time.monotonic() < deadline
+            raw_scores = self._lexical_scores(doc, evidence, matched_tokens, lex, fuzzy=fuzzy)
+            skipped = [] if fuzzy or raw_scores.any_positive() else ["fuzzy"]
+            sentiment, cascade = self._cascade(raw_scores, sentiment, deadline, skipped)
+        result = self._finalize(raw_scores, evidence, sentiment, self._negative_cue(doc.norm), matched_tokens,
+                                total_tokens, top_k)
+        if not lean:
+            result["details"]["data_version"] = lex.version
+            if staged:
+                result["details"]["cascade"] = cascade
+        return result
+
+    def _detect_emotion_windowed(self, text: str, top_k: int = 4, lean: bool = False,
+                                 deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Long-input path: stream sentence-packed windows through the lexical
+        stages, accumulate scores, and stop early once the leading emotion is
+        ahead by `chunk_margin` (or the deadline has passed, after at least
+        one window). Only per-window summaries are kept, so memory is bounded
+        by one window plus the score vector.
+        """
+        truncated = len(text) > self.max_input_chars
+        lex = self.compiled
+        acc = ScoreAccumulator(margin=self.chunk_margin, min_windows=self.chunk_min_windows)
+        matched_tokens: set = set()
+        sent_parts: List[Tuple[SentimentSignals, float]] = []
+        windows: List[Dict[str, Any]] = []
+        total_tokens = 0
+        analyzed_chars = 0
+        negative_cue = None
+        early_exit = False
+        staged = self.cascade_margin is not None or deadline is not None
+        skipped: List[str] = []
+
+        for index, (start, chunk) in enumerate(iter_windows(text, self.window_chars, self.max_input_chars)):
+            expired = deadline is not None and time.monotonic() >= deadline
+            if expired and sent_parts:
+                skipped.append("windows")
+                break
+            doc = AnalysisDocument(chunk)
+            if not doc.words:
+                continue
+            hits_before = len(matched_tokens)
+            raw = self._lexical_scores(doc, None, matched_tokens, lex, fuzzy=not expired)
+            if expired and not raw.any_positive() and "fuzzy" not in skipped:
+                skipped.append("fuzzy")
+            acc.add(raw.as_dict())
+
+            # sentiment is averaged over windows, weighted by token count
+            n = len(doc.words)
+            sent_parts.append((self._sentiment(doc), n))
+            total_tokens += n
+            analyzed_chars = start + len(chunk)
+
+            cue = self._negative_cue(doc.norm)
+            if cue != "sadness" and negative_cue is None:
+                negative_cue = cue
+
+            if not lean:
+                top = raw.top()
+                windows.append({
+                    "index": index,
+                    "start": start,
+                    "chars": len(chunk),
+                    "tokens": n,
+                    "top_emotion": top[0] if top[1] > 0 else None,
+                    "top_score": round(top[1], 3),
+                    "new_matched_tokens": len(matched_tokens) - hits_before,
+                })
+            if acc.decided():
+                early_exit = True
+                break
+
+        total_tokens = max(1, total_tokens)
+        sentiment = AveragedSignals(sent_parts)
+        raw_scores = ScoreVector.from_dict(lex.emotions, acc.totals)
+        if staged:
+            sentiment, cascade = self._cascade(raw_scores, sentiment, deadline, skipped)
+        result = self._finalize(raw_scores, None if lean else defaultdict(list), sentiment,
+                                negative_cue or "sadness", matched_tokens, total_tokens, top_k)
+        if lean:
+            return result
+        details = result["details"]
+        del details["evidence"]
+        details.update({
+            "windowed": True,
+            "data_version": lex.version,
+            "windows": windows,
+            "analyzed_chars": analyzed_chars,
+            "input_chars": len(text),
+            "truncated": truncated,
+            "early_exit": early_exit,
+        })
+        if staged:
+            details["cascade"] = cascade
+        return result
 
     # batch analyze convenience
     def analyze_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
@@ -0,0 +1,395 @@
+"""
+emotion_export.py
+
+Columnar export of user_emotions for offline analysis:
+- Streams the table in id-ordered chunks (no full-table fetch)
+- One append-only binary file per column: dictionary-encoded emotion /
+  sentiment codes, float32 confidence / compound, int64 id and timestamp
+  (microseconds since 1970-01-01 on the naive local clock the rows use)
+- Incremental: each run appends only rows with id > manifest.last_id
+- Query helper: group-by counts and mean/min/max over the export, using
+  NumPy when installed (vectorized) and a pure-Python loop otherwise
+
+input_text is not exported.
+
+Usage (CLI):
+    python emotion_export.py export --db user_data.db --out exports/emotions
+    python emotion_export.py query --out exports/emotions --by emotion --by month
+    python emotion_export.py info --out exports/emotions
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional; the query helper falls back to plain loops
+    np = None
+
+import storage
+
+FORMAT_VERSION = 1
+DEFAULT_OUT = "exports/emotions"
+
+# column -> array typecode
+COLUMNS: Dict[str, str] = {
+    "id": "q",
+    "emotion": "H",      # code into dictionaries["emotion"]
+    "sentiment": "B",    # code into dictionaries["sentiment"]
+    "confidence": "f",
+    "compound": "f",
+    "ts_us": "q",
+}
+DICTIONARY_COLUMNS = ("emotion", "sentiment")
+VALUE_COLUMNS = ("confidence", "compound")
+TIME_KEYS = ("day", "week", "month")
+
+_EPOCH = datetime(1970, 1, 1)
+_US_PER_DAY = 86_400_000_000
+_CODE_LIMITS = {"H": 0xFFFF, "B": 0xFF}
+
+
+def _to_us(ts: Any) -> int:
+    if ts is None:
+        return 0
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    return (ts - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_day(day: int) -> date:
+    return (_EPOCH + timedelta(days=day)).date()
+
+
+def _column_path(out_dir: str, name: str) -> str:
+    return os.path.join(out_dir, f"{name}.bin")
+
+
+# ------------------------------------
+# Manifest
+# ------------------------------------
+def _empty_manifest() -> Dict[str, Any]:
+    return {
+        "format": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "columns": dict(COLUMNS),
+        "dictionaries": {name: [] for name in DICTIONARY_COLUMNS},
+        "rows": 0,
+        "last_id": 0,
+        "exports": [],
+    }
+
+
+def load_manifest(out_dir: str) -> Dict[str, Any]:
+    path = os.path.join(out_dir, "manifest.json")
+    if not os.path.exists(path):
+        return _empty_manifest()
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_VERSION or manifest.get("columns") != COLUMNS:
+        raise ValueError(f"{path}: unsupported export format; export to a fresh directory")
+    return manifest
+
+
+def _write_manifest(out_dir: str, manifest: Dict[str, Any]):
+    # atomic replace: readers see the old or the new manifest, never a partial one
+    tmp = os.path.join(out_dir, "manifest.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(out_dir, "manifest.json"))
+
+
+# ------------------------------------
+# Export
+# ------------------------------------
+def export(db_path: str, out_dir: str = DEFAULT_OUT, chunk_size: int = 5000) -> Dict[str, Any]:
+    """Append rows added since the last export. Returns a summary of this run."""
+    t0 = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    rows_before = manifest["rows"]
+
+    # drop any tail written by a run that died before its manifest was saved
+    for name, code in COLUMNS.items():
+        path = _column_path(out_dir, name)
+        if os.path.exists(path):
+            with open(path, "r+b") as f:
+                f.truncate(rows_before * array(code).itemsize)
+
+    dictionaries = manifest["dictionaries"]
+    lookups = {name: {v: i for i, v in enumerate(dictionaries[name])} for name in DICTIONARY_COLUMNS}
+
+    def encode(name: str, value: Optional[str]) -> int:
+        table = lookups[name]
+        code = table.get(value)
+        if code is None:
+            code = len(dictionaries[name])
+            if code > _CODE_LIMITS[COLUMNS[name]]:
+                raise ValueError(f"too many distinct {name} values for the export format")
+            table[value] = code
+            dictionaries[name].append(value)
+        return code
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    if storage.schema_version(conn) != storage.SCHEMA_VERSION:
+        conn.close()
+        raise ValueError(f"{db_path}: not a v{storage.SCHEMA_VERSION} database; run `python storage.py migrate` first")
+    files = {name: open(_column_path(out_dir, name), "ab") for name in COLUMNS}
+    appended = 0
+    last_id = manifest["last_id"]
+    try:
+        for rows in storage.iter_rows(conn, last_id, chunk_size):
+            cols = {name: array(code) for name, code in COLUMNS.items()}
+            for rid, emotion, confidence, _text, sentiment, compound, ts_us in rows:
+                cols["id"].append(rid)
+                cols["emotion"].append(encode("emotion", emotion))
+                cols["sentiment"].append(encode("sentiment", sentiment))
+                cols["confidence"].append(float(confidence or 0.0))
+                cols["compound"].append(float(compound or 0.0))
+                cols["ts_us"].append(ts_us)  # stored in this encoding
+            for name, col in cols.items():
+                col.tofile(files[name])
+            appended += len(rows)
+            last_id = rows[-1][0]
+    finally:
+        for f in files.values():
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+        conn.close()
+
+    run = {
+        "at": datetime.now().isoformat(),
+        "appended": appended,
+        "rows": rows_before + appended,
+        "last_id": last_id,
+        "duration_ms": round((time.perf_counter() - t0) * 1000, 2),
+    }
+    if appended:
+        manifest.update({"rows": rows_before + appended, "last_id": last_id})
+        manifest["exports"] = (manifest["exports"] + [run])[-50:]
+        _write_manifest(out_dir, manifest)
+    return run
+
+
+# ------------------------------------
+# Query helper
+# ------------------------------------
+class EmotionExport:
+    """Read-only view of an export directory."""
+
+    def __init__(self, out_dir: str = DEFAULT_OUT, use_numpy: Optional[bool] = None):
+        self.out_dir = out_dir
+        self.manifest = load_manifest(out_dir)
+        self.rows = self.manifest["rows"]
+        self.use_numpy = (np is not None) if use_numpy is None else (use_numpy and np is not None)
+        self._cache: Dict[str, Any] = {}
+
+    def column(self, name: str):
+        """The column as a NumPy array (if enabled) or an array.array."""
+        col = self._cache.get(name)
+        if col is not None:
+            return col
+        code = COLUMNS[name]
+        swap = self.manifest["byteorder"] != sys.byteorder
+        path = _column_path(self.out_dir, name)
+        if self.use_numpy:
+            col = np.fromfile(path, dtype=np.dtype(code), count=self.rows)
+            if swap:
+                col = col.byteswap()
+        else:
+            col = array(code)
+            if self.rows:
+                with open(path, "rb") as f:
+                    col.fromfile(f, self.rows)
+            if swap:
+                col.byteswap()
+        self._cache[name] = col
+        return col
+
+    def dictionary(self, name: str) -> List[Optional[str]]:
+        return self.manifest["dictionaries"][name]
+
+    def _label(self, key: str, value: int) -> Any:
+        if key in DICTIONARY_COLUMNS:
+            return self.dictionary(key)[value]
+        if key == "day":
+            return _from_day(value).isoformat()
+        if key == "week":
+            return _from_day(value * 7 - 3).isoformat()  # Monday that starts the week
+        year, month = divmod(value, 12)
+        return f"{year + 1970:04d}-{month + 1:02d}"
+
+    def group_by(self, by: Sequence[str] = ("emotion",), values: Sequence[str] = VALUE_COLUMNS,
+                 since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Group rows by any of emotion / sentiment / day / week / month and
+        return count plus mean/min/max of each value column per group,
+        largest groups first. `since` / `until` bound the timestamp (until
+        is exclusive).
+        """
+        for key in by:
+            if key not in DICTIONARY_COLUMNS and key not in TIME_KEYS:
+                raise ValueError(f"cannot group by {key!r}")
+        for v in values:
+            if v not in VALUE_COLUMNS:
+                raise ValueError(f"not a value column: {v!r}")
+        if not self.rows:
+            return []
+        lo = _to_us(since) if since else None
+        hi = _to_us(until) if until else None
+        if self.use_numpy:
+            groups = self._group_numpy(by, values, lo, hi)
+        else:
+            groups = self._group_python(by, values, lo, hi)
+
+        out = []
+        for key_values, (count, stats) in groups:
+            row: Dict[str, Any] = {key: self._label(key, kv) for key, kv in zip(by, key_values)}
+            row["count"] = count
+            for v, (total, vmin, vmax) in zip(values, stats):
+                row[v] = {"mean": round(total / count, 4), "min": round(vmin, 4), "max": round(vmax, 4)}
+            out.append(row)
+        out.sort(key=lambda r: (-r["count"], [str(r[k]) for k in by]))
+        return out
+
+    def _group_numpy(self, by, values, lo, hi):
+        ts = self.column("ts_us")
+        mask = np.ones(self.rows, dtype=bool)
+        if lo is not None:
+            mask &= ts >= lo
+        if hi is not None:
+            mask &= ts < hi
+
+        keys = []
+        days = None
+        for key in by:
+            if key in DICTIONARY_COLUMNS:
+                keys.append(self.column(key)[mask].astype(np.int64))
+                continue
+            if days is None:
+                days = ts[mask] // _US_PER_DAY
+            if key == "day":
+                keys.append(days)
+            elif key == "week":
+                keys.append((days + 3) // 7)
+            else:
+                keys.append(days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64))
+        if not keys or not len(keys[0]):
+            return []
+
+        uniq, inverse = np.unique(np.stack(keys, axis=1), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        n = len(uniq)
+        counts = np.bincount(inverse, minlength=n)
+        per_value = []
+        for v in values:
+            col = self.column(v)[mask].astype(np.float64)
+            sums = np.bincount(inverse, weights=col, minlength=n)
+            mins = np.full(n, np.inf)
+            maxs = np.full(n, -np.inf)
+            np.minimum.at(mins, inverse, col)
+            np.maximum.at(maxs, inverse, col)
+            per_value.append((sums, mins, maxs))
+        return [
+            (tuple(int(x) for x in uniq[g]),
+             (int(counts[g]), [(float(s[g]), float(mn[g]), float(mx[g])) for s, mn, mx in per_value]))
+            for g in range(n)
+        ]
+
+    def _group_python(self, by, values, lo, hi):
+        ts = self.column("ts_us")
+        key_cols = [self.column(key) if key in DICTIONARY_COLUMNS else None for key in by]
+        value_cols = [self.column(v) for v in values]
+        acc: Dict[Tuple[int, ...], list] = {}
+        for i, t in enumerate(ts):
+            if (lo is not None and t < lo) or (hi is not None and t >= hi):
+                continue
+            day = t // _US_PER_DAY
+            key = []
+            for name, col in zip(by, key_cols):
+                if col is not None:
+                    key.append(col[i])
+                elif name == "day":
+                    key.append(day)
+                elif name == "week":
+                    key.append((day + 3) // 7)
+                else:
+                    d = _from_day(day)
+                    key.append((d.year - 1970) * 12 + d.month - 1)
+            key = tuple(key)
+            entry = acc.get(key)
+            if entry is None:
+                entry = acc[key] = [0, [[0.0, float("inf"), float("-inf")] for _ in values]]
+            entry[0] += 1
+            for stats, col in zip(entry[1], value_cols):
+                x = col[i]
+                stats[0] += x
+                if x < stats[1]:
+                    stats[1] = x
+                if x > stats[2]:
+                    stats[2] = x
+        return [(k, (count, [tuple(s) for s in stats])) for k, (count, stats) in acc.items()]
+
+
+# ------------------------------------
+# CLI
+# ------------------------------------
+def _main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Columnar export of user_emotions")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_export = sub.add_parser("export", help="append new rows to the export")
+    p_export.add_argument("--db", default="user_data.db")
+    p_export.add_argument("--out", default=DEFAULT_OUT)
+    p_export.add_argument("--chunk-size", type=int, default=5000)
+
+    p_query = sub.add_parser("query", help="group-by aggregates over the export")
+    p_query.add_argument("--out", default=DEFAULT_OUT)
+    p_query.add_argument("--by", action="append", choices=list(DICTIONARY_COLUMNS + TIME_KEYS),
+                         help="group key (repeatable; default: emotion)")
+    p_query.add_argument("--since", type=datetime.fromisoformat)
+    p_query.add_argument("--until", type=datetime.fromisoformat)
+    p_query.add_argument("--no-numpy", action="store_true")
+    p_query.add_argument("--json", action="store_true", help="print JSON instead of a table")
+
+    p_info = sub.add_parser("info", help="show the export manifest")
+    p_info.add_argument("--out", default=DEFAULT_OUT)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        run = export(args.db, args.out, args.chunk_size)
+        print(f"appended {run['appended']} rows (total {run['rows']}, last id {run['last_id']}) "
+              f"in {run['duration_ms']:.1f} ms")
+        return 0
+
+    if args.command == "info":
+        manifest = load_manifest(args.out)
+        print(json.dumps({k: manifest[k] for k in ("rows", "last_id", "columns", "dictionaries")}, indent=1))
+        return 0
+
+    by = args.by or ["emotion"]
+    view = EmotionExport(args.out, use_numpy=not args.no_numpy)
+    rows = view.group_by(by, since=args.since, until=args.until)
+    if args.json:
+        print(json.dumps(rows, indent=1))
+        return 0
+    for r in rows:
+        keys = "  ".join(f"{str(r[k]):<12}" for k in by)
+        stats = "  ".join(f"{v} {r[v]['mean']:>7.3f} [{r[v]['min']:.2f}, {r[v]['max']:.2f}]" for v in VALUE_COLUMNS)
+        print(f"{keys}  n={r['count']:<7} {stats}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -0,0 +1,136 @@
+"""
+fuzzy_index.py
+
+Prebuilt approximate-match index for the analyzer's fuzzy fallback.
+
+`FuzzyIndex.close_matches(word, n)` returns exactly what
+`difflib.get_close_matches(word, keywords, n, cutoff)` returns for the
+de-duplicated keyword list, but only scores candidates pulled from a
+deletion-neighbourhood index instead of scanning every keyword.
+
+Why the index cannot miss a match: difflib's ratio is 2*M/T with
+T = len(a) + len(b) and M the matched characters (a common subsequence, so
+M <= LCS). The indel distance is T - 2*LCS and Levenshtein <= indel, hence
+ratio >= cutoff implies levenshtein(a, b) <= floor(T * (1 - cutoff)); the
+ratio also caps len(b) at len(a) * (2 - cutoff) / cutoff. Two strings within
+edit distance k share a string reachable by at most k deletions from each,
+so indexing every keyword's k-deletion variants (and probing the query's)
+finds every keyword that can clear the cutoff.
+
+The query's variant count grows as C(len, k), and k grows with the length, so
+for long tokens ("overwhelmingly": k = 4, ~1500 variants) probing costs more
+than scoring the keywords directly. When the variant count would exceed the
+number of keywords inside the query's length window, `candidates` returns
+that window instead: a linear scan like difflib's, minus the keywords whose
+length already rules them out. Either way the result is the same.
+"""
+
+import heapq
+import math
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Set, Tuple, Union
+
+
+def deletion_variants(word: str, max_deletes: int) -> Set[str]:
+    """`word` plus every string reachable by deleting up to `max_deletes` characters."""
+    out = {word}
+    frontier = {word}
+    for _ in range(max_deletes):
+        nxt = set()
+        for w in frontier:
+            for i in range(len(w)):
+                nxt.add(w[:i] + w[i + 1:])
+        nxt -= out
+        if not nxt:
+            break
+        out |= nxt
+        frontier = nxt
+    return out
+
+
+class FuzzyIndex:
+    """difflib-compatible close-match lookup backed by a deletion-neighbourhood index."""
+
+    def __init__(self, keywords: Iterable[str], cutoff: float = 0.86):
+        if not 0.0 < cutoff <= 1.0:
+            raise ValueError(f"cutoff must be in (0, 1], got {cutoff!r}")
+        self.cutoff = cutoff
+        self.keywords: List[str] = list(dict.fromkeys(keywords))
+
+        lengths = [len(k) for k in self.keywords]
+        self._min_len = min(lengths, default=0)
+        self._max_len = max(lengths, default=0)
+        self._by_length: Dict[int, List[str]] = defaultdict(list)
+        for kw in self.keywords:
+            self._by_length[len(kw)].append(kw)
+        # query length -> keywords to scan directly, or None to probe the variants
+        self._scan: Dict[int, Union[List[str], None]] = {}
+
+        variants: Dict[str, List[int]] = defaultdict(list)
+        for kid, kw in enumerate(self.keywords):
+            for v in deletion_variants(kw, self.max_edits(len(kw))):
+                variants[v].append(kid)
+        # most variants belong to a single keyword: store a bare id there instead of a 1-tuple
+        self._variants: Dict[str, Union[int, Tuple[int, ...]]] = {
+            v: ids[0] if len(ids) == 1 else tuple(ids) for v, ids in variants.items()
+        }
+
+    def max_edits(self, length: int) -> int:
+        """Largest edit distance at which a string of `length` can still clear the cutoff."""
+        c = self.cutoff
+        longest_partner = math.floor(length * (2.0 - c) / c + 1e-9)
+        return int(math.floor((length + longest_partner) * (1.0 - c) + 1e-9))
+
+    def _length_window(self, length: int) -> Tuple[int, int]:
+        c = self.cutoff
+        return math.ceil(length * c / (2.0 - c) - 1e-9), math.floor(length * (2.0 - c) / c + 1e-9)
+
+    def _scan_window(self, length: int) -> Union[List[str], None]:
+        """The keywords a query of `length` could match, when scanning them is cheaper than probing."""
+        if length not in self._scan:
+            lo, hi = self._length_window(length)
+            window = [kw for n in range(lo, hi + 1) for kw in self._by_length.get(n, ())]
+            edits = self.max_edits(length)
+            probes = sum(math.comb(length, i) for i in range(min(edits, length) + 1))
+            self._scan[length] = window if probes > len(window) else None
+        return self._scan[length]
+
+    def candidates(self, word: str) -> List[str]:
+        lo, hi = self._length_window(len(word))
+        if hi < self._min_len or lo > self._max_len:
+            return []
+        window = self._scan_window(len(word))
+        if window is not None:
+            return window
+        ids: Set[int] = set()
+        variants = self._variants
+        for v in deletion_variants(word, self.max_edits(len(word))):
+            hit = variants.get(v)
+            if hit is None:
+                continue
+            if type(hit) is int:
+                ids.add(hit)
+            else:
+                ids.update(hit)
+        return [self.keywords[i] for i in ids]
+
+    def close_matches(self, word: str, n: int = 2) -> List[str]:
+        if n <= 0 or not word:
+            return []
+        candidates = self.candidates(word)
+        if not candidates:
+            return []
+        # score exactly like difflib.get_close_matches
+        s = SequenceMatcher()
+        s.set_seq2(word)
+        cutoff = self.cutoff
+        result = []
+        for x in candidates:
+            s.set_seq1(x)
+            if s.real_quick_ratio() >= cutoff and s.quick_ratio() >= cutoff and s.ratio() >= cutoff:
+                result.append((s.ratio(), x))
+        return [x for _score, x in heapq.nlargest(n, result)]
+
+    def stats(self) -> Dict[str, int]:
+        return {"keywords": len(self.keywords), "variants": len(self._variants)}
@@ -0,0 +1,82 @@
+"""
+gunicorn.conf.py
+
+Multi-worker deployment with a preloaded, warmed and frozen master:
+- preload_app: the master imports app.py once (NLTK resources, VADER /
+  TextBlob sentiment tables, compiled keyword lexicon, shloka selector and
+  fragments) and forks the workers from it, so that state is shared
+  copy-on-write instead of being rebuilt per worker
+- when_ready: app.prepare_for_fork() runs the warm-up inference in the
+  master, then gc.freeze()s the heap so the workers' collector never touches
+  (and so never copies) the preloaded objects
+- post_worker_init: app.after_fork() reseeds random, reinstalls the SIGHUP
+  data reload and restarts the retention / profiler threads per worker
+- workers report ready on /ready as soon as they start (the warm state is
+  inherited); /health stays a plain liveness check
+
+Any worker can serve any request: state that changes per request lives in
+SQLite and is updated inside the request's write transaction -
+conversation sessions (chat_sessions), shloka rotation cursors
+(shloka_rotations), recommender profiles (recommender_profiles) and trends
+(emotion_trends). What a worker keeps in memory is a cache of those rows
+(parsed trend states, verse rankings) or of user_emotions (the
+similar-moments index, which catches up with rows other workers saved before
+each query). Per worker are only the request counters, the admission
+limiter and its settings, and POST /api/admin/reload (send SIGHUP to the
+workers, or restart, to reload all of them).
+
+Threads follow the admission settings (admission.py): every request the
+limiter can hold - running, queued or degraded - gets a thread, plus
+GUNICORN_SPARE_THREADS for /health, /ready and the GET endpoints. With fewer,
+overload would queue inside gunicorn, out of the limiter's sight. The budget
+is handed to the app as ADMISSION_HANDLER_THREADS, which refuses (at startup
+and in /api/admin/admission) settings that need more threads than that; an
+explicit GUNICORN_THREADS that is too small therefore fails at startup.
+
+Usage (CLI):
+    pip install gunicorn
+    gunicorn -c gunicorn.conf.py app:app
+    ADMISSION_QUEUE=64 gunicorn -c gunicorn.conf.py app:app   # threads grow with the queue
+    WEB_CONCURRENCY=8 gunicorn -c gunicorn.conf.py app:app   # more processes sharing the frozen heap
+    PRELOAD=0 gunicorn -c gunicorn.conf.py app:app     # import + warm up in each worker instead
+
+Settings come from PORT / BIND, WEB_CONCURRENCY, GUNICORN_THREADS,
+GUNICORN_SPARE_THREADS, GUNICORN_TIMEOUT, PRELOAD and the ADMISSION_* variables.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from admission import AdmissionController
+
+preload_app = os.environ.get("PRELOAD", "1") == "1"
+# app.py reads this at import: with preloading the master warms up in when_ready, not on a thread
+os.environ.setdefault("WARMUP_MODE", "preload" if preload_app else "background")
+
+bind = os.environ.get("BIND", f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+worker_class = "gthread"
+# CPU-bound handlers share one GIL per worker: more than a handful in flight only adds latency
+os.environ.setdefault("ADMISSION_MAX_LIMIT", "16")
+spare_threads = int(os.environ.get("GUNICORN_SPARE_THREADS", 4))
+threads = int(os.environ.get("GUNICORN_THREADS", AdmissionController.from_env().required_threads + spare_threads))
+os.environ["ADMISSION_HANDLER_THREADS"] = str(max(1, threads - spare_threads))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    import app
+    status = app.prepare_for_fork()
+    server.log.info("preloaded: warm-up %s ms, %s objects frozen", status["duration_ms"],
+                    status["frozen"].get("frozen_objects"))
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        return
+    import app
+    app.after_fork()
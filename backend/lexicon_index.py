@@ -0,0 +1,175 @@
+"""
+lexicon_index.py
+
+Compact, array-backed form of the analyzer lexicon.
+
+The source lexicon is a nested {emotion: {"phrases"|"keywords": {text: weight}}}
+dict. `CompiledLexicon` flattens it once into parallel arrays indexed by an
+entry id (emotion id, weight), keeps each keyword / phrase as one interned
+string, and builds small lookup tables keyed by string:
+
+- exact:  normalized keyword -> entry ids (probed with every substring of a token)
+- stems:  stemmed keyword    -> entry ids
+- owners: raw keyword        -> entry ids (fuzzy fallback)
+
+Matching is token-driven: each distinct token is resolved to the entry ids it
+hits (memoized), instead of looping every keyword over every token. Entry ids
+follow lexicon order, so per-emotion sums are accumulated in the same order
+as the nested-dict walk and scores are bit-for-bit identical.
+
+Scores accumulate into a `ScoreVector`, a fixed-length per-emotion vector.
+"""
+
+import sys
+from array import array
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fuzzy_index import FuzzyIndex
+from memo import BoundedMemo
+
+
+class ScoreVector:
+    """Per-emotion raw scores, indexed by emotion id."""
+
+    __slots__ = ("emotions", "values")
+
+    def __init__(self, emotions: Tuple[str, ...], values: Optional[List[float]] = None):
+        self.emotions = emotions
+        self.values = values if values is not None else [0.0] * len(emotions)
+
+    def any_positive(self) -> bool:
+        return any(v > 0 for v in self.values)
+
+    def top(self) -> Tuple[Optional[str], float]:
+        best, best_v = None, 0.0
+        for emo, v in zip(self.emotions, self.values):
+            if v > best_v:
+                best, best_v = emo, v
+        return best, best_v
+
+    def margin(self) -> float:
+        """(top - second) / top, the lead of the best emotion over the runner-up; 0.0 with no positive score."""
+        first = second = 0.0
+        for v in self.values:
+            if v > first:
+                first, second = v, first
+            elif v > second:
+                second = v
+        return (first - second) / first if first > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        """Non-zero scores keyed by emotion name."""
+        return {emo: v for emo, v in zip(self.emotions, self.values) if v}
+
+    @classmethod
+    def from_dict(cls, emotions: Tuple[str, ...], scores: Dict[str, float]) -> "ScoreVector":
+        return cls(emotions, [float(scores.get(emo, 0.0)) for emo in emotions])
+
+
+class CompiledLexicon:
+    """Flattened lexicon: parallel arrays plus string -> entry-id tables."""
+
+    __slots__ = (
+        "emotions", "emotion_ids",
+        "kw_text", "kw_emotion", "kw_weight",
+        "ph_text", "ph_norm", "ph_emotion", "ph_weight",
+        "exact", "stems", "owners", "min_kw_len", "max_kw_len",
+        "fuzzy", "_stem", "token_entries", "version",
+    )
+
+    def __init__(self, lexicon: Dict[str, Dict[str, Dict[str, float]]], normalize: Callable[[str], str],
+                 stem: BoundedMemo, fuzzy_cutoff: float = 0.86, memo_size: int = 50000):
+        intern = sys.intern
+        self.emotions: Tuple[str, ...] = tuple(intern(e) for e in lexicon)
+        self.emotion_ids: Dict[str, int] = {e: i for i, e in enumerate(self.emotions)}
+        self._stem = stem
+        self.version = ""
+
+        self.kw_text: List[str] = []
+        self.kw_emotion = array("H")
+        self.kw_weight = array("d")
+        self.ph_text: List[str] = []
+        self.ph_norm: List[str] = []
+        self.ph_emotion = array("H")
+        self.ph_weight = array("d")
+
+        exact: Dict[str, List[int]] = defaultdict(list)
+        stems: Dict[str, List[int]] = defaultdict(list)
+        owners: Dict[str, List[int]] = defaultdict(list)
+        for eid, emo in enumerate(self.emotions):
+            group = lexicon[emo]
+            for phrase, w in group.get("phrases", {}).items():
+                ph = normalize(phrase)
+                if not ph:
+                    continue
+                self.ph_text.append(intern(phrase))
+                self.ph_norm.append(intern(ph))
+                self.ph_emotion.append(eid)
+                self.ph_weight.append(w)
+            for kw, w in group.get("keywords", {}).items():
+                kw_norm = normalize(kw)
+                if not kw_norm:
+                    continue
+                kid = len(self.kw_text)
+                self.kw_text.append(intern(kw))
+                self.kw_emotion.append(eid)
+                self.kw_weight.append(w)
+                exact[intern(kw_norm)].append(kid)
+                stems[stem.pin(kw_norm)].append(kid)
+                owners[kw].append(kid)
+                stem.pin(kw)
+
+        self.exact: Dict[str, Tuple[int, ...]] = {k: tuple(v) for k, v in exact.items()}
+        self.stems: Dict[str, Tuple[int, ...]] = {k: tuple(v) for k, v in stems.items()}
+        self.owners: Dict[str, Tuple[int, ...]] = {k: tuple(v) for k, v in owners.items()}
+        lengths = [len(k) for k in self.exact]
+        self.min_kw_len = min(lengths, default=1)
+        self.max_kw_len = max(lengths, default=0)
+
+        self.fuzzy = FuzzyIndex(self.owners.keys(), cutoff=fuzzy_cutoff)
+        self.token_entries = BoundedMemo(self._match_token, max_size=memo_size, name="token_entries")
+
+    def __len__(self) -> int:
+        return len(self.kw_text) + len(self.ph_text)
+
+    def _match_token(self, token: str) -> Tuple[int, ...]:
+        """
+        Keyword entry ids a token counts towards: the keyword equals or is a
+        substring of the token, or both share a stem. Sorted by entry id.
+        """
+        ids = set()
+        exact = self.exact
+        n_tok = len(token)
+        for n in range(self.min_kw_len, min(self.max_kw_len, n_tok) + 1):
+            for i in range(n_tok - n + 1):
+                hit = exact.get(token[i:i + n])
+                if hit:
+                    ids.update(hit)
+        hit = self.stems.get(self._stem(token))
+        if hit:
+            ids.update(hit)
+        return tuple(sorted(ids))
+
+    def new_vector(self) -> ScoreVector:
+        return ScoreVector(self.emotions)
+
+    def as_nested(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Rebuild the nested source form (for inspection; not used when scoring)."""
+        out = {emo: {"phrases": {}, "keywords": {}} for emo in self.emotions}
+        for text, eid, w in zip(self.ph_text, self.ph_emotion, self.ph_weight):
+            out[self.emotions[eid]]["phrases"][text] = w
+        for text, eid, w in zip(self.kw_text, self.kw_emotion, self.kw_weight):
+            out[self.emotions[eid]]["keywords"][text] = w
+        return out
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "emotions": len(self.emotions),
+            "keywords": len(self.kw_text),
+            "phrases": len(self.ph_text),
+            "exact_keys": len(self.exact),
+            "stem_keys": len(self.stems),
+            "fuzzy_variants": self.fuzzy.stats()["variants"],
+        }
+
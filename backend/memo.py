@@ -0,0 +1,84 @@
+"""
+memo.py
+
+Bounded memo tables for hot, repetitive string transforms (stemming,
+normalization). Entries computed at build time are pinned and never evicted;
+entries added lazily at request time live in a size-capped table that evicts
+oldest-first. Keys and string values are interned so repeated tokens share
+one object.
+"""
+
+import sys
+from typing import Any, Callable, Dict, Iterable
+
+
+class BoundedMemo:
+    __slots__ = ("name", "func", "max_size", "_pinned", "_lazy", "hits", "misses", "evictions")
+
+    def __init__(self, func: Callable[[str], Any], max_size: int = 50000, name: str = ""):
+        self.name = name or getattr(func, "__name__", "memo")
+        self.func = func
+        self.max_size = max(0, int(max_size))
+        self._pinned: Dict[str, Any] = {}
+        self._lazy: Dict[str, Any] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _intern(value: Any) -> Any:
+        return sys.intern(value) if type(value) is str else value
+
+    def pin(self, key: str) -> Any:
+        """Compute (or reuse) `key` and keep it for the lifetime of the table."""
+        value = self._pinned.get(key)
+        if value is None:
+            value = self._lazy.pop(key, None)
+            if value is None:
+                value = self._intern(self.func(key))
+            self._pinned[sys.intern(key)] = value
+        return value
+
+    def pin_all(self, keys: Iterable[str]):
+        for k in keys:
+            self.pin(k)
+
+    def __call__(self, key: str) -> Any:
+        value = self._pinned.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        value = self._lazy.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = self.func(key)
+        if self.max_size:
+            lazy = self._lazy
+            if len(lazy) >= self.max_size:
+                try:
+                    del lazy[next(iter(lazy))]
+                    self.evictions += 1
+                except (StopIteration, KeyError, RuntimeError):
+                    pass
+            value = self._intern(value)
+            lazy[sys.intern(key)] = value
+        return value
+
+    def clear_lazy(self):
+        self._lazy.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "pinned": len(self._pinned),
+            "lazy": len(self._lazy),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,57 @@
+"""
+metrics.py
+
+Process-local counters for the request paths:
+- Counters: named integer counters, thread-safe, snapshot / reset
+- ratios(): derived shares (e.g. how often an analysis needed the pattern
+  sentiment pass) computed from a snapshot at read time
+
+Counters are per worker process; /api/admin/metrics reports the worker that
+served the request.
+"""
+
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, Tuple
+
+
+class Counters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+        self._since = time.time()
+
+    def incr(self, name: str, n: int = 1):
+        with self._lock:
+            self._counts[name] += n
+
+    def incr_many(self, names: Iterable[str]):
+        with self._lock:
+            for name in names:
+                self._counts[name] += 1
+
+    def get(self, name: str) -> int:
+        with self._lock:
+            return self._counts[name]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(sorted(self._counts.items()))
+            since = self._since
+        return {"since": round(since, 3), "uptime_s": round(time.time() - since, 3), "counters": counts}
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+            self._since = time.time()
+
+
+def ratios(counters: Dict[str, int], pairs: Iterable[Tuple[str, str, str]]) -> Dict[str, float]:
+    """{name: numerator / denominator} for (name, numerator, denominator) triples with a non-zero denominator."""
+    out: Dict[str, float] = {}
+    for name, num, den in pairs:
+        d = counters.get(den, 0)
+        if d:
+            out[name] = round(counters.get(num, 0) / d, 4)
+    return out
@@ -0,0 +1,350 @@
+"""
+profiling.py
+
+Opt-in request profiler for the Flask app:
+- Background stack sampler that records collapsed stacks for in-flight requests
+- Keeps a profile when a request exceeds a latency threshold or hits a 1-in-N sample
+- Writes profiles to a rotating local directory, one JSON file per request id
+- Runtime-tunable (enable, threshold, sample rate, interval) without restarting
+- CLI to aggregate captured profiles into a flamegraph-ready collapsed-stack file
+
+Usage (CLI):
+    python profiling.py list profiles/
+    python profiling.py collapse profiles/ -o chat.folded --path /api/chat
+    flamegraph.pl chat.folded > chat.svg
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from collections import Counter
+from typing import Dict, List, Any, Optional
+
+# Per-request limits keep a pathological request from growing a huge capture
+MAX_STACK_DEPTH = 128
+MAX_DISTINCT_STACKS = 5000
+
+_SAFE_ID_RE = re.compile(r"[^A-Za-z0-9_.-]")
+# <started ms, 13 digits>-<request id>.json: the only files _rotate() may delete
+_PROFILE_NAME_RE = re.compile(r"^\d{13}-[A-Za-z0-9_.-]{1,64}\.json$")
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse_stack(frame) -> str:
+    # walk leaf -> root, then emit root-first as flamegraph tools expect
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+class _Capture:
+    __slots__ = ("request_id", "method", "path", "started", "started_wall", "sampled", "stacks", "samples")
+
+    def __init__(self, request_id: str, method: str, path: str, sampled: bool):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.started_wall = time.time()
+        self.sampled = sampled
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+
+class RequestProfiler:
+    """
+    Samples the stacks of request threads while they run and persists the
+    samples of slow (or randomly chosen) requests.
+
+    The sampler thread only runs while profiling is enabled; when disabled the
+    per-request cost is a single attribute check.
+    """
+
+    def __init__(self, out_dir: str = "profiles", enabled: bool = False, threshold_ms: float = 500.0,
+                 sample_one_in: int = 0, interval_ms: float = 5.0, max_files: int = 200):
+        self.out_dir = out_dir
+        self.enabled = False
+        self.threshold_ms = float(threshold_ms)
+        self.sample_one_in = int(sample_one_in)
+        self.interval_ms = float(interval_ms)
+        self.max_files = int(max_files)
+
+        self._lock = threading.Lock()
+        self._active: Dict[int, _Capture] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.stats = Counter()
+
+        if enabled:
+            self.configure(enabled=True)
+
+    @classmethod
+    def from_env(cls) -> "RequestProfiler":
+        return cls(
+            out_dir=os.environ.get("PROFILE_DIR", "profiles"),
+            enabled=os.environ.get("PROFILE_ENABLED", "0") == "1",
+            threshold_ms=float(os.environ.get("PROFILE_THRESHOLD_MS", 500)),
+            sample_one_in=int(os.environ.get("PROFILE_SAMPLE_ONE_IN", 0)),
+            interval_ms=float(os.environ.get("PROFILE_INTERVAL_MS", 5)),
+            max_files=int(os.environ.get("PROFILE_MAX_FILES", 200)),
+        )
+
+    # -------------------------
+    # Runtime configuration
+    # -------------------------
+    def configure(self, **options) -> Dict[str, Any]:
+        """
+        Update settings in place. Unknown keys or a non-boolean `enabled`
+        raise ValueError. The output directory is not among them: it only
+        comes from the constructor (PROFILE_DIR), since rotation deletes
+        files in it.
+        """
+        allowed = {"enabled", "threshold_ms", "sample_one_in", "interval_ms", "max_files"}
+        unknown = set(options) - allowed
+        if unknown:
+            raise ValueError(f"unknown profiler option(s): {', '.join(sorted(unknown))}")
+        if "enabled" in options and not isinstance(options["enabled"], bool):
+            raise ValueError("enabled must be true or false")
+
+        with self._lock:
+            if "threshold_ms" in options:
+                self.threshold_ms = max(0.0, float(options["threshold_ms"]))
+            if "sample_one_in" in options:
+                self.sample_one_in = max(0, int(options["sample_one_in"]))
+            if "interval_ms" in options:
+                self.interval_ms = min(1000.0, max(0.5, float(options["interval_ms"])))
+            if "max_files" in options:
+                self.max_files = max(1, int(options["max_files"]))
+
+        if "enabled" in options:
+            if options["enabled"]:
+                self._start()
+            else:
+                self._stop_sampler()
+        return self.config()
+
+    def config(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": self.threshold_ms,
+            "sample_one_in": self.sample_one_in,
+            "interval_ms": self.interval_ms,
+            "max_files": self.max_files,
+            "out_dir": self.out_dir,
+            "active_requests": len(self._active),
+            "stats": dict(self.stats),
+        }
+
+    def _start(self):
+        with self._lock:
+            if self.enabled:
+                return
+            self.enabled = True
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+            self._thread.start()
+
+    def _stop_sampler(self):
+        with self._lock:
+            if not self.enabled:
+                return
+            self.enabled = False
+            self._stop.set()
+            thread, self._thread = self._thread, None
+            self._active.clear()
+        if thread is not None:
+            thread.join(timeout=1.0)
+
+    # -------------------------
+    # Sampling
+    # -------------------------
+    def _sample_loop(self):
+        while not self._stop.wait(self.interval_ms / 1000.0):
+            if not self._active:
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, capture in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+                    stack = _collapse_stack(frame)
+                    if stack in capture.stacks or len(capture.stacks) < MAX_DISTINCT_STACKS:
+                        capture.stacks[stack] += 1
+                    capture.samples += 1
+            del frames
+
+    def begin(self, request_id: str, method: str, path: str):
+        if not self.enabled:
+            return
+        sampled = self.sample_one_in > 0 and random.randrange(self.sample_one_in) == 0
+        capture = _Capture(request_id, method, path, sampled)
+        with self._lock:
+            self._active[threading.get_ident()] = capture
+
+    def end(self, status: int = 0) -> Optional[str]:
+        """Finish the current thread's capture; returns the written file path, if any."""
+        if not self._active:
+            return None
+        with self._lock:
+            capture = self._active.pop(threading.get_ident(), None)
+        if capture is None:
+            return None
+
+        duration_ms = (time.perf_counter() - capture.started) * 1000.0
+        self.stats["requests"] += 1
+        if duration_ms >= self.threshold_ms:
+            reason = "slow"
+        elif capture.sampled:
+            reason = "sampled"
+        else:
+            return None
+        if not capture.samples:
+            self.stats["kept_without_samples"] += 1
+            return None
+
+        record = {
+            "request_id": capture.request_id,
+            "method": capture.method,
+            "path": capture.path,
+            "status": status,
+            "reason": reason,
+            "duration_ms": round(duration_ms, 3),
+            "started_at": capture.started_wall,
+            "interval_ms": self.interval_ms,
+            "samples": capture.samples,
+            "stacks": dict(capture.stacks),
+        }
+        try:
+            path = self._write(record)
+        except OSError:
+            self.stats["write_errors"] += 1
+            return None
+        self.stats[f"kept_{reason}"] += 1
+        return path
+
+    # -------------------------
+    # Persistence (rotating directory)
+    # -------------------------
+    def _write(self, record: Dict[str, Any]) -> str:
+        os.makedirs(self.out_dir, exist_ok=True)
+        safe_id = _SAFE_ID_RE.sub("", record["request_id"])[:64] or "request"
+        name = f"{int(record['started_at'] * 1000):013d}-{safe_id}.json"
+        path = os.path.join(self.out_dir, name)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        os.replace(tmp, path)
+        self._rotate()
+        return path
+
+    def _rotate(self):
+        files = sorted(n for n in os.listdir(self.out_dir) if _PROFILE_NAME_RE.match(n))
+        for name in files[:max(0, len(files) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.out_dir, name))
+                self.stats["rotated"] += 1
+            except OSError:
+                pass
+
+    # -------------------------
+    # Flask integration
+    # -------------------------
+    def init_app(self, app):
+        from flask import request, g
+
+        @app.before_request
+        def _profile_begin():
+            g.request_id = _SAFE_ID_RE.sub("", request.headers.get("X-Request-ID", ""))[:64] or uuid.uuid4().hex[:16]
+            self.begin(g.request_id, request.method, request.path)
+
+        @app.after_request
+        def _profile_end(response):
+            self.end(response.status_code)
+            response.headers["X-Request-ID"] = g.get("request_id", "")
+            return response
+
+        @app.teardown_request
+        def _profile_teardown(_exc):
+            # after_request is skipped on unhandled errors; make sure the capture is released
+            self.end(500)
+
+
+# -------------------------
+# Aggregation helpers / CLI
+# -------------------------
+def load_profiles(directory: str) -> List[Dict[str, Any]]:
+    out = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                out.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def collapse_profiles(profiles: List[Dict[str, Any]], path: Optional[str] = None,
+                      min_duration_ms: float = 0.0, by_endpoint: bool = False) -> Counter:
+    merged: Counter = Counter()
+    for prof in profiles:
+        if path and prof.get("path") != path:
+            continue
+        if prof.get("duration_ms", 0.0) < min_duration_ms:
+            continue
+        prefix = f"{prof.get('method', '')} {prof.get('path', '')};" if by_endpoint else ""
+        for stack, count in prof.get("stacks", {}).items():
+            merged[prefix + stack] += int(count)
+    return merged
+
+
+def _main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect and aggregate request profiles")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_list = sub.add_parser("list", help="list captured profiles")
+    p_list.add_argument("directory", nargs="?", default="profiles")
+
+    p_collapse = sub.add_parser("collapse", help="merge profiles into collapsed-stack format")
+    p_collapse.add_argument("directory", nargs="?", default="profiles")
+    p_collapse.add_argument("-o", "--output", help="output file (default: stdout)")
+    p_collapse.add_argument("--path", help="only include requests to this path, e.g. /api/chat")
+    p_collapse.add_argument("--min-duration-ms", type=float, default=0.0)
+    p_collapse.add_argument("--by-endpoint", action="store_true", help="prefix stacks with 'METHOD /path'")
+
+    args = parser.parse_args(argv)
+    profiles = load_profiles(args.directory)
+
+    if args.command == "list":
+        for prof in profiles:
+            print(f"{prof['request_id']:<20} {prof['method']:<6} {prof['path']:<28} "
+                  f"{prof['duration_ms']:>9.1f} ms  {prof['reason']:<8} samples={prof['samples']}")
+        return 0
+
+    merged = collapse_profiles(profiles, args.path, args.min_duration_ms, args.by_endpoint)
+    lines = [f"{stack} {count}" for stack, count in sorted(merged.items())]
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + ("\n" if lines else ""))
+        print(f"wrote {len(lines)} stacks from {len(profiles)} profiles to {args.output}")
+    else:
+        print("\n".join(lines))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -0,0 +1,286 @@
+"""
+recommender.py
+
+Personalised shloka recommendations.
+
+- RelevanceIndex: a verse x emotion relevance matrix built once per data
+  snapshot. Each distinct verse (chapter, verse) gets a prior for every
+  bucket it is filed under plus lexicon keyword hits in its translation,
+  explanation and practical advice; rows are L2-normalised.
+- Recommender: per-user state is an exponentially weighted emotion vector
+  (updated in O(emotions) for each saved analysis) and a short list of
+  recently shown verses, stored as one JSON row per user
+  (recommender_profiles) so every worker process reads and updates the same
+  profile. Scores are one matrix-vector product, computed only when the
+  vector changed (NumPy when installed, a flat array loop otherwise); each
+  process caches the ranked list per user, so a request walks at most
+  k + recent entries.
+
+A user without state is seeded from their latest user_emotions rows; until
+then, observe() ignores them so the seed does not count a row twice. Every
+method takes the caller's connection; the writing ones (seed, observe,
+mark_shown, recommend with mark) belong in its write transaction, so a
+profile update is committed together with the row it reflects. The API
+recommends with mark=False and records displayed verses separately
+(mark_shown), so serving recommendations never takes the write lock.
+"""
+
+import re
+import json
+import math
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional: pure-Python scoring is used without it
+    np = None
+
+BUCKET_PRIOR = 1.0
+KEYWORD_WEIGHT = 0.5
+_WORD_RE = re.compile(r"[a-z']+")
+
+
+def _verse_key(shloka: Dict[str, Any]) -> Tuple[Any, Any]:
+    return shloka.get("chapter"), shloka.get("verse")
+
+
+def _verse_text(shloka: Dict[str, Any]) -> str:
+    return " ".join(shloka.get(f, "") for f in ("translation", "explanation", "practical_advice")).lower()
+
+
+class RelevanceIndex:
+    __slots__ = ("version", "emotions", "emotion_ids", "verses", "keys", "fallback_id", "matrix", "_np_matrix")
+
+    def __init__(self, shlokas: Dict[str, List[Dict[str, Any]]], keywords: Dict[str, List[str]],
+                 version: str = "", fallback: str = "confusion"):
+        self.version = version
+        self.emotions: Tuple[str, ...] = tuple(dict.fromkeys([*shlokas, *keywords]))
+        self.emotion_ids: Dict[str, int] = {e: i for i, e in enumerate(self.emotions)}
+        self.fallback_id = self.emotion_ids.get(fallback, 0)
+
+        # one row per distinct verse, however many buckets list it
+        rows: "OrderedDict[Tuple[Any, Any], Dict[str, Any]]" = OrderedDict()
+        buckets: Dict[Tuple[Any, Any], List[int]] = {}
+        for emotion, arr in shlokas.items():
+            for s in arr:
+                key = _verse_key(s)
+                rows.setdefault(key, s)
+                buckets.setdefault(key, []).append(self.emotion_ids[emotion])
+        self.keys: Tuple[Tuple[Any, Any], ...] = tuple(rows)
+        self.verses: Tuple[Dict[str, Any], ...] = tuple(rows.values())
+
+        words = {e: {k.lower() for k in kws if " " not in k and "'" not in k} for e, kws in keywords.items()}
+        phrases = {e: [k.lower() for k in kws if " " in k or "'" in k] for e, kws in keywords.items()}
+        n_emo = len(self.emotions)
+        matrix = array("d", bytes(8 * n_emo * len(self.verses)))
+        for v, (key, s) in enumerate(rows.items()):
+            text = _verse_text(s)
+            tokens = _WORD_RE.findall(text)
+            hits = [0.0] * n_emo
+            for emotion in keywords:
+                kw = words[emotion]
+                count = sum(1 for t in tokens if t in kw) + sum(text.count(p) for p in phrases[emotion])
+                hits[self.emotion_ids[emotion]] = float(count)
+            top = max(hits) or 1.0
+            row = [KEYWORD_WEIGHT * h / top for h in hits]
+            for eid in buckets[key]:
+                row[eid] += BUCKET_PRIOR
+            norm = math.sqrt(sum(x * x for x in row)) or 1.0
+            matrix[v * n_emo:(v + 1) * n_emo] = array("d", (x / norm for x in row))
+        self.matrix = matrix
+        self._np_matrix = (np.frombuffer(matrix, dtype=np.float64).reshape(len(self.verses), n_emo)
+                           if np is not None and self.verses else None)
+
+    def __len__(self) -> int:
+        return len(self.verses)
+
+    def score(self, vector: Sequence[float]) -> List[float]:
+        """Relevance of every verse to an emotion vector on this index's axis."""
+        if self._np_matrix is not None:
+            return (self._np_matrix @ np.asarray(vector, dtype=np.float64)).tolist()
+        n_emo = len(self.emotions)
+        m = self.matrix
+        nz = [(i, w) for i, w in enumerate(vector) if w]
+        return [sum(m[base + i] * w for i, w in nz) for base in range(0, len(m), n_emo)]
+
+    def rank(self, vector: Sequence[float]) -> Tuple[Tuple[int, float], ...]:
+        """(verse index, score) best first; a vector with no overlap ranks by the fallback bucket."""
+        scores = self.score(vector)
+        if not any(scores):
+            fallback = [0.0] * len(self.emotions)
+            fallback[self.fallback_id] = 1.0
+            scores = self.score(fallback)
+        order = sorted(range(len(scores)), key=lambda v: (-scores[v], v))
+        return tuple((v, scores[v]) for v in order)
+
+    def top_emotions(self, verse: int, n: int = 3) -> List[str]:
+        n_emo = len(self.emotions)
+        row = self.matrix[verse * n_emo:(verse + 1) * n_emo]
+        best = sorted(range(n_emo), key=lambda i: -row[i])[:n]
+        return [self.emotions[i] for i in best if row[i] > 0]
+
+
+SCHEMA_VERSION = 1
+
+
+class UserProfile:
+    __slots__ = ("weights", "seq", "recent")
+
+    def __init__(self, recent_size: int):
+        self.weights: Dict[str, float] = {}
+        self.seq = 0  # observations folded into the vector
+        self.recent: Deque[Tuple[Any, Any]] = deque(maxlen=recent_size)
+
+    def to_json(self) -> str:
+        return json.dumps({"v": SCHEMA_VERSION, "weights": self.weights, "recent": [list(k) for k in self.recent]},
+                          separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, raw: str, seq: int, recent_size: int) -> "UserProfile":
+        data = json.loads(raw)
+        if data.get("v") != SCHEMA_VERSION:
+            raise ValueError(f"unsupported profile version {data.get('v')!r}")
+        profile = cls(recent_size)
+        profile.weights = {e: float(w) for e, w in data["weights"].items()}
+        profile.seq = seq
+        profile.recent.extend(tuple(k) for k in data["recent"])
+        return profile
+
+
+class Recommender:
+    """
+    Per-user emotion vectors in SQLite + per-process cached rankings against a
+    RelevanceIndex. `alpha` is the EWMA weight of the newest observation;
+    `recent_size` verses are excluded after being shown; at most `max_users`
+    profiles are kept (least recently updated are deleted first).
+    """
+
+    def __init__(self, alpha: float = 0.2, recent_size: int = 5, max_users: int = 10000):
+        self.alpha = alpha
+        self.recent_size = recent_size
+        self.max_users = max(1, int(max_users))
+        # user -> ((index version, profile seq), ranking); only the ranking is cached, the profile is re-read
+        self._ranked: "OrderedDict[str, Tuple[Tuple[str, int], Tuple[Tuple[int, float], ...]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.rank_computations = 0
+
+    @staticmethod
+    def init_schema(conn):
+        conn.execute('''CREATE TABLE IF NOT EXISTS recommender_profiles
+                        (user_id TEXT PRIMARY KEY,
+                         seq INTEGER NOT NULL,
+                         state TEXT NOT NULL,
+                         updated_at REAL NOT NULL)''')
+
+    def _load(self, conn, user: str) -> Optional[UserProfile]:
+        row = conn.execute("SELECT seq, state FROM recommender_profiles WHERE user_id = ?", (user,)).fetchone()
+        if row is None:
+            return None
+        try:
+            return UserProfile.from_json(row[1], row[0], self.recent_size)
+        except (ValueError, KeyError, TypeError):
+            return None  # unreadable: treated as unknown, so the next read seeds it again
+
+    def _store(self, conn, user: str, profile: UserProfile):
+        conn.execute('''INSERT INTO recommender_profiles (user_id, seq, state, updated_at) VALUES (?, ?, ?, ?)
+                        ON CONFLICT(user_id) DO UPDATE SET seq=excluded.seq, state=excluded.state,
+                                                          updated_at=excluded.updated_at''',
+                     (user, profile.seq, profile.to_json(), time.time()))
+
+    def has_user(self, conn, user: str) -> bool:
+        return self._load(conn, user) is not None
+
+    def seed(self, conn, user: str, history: Iterable[Tuple[str, float]]):
+        """Create a profile from (emotion, confidence) pairs, oldest first."""
+        profile = UserProfile(self.recent_size)
+        for emotion, weight in history:
+            self._decay_add(profile, emotion, weight)
+        self._store(conn, user, profile)
+        over = conn.execute("SELECT COUNT(*) FROM recommender_profiles").fetchone()[0] - self.max_users
+        if over > 0:
+            conn.execute('''DELETE FROM recommender_profiles WHERE user_id IN
+                            (SELECT user_id FROM recommender_profiles WHERE user_id != ?
+                             ORDER BY updated_at LIMIT ?)''', (user, over))
+
+    def _decay_add(self, profile: UserProfile, emotion: str, weight: float):
+        keep = 1.0 - self.alpha
+        w = profile.weights
+        for e in w:
+            w[e] *= keep
+        w[emotion] = w.get(emotion, 0.0) + self.alpha * max(0.0, float(weight or 0.0))
+        profile.seq += 1
+
+    def observe(self, conn, user: str, emotion: str, weight: float = 1.0):
+        """Fold a saved analysis into a known user's vector; unknown users are seeded on first read."""
+        profile = self._load(conn, user)
+        if profile is not None:
+            self._decay_add(profile, emotion, weight)
+            self._store(conn, user, profile)
+
+    def mark_shown(self, conn, user: str, shlokas: Iterable[Dict[str, Any]]):
+        profile = self._load(conn, user)
+        if profile is not None:
+            profile.recent.extend(_verse_key(s) for s in shlokas)
+            self._store(conn, user, profile)
+
+    def _ranking(self, index: RelevanceIndex, user: str, profile: UserProfile) -> Tuple[Tuple[int, float], ...]:
+        stamp = (index.version, profile.seq)
+        with self._lock:
+            cached = self._ranked.get(user)
+            if cached is not None and cached[0] == stamp:
+                self._ranked.move_to_end(user)
+                return cached[1]
+        ids = index.emotion_ids
+        vector = [0.0] * len(index.emotions)
+        for e, w in profile.weights.items():
+            if e in ids:
+                vector[ids[e]] = w
+        ranked = index.rank(vector)
+        with self._lock:
+            self._ranked[user] = (stamp, ranked)
+            self._ranked.move_to_end(user)
+            while len(self._ranked) > self.max_users:
+                self._ranked.popitem(last=False)
+            self.rank_computations += 1
+        return ranked
+
+    def recommend(self, conn, index: RelevanceIndex, user: str, k: int = 3, mark: bool = True) -> List[Dict[str, Any]]:
+        """Top-k verses not shown recently (recent ones are used only if nothing else is left)."""
+        profile = self._load(conn, user)
+        if profile is None:
+            raise KeyError(user)
+        ranked = self._ranking(index, user, profile)
+        recent = set(profile.recent)
+        picked: List[Tuple[int, float]] = []
+        for v, score in ranked:
+            if index.keys[v] not in recent:
+                picked.append((v, score))
+                if len(picked) >= k:
+                    break
+        if len(picked) < k:
+            chosen = {v for v, _ in picked}
+            picked.extend(item for item in ranked if item[0] not in chosen)
+            picked = picked[:k]
+        if mark:
+            profile.recent.extend(index.keys[v] for v, _ in picked)
+            self._store(conn, user, profile)
+        return [{"shloka": index.verses[v], "score": round(score, 4), "themes": index.top_emotions(v)}
+                for v, score in picked]
+
+    def profile(self, conn, user: str, n: int = 5) -> Dict[str, Any]:
+        p = self._load(conn, user)
+        if p is None:
+            return {"emotions": [], "observations": 0}
+        total = sum(p.weights.values()) or 1.0
+        top = sorted(p.weights.items(), key=lambda kv: -kv[1])[:n]
+        return {"emotions": [{"emotion": e, "weight": round(w / total, 3)} for e, w in top if w > 0],
+                "observations": p.seq}
+
+    def stats(self, conn) -> Dict[str, Any]:
+        users = conn.execute("SELECT COUNT(*) FROM recommender_profiles").fetchone()[0]
+        return {"users": users, "cached_rankings": len(self._ranked), "rank_computations": self.rank_computations,
+                "numpy": np is not None}
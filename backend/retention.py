@@ -0,0 +1,438 @@
+"""
+retention.py
+
+Retention and compaction for user_emotions:
+- Text horizon: rows older than `text_days` keep their row but input_text is
+  cut to `keep_chars` (enough for journey previews); the full text goes to
+  the cold archive first
+- Rollup horizon: rows older than `rollup_days` are folded into
+  emotion_rollups (per day / emotion / sentiment: count, sums, min / max
+  compound), archived, and deleted
+- Texts (storage.py keeps each distinct message once) that no row points to
+  after truncation or rollup are deleted in the same batch
+- Cold archive: gzip JSON lines, one file per month of the row timestamps;
+  records are keyed by row id and reason, so a batch retried after a failed
+  commit is not archived twice
+- Space: PRAGMA incremental_vacuum in small steps (databases created by
+  init_db use auto_vacuum=INCREMENTAL and WAL, so readers never block the job)
+
+Every batch is its own short BEGIN IMMEDIATE transaction with a pause after
+it, so live inserts interleave with the job instead of waiting for it.
+
+Usage (CLI):
+    python retention.py run --db user_data.db --rollup-days 365 --text-days 90
+    python retention.py run --db user_data.db --dry-run
+    python retention.py report --db user_data.db
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import storage
+
+
+def init_schema(conn: sqlite3.Connection):
+    conn.execute('''CREATE TABLE IF NOT EXISTS emotion_rollups
+                    (day TEXT NOT NULL,
+                     emotion TEXT NOT NULL,
+                     sentiment TEXT NOT NULL,
+                     count INTEGER NOT NULL,
+                     confidence_sum REAL NOT NULL,
+                     compound_sum REAL NOT NULL,
+                     compound_min REAL,
+                     compound_max REAL,
+                     PRIMARY KEY (day, emotion, sentiment))''')
+
+
+def configure_new_database(conn: sqlite3.Connection):
+    """WAL + incremental auto-vacuum. auto_vacuum only takes effect before the first table exists."""
+    if not conn.execute("SELECT count(*) FROM sqlite_master").fetchone()[0]:
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('PRAGMA journal_mode = WAL')
+
+
+def _cutoff(days: float, now: datetime) -> int:
+    # user_emotions.ts_us: microseconds on the same naive clock
+    return storage.to_us(now - timedelta(days=days))
+
+
+def _space(conn: sqlite3.Connection) -> Dict[str, int]:
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    pages = conn.execute('PRAGMA page_count').fetchone()[0]
+    free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    return {"page_size": page_size, "pages": pages, "free_pages": free, "bytes": pages * page_size}
+
+
+class ColdArchive:
+    """
+    Append-only gzip JSON-lines files, one per month of row timestamps.
+
+    Batches are archived inside their transaction, before the commit, so no row
+    is deleted or truncated without its copy. A commit that fails (or a process
+    killed before it) leaves lines for rows that are still in the table; the
+    next run finds them again, and write() skips every (row id, reason) the
+    month's file already holds.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        # month -> (file size when read, archived (id, reason) keys)
+        self._keys: Dict[str, Tuple[int, Set[Tuple[Any, Any]]]] = {}
+
+    def _path(self, month: str) -> str:
+        return os.path.join(self.directory, f"user_emotions-{month}.jsonl.gz")
+
+    def _archived(self, month: str) -> Set[Tuple[Any, Any]]:
+        path = self._path(month)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        cached = self._keys.get(month)
+        if cached is not None and cached[0] == size:
+            return cached[1]
+        # first look, or another process (every worker may run the job) appended since
+        keys: Set[Tuple[Any, Any]] = set()
+        if size:
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            rec = json.loads(line)
+                        except ValueError:
+                            continue
+                        keys.add((rec.get("id"), rec.get("reason")))
+            except (EOFError, OSError):
+                pass  # a member cut short by a killed write; the keys read before it still count
+        self._keys[month] = (size, keys)
+        return keys
+
+    def write(self, records: List[Dict[str, Any]]) -> int:
+        """Append the records not archived yet; returns how many were written."""
+        if not records:
+            return 0
+        os.makedirs(self.directory, exist_ok=True)
+        by_month: Dict[str, List[Dict[str, Any]]] = {}
+        for rec in records:
+            month = str(rec.get("timestamp") or "unknown")[:7]
+            by_month.setdefault(month, []).append(rec)
+        written = 0
+        for month, recs in by_month.items():
+            keys = self._archived(month)
+            new = {}
+            for rec in recs:
+                key = (rec.get("id"), rec.get("reason"))
+                if key not in keys and key not in new:
+                    new[key] = json.dumps(rec, ensure_ascii=False, default=str)
+            if not new:
+                continue
+            path = self._path(month)
+            # gzip members concatenate, so appending keeps the file readable as one stream
+            with gzip.open(path, "at", encoding="utf-8") as f:
+                f.write("\n".join(new.values()) + "\n")
+            keys.update(new)
+            self._keys[month] = (os.path.getsize(path), keys)
+            written += len(new)
+        return written
+
+
+class RetentionJob:
+    def __init__(self, connect: Callable[[], sqlite3.Connection], rollup_days: Optional[float] = 365,
+                 text_days: Optional[float] = 90, keep_chars: int = 120, archive_dir: Optional[str] = "archive",
+                 batch_size: int = 500, pause_ms: float = 20.0, vacuum_pages: int = 200):
+        self.connect = connect
+        self.rollup_days = rollup_days
+        self.text_days = text_days
+        self.keep_chars = keep_chars
+        self.archive = ColdArchive(archive_dir) if archive_dir else None
+        self.batch_size = batch_size
+        self.pause_ms = pause_ms
+        self.vacuum_pages = vacuum_pages
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls, connect: Callable[[], sqlite3.Connection]) -> "RetentionJob":
+        def days(name: str, default: str) -> Optional[float]:
+            raw = os.environ.get(name, default)
+            return float(raw) if raw not in ("", "0", "off") else None
+        return cls(
+            connect,
+            rollup_days=days('RETENTION_ROLLUP_DAYS', '365'),
+            text_days=days('RETENTION_TEXT_DAYS', '90'),
+            keep_chars=int(os.environ.get('RETENTION_KEEP_CHARS', 120)),
+            archive_dir=os.environ.get('RETENTION_ARCHIVE_DIR', 'archive') or None,
+            batch_size=int(os.environ.get('RETENTION_BATCH_SIZE', 500)),
+        )
+
+    def config(self) -> Dict[str, Any]:
+        return {
+            "rollup_days": self.rollup_days,
+            "text_days": self.text_days,
+            "keep_chars": self.keep_chars,
+            "archive_dir": self.archive.directory if self.archive else None,
+            "batch_size": self.batch_size,
+            "pause_ms": self.pause_ms,
+            "vacuum_pages": self.vacuum_pages,
+            "running": self._run_lock.locked(),
+            "background": self._thread is not None and self._thread.is_alive(),
+        }
+
+    # -------- phases --------
+    def _pause(self):
+        if self.pause_ms > 0:
+            time.sleep(self.pause_ms / 1000.0)
+
+    def _truncate_texts(self, conn: sqlite3.Connection, cutoff: int, stats: Dict[str, Any]):
+        while not self._stop.is_set():
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = storage.select_rows(conn, "e.ts_us < ? AND t.chars > ?", (cutoff, self.keep_chars),
+                                           order="e.ts_us", limit=self.batch_size)
+                if not rows:
+                    conn.rollback()
+                    return
+                if self.archive:
+                    stats["archived"] += self.archive.write([
+                        {"id": r[0], "emotion": r[1], "sentiment": r[4], "timestamp": storage.format_ts(r[6]),
+                         "input_text": r[3], "reason": "text_horizon"} for r in rows])
+                for r in rows:
+                    stats["texts_freed"] += storage.replace_text(conn, r[0], r[3][:self.keep_chars])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            stats["texts_truncated"] += len(rows)
+            stats["batches"] += 1
+            self._pause()
+
+    def _rollup(self, conn: sqlite3.Connection, cutoff: int, stats: Dict[str, Any]):
+        while not self._stop.is_set():
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = storage.select_rows(conn, "e.ts_us < ?", (cutoff,), order="e.ts_us", limit=self.batch_size)
+                if not rows:
+                    conn.rollback()
+                    return
+
+                groups: Dict[tuple, List[float]] = {}
+                for _id, emotion, confidence, _text, sentiment, compound, ts_us in rows:
+                    key = (storage.format_ts(ts_us)[:10], emotion or "", sentiment or "")
+                    conf, comp = float(confidence or 0.0), float(compound or 0.0)
+                    g = groups.get(key)
+                    if g is None:
+                        groups[key] = [1, conf, comp, comp, comp]
+                    else:
+                        g[0] += 1
+                        g[1] += conf
+                        g[2] += comp
+                        g[3] = min(g[3], comp)
+                        g[4] = max(g[4], comp)
+                conn.executemany(
+                    '''INSERT INTO emotion_rollups
+                         (day, emotion, sentiment, count, confidence_sum, compound_sum, compound_min, compound_max)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT(day, emotion, sentiment) DO UPDATE SET
+                         count = count + excluded.count,
+                         confidence_sum = confidence_sum + excluded.confidence_sum,
+                         compound_sum = compound_sum + excluded.compound_sum,
+                         compound_min = min(compound_min, excluded.compound_min),
+                         compound_max = max(compound_max, excluded.compound_max)''',
+                    [(*key, *vals) for key, vals in groups.items()])
+
+                if self.archive:
+                    stats["archived"] += self.archive.write([
+                        {"id": r[0], "emotion": r[1], "sentiment": r[4], "confidence": r[2], "compound": r[5],
+                         "timestamp": storage.format_ts(r[6]), "input_text": r[3], "reason": "rollup_horizon"}
+                        for r in rows])
+                stats["texts_freed"] += storage.delete_rows(conn, [r[0] for r in rows])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            stats["rows_rolled_up"] += len(rows)
+            stats["rollup_upserts"] += len(groups)
+            stats["batches"] += 1
+            self._pause()
+
+    def _vacuum(self, conn: sqlite3.Connection, stats: Dict[str, Any]):
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            stats["vacuum"] = "skipped (auto_vacuum is not INCREMENTAL; see configure_new_database)"
+            return
+        while not self._stop.is_set():
+            free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if not free:
+                break
+            # execute() steps the pragma once (one page); executescript runs it to completion
+            conn.executescript(f'PRAGMA incremental_vacuum({int(self.vacuum_pages)});')
+            stats["vacuum_steps"] += 1
+            self._pause()
+        stats["vacuum"] = "incremental"
+
+    # -------- entry points --------
+    def dry_run(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        now = now or datetime.now()
+        conn = self.connect()
+        try:
+            out: Dict[str, Any] = {"dry_run": True, "config": self.config()}
+            if self.text_days is not None:
+                out["texts_to_truncate"] = conn.execute(
+                    '''SELECT count(*) FROM user_emotions e JOIN message_texts t ON t.id = e.text_id
+                       WHERE e.ts_us < ? AND t.chars > ?''',
+                    (_cutoff(self.text_days, now), self.keep_chars)).fetchone()[0]
+            if self.rollup_days is not None:
+                out["rows_to_roll_up"] = conn.execute(
+                    'SELECT count(*) FROM user_emotions WHERE ts_us < ?',
+                    (_cutoff(self.rollup_days, now),)).fetchone()[0]
+            out["space"] = _space(conn)
+            return out
+        finally:
+            conn.close()
+
+    def run(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """One full pass. Returns a report with counts, reclaimed space and per-phase timing."""
+        if not self._run_lock.acquire(blocking=False):
+            return {"skipped": "already running"}
+        try:
+            now = now or datetime.now()
+            t0 = time.perf_counter()
+            conn = self.connect()
+            conn.isolation_level = None  # explicit BEGIN/COMMIT per batch
+            try:
+                storage.ensure_schema(conn)
+                init_schema(conn)
+                before = _space(conn)
+                stats: Dict[str, Any] = {"texts_truncated": 0, "rows_rolled_up": 0, "rollup_upserts": 0,
+                                         "texts_freed": 0, "archived": 0, "batches": 0, "vacuum_steps": 0}
+                timing: Dict[str, float] = {}
+
+                t = time.perf_counter()
+                if self.rollup_days is not None:
+                    self._rollup(conn, _cutoff(self.rollup_days, now), stats)
+                timing["rollup_ms"] = round((time.perf_counter() - t) * 1000, 2)
+
+                t = time.perf_counter()
+                if self.text_days is not None:
+                    self._truncate_texts(conn, _cutoff(self.text_days, now), stats)
+                timing["truncate_ms"] = round((time.perf_counter() - t) * 1000, 2)
+
+                t = time.perf_counter()
+                self._vacuum(conn, stats)
+                timing["vacuum_ms"] = round((time.perf_counter() - t) * 1000, 2)
+                after = _space(conn)
+            finally:
+                conn.close()
+
+            report = {
+                "started_at": now.isoformat(),
+                **stats,
+                "space_before": before,
+                "space_after": after,
+                "reclaimed_bytes": before["bytes"] - after["bytes"],
+                "timing": {**timing, "total_ms": round((time.perf_counter() - t0) * 1000, 2)},
+                "interrupted": self._stop.is_set(),
+            }
+            self.last_report = report
+            return report
+        finally:
+            self._run_lock.release()
+
+    def start(self, interval_s: float) -> threading.Thread:
+        """Run every `interval_s` seconds on a daemon thread until stop()."""
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(interval_s):
+                try:
+                    self.run()
+                except Exception as e:
+                    self.last_report = {"error": f"{type(e).__name__}: {e}", "at": datetime.now().isoformat()}
+
+        self._thread = threading.Thread(target=loop, name="retention", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+
+
+def table_report(conn: sqlite3.Connection) -> Dict[str, Any]:
+    version = storage.schema_version(conn)
+    if version != storage.SCHEMA_VERSION:
+        return {"schema_version": version, "error": "run `python storage.py migrate` first", "space": _space(conn)}
+    oldest, newest, rows = conn.execute(
+        'SELECT min(ts_us), max(ts_us), count(*) FROM user_emotions').fetchone()
+    text_chars = conn.execute(
+        '''SELECT coalesce(sum(t.chars), 0) FROM user_emotions e
+           JOIN message_texts t ON t.id = e.text_id''').fetchone()[0]
+    texts, text_bytes = conn.execute(
+        'SELECT count(*), coalesce(sum(length(body)), 0) FROM message_texts').fetchone()
+    has_rollups = conn.execute(
+        "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = 'emotion_rollups'").fetchone()[0]
+    rollups = conn.execute('SELECT count(*), coalesce(sum(count), 0) FROM emotion_rollups').fetchone() \
+        if has_rollups else (0, 0)
+    return {
+        "rows": rows,
+        "oldest": storage.format_ts(oldest) if oldest is not None else None,
+        "newest": storage.format_ts(newest) if newest is not None else None,
+        "input_text_chars": text_chars,
+        "distinct_texts": texts,
+        "stored_text_bytes": text_bytes,
+        "rollup_groups": rollups[0],
+        "rolled_up_rows": rollups[1],
+        "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(conn.execute('PRAGMA auto_vacuum').fetchone()[0]),
+        "journal_mode": conn.execute('PRAGMA journal_mode').fetchone()[0],
+        "space": _space(conn),
+    }
+
+
+# ------------------------------------
+# CLI
+# ------------------------------------
+def _main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Retention and compaction for user_emotions")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="roll up / truncate / vacuum once")
+    p_run.add_argument("--db", default="user_data.db")
+    p_run.add_argument("--rollup-days", type=float, default=365)
+    p_run.add_argument("--text-days", type=float, default=90)
+    p_run.add_argument("--keep-chars", type=int, default=120)
+    p_run.add_argument("--archive-dir", default="archive", help="'' disables the cold archive")
+    p_run.add_argument("--batch-size", type=int, default=500)
+    p_run.add_argument("--pause-ms", type=float, default=20.0)
+    p_run.add_argument("--dry-run", action="store_true")
+
+    p_report = sub.add_parser("report", help="table size and age summary")
+    p_report.add_argument("--db", default="user_data.db")
+
+    args = parser.parse_args(argv)
+
+    def connect():
+        return sqlite3.connect(args.db, timeout=30)
+
+    if args.command == "report":
+        conn = connect()
+        try:
+            print(json.dumps(table_report(conn), indent=1))
+        finally:
+            conn.close()
+        return 0
+
+    job = RetentionJob(connect, rollup_days=args.rollup_days, text_days=args.text_days, keep_chars=args.keep_chars,
+                       archive_dir=args.archive_dir or None, batch_size=args.batch_size, pause_ms=args.pause_ms)
+    print(json.dumps(job.dry_run() if args.dry_run else job.run(), indent=1))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
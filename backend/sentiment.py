@@ -0,0 +1,603 @@
+"""
+sentiment.py
+
+Fused VADER + TextBlob (pattern) sentiment: compound / pos / neu / neg and
+polarity / subjectivity from one pass over the input's whitespace chunks.
+
+- SentimentTables: flat lookup tables compiled once from the libraries' own
+  data: the loaded VADER lexicon with its booster / negation / idiom
+  constants, and TextBlob's en-sentiment lexicon averaged per word (the
+  (polarity, subjectivity, intensity) triple TextBlob uses for untagged text)
+  plus an adverb flag per word
+- each chunk (text.split()) is tokenized once for both models: VADER's
+  punctuation-trimmed word and pattern's split tokens; chunk tokenizations
+  live in a BoundedMemo, so common vocabulary costs one dict lookup
+- FusedSentiment runs both rule sets over those tokens without building
+  SentiText / TextBlob objects; LibrarySentiment calls the libraries
+  (SENTIMENT_ENGINE=library in the app, reference() for parity checks)
+- engine.signals(doc) returns SentimentSignals: each model's pass runs on
+  first access to one of its values, so a caller that only reads compound
+  never runs the pattern pass; AveragedSignals does the same over windows,
+  and VaderOnlySignals drops the pattern pass outright (analyzer cascade)
+
+The rules mirror nltk 3.8 VADER and textblob 0.17 PatternAnalyzer, including
+their quirks (VADER scores a repeated word with the context of its first
+occurrence; pattern reads ": (" as a frown). `python -m benchmarks.sentiment`
+compares both on the benchmark corpora and exits non-zero above tolerance.
+"""
+
+import math
+import re
+import string
+from typing import Any, Dict, List, Optional, Tuple
+
+from nltk.sentiment import SentimentIntensityAnalyzer
+from nltk.sentiment.vader import VaderConstants
+from textblob import TextBlob
+from textblob.en import sentiment as pattern_sentiment
+from textblob._text import (ABBREVIATIONS, EMOTICONS, EOS, PUNCTUATION, RE_ABBR1, RE_ABBR2, RE_ABBR3,
+                            RE_EMOTICONS, RE_SARCASM, replacements as PATTERN_REPLACEMENTS)
+
+from memo import BoundedMemo
+from text_pipeline import AnalysisDocument, as_document
+
+_VADER_PUNCT = frozenset(string.punctuation)
+_QUOTES = ("“", "”", "‘", "’", "'", '"')
+_LEAD = tuple(PUNCTUATION.replace(".", ""))
+_TRAIL = _LEAD + (".",)
+_EMOTICONS_ALL = [e for faces in EMOTICONS.values() for e in faces]
+# chunks that can take part in the sentence-level emoticon merge: symbol characters, or the
+# start of an all-alphanumeric emoticon split by whitespace ("X D")
+_EMOTICON_SYMBOLS = frozenset(ch for e in _EMOTICONS_ALL for ch in e if not ch.isalnum())
+_EMOTICON_PREFIXES = frozenset(e[:k] for e in _EMOTICONS_ALL if e.isalnum() for k in range(1, len(e)))
+_WHITESPACE = re.compile(r"(\s+)")
+_LINEBREAK = re.compile(r"\n{2,}")
+_SENTENCE_END = ("...", ".", "!", "?", EOS)
+_SENTENCE_CLOSE = ("'", "\"", "”", "’", "...", ".", "!", "?", ")", EOS)
+
+
+class SentimentScores:
+    __slots__ = ("compound", "pos", "neu", "neg", "polarity", "subjectivity")
+
+    def __init__(self, compound: float, pos: float, neu: float, neg: float,
+                 polarity: float, subjectivity: float):
+        self.compound = compound
+        self.pos = pos
+        self.neu = neu
+        self.neg = neg
+        self.polarity = polarity
+        self.subjectivity = subjectivity
+
+    def vader(self) -> Dict[str, float]:
+        """Same shape as SentimentIntensityAnalyzer.polarity_scores()."""
+        return {"neg": self.neg, "neu": self.neu, "pos": self.pos, "compound": self.compound}
+
+    def as_dict(self) -> Dict[str, float]:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+# ------------------------------------
+# Tables
+# ------------------------------------
+class SentimentTables:
+    """Everything the scorer looks up, as plain dicts / sets."""
+
+    def __init__(self, vader_lexicon: Optional[Dict[str, float]] = None, pattern: Any = None):
+        if vader_lexicon is None:
+            vader_lexicon = SentimentIntensityAnalyzer().lexicon
+        c = VaderConstants
+        self.lexicon: Dict[str, float] = dict(vader_lexicon)
+        self.booster: Dict[str, float] = dict(c.BOOSTER_DICT)
+        self.negate = frozenset(c.NEGATE)
+        self.idioms: Dict[str, float] = dict(c.SPECIAL_CASE_IDIOMS)
+        self.b_decr, self.c_incr, self.n_scalar = c.B_DECR, c.C_INCR, c.N_SCALAR
+
+        pattern = pattern_sentiment if pattern is None else pattern
+        len(pattern)  # lazydict: load the XML lexicon now
+        modifiers = tuple(pattern.modifiers)
+        # word -> (polarity, subjectivity, intensity, is_modifier) for untagged input
+        self.pattern: Dict[str, Tuple[float, float, float, bool]] = {}
+        for word, by_pos in dict.items(pattern):
+            p, s, i = by_pos[None]
+            self.pattern[word] = (p, s, i, any(m in by_pos for m in modifiers))
+        self.negations = frozenset(pattern.negations)
+        self.modifier = pattern.modifier
+        # lowercased emoticon -> polarity, first facial expression wins (as in the library)
+        self.emoticons: Dict[str, float] = {}
+        for (_, p), faces in EMOTICONS.items():
+            for e in faces:
+                self.emoticons.setdefault(e.lower(), p)
+
+
+# ------------------------------------
+# Tokenization (per whitespace chunk)
+# ------------------------------------
+def _vader_word(chunk: str) -> Optional[str]:
+    """SentiText._words_and_emoticons for one chunk: one punctuation mark trimmed off one side."""
+    if len(chunk) <= 1:
+        return None
+    k = 0
+    while k < len(chunk) and chunk[k] in _VADER_PUNCT:
+        k += 1
+    if 0 < k < len(chunk):
+        head, rest = chunk[:k], chunk[k:]
+    else:
+        k = len(chunk)
+        while k > 0 and chunk[k - 1] in _VADER_PUNCT:
+            k -= 1
+        if not 0 < k < len(chunk):
+            return chunk
+        head, rest = chunk[k:], chunk[:k]
+    if head in VaderConstants.PUNC_LIST and len(rest) > 1 and not any(ch in _VADER_PUNCT for ch in rest):
+        return rest
+    return chunk
+
+
+def _pattern_tokens(chunk: str) -> List[str]:
+    """pattern's find_tokens for one chunk, before the sentence-level emoticon / sarcasm merge."""
+    for a, b in PATTERN_REPLACEMENTS.items():
+        if a in chunk:
+            chunk = chunk.replace(a, b)
+    for q in _QUOTES:
+        if q in chunk:
+            chunk = chunk.replace(q, " %s " % q)
+    tokens: List[str] = []
+    for t in chunk.split():
+        tail: List[str] = []
+        while t.startswith(_LEAD) and t not in PATTERN_REPLACEMENTS:
+            tokens.append(t[0])
+            t = t[1:]
+        while t.endswith(_TRAIL) and t not in PATTERN_REPLACEMENTS:
+            if t.endswith(_LEAD):
+                tail.append(t[-1])
+                t = t[:-1]
+            if t.endswith("..."):
+                tail.append("...")
+                t = t[:-3].rstrip(".")
+            if t.endswith("."):
+                if (t in ABBREVIATIONS or RE_ABBR1.match(t) is not None or RE_ABBR2.match(t) is not None
+                        or RE_ABBR3.match(t) is not None):
+                    break
+                tail.append(t[-1])
+                t = t[:-1]
+        if t != "":
+            tokens.append(t)
+        tokens.extend(reversed(tail))
+    return tokens
+
+
+def _tokenize_chunk(chunk: str) -> Tuple[Optional[str], Tuple[str, ...], Tuple[str, ...], bool]:
+    """(VADER word or None, lowercased pattern tokens, original-case tokens, may need the regex merge)."""
+    if chunk.isalpha() and "’" not in chunk:
+        # plain word: nothing to split or trim
+        return (chunk if len(chunk) > 1 else None), (chunk.lower(),), (chunk,), chunk in _EMOTICON_PREFIXES
+    tokens = tuple(_pattern_tokens(chunk))
+    merge = chunk in _EMOTICON_PREFIXES or any(ch in _EMOTICON_SYMBOLS for ch in chunk)
+    return _vader_word(chunk), tuple(t.lower() for t in tokens), tokens, merge
+
+
+# ------------------------------------
+# Lazy signals
+# ------------------------------------
+class SentimentSignals:
+    """
+    Sentiment of one document, evaluated on first access: the VADER pass runs
+    when compound / pos / neu / neg is read, the pattern pass when polarity /
+    subjectivity is. computed() lists the passes that actually ran.
+    """
+    __slots__ = ("_doc", "_engine", "_vader", "_pattern")
+
+    def __init__(self, doc: Optional[AnalysisDocument], engine: Any):
+        self._doc = doc
+        self._engine = engine
+        self._vader: Optional[Tuple[float, float, float, float]] = None
+        self._pattern: Optional[Tuple[float, float]] = None
+
+    def _compute_vader(self) -> Tuple[float, float, float, float]:
+        return self._engine.vader_scores(self._doc)
+
+    def _compute_pattern(self) -> Tuple[float, float]:
+        return self._engine.pattern_scores(self._doc)
+
+    def _v(self) -> Tuple[float, float, float, float]:
+        if self._vader is None:
+            self._vader = self._compute_vader()
+        return self._vader
+
+    def _p(self) -> Tuple[float, float]:
+        if self._pattern is None:
+            self._pattern = self._compute_pattern()
+        return self._pattern
+
+    @property
+    def compound(self) -> float:
+        return self._v()[0]
+
+    @property
+    def pos(self) -> float:
+        return self._v()[1]
+
+    @property
+    def neu(self) -> float:
+        return self._v()[2]
+
+    @property
+    def neg(self) -> float:
+        return self._v()[3]
+
+    @property
+    def polarity(self) -> float:
+        return self._p()[0]
+
+    @property
+    def subjectivity(self) -> float:
+        return self._p()[1]
+
+    def vader(self) -> Dict[str, float]:
+        """Same shape as SentimentIntensityAnalyzer.polarity_scores()."""
+        compound, pos, neu, neg = self._v()
+        return {"neg": neg, "neu": neu, "pos": pos, "compound": compound}
+
+    def computed(self) -> List[str]:
+        return [name for name, value in (("vader", self._vader), ("pattern", self._pattern)) if value is not None]
+
+
+class AveragedSignals(SentimentSignals):
+    """Weighted mean of per-window signals (long inputs); each pass runs over the windows only when read."""
+    __slots__ = ("_parts",)
+
+    def __init__(self, parts: List[Tuple[SentimentSignals, float]]):
+        super().__init__(None, None)
+        self._parts = parts
+
+    def _mean(self, values: List[Tuple[float, ...]], width: int) -> Tuple[float, ...]:
+        weight = max(1, sum(w for _, w in self._parts))
+        sums = [0.0] * width
+        for v, (_, w) in zip(values, self._parts):
+            for k in range(width):
+                sums[k] += v[k] * w
+        return tuple(x / weight for x in sums)
+
+    def _compute_vader(self) -> Tuple[float, float, float, float]:
+        return self._mean([s._v() for s, _ in self._parts], 4)
+
+    def _compute_pattern(self) -> Tuple[float, float]:
+        return self._mean([s._p() for s, _ in self._parts], 2)
+
+    def computed(self) -> List[str]:
+        done = set(super().computed())
+        for s, _ in self._parts:
+            done.update(s.computed())
+        return [name for name in ("vader", "pattern") if name in done]
+
+
+class VaderOnlySignals(SentimentSignals):
+    """
+    VADER side of `base` with the pattern pass skipped (cascade early exit or
+    an expired deadline): polarity and subjectivity read as 0.0.
+    """
+    __slots__ = ("_base",)
+
+    def __init__(self, base: SentimentSignals):
+        super().__init__(None, None)
+        self._base = base
+        self._pattern = (0.0, 0.0)
+
+    def _compute_vader(self) -> Tuple[float, float, float, float]:
+        return self._base._v()
+
+    def computed(self) -> List[str]:
+        return self._base.computed()
+
+
+# ------------------------------------
+# Engines
+# ------------------------------------
+class SentimentEngine:
+    """vader_scores / pattern_scores per document; score() runs both, signals() defers them."""
+
+    def vader_scores(self, doc: AnalysisDocument) -> Tuple[float, float, float, float]:
+        raise NotImplementedError
+
+    def pattern_scores(self, doc: AnalysisDocument) -> Tuple[float, float]:
+        raise NotImplementedError
+
+    def signals(self, text_or_doc: Any) -> SentimentSignals:
+        doc = as_document(text_or_doc)
+        return doc.memo(("signals", self), lambda d: SentimentSignals(d, self))
+
+    def score(self, text_or_doc: Any) -> SentimentScores:
+        s = self.signals(text_or_doc)
+        return SentimentScores(s.compound, s.pos, s.neu, s.neg, s.polarity, s.subjectivity)
+
+
+class LibrarySentiment(SentimentEngine):
+    """NLTK VADER + TextBlob, as the analyzers called them before the fused scorer."""
+
+    def __init__(self, sia: Optional[SentimentIntensityAnalyzer] = None):
+        self.sia = sia or SentimentIntensityAnalyzer()
+
+    def vader_scores(self, doc: AnalysisDocument) -> Tuple[float, float, float, float]:
+        v = self.sia.polarity_scores(doc.text)
+        return v["compound"], v["pos"], v["neu"], v["neg"]
+
+    def pattern_scores(self, doc: AnalysisDocument) -> Tuple[float, float]:
+        blob = TextBlob(doc.text).sentiment
+        return blob.polarity, blob.subjectivity
+
+
+class FusedSentiment(SentimentEngine):
+    def __init__(self, tables: Optional[SentimentTables] = None, memo_size: int = 50000):
+        self.tables = tables or SentimentTables()
+        self._chunks = BoundedMemo(_tokenize_chunk, max_size=memo_size, name="sentiment_chunks")
+
+    def vader_scores(self, doc: AnalysisDocument) -> Tuple[float, float, float, float]:
+        return self._vader(self._tokens(doc)[0], doc.text)
+
+    def pattern_scores(self, doc: AnalysisDocument) -> Tuple[float, float]:
+        _, ptokens, original, merge = self._tokens(doc)
+        if merge:
+            # a per-sentence match is also a match in the joined tokens, so one search decides
+            joined = " ".join(original)
+            if RE_SARCASM.search(joined) or RE_EMOTICONS.search(joined):
+                ptokens = self._merged_tokens(doc.text)
+        return self._pattern(ptokens)
+
+    def _tokens(self, doc: AnalysisDocument) -> Tuple[List[str], List[str], List[str], bool]:
+        """One pass over the chunks for both models (cached on the document)."""
+        return doc.memo(("sentiment_tokens", self), self._tokenize)
+
+    def _tokenize(self, doc: AnalysisDocument) -> Tuple[List[str], List[str], List[str], bool]:
+        words: List[str] = []
+        ptokens: List[str] = []
+        original: List[str] = []
+        merge = False
+        tokenize = self._chunks
+        for chunk in doc.chunks:
+            vw, toks, orig, m = tokenize(chunk)
+            if vw is not None:
+                words.append(vw)
+            ptokens.extend(toks)
+            original.extend(orig)
+            merge = merge or m
+        return words, ptokens, original, merge
+
+    def _merged_tokens(self, text: str) -> List[str]:
+        """
+        Slow path for inputs with emoticon / sarcasm characters: pattern merges "(!)" and
+        emoticons the tokenizer split apart (": )" -> ":)") per sentence, on original-case
+        tokens, so the sentence grouping of find_tokens (paragraph breaks included) is
+        replayed here before the regexes run.
+        """
+        tokens: List[str] = []
+        for k, piece in enumerate(_WHITESPACE.split(text)):
+            if k % 2:
+                tokens.extend([EOS] * len(_LINEBREAK.findall(piece.replace("\r\n", "\n"))))
+            elif piece:
+                tokens.extend(self._chunks(piece)[2])
+        sentences: List[List[str]] = [[]]
+        i = j = 0
+        while j < len(tokens):
+            if tokens[j] in _SENTENCE_END:
+                while j < len(tokens) and tokens[j] in _SENTENCE_CLOSE:
+                    if tokens[j] in ("'", "\"") and sentences[-1].count(tokens[j]) % 2 == 0:
+                        break  # balanced quotes
+                    j += 1
+                sentences[-1].extend(t for t in tokens[i:j] if t != EOS)
+                sentences.append([])
+                i = j
+            j += 1
+        sentences[-1].extend(tokens[i:j])
+        out: List[str] = []
+        for sentence in sentences:
+            if sentence:
+                joined = RE_SARCASM.sub("(!)", " ".join(sentence))
+                joined = RE_EMOTICONS.sub(lambda m: m.group(1).replace(" ", "") + m.group(2), joined)
+                out.extend(joined.lower().split())
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return self._chunks.stats()
+
+    # -------------------------
+    # VADER
+    # -------------------------
+    def _vader(self, words: List[str], text: str) -> Tuple[float, float, float, float]:
+        t = self.tables
+        lexicon, booster = t.lexicon, t.booster
+        n = len(words)
+        lower = [w.lower() for w in words]
+        upper = [w.isupper() for w in words]
+        n_upper = sum(upper)
+        cap_diff = 0 < n - n_upper < n
+        negated = [lw in t.negate or "n't" in lw for lw in lower]
+        first: Dict[str, int] = {}
+        for k, w in enumerate(words):
+            first.setdefault(w, k)
+
+        def scalar(j: int, valence: float) -> float:
+            s = booster.get(lower[j], 0.0)
+            if s:
+                if valence < 0:
+                    s = -s
+                if upper[j] and cap_diff:
+                    s = s + t.c_incr if valence > 0 else s - t.c_incr
+            return s
+
+        sentiments: List[float] = []
+        for w in words:
+            i = first[w]  # nltk looks the word up with list.index()
+            lw = lower[i]
+            if lw in booster or (lw == "kind" and i < n - 1 and lower[i + 1] == "of"):
+                sentiments.append(0)
+                continue
+            valence = lexicon.get(lw)
+            if valence is None:
+                sentiments.append(0)
+                continue
+            if upper[i] and cap_diff:
+                valence = valence + t.c_incr if valence > 0 else valence - t.c_incr
+            for start_i in range(3):
+                j = i - start_i - 1
+                if i > start_i and lower[j] not in lexicon:
+                    s = scalar(j, valence)
+                    if start_i == 1 and s != 0:
+                        s = s * 0.95
+                    if start_i == 2 and s != 0:
+                        s = s * 0.9
+                    valence = valence + s
+                    if start_i == 0:
+                        if negated[i - 1]:
+                            valence = valence * t.n_scalar
+                    elif start_i == 1:
+                        if words[i - 2] == "never" and words[i - 1] in ("so", "this"):
+                            valence = valence * 1.5
+                        elif negated[i - 2]:
+                            valence = valence * t.n_scalar
+                    else:
+                        if (words[i - 3] == "never" and words[i - 2] in ("so", "this")
+                                or words[i - 1] in ("so", "this")):
+                            valence = valence * 1.25
+                        elif negated[i - 3]:
+                            valence = valence * t.n_scalar
+                        valence = self._idioms(valence, words, i)
+            # "least" negates unless "at least" / "very least"
+            if i > 0 and lower[i - 1] == "least" and "least" not in lexicon:
+                if i == 1 or lower[i - 2] not in ("at", "very"):
+                    valence = valence * t.n_scalar
+            sentiments.append(valence)
+
+        if "but" in lower:
+            bi = lower.index("but")
+            sentiments = [s * 0.5 if k < bi else (s * 1.5 if k > bi else s) for k, s in enumerate(sentiments)]
+        return self._vader_summary(sentiments, text)
+
+    def _idioms(self, valence: float, words: List[str], i: int) -> float:
+        idioms = self.tables.idioms
+        onezero = f"{words[i - 1]} {words[i]}"
+        twoonezero = f"{words[i - 2]} {words[i - 1]} {words[i]}"
+        twoone = f"{words[i - 2]} {words[i - 1]}"
+        threetwoone = f"{words[i - 3]} {words[i - 2]} {words[i - 1]}"
+        threetwo = f"{words[i - 3]} {words[i - 2]}"
+        for seq in (onezero, twoonezero, twoone, threetwoone, threetwo):
+            if seq in idioms:
+                valence = idioms[seq]
+                break
+        if len(words) - 1 > i:
+            zeroone = f"{words[i]} {words[i + 1]}"
+            if zeroone in idioms:
+                valence = idioms[zeroone]
+        if len(words) - 1 > i + 1:
+            zeroonetwo = f"{words[i]} {words[i + 1]} {words[i + 2]}"
+            if zeroonetwo in idioms:
+                valence = idioms[zeroonetwo]
+        if threetwo in self.tables.booster or twoone in self.tables.booster:
+            valence = valence + self.tables.b_decr
+        return valence
+
+    @staticmethod
+    def _vader_summary(sentiments: List[float], text: str) -> Tuple[float, float, float, float]:
+        if not sentiments:
+            return 0.0, 0.0, 0.0, 0.0
+        sum_s = float(sum(sentiments))
+        ep = min(text.count("!"), 4) * 0.292
+        qm_count = text.count("?")
+        qm = 0 if qm_count <= 1 else (qm_count * 0.18 if qm_count <= 3 else 0.96)
+        amp = ep + qm
+        if sum_s > 0:
+            sum_s += amp
+        elif sum_s < 0:
+            sum_s -= amp
+        compound = sum_s / math.sqrt((sum_s * sum_s) + 15)
+        pos_sum, neg_sum, neu_count = 0.0, 0.0, 0
+        for s in sentiments:
+            if s > 0:
+                pos_sum += float(s) + 1
+            if s < 0:
+                neg_sum += float(s) - 1
+            if s == 0:
+                neu_count += 1
+        if pos_sum > math.fabs(neg_sum):
+            pos_sum += amp
+        elif pos_sum < math.fabs(neg_sum):
+            neg_sum -= amp
+        total = pos_sum + math.fabs(neg_sum) + neu_count
+        return (round(compound, 4), round(math.fabs(pos_sum / total), 3),
+                round(math.fabs(neu_count / total), 3), round(math.fabs(neg_sum / total), 3))
+
+    # -------------------------
+    # pattern (TextBlob)
+    # -------------------------
+    def _pattern(self, tokens: List[str]) -> Tuple[float, float]:
+        t = self.tables
+        lexicon, negations, emoticons = t.pattern, t.negations, t.emoticons
+        a: List[List[float]] = []  # [polarity, subjectivity, intensity, negated(-1)]
+        m: Optional[str] = None    # preceding modifier
+        neg: Optional[str] = None  # preceding negation
+        for w in tokens:
+            e = lexicon.get(w)
+            if e is not None:
+                p, s, i, is_mod = e
+                if m is None:
+                    a.append([p, s, i, 1])
+                else:
+                    last = a[-1]
+                    last[0] = max(-1.0, min(p * last[2], +1.0))
+                    last[1] = max(-1.0, min(s * last[2], +1.0))
+                    last[2] = i
+                if neg is not None:
+                    a[-1][2] = 1.0 / a[-1][2]
+                    a[-1][3] = -1
+                m = w if is_mod else None
+                neg = w if w in negations else None
+            else:
+                if w in negations:
+                    neg = w
+                elif neg and len(w.strip("'")) > 1:
+                    neg = None
+                if neg is not None and m is not None and t.modifier(m):
+                    a[-1][3] = -1
+                    neg = None
+                elif m and len(w) > 2:
+                    m = None
+                if w == "!" and a:
+                    a[-1][0] = max(-1.0, min(a[-1][0] * 1.25, +1.0))
+                if w == "(!)":
+                    a.append([0.0, 1.0, 1.0, 1])
+                if w.isalpha() is False and len(w) <= 5 and w not in PUNCTUATION:
+                    p = emoticons.get(w)
+                    if p is not None:
+                        a.append([p, 1.0, 1.0, 1])
+        if not a:
+            return 0.0, 0.0
+        polarity = 0
+        subjectivity = 0
+        for p, s, _, negated in a:
+            polarity += p * -0.5 if negated < 0 else p
+            subjectivity += s
+        return polarity / float(len(a)), subjectivity / float(len(a))
+
+
+# ------------------------------------
+# Reference (library) path
+# ------------------------------------
+_LIBRARY: Optional[LibrarySentiment] = None
+
+
+def reference(text: str) -> SentimentScores:
+    """Scores from the library calls, for parity checks."""
+    global _LIBRARY
+    if _LIBRARY is None:
+        _LIBRARY = LibrarySentiment()
+    return _LIBRARY.score(text)
+
+
+_DEFAULT: Optional[FusedSentiment] = None
+
+
+def default_sentiment() -> FusedSentiment:
+    """Process-wide scorer shared by the app and the analyzers."""
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = FusedSentiment()
+    return _DEFAULT
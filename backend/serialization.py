@@ -0,0 +1,116 @@
+"""
+serialization.py
+
+JSON encoding for the read-heavy API responses:
+- dumps(): orjson when it is installed (optional: pip install orjson),
+  otherwise the stdlib encoder; both give sorted keys, compact separators
+  and UTF-8 output (Devanagari is written as-is, not \\u-escaped)
+- Fragment: an already-encoded JSON value, spliced verbatim into the output
+  of dumps() (one C-level encode plus one substitution pass)
+- ShlokaFragments: each verse's response fragments (the analyze-emotion
+  card and the full daily-quote object), encoded once per data snapshot;
+  short values such as journey previews stay plain strings, since splicing
+  costs more than encoding them
+- json_response(): a Flask response for a payload; with compress=True the
+  body is gzipped when the client accepts gzip and the body is at least
+  JSON_GZIP_MIN_BYTES (no brotli dependency)
+
+JSON_ENCODER=stdlib forces the stdlib encoder even when orjson is present.
+"""
+
+import os
+import re
+import gzip
+import json
+import secrets
+from typing import Any, Dict, List, Optional, Sequence
+
+from flask import Response, request
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+ENCODER = "orjson" if orjson is not None and os.environ.get("JSON_ENCODER", "orjson") != "stdlib" else "stdlib"
+GZIP_MIN_BYTES = int(os.environ.get("JSON_GZIP_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.environ.get("JSON_GZIP_LEVEL", 6))
+
+# fragments are encoded as a marker string carrying a per-process random nonce, then swapped for their
+# bytes; user text cannot forge a marker without knowing the nonce
+_MARK = "\ue000" + secrets.token_hex(8) + ":"
+_MARK_RE = re.compile(b'"' + re.escape(_MARK.encode()) + rb'(\d+)"')
+
+# shloka fields in the /api/analyze-emotion card
+CARD_FIELDS = ("sanskrit", "translation", "chapter", "verse", "explanation", "practical_advice")
+
+
+class Fragment:
+    """A pre-encoded JSON value (UTF-8 bytes)."""
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    @classmethod
+    def of(cls, value: Any) -> "Fragment":
+        return cls(dumps(value))
+
+
+def _stdlib_dumps(value: Any, default=None) -> bytes:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+                      default=default).encode("utf-8")
+
+
+def _orjson_dumps(value: Any, default=None) -> bytes:
+    return orjson.dumps(value, default=default, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+
+
+ENCODERS = {"stdlib": _stdlib_dumps}
+if orjson is not None:
+    ENCODERS["orjson"] = _orjson_dumps
+
+
+def dumps(value: Any, encoder: Optional[str] = None) -> bytes:
+    """Encode `value` (with ENCODER unless one is named); Fragment instances anywhere inside are spliced in verbatim."""
+    fragments: List[bytes] = []
+
+    def default(obj):
+        if isinstance(obj, Fragment):
+            fragments.append(obj.data)
+            return f"{_MARK}{len(fragments) - 1}"
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    out = ENCODERS[encoder or ENCODER](value, default)
+    if fragments:
+        out = _MARK_RE.sub(lambda m: fragments[int(m.group(1))], out)
+    return out
+
+
+class ShlokaFragments:
+    """Per-verse pre-encoded fragments, indexed like ShlokaSelector.verses."""
+    __slots__ = ("cards", "full")
+
+    def __init__(self, verses: Sequence[Dict[str, Any]]):
+        self.cards = tuple(Fragment.of({k: v[k] for k in CARD_FIELDS}) for v in verses)
+        self.full = tuple(Fragment.of(v) for v in verses)
+
+    def stats(self) -> Dict[str, int]:
+        return {"verses": len(self.cards),
+                "bytes": sum(len(f.data) for group in (self.cards, self.full) for f in group)}
+
+
+def _accepts_gzip() -> bool:
+    return request.accept_encodings["gzip"] > 0
+
+
+def json_response(payload: Any, status: int = 200, compress: bool = False,
+                  min_bytes: Optional[int] = None) -> Response:
+    body = dumps(payload)
+    resp = Response(body, status=status, mimetype="application/json")
+    if compress:
+        resp.vary.add("Accept-Encoding")
+        if len(body) >= (GZIP_MIN_BYTES if min_bytes is None else min_bytes) and _accepts_gzip():
+            resp.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+            resp.headers["Content-Encoding"] = "gzip"
+    return resp
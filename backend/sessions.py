@@ -0,0 +1,278 @@
+"""
+sessions.py
+
+Server-side conversation state for /api/chat, keyed by conversation id:
+- Session: a rolling (exponentially weighted) emotion vector plus a
+  fixed-size ring buffer of recent turns (emotion, confidence, compound,
+  topics, served verse); recent topics and verses are read from the ring
+- each message folds into the session in O(emotions in the turn): earlier
+  turns are never re-analyzed, and the smoothed emotion is the vector's
+  argmax
+- a message without lexical evidence of its own - no emotion keyword hit,
+  or a lead over the runner-up emotion below `smooth_margin` - is answered
+  for the conversation's smoothed emotion (reply_emotion), so one vague
+  line does not swing the reply and verse away from the conversation's
+  mood. Such a turn also folds into the vector at `vague_weight` of its
+  confidence, so a run of vague lines moves the mood only slowly.
+  Confidence is not used to decide: it may be rescaled by calibration,
+  while a clear single-keyword message should always be answered as such
+- SessionStore keeps one compact JSON row per conversation in SQLite
+  (chat_sessions). A turn is read, folded and written back inside the
+  caller's write transaction, so every worker process sees the same
+  conversation and concurrent turns serialize on SQLite's write lock.
+  Rows are bounded by the ring size; the least recently updated
+  conversations are deleted past max_sessions. Counts, bytes and
+  evictions are reported by stats() (/api/admin/metrics).
+
+A client whose id is no longer known simply starts a new session under the
+same id.
+"""
+
+import json
+import os
+import re
+import time
+import secrets
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from metrics import Counters
+
+SCHEMA_VERSION = 1
+
+# client-supplied conversation ids: short, URL-safe
+_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def valid_id(conversation_id: Any) -> bool:
+    return isinstance(conversation_id, str) and bool(_ID_RE.match(conversation_id))
+
+
+def new_id() -> str:
+    return secrets.token_urlsafe(12)
+
+
+class Turn:
+    """One message as remembered by its session (the text itself is not kept)."""
+    __slots__ = ("emotion", "confidence", "compound", "topics", "verse")
+
+    def __init__(self, emotion: str, confidence: float, compound: float, topics: Tuple[str, ...] = (),
+                 verse: Optional[Tuple[Any, Any]] = None):
+        self.emotion = emotion
+        self.confidence = confidence
+        self.compound = compound
+        self.topics = topics
+        self.verse = verse
+
+    def to_list(self) -> list:
+        return [self.emotion, self.confidence, self.compound, list(self.topics),
+                list(self.verse) if self.verse is not None else None]
+
+    @classmethod
+    def from_list(cls, item: list) -> "Turn":
+        emotion, confidence, compound, topics, verse = item
+        return cls(emotion, confidence, compound, tuple(topics), tuple(verse) if verse is not None else None)
+
+
+class Session:
+    __slots__ = ("id", "weights", "turns", "ring", "created", "updated", "is_new")
+
+    def __init__(self, conversation_id: str, ring_size: int):
+        self.id = conversation_id
+        self.weights: Dict[str, float] = {}
+        self.turns = 0
+        self.ring: Deque[Turn] = deque(maxlen=ring_size)
+        self.created = self.updated = time.time()
+        self.is_new = True  # no stored row yet
+
+    def fold(self, emotion: str, confidence: float, top_emotions: Iterable[Tuple[str, float]], alpha: float):
+        """
+        Decay the vector and add the turn's emotion distribution: `top_emotions`
+        (emotion, score) normalised and scaled by confidence, or the detected
+        emotion alone.
+        """
+        dist = [(e, float(s)) for e, s in top_emotions if s > 0] or [(emotion, 1.0)]
+        total = sum(s for _, s in dist)
+        keep = 1.0 - alpha
+        w = self.weights
+        for e in w:
+            w[e] *= keep
+        for e, s in dist:
+            w[e] = w.get(e, 0.0) + alpha * float(confidence) * s / total
+        self.turns += 1
+        self.updated = time.time()
+
+    def smoothed_emotion(self) -> Optional[str]:
+        return max(self.weights.items(), key=lambda kv: kv[1])[0] if self.weights else None
+
+    def mood(self, n: int = 3) -> List[Dict[str, Any]]:
+        total = sum(self.weights.values()) or 1.0
+        top = sorted(self.weights.items(), key=lambda kv: -kv[1])[:n]
+        return [{"emotion": e, "weight": round(w / total, 3)} for e, w in top if w > 0]
+
+    def recent_topics(self) -> List[str]:
+        """Topics of the turns in the ring, most recent first, without repeats."""
+        seen: Dict[str, None] = {}
+        for turn in reversed(self.ring):
+            for topic in turn.topics:
+                seen.setdefault(topic)
+        return list(seen)
+
+    def recent_verses(self) -> List[Tuple[Any, Any]]:
+        return [turn.verse for turn in self.ring if turn.verse is not None]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "turns": self.turns,
+            "smoothed_emotion": self.smoothed_emotion(),
+            "mood": self.mood(),
+            "recent_topics": self.recent_topics(),
+        }
+
+    # -------- persistence --------
+    def to_json(self) -> str:
+        return json.dumps({
+            "v": SCHEMA_VERSION,
+            "weights": self.weights, "turns": self.turns,
+            "ring": [t.to_list() for t in self.ring],
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, conversation_id: str, raw: str, ring_size: int) -> "Session":
+        data = json.loads(raw)
+        if data.get("v") != SCHEMA_VERSION:
+            raise ValueError(f"unsupported session state version {data.get('v')!r}")
+        session = cls(conversation_id, ring_size)
+        session.weights = {e: float(w) for e, w in data["weights"].items()}
+        session.turns = int(data["turns"])
+        # a smaller SESSION_RING keeps the newest turns
+        session.ring.extend(Turn.from_list(t) for t in data["ring"])
+        session.is_new = False
+        return session
+
+
+class SessionStore:
+    """
+    Conversation id -> Session rows in SQLite. `alpha` is the EWMA weight of
+    the newest turn; `ring_size` turns are remembered per session. Every
+    method takes the caller's connection; open() / save() (or record())
+    must run inside one write transaction (BEGIN IMMEDIATE) that the caller
+    commits.
+    """
+
+    def __init__(self, max_sessions: int = 10000, ring_size: int = 8, alpha: float = 0.4,
+                 smooth_margin: float = 0.25, vague_weight: float = 0.25, metrics: Optional[Counters] = None):
+        self.max_sessions = max(1, int(max_sessions))
+        self.ring_size = max(1, int(ring_size))
+        self.alpha = min(1.0, max(0.0, float(alpha)))
+        self.smooth_margin = float(smooth_margin)
+        self.vague_weight = min(1.0, max(0.0, float(vague_weight)))
+        self.metrics = metrics if metrics is not None else Counters()
+
+    @classmethod
+    def from_env(cls, metrics: Optional[Counters] = None) -> "SessionStore":
+        return cls(
+            max_sessions=int(os.environ.get("SESSION_MAX", 10000)),
+            ring_size=int(os.environ.get("SESSION_RING", 8)),
+            alpha=float(os.environ.get("SESSION_ALPHA", 0.4)),
+            smooth_margin=float(os.environ.get("SESSION_SMOOTH_MARGIN", 0.25)),
+            vague_weight=float(os.environ.get("SESSION_VAGUE_WEIGHT", 0.25)),
+            metrics=metrics,
+        )
+
+    @staticmethod
+    def init_schema(conn):
+        conn.execute('''CREATE TABLE IF NOT EXISTS chat_sessions
+                        (id TEXT PRIMARY KEY,
+                         state TEXT NOT NULL,
+                         created_at REAL NOT NULL,
+                         updated_at REAL NOT NULL)''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated ON chat_sessions(updated_at)')
+
+    def load(self, conn, conversation_id: str) -> Optional[Session]:
+        """The stored session, or None (also for a row this version cannot read)."""
+        row = conn.execute("SELECT state, created_at, updated_at FROM chat_sessions WHERE id = ?",
+                           (conversation_id,)).fetchone()
+        if row is None:
+            return None
+        try:
+            session = Session.from_json(conversation_id, row[0], self.ring_size)
+        except (ValueError, KeyError, TypeError):
+            return None  # save() overwrites it with a fresh session
+        session.created, session.updated = row[1], row[2]
+        return session
+
+    def open(self, conn, conversation_id: str) -> Session:
+        """The stored session, or a new one (written by save())."""
+        return self.load(conn, conversation_id) or Session(conversation_id, self.ring_size)
+
+    def vague(self, margin: Optional[float]) -> bool:
+        """No keyword hit (margin None) or too small a lead over the runner-up emotion."""
+        return margin is None or margin < self.smooth_margin
+
+    def reply_emotion(self, session: Session, emotion: str, margin: Optional[float]) -> str:
+        """
+        The detected emotion, or the session's smoothed one when the message
+        alone is unsure. `margin` is the analysis' details.lexical_margin
+        (None: no keyword hit, the emotion came from sentiment alone). Call it
+        before save(): the mood is the conversation's before this message.
+        """
+        if not self.vague(margin):
+            return emotion
+        smoothed = session.smoothed_emotion()
+        if smoothed is None or smoothed == emotion:
+            return emotion
+        self.metrics.incr("sessions.smoothed")
+        return smoothed
+
+    def save(self, conn, session: Session, emotion: str, confidence: float, compound: float,
+             top_emotions: Iterable[Tuple[str, float]] = (), topics: Iterable[str] = (),
+             verse: Optional[Tuple[Any, Any]] = None, margin: Optional[float] = 1.0) -> Dict[str, Any]:
+        """
+        Fold the turn into the vector (a vague one, see reply_emotion, at
+        vague_weight) and the ring, write the session back and return its summary.
+        """
+        weight = float(confidence) * (self.vague_weight if self.vague(margin) else 1.0)
+        session.fold(emotion, weight, top_emotions, self.alpha)
+        session.ring.append(Turn(emotion, float(confidence), float(compound), tuple(topics), verse))
+        conn.execute('''INSERT INTO chat_sessions (id, state, created_at, updated_at) VALUES (?, ?, ?, ?)
+                        ON CONFLICT(id) DO UPDATE SET state=excluded.state, updated_at=excluded.updated_at''',
+                     (session.id, session.to_json(), session.created, session.updated))
+        if session.is_new:
+            session.is_new = False
+            self.metrics.incr("sessions.created")
+            self._evict(conn, keep=session.id)
+        return session.summary()
+
+    def record(self, conn, conversation_id: str, emotion: str, confidence: float, compound: float,
+               top_emotions: Iterable[Tuple[str, float]] = (), topics: Iterable[str] = (),
+               verse: Optional[Tuple[Any, Any]] = None, margin: Optional[float] = 1.0) -> Dict[str, Any]:
+        """open() + save() for a turn whose reply does not depend on the session."""
+        return self.save(conn, self.open(conn, conversation_id), emotion, confidence, compound,
+                         top_emotions, topics, verse, margin)
+
+    def _evict(self, conn, keep: str):
+        # only new sessions grow the table, so the count runs once per conversation, not per turn
+        over = conn.execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0] - self.max_sessions
+        if over > 0:
+            evicted = conn.execute('''DELETE FROM chat_sessions WHERE id IN
+                                      (SELECT id FROM chat_sessions WHERE id != ? ORDER BY updated_at LIMIT ?)''',
+                                   (keep, over)).rowcount
+            self.metrics.incr("sessions.evicted", evicted)
+
+    def drop(self, conn, conversation_id: str) -> bool:
+        return conn.execute("DELETE FROM chat_sessions WHERE id = ?", (conversation_id,)).rowcount > 0
+
+    def stats(self, conn) -> Dict[str, Any]:
+        n, nbytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(state)), 0) FROM chat_sessions").fetchone()
+        return {
+            "sessions": n,
+            "bytes": nbytes,
+            "avg_bytes": round(nbytes / n) if n else 0,
+            "max_sessions": self.max_sessions,
+            "ring_size": self.ring_size,
+            "alpha": self.alpha,
+            "smooth_margin": self.smooth_margin,
+            "vague_weight": self.vague_weight,
+        }
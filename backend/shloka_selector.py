@@ -0,0 +1,222 @@
+"""
+shloka_selector.py
+
+Precomputed shloka selection, built once per data snapshot:
+- emotion names and aliases ("angry", "Self-Realization", ...) resolve to one
+  canonical id; unknown emotions resolve to the fallback bucket
+- each emotion gets a fixed rotation schedule (smooth weighted round robin over
+  an optional per-shloka "weight", default 1); a user walks their own cursor
+  through it, starting at a per-user offset, so consecutive picks for the same
+  user and emotion do not repeat until the bucket is exhausted
+- preview strings are cut once at load; pick()/preview() choose by a stable
+  key (e.g. a row id) so history pages render the same verse every time
+
+Nothing here calls the random module. Rotation cursors live in a RotationState
+that outlives snapshots, so a data reload does not restart everyone's rotation;
+StoredRotationState keeps them in SQLite instead, so every worker process
+advances the same cursors.
+"""
+
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# surface forms the analyzers / clients use for the shloka buckets
+DEFAULT_ALIASES: Dict[str, str] = {
+    "happy": "joy", "happiness": "joy", "joyful": "joy",
+    "sad": "sadness", "sorrow": "sadness", "grief": "sadness",
+    "anxious": "anxiety", "worry": "anxiety", "worried": "anxiety", "stress": "anxiety",
+    "angry": "anger", "rage": "anger",
+    "afraid": "fear", "scared": "fear",
+    "confused": "confusion",
+    "grateful": "gratitude", "thankful": "gratitude",
+    "hopeful": "hope",
+    "loving": "love",
+}
+
+
+def canonical_key(name: str) -> str:
+    return name.strip().lower().replace("-", "_").replace(" ", "_")
+
+
+def _stable_hash(value: str) -> int:
+    # builtin hash() is salted per process; offsets must agree across workers and restarts
+    return zlib.crc32(value.encode("utf-8"))
+
+
+def _weighted_schedule(indices: List[int], weights: List[int]) -> Tuple[int, ...]:
+    """Smooth weighted round robin: each index appears `weight` times, spread out."""
+    total = sum(weights)
+    if total == len(weights):
+        return tuple(indices)
+    current = [0] * len(indices)
+    out = []
+    for _ in range(total):
+        best = 0
+        for i, w in enumerate(weights):
+            current[i] += w
+            if current[i] > current[best]:
+                best = i
+        current[best] -= total
+        out.append(indices[best])
+    return tuple(out)
+
+
+class RotationState:
+    """Per-(user, emotion) rotation cursors; least recently used users are dropped past `max_entries`."""
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max(1, int(max_entries))
+        self._cursors: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def advance(self, user: str, emotion: str, step: int = 1, conn=None) -> int:
+        """Return the cursor for (user, emotion) and move it forward by `step` (`conn` is unused here)."""
+        key = (user, emotion)
+        with self._lock:
+            cursor = self._cursors.pop(key, 0)
+            self._cursors[key] = cursor + step
+            if len(self._cursors) > self.max_entries:
+                self._cursors.popitem(last=False)
+        return cursor
+
+    def __len__(self) -> int:
+        return len(self._cursors)
+
+
+class StoredRotationState(RotationState):
+    """
+    Rotation cursors as rows of shloka_rotations. One upsert both reads and
+    moves a cursor, so concurrent workers never hand out the same position.
+    advance() runs on the caller's connection when given one (inside its
+    transaction, committed by the caller), else on its own short connection.
+    """
+
+    def __init__(self, connect: Callable[[], Any]):
+        super().__init__()
+        self.connect = connect
+
+    @staticmethod
+    def init_schema(conn):
+        conn.execute('''CREATE TABLE IF NOT EXISTS shloka_rotations
+                        (user_id TEXT NOT NULL,
+                         emotion TEXT NOT NULL,
+                         cursor INTEGER NOT NULL,
+                         PRIMARY KEY (user_id, emotion))''')
+
+    def advance(self, user: str, emotion: str, step: int = 1, conn=None) -> int:
+        own = conn is None
+        if own:
+            conn = self.connect()
+        try:
+            cursor = conn.execute('''INSERT INTO shloka_rotations (user_id, emotion, cursor) VALUES (?, ?, ?)
+                                     ON CONFLICT(user_id, emotion) DO UPDATE SET cursor = cursor + excluded.cursor
+                                     RETURNING cursor''', (user, emotion, step)).fetchone()[0]
+            if own:
+                conn.commit()
+        finally:
+            if own:
+                conn.close()
+        return cursor - step
+
+    def __len__(self) -> int:
+        conn = self.connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM shloka_rotations").fetchone()[0]
+        finally:
+            conn.close()
+
+
+class ShlokaSelector:
+    __slots__ = ("emotions", "ids", "fallback_id", "verses", "previews", "schedules", "state")
+
+    def __init__(self, shlokas: Dict[str, List[Dict[str, Any]]], aliases: Optional[Dict[str, str]] = None,
+                 fallback: str = "confusion", preview_chars: int = 120, state: Optional[RotationState] = None):
+        if fallback not in shlokas or not shlokas[fallback]:
+            raise ValueError(f"shloka data needs a non-empty {fallback!r} entry (the fallback emotion)")
+        self.emotions: Tuple[str, ...] = tuple(shlokas)
+        self.ids: Dict[str, int] = {}
+        for eid, name in enumerate(self.emotions):
+            self.ids[name] = eid
+            self.ids.setdefault(canonical_key(name), eid)
+        for alias, target in {**DEFAULT_ALIASES, **(aliases or {})}.items():
+            if target in self.ids:
+                self.ids.setdefault(canonical_key(alias), self.ids[target])
+        self.fallback_id = self.ids[fallback]
+
+        verses: List[Dict[str, Any]] = []
+        schedules: List[Tuple[int, ...]] = []
+        for name in self.emotions:
+            start = len(verses)
+            verses.extend(shlokas[name])
+            indices = list(range(start, len(verses)))
+            weights = [max(1, int(s.get("weight", 1))) for s in shlokas[name]]
+            schedules.append(_weighted_schedule(indices, weights))
+        # empty buckets behave like unknown emotions
+        fallback_schedule = schedules[self.fallback_id]
+        self.schedules = tuple(s or fallback_schedule for s in schedules)
+        self.verses = tuple(verses)
+        self.previews = tuple(s["translation"][:preview_chars] + "..." for s in verses)
+        self.state = state if state is not None else RotationState()
+
+    def emotion_id(self, emotion: str) -> int:
+        eid = self.ids.get(emotion)
+        if eid is None:
+            eid = self.ids.get(canonical_key(emotion), self.fallback_id)
+        return eid
+
+    def canonical(self, emotion: str) -> str:
+        return self.emotions[self.emotion_id(emotion)]
+
+    def pool(self, emotion: str) -> List[Dict[str, Any]]:
+        """Distinct shlokas for `emotion` (after alias / fallback resolution)."""
+        return [self.verses[i] for i in dict.fromkeys(self.schedules[self.emotion_id(emotion)])]
+
+    def _slot(self, eid: int, user: str, step: int, conn=None) -> Tuple[Tuple[int, ...], int]:
+        schedule = self.schedules[eid]
+        cursor = self.state.advance(user, self.emotions[eid], step, conn)
+        return schedule, (_stable_hash(user) + cursor) % len(schedule)
+
+    # `conn`: the caller's open transaction, for a stored rotation state (see StoredRotationState)
+    def next_index(self, emotion: str, user: str = "default", conn=None) -> int:
+        """Index into `verses` of the user's next shloka for `emotion` in rotation order."""
+        schedule, pos = self._slot(self.emotion_id(emotion), user, 1, conn)
+        return schedule[pos]
+
+    def next(self, emotion: str, user: str = "default", conn=None) -> Dict[str, Any]:
+        """The user's next shloka for `emotion` in rotation order."""
+        return self.verses[self.next_index(emotion, user, conn)]
+
+    def next_many(self, emotion: str, count: int, user: str = "default", conn=None) -> List[Dict[str, Any]]:
+        """Up to `count` distinct shlokas, continuing the user's rotation."""
+        eid = self.emotion_id(emotion)
+        distinct = len(set(self.schedules[eid]))
+        count = min(max(0, count), distinct)
+        schedule, pos = self._slot(eid, user, count, conn)
+        out: Dict[int, None] = {}
+        n = len(schedule)
+        while len(out) < count:
+            out.setdefault(schedule[pos % n])
+            pos += 1
+        return [self.verses[i] for i in out]
+
+    def index_for(self, emotion: str, key: int) -> int:
+        """Index into `verses` of the deterministic choice for a stable key."""
+        schedule = self.schedules[self.emotion_id(emotion)]
+        return schedule[key % len(schedule)]
+
+    def pick(self, emotion: str, key: int) -> Dict[str, Any]:
+        """Deterministic choice by a stable key; does not advance any rotation."""
+        return self.verses[self.index_for(emotion, key)]
+
+    def preview(self, emotion: str, key: int) -> str:
+        return self.previews[self.index_for(emotion, key)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "emotions": len(self.emotions),
+            "aliases": len(self.ids) - len(self.emotions),
+            "shlokas": len(self.verses),
+            "rotation_cursors": len(self.state),
+        }
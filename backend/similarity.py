@@ -0,0 +1,372 @@
+"""
+similarity.py
+
+"Similar moments": a per-user TF-IDF index over user_emotions.input_text.
+- terms: the words text_pipeline.py tokenizes ([\\w']+ runs of the lowercased
+  text, typographic apostrophes folded) without stopwords, digits and
+  one-letter tokens; tf weight 1 + ln(tf), idf ln((N + 1) / (df + 1)) + 1
+- inverted index: for each term, the positions of the entries containing it
+  and their tf weights (array('I') / array('f'), 8 bytes per posting). A
+  query's cosine scores are a sparse dot product over its own terms'
+  postings only: one np.bincount per term when NumPy is installed, a dict
+  accumulation otherwise; top-k by argpartition / heapq
+- entry norms include idf, which drifts as entries are added; they are
+  recomputed once the entry count has grown by `renorm_growth` (amortized
+  O(1) per entry)
+- incremental: the database is the source of truth. Each query first indexes
+  rows with id > last_id (one indexed range read when nothing is new), so
+  saving an analysis never touches the index and every worker catches up on
+  its own
+- persisted: one checkpoint file per user under `directory`, written
+  atomically every `save_every` new entries; a restarted worker loads it and
+  indexes only the newer rows (a checkpoint that does not match the database
+  or was written for another user is discarded)
+- entries deleted by retention are dropped from results once the caller
+  reports them missing (forget()); when they make up `max_dead` of the
+  index it is rebuilt. Texts truncated by retention keep their full terms
+
+Only "default" has rows (user_emotions is not attributed to other users),
+as in trends.py and recommender.py.
+"""
+
+import os
+import re
+import io
+import json
+import hashlib
+import math
+import heapq
+import struct
+import sqlite3
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional: dict accumulation is used without it
+    np = None
+
+import storage
+
+FORMAT_VERSION = 1
+_MAGIC = b"SIMIDX\x00\x01"
+_SYNC_CHUNK = 2000
+# AnalysisDocument's word runs; one findall, since offsets / boundaries are not needed here
+_WORD_RE = re.compile(r"[\w']+")
+
+_STOPWORDS = frozenset("""
+a about above after again against all also am an and any are aren't as at be because been before being below between
+both but by can can't cannot could couldn't did didn't do does doesn't doing don't down during each even every few for
+from further get got had hadn't has hasn't have haven't having he he'd he'll he's her here here's hers herself him
+himself his how how's i i'd i'll i'm i've if in into is isn't it it's its itself just let's like me more most much
+mustn't my myself no nor not now of off on once only or other ought our ours ourselves out over own really same shan't
+she she'd she'll she's should shouldn't so some still such than that that's the their theirs them themselves then
+there there's these they they'd they'll they're they've this those through to too under until up very was wasn't we
+we'd we'll we're we've were weren't what what's when when's where where's which while who who's whom why why's will
+with won't would wouldn't you you'd you'll you're you've your yours yourself yourselves
+""".split())
+
+
+def terms(text: str) -> Dict[str, int]:
+    """term -> count for one entry or query."""
+    counts: Dict[str, int] = {}
+    for w in _WORD_RE.findall(text.lower().replace("’", "'")):
+        if w in _STOPWORDS:
+            continue
+        w = w.strip("'_")
+        if len(w) > 1 and not w.isdigit() and w not in _STOPWORDS:
+            counts[w] = counts.get(w, 0) + 1
+    return counts
+
+
+def _idf(df: int, n: int) -> float:
+    return math.log((n + 1) / (df + 1)) + 1.0
+
+
+class UserIndex:
+    """Inverted TF-IDF index over one user's entries, in row id order (positions are dense)."""
+
+    def __init__(self, user: str):
+        self.user = user
+        self.last_id = 0
+        self.last_ts = 0  # ts_us of row last_id: a checkpoint is only reused if the database still has it
+        self.rows = array("q")  # position -> row id (ascending)
+        self.norms = array("d")  # position -> |entry| with idf as of its insertion / the last renormalize()
+        self.term_ids: Dict[str, int] = {}
+        self.positions: List[array] = []  # term id -> array("I") of positions
+        self.weights: List[array] = []  # term id -> array("f") of tf weights
+        self.norm_docs = 0
+        self.dead: Set[int] = set()  # positions whose rows are gone
+        self.dirty = 0  # entries added since the last checkpoint
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add(self, row_id: int, ts_us: int, text: Optional[str]):
+        pos = len(self.rows)
+        n = pos + 1
+        sq = 0.0
+        for term, tf in terms(text or "").items():
+            tid = self.term_ids.get(term)
+            if tid is None:
+                tid = self.term_ids[term] = len(self.positions)
+                self.positions.append(array("I"))
+                self.weights.append(array("f"))
+            w = 1.0 + math.log(tf)
+            self.positions[tid].append(pos)
+            self.weights[tid].append(w)
+            idf = _idf(len(self.positions[tid]), n)
+            sq += (w * idf) ** 2
+        self.rows.append(row_id)
+        self.norms.append(math.sqrt(sq))
+        self.last_id, self.last_ts = row_id, ts_us
+        self.dirty += 1
+
+    def renormalize(self):
+        """Recompute every entry norm with the current idf."""
+        n = len(self.rows)
+        if np is not None and n:
+            sq = np.zeros(n)
+            for pos, wts in zip(self.positions, self.weights):
+                idf = _idf(len(pos), n)
+                w = np.frombuffer(wts, dtype=np.float32).astype(np.float64) * idf
+                sq += np.bincount(np.frombuffer(pos, dtype=np.uint32), weights=w * w, minlength=n)
+            self.norms = array("d", np.sqrt(sq).tobytes())
+        else:
+            acc = [0.0] * n
+            for pos, wts in zip(self.positions, self.weights):
+                idf2 = _idf(len(pos), n) ** 2
+                for p, w in zip(pos, wts):
+                    acc[p] += w * w * idf2
+            self.norms = array("d", map(math.sqrt, acc))
+        self.norm_docs = n
+
+    def position(self, row_id: int) -> Optional[int]:
+        p = bisect_left(self.rows, row_id)
+        return p if p < len(self.rows) and self.rows[p] == row_id else None
+
+    def search(self, text: str, k: int, exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """(row id, cosine similarity) best first; entries sharing no term with `text` are not returned."""
+        n = len(self.rows)
+        if not n or k <= 0:
+            return []
+        query: List[Tuple[int, float]] = []
+        q_sq = 0.0
+        for term, tf in terms(text).items():
+            tid = self.term_ids.get(term)
+            idf = _idf(len(self.positions[tid]) if tid is not None else 0, n)
+            w = (1.0 + math.log(tf)) * idf
+            q_sq += w * w  # unknown terms still count towards the query's norm
+            if tid is not None:
+                query.append((tid, w * idf))  # entry weight is tf weight x idf
+        if not query:
+            return []
+        q_norm = math.sqrt(q_sq)
+        skip = set(self.dead)
+        for row_id in exclude:
+            p = self.position(row_id)
+            if p is not None:
+                skip.add(p)
+
+        if np is not None:
+            scores = np.zeros(n)
+            for tid, qw in query:
+                scores += np.bincount(np.frombuffer(self.positions[tid], dtype=np.uint32),
+                                      weights=np.frombuffer(self.weights[tid], dtype=np.float32) * qw, minlength=n)
+            if skip:
+                scores[list(skip)] = 0.0
+            norms = np.frombuffer(self.norms, dtype=np.float64)
+            hit = np.flatnonzero(scores)
+            if not hit.size:
+                return []
+            sims = scores[hit] / (norms[hit] * q_norm)
+            top = min(k, hit.size)
+            best = np.argpartition(-sims, top - 1)[:top]
+            best = best[np.argsort(-sims[best], kind="stable")]
+            return [(self.rows[int(hit[i])], float(sims[i])) for i in best]
+
+        acc: Dict[int, float] = {}
+        get = acc.get
+        for tid, qw in query:
+            for p, w in zip(self.positions[tid], self.weights[tid]):
+                acc[p] = get(p, 0.0) + qw * w
+        for p in skip:
+            acc.pop(p, None)
+        norms = self.norms
+        best = heapq.nlargest(k, ((s / (norms[p] * q_norm), p) for p, s in acc.items()))
+        return [(self.rows[p], sim) for sim, p in best]
+
+    def postings(self) -> int:
+        return sum(len(p) for p in self.positions)
+
+    # -------- checkpoint --------
+    def dump(self, f: io.BufferedIOBase):
+        terms_by_id = [""] * len(self.term_ids)
+        for term, tid in self.term_ids.items():
+            terms_by_id[tid] = term
+        header = json.dumps({
+            "format": FORMAT_VERSION, "user": self.user, "last_id": self.last_id, "last_ts": self.last_ts,
+            "entries": len(self.rows), "norm_docs": self.norm_docs, "terms": terms_by_id,
+            "lengths": [len(p) for p in self.positions], "dead": sorted(self.dead),
+        }, separators=(",", ":")).encode("utf-8")
+        f.write(_MAGIC + struct.pack("<I", len(header)) + header)
+        f.write(self.rows.tobytes())
+        f.write(self.norms.tobytes())
+        for pos, wts in zip(self.positions, self.weights):
+            f.write(pos.tobytes())
+            f.write(wts.tobytes())
+
+    @classmethod
+    def load(cls, f: io.BufferedIOBase) -> "UserIndex":
+        if f.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError("not a similarity index checkpoint")
+        header = json.loads(f.read(struct.unpack("<I", f.read(4))[0]))
+        if header.get("format") != FORMAT_VERSION:
+            raise ValueError(f"unsupported checkpoint format {header.get('format')}")
+
+        def read(code: str, count: int) -> array:
+            out = array(code)
+            out.frombytes(f.read(out.itemsize * count))
+            if len(out) != count:
+                raise ValueError("truncated checkpoint")
+            return out
+
+        index = cls(header["user"])
+        index.last_id, index.last_ts = header["last_id"], header["last_ts"]
+        index.rows = read("q", header["entries"])
+        index.norms = read("d", header["entries"])
+        index.norm_docs = header["norm_docs"]
+        index.dead = set(header["dead"])
+        for tid, (term, length) in enumerate(zip(header["terms"], header["lengths"])):
+            index.term_ids[term] = tid
+            index.positions.append(read("I", length))
+            index.weights.append(read("f", length))
+        return index
+
+
+class SimilarMoments:
+    """
+    UserIndex per user (at most `max_users` in memory, least recently used
+    evicted), kept in step with user_emotions and checkpointed to `directory`
+    (None: memory only).
+    """
+
+    def __init__(self, directory: Optional[str] = "similarity_index", save_every: int = 200,
+                 renorm_growth: float = 1.1, max_dead: float = 0.2, max_users: int = 100):
+        self.directory = directory
+        self.save_every = max(1, int(save_every))
+        self.renorm_growth = max(1.0, float(renorm_growth))
+        self.max_dead = max_dead
+        self.max_users = max(1, int(max_users))
+        self._indexes: "OrderedDict[str, UserIndex]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.queries = 0
+        self.rebuilds = 0
+        self.checkpoints = 0
+
+    @classmethod
+    def from_env(cls) -> "SimilarMoments":
+        return cls(
+            directory=os.environ.get('SIMILARITY_DIR', 'similarity_index') or None,
+            save_every=int(os.environ.get('SIMILARITY_SAVE_EVERY', 200)),
+            renorm_growth=float(os.environ.get('SIMILARITY_RENORM_GROWTH', 1.1)),
+            max_users=int(os.environ.get('SIMILARITY_MAX_USERS', 100)),
+        )
+
+    def _path(self, user: str) -> str:
+        name = re.sub(r"[^A-Za-z0-9_-]", "_", user)
+        if name != user:
+            # "a.b" and "a_b" would otherwise share a file
+            name += "-" + hashlib.sha1(user.encode("utf-8")).hexdigest()[:10]
+        return os.path.join(self.directory, name + ".idx")
+
+    def _load(self, conn: sqlite3.Connection, user: str) -> UserIndex:
+        if self.directory:
+            try:
+                with open(self._path(user), "rb") as f:
+                    index = UserIndex.load(f)
+                if index.user != user:
+                    raise ValueError(f"checkpoint belongs to {index.user!r}")
+                row = conn.execute('SELECT ts_us FROM user_emotions WHERE id = ?', (index.last_id,)).fetchone()
+                if index.last_id == 0 or (row is not None and row[0] == index.last_ts):
+                    return index
+            except (OSError, ValueError, KeyError, struct.error):
+                pass  # missing or unusable: rebuilt from the database
+        return UserIndex(user)
+
+    def save(self, index: UserIndex):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(index.user)
+        # atomic replace: a crash leaves the previous checkpoint; each worker writes its own temp file
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            index.dump(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        index.dirty = 0
+        self.checkpoints += 1
+
+    def _index(self, conn: sqlite3.Connection, user: str) -> UserIndex:
+        index = self._indexes.get(user)
+        if index is None:
+            index = self._indexes[user] = self._load(conn, user)
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+        self._indexes.move_to_end(user)
+        return index
+
+    def sync(self, conn: sqlite3.Connection, user: str = "default") -> UserIndex:
+        """Index the user's rows added since the last sync; returns the index."""
+        with self._lock:
+            index = self._index(conn, user)
+            if user != "default":
+                return index  # user_emotions rows are not attributed to other users
+            if index.dead and len(index.dead) > self.max_dead * len(index):
+                index = self._indexes[user] = UserIndex(user)
+                self.rebuilds += 1
+            added = 0
+            while True:
+                rows = storage.select_rows(conn, "e.id > ?", (index.last_id,), limit=_SYNC_CHUNK)
+                for row_id, _emotion, _conf, text, _sent, _comp, ts_us in rows:
+                    index.add(row_id, ts_us, text)
+                added += len(rows)
+                if len(rows) < _SYNC_CHUNK:
+                    break
+            if added and len(index) >= index.norm_docs * self.renorm_growth:
+                index.renormalize()
+            if index.dirty >= self.save_every:
+                self.save(index)
+            return index
+
+    def search(self, conn: sqlite3.Connection, text: str, k: int = 5, user: str = "default",
+               exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """(row id, cosine similarity) of the user's entries most similar to `text`, best first."""
+        with self._lock:
+            index = self.sync(conn, user)
+            self.queries += 1
+            return index.search(text, k, exclude)
+
+    def forget(self, row_ids: Sequence[int], user: str = "default"):
+        """Drop entries whose rows no longer exist (e.g. rolled up by retention) from future results."""
+        with self._lock:
+            index = self._indexes.get(user)
+            if index is None:
+                return
+            for row_id in row_ids:
+                p = index.position(row_id)
+                if p is not None:
+                    index.dead.add(p)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            users = {user: {"entries": len(ix), "terms": len(ix.term_ids), "postings": ix.postings(),
+                            "dead": len(ix.dead), "last_id": ix.last_id, "unsaved": ix.dirty}
+                     for user, ix in self._indexes.items()}
+        return {"users": users, "queries": self.queries, "rebuilds": self.rebuilds, "checkpoints": self.checkpoints,
+                "directory": self.directory, "numpy": np is not None}
@@ -0,0 +1,465 @@
+"""
+storage.py
+
+Compact storage for user_emotions (schema v2, PRAGMA user_version = 2):
+- emotion / sentiment labels are small integers backed by lookup tables
+  (emotion_labels, sentiment_labels); each process caches them per database
+- timestamps are INTEGER microseconds since 1970-01-01 on the naive local
+  clock the app writes (the encoding emotion_export uses), so reads parse
+  no dates and horizon checks compare integers
+- input_text lives in message_texts, addressed by a BLAKE2b digest of its
+  UTF-8 bytes: a repeated message is stored once. Bodies of at least
+  COMPRESS_MIN_BYTES are zlib-compressed when that makes them smaller
+  (STORAGE_COMPRESS=0 stores plain UTF-8; readers handle both)
+- replace_text() / delete_rows() (used by retention) release texts no row
+  points to any more
+- timestamps missing from v1 rows are stored as 0
+- migrate(): converts a v1 database (TEXT labels, DATETIME timestamps,
+  inline input_text) in place, in batches. The v1 table is renamed to
+  user_emotions_v1 and drained into the v2 table one short transaction at a
+  time (ids are kept), so an interrupted migration resumes where it stopped
+  and concurrent callers share the work
+
+Usage (CLI):
+    python storage.py migrate --db user_data.db
+    python storage.py migrate --db user_data.db --batch-size 2000 --no-compress --vacuum
+    python storage.py info --db user_data.db
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+SCHEMA_VERSION = 2
+CODEC_UTF8, CODEC_ZLIB = 0, 1
+COMPRESS = os.environ.get("STORAGE_COMPRESS", "1") == "1"
+COMPRESS_MIN_BYTES = int(os.environ.get("STORAGE_COMPRESS_MIN_BYTES", 64))
+# a v1 database found by ensure_schema() is migrated on the spot unless this is 0
+AUTO_MIGRATE = os.environ.get("STORAGE_AUTO_MIGRATE", "1") == "1"
+
+US_PER_DAY = 86_400_000_000
+
+_EPOCH = datetime(1970, 1, 1)
+_LABEL_TABLES = {"emotion": "emotion_labels", "sentiment": "sentiment_labels"}
+
+# (id, emotion, confidence, input_text, sentiment, compound, ts_us): the decoded row shape
+Row = Tuple[int, Optional[str], Optional[float], Optional[str], Optional[str], Optional[float], int]
+
+
+# ------------------------------------
+# Timestamps
+# ------------------------------------
+def to_us(ts: Any) -> int:
+    """datetime (or its ISO text) -> microseconds since 1970-01-01 on the same naive clock; None -> 0."""
+    if ts is None:
+        return 0
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    return (ts - _EPOCH) // timedelta(microseconds=1)
+
+
+def from_us(us: int) -> datetime:
+    return _EPOCH + timedelta(0, 0, us)  # positional: measurably cheaper than microseconds=us
+
+
+def format_ts(us: int) -> str:
+    """The text form v1 rows stored ('YYYY-MM-DD HH:MM:SS[.ffffff]'); API responses keep it."""
+    return str(from_us(us))
+
+
+# ------------------------------------
+# Schema
+# ------------------------------------
+def create_schema(conn: sqlite3.Connection):
+    conn.execute('''CREATE TABLE IF NOT EXISTS emotion_labels
+                    (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS sentiment_labels
+                    (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS message_texts
+                    (id INTEGER PRIMARY KEY,
+                     digest BLOB NOT NULL UNIQUE,
+                     codec INTEGER NOT NULL,
+                     chars INTEGER NOT NULL,
+                     body BLOB NOT NULL)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS user_emotions
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     emotion_id INTEGER,
+                     sentiment_id INTEGER,
+                     confidence REAL,
+                     compound REAL,
+                     ts_us INTEGER NOT NULL,
+                     text_id INTEGER)''')
+    # horizon scans, the 30-day window and the journey's ORDER BY ts_us use the first; text GC the second
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_emotions_ts ON user_emotions(ts_us)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_emotions_text ON user_emotions(text_id)')
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    """2 once migrated, 1 for a v1 table (also mid-migration), 0 for a database without user_emotions."""
+    if conn.execute("SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = 'user_emotions_v1'"
+                    ).fetchone()[0]:
+        return 1
+    columns = _columns(conn, "user_emotions")
+    if not columns:
+        return 0
+    return 1 if "timestamp" in columns else SCHEMA_VERSION
+
+
+def ensure_schema(conn: sqlite3.Connection):
+    """Create the v2 tables; a v1 database is migrated first (or rejected when STORAGE_AUTO_MIGRATE=0)."""
+    version = schema_version(conn)
+    if version == 1:
+        if not AUTO_MIGRATE:
+            raise RuntimeError("user_emotions uses storage schema v1; run `python storage.py migrate --db <path>`")
+        conn.commit()
+        migrate(conn)
+    create_schema(conn)
+    conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+
+# ------------------------------------
+# Labels
+# ------------------------------------
+class Labels:
+    """
+    name <-> id for one database's label tables. A label added inside a
+    transaction that is then rolled back leaves a stale entry, so writers
+    call clear() before ROLLBACK (while they still hold the write lock).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def id(self, conn: sqlite3.Connection, kind: str, name: Optional[str]) -> Optional[int]:
+        """The label's id, added to the table on first use (the caller commits)."""
+        if name is None:
+            return None
+        label_id = self.ids[kind].get(name)
+        if label_id is None:
+            table = _LABEL_TABLES[kind]
+            conn.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (name,))
+            label_id = conn.execute(f"SELECT id FROM {table} WHERE name = ?", (name,)).fetchone()[0]
+            with self._lock:
+                self.ids[kind][name] = label_id
+                self.names[kind][label_id] = name
+        return label_id
+
+    def reload(self, conn: sqlite3.Connection):
+        """Pick up labels added by other processes (the tables are small)."""
+        for kind, table in _LABEL_TABLES.items():
+            rows = conn.execute(f"SELECT id, name FROM {table}").fetchall()
+            with self._lock:
+                for i, n in rows:
+                    self.names[kind][i] = n
+                    self.ids[kind][n] = i
+
+    def clear(self):
+        with self._lock:
+            self.ids: Dict[str, Dict[str, int]] = {kind: {} for kind in _LABEL_TABLES}
+            # None -> None lets readers index the dict directly for NULL label ids
+            self.names: Dict[str, Dict[Optional[int], Optional[str]]] = {kind: {None: None} for kind in _LABEL_TABLES}
+
+
+_LABELS: Dict[Tuple[str, int, int], Labels] = {}
+_LABELS_LOCK = threading.Lock()
+
+
+def labels(conn: sqlite3.Connection) -> Labels:
+    """The label cache for the connection's database file (keyed by path and inode, so a replaced file starts fresh)."""
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    if not path:
+        return Labels()  # in-memory / temporary database: nothing to share
+    st = os.stat(path)
+    key = (path, st.st_dev, st.st_ino)
+    cache = _LABELS.get(key)
+    if cache is None:
+        with _LABELS_LOCK:
+            cache = _LABELS.setdefault(key, Labels())
+    return cache
+
+
+# ------------------------------------
+# Texts
+# ------------------------------------
+def encode_text(text: str, compress: Optional[bool] = None) -> Tuple[bytes, int, bytes]:
+    """(digest, codec, body) for a message."""
+    raw = text.encode("utf-8")
+    digest = hashlib.blake2b(raw, digest_size=16).digest()
+    if (COMPRESS if compress is None else compress) and len(raw) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(raw, 6)
+        if len(packed) < len(raw):
+            return digest, CODEC_ZLIB, packed
+    return digest, CODEC_UTF8, raw
+
+
+def decode_text(codec: Optional[int], body: Optional[bytes]) -> Optional[str]:
+    if body is None:
+        return None
+    if codec == CODEC_ZLIB:
+        body = zlib.decompress(body)
+    return bytes(body).decode("utf-8")
+
+
+def put_text(conn: sqlite3.Connection, text: Optional[str], compress: Optional[bool] = None) -> Optional[int]:
+    """Id of the stored text, inserting it unless an identical one exists (call inside a write transaction)."""
+    if text is None:
+        return None
+    digest, codec, body = encode_text(text, compress)
+    row = conn.execute("SELECT id FROM message_texts WHERE digest = ?", (digest,)).fetchone()
+    if row is not None:
+        return row[0]
+    return conn.execute("INSERT INTO message_texts (digest, codec, chars, body) VALUES (?, ?, ?, ?)",
+                        (digest, codec, len(text), body)).lastrowid
+
+
+def release_texts(conn: sqlite3.Connection, text_ids: Iterable[Optional[int]]) -> int:
+    """Delete those of `text_ids` that no row references any more; returns how many went."""
+    freed = 0
+    for text_id in set(text_ids):
+        if text_id is not None:
+            freed += conn.execute(
+                '''DELETE FROM message_texts WHERE id = ?
+                   AND NOT EXISTS (SELECT 1 FROM user_emotions WHERE text_id = ?)''', (text_id, text_id)).rowcount
+    return freed
+
+
+# ------------------------------------
+# Rows
+# ------------------------------------
+_SELECT = '''SELECT e.id, e.emotion_id, e.confidence, t.codec, t.body, e.sentiment_id, e.compound, e.ts_us
+             FROM user_emotions e LEFT JOIN message_texts t ON t.id = e.text_id'''
+_SELECT_NO_TEXT = '''SELECT e.id, e.emotion_id, e.confidence, e.sentiment_id, e.compound, e.ts_us
+                     FROM user_emotions e'''
+
+
+def insert_row(conn: sqlite3.Connection, emotion: Optional[str], confidence: Optional[float],
+               input_text: Optional[str], sentiment: Optional[str], compound: Optional[float], ts: datetime,
+               row_id: Optional[int] = None, compress: Optional[bool] = None) -> int:
+    """Insert one row (inside the caller's write transaction); returns its id."""
+    lab = labels(conn)
+    return conn.execute(
+        '''INSERT INTO user_emotions (id, emotion_id, sentiment_id, confidence, compound, ts_us, text_id)
+           VALUES (?, ?, ?, ?, ?, ?, ?)''',
+        (row_id, lab.id(conn, "emotion", emotion), lab.id(conn, "sentiment", sentiment),
+         confidence, compound, to_us(ts), put_text(conn, input_text, compress))).lastrowid
+
+
+def replace_text(conn: sqlite3.Connection, row_id: int, text: Optional[str]) -> int:
+    """Point row `row_id` at `text` (other rows sharing its old text keep it); returns texts freed."""
+    old = conn.execute('SELECT text_id FROM user_emotions WHERE id = ?', (row_id,)).fetchone()
+    conn.execute('UPDATE user_emotions SET text_id = ? WHERE id = ?', (put_text(conn, text), row_id))
+    return release_texts(conn, [old[0]] if old else [])
+
+
+def delete_rows(conn: sqlite3.Connection, row_ids: Sequence[int]) -> int:
+    """Delete rows and the texts only they referenced; returns texts freed."""
+    text_ids: List[Optional[int]] = []
+    for row_id in row_ids:
+        old = conn.execute('SELECT text_id FROM user_emotions WHERE id = ?', (row_id,)).fetchone()
+        if old is not None:
+            text_ids.append(old[0])
+            conn.execute('DELETE FROM user_emotions WHERE id = ?', (row_id,))
+    return release_texts(conn, text_ids)
+
+
+def select_rows(conn: sqlite3.Connection, where: str = "", params: Sequence[Any] = (), order: str = "e.id",
+                limit: Optional[int] = None, text: bool = True) -> List[Row]:
+    """
+    Decoded rows, (id, emotion, confidence, input_text, sentiment, compound,
+    ts_us). `where` / `order` are SQL over alias e (user_emotions) and t
+    (message_texts); text=False skips the text join and leaves input_text None.
+    """
+    sql = _SELECT if text else _SELECT_NO_TEXT
+    if where:
+        sql += f" WHERE {where}"
+    sql += f" ORDER BY {order}"
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    rows = conn.execute(sql, params).fetchall()
+    lab = labels(conn)
+    try:
+        return _decode(rows, lab, text)
+    except KeyError:  # a label id this process has not seen yet
+        lab.reload(conn)
+        return _decode(rows, lab, text)
+
+
+def _decode(rows: List[tuple], lab: Labels, text: bool) -> List[Row]:
+    emotion, sentiment = lab.names["emotion"], lab.names["sentiment"]
+    if text:
+        return [(rid, emotion[eid], confidence, decode_text(codec, body), sentiment[sid], compound, ts_us)
+                for rid, eid, confidence, codec, body, sid, compound, ts_us in rows]
+    return [(rid, emotion[eid], confidence, None, sentiment[sid], compound, ts_us)
+            for rid, eid, confidence, sid, compound, ts_us in rows]
+
+
+def iter_rows(conn: sqlite3.Connection, after_id: int = 0, chunk_size: int = 5000,
+              text: bool = False) -> Iterator[List[Row]]:
+    """Id-ordered chunks of decoded rows with id > after_id."""
+    last = after_id
+    while True:
+        rows = select_rows(conn, "e.id > ?", (last,), limit=chunk_size, text=text)
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+
+
+# ------------------------------------
+# Migration (v1 -> v2)
+# ------------------------------------
+def migrate(conn: sqlite3.Connection, batch_size: int = 1000, compress: Optional[bool] = None,
+            pause_ms: float = 0.0) -> Dict[str, Any]:
+    """
+    Convert a v1 user_emotions table in place. Each batch moves the oldest
+    `batch_size` v1 rows into the v2 table in one BEGIN IMMEDIATE transaction;
+    safe to interrupt, re-run, or run from several processes at once.
+    """
+    t0 = time.perf_counter()
+    isolation = conn.isolation_level
+    conn.isolation_level = None  # explicit BEGIN/COMMIT per batch
+    stats: Dict[str, Any] = {"rows": 0, "batches": 0, "texts_stored": 0}
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if "timestamp" in _columns(conn, "user_emotions"):
+                # the rename is instant; the v1 index would otherwise keep the name the v2 schema does not use
+                conn.execute('DROP INDEX IF EXISTS idx_user_emotions_timestamp')
+                conn.execute('ALTER TABLE user_emotions RENAME TO user_emotions_v1')
+                create_schema(conn)
+                # AUTOINCREMENT: ids of deleted v1 rows stay retired
+                seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'user_emotions_v1'").fetchone()
+                if seq is not None:
+                    conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('user_emotions', ?)", (seq[0],))
+                stats["started"] = True
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if not conn.execute("SELECT count(*) FROM sqlite_master WHERE type = 'table' "
+                                    "AND name = 'user_emotions_v1'").fetchone()[0]:
+                    conn.execute('COMMIT')
+                    break
+                rows = conn.execute(
+                    '''SELECT id, emotion, confidence, input_text, sentiment, compound, timestamp
+                       FROM user_emotions_v1 ORDER BY id LIMIT ?''', (batch_size,)).fetchall()
+                if not rows:
+                    conn.execute('DROP TABLE user_emotions_v1')
+                    conn.execute("DELETE FROM sqlite_sequence WHERE name = 'user_emotions_v1'")
+                    conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+                    conn.execute('COMMIT')
+                    break
+                texts = conn.execute('SELECT count(*) FROM message_texts').fetchone()[0]
+                for rid, emotion, confidence, text, sentiment, compound, ts in rows:
+                    try:
+                        when = ts if isinstance(ts, datetime) else datetime.fromisoformat(ts) if ts else _EPOCH
+                    except ValueError:
+                        when = _EPOCH  # unparsable v1 timestamps sort first, as 1970-01-01
+                    insert_row(conn, emotion, confidence, text, sentiment, compound, when, row_id=rid,
+                               compress=compress)
+                conn.execute('DELETE FROM user_emotions_v1 WHERE id <= ?', (rows[-1][0],))
+                stats["texts_stored"] += conn.execute('SELECT count(*) FROM message_texts').fetchone()[0] - texts
+                conn.execute('COMMIT')
+            except Exception:
+                labels(conn).clear()
+                conn.execute('ROLLBACK')
+                raise
+            stats["rows"] += len(rows)
+            stats["batches"] += 1
+            if pause_ms > 0:
+                time.sleep(pause_ms / 1000.0)
+    finally:
+        conn.isolation_level = isolation
+    stats["schema_version"] = schema_version(conn)
+    stats["duration_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    return stats
+
+
+def info(conn: sqlite3.Connection) -> Dict[str, Any]:
+    version = schema_version(conn)
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    out: Dict[str, Any] = {
+        "schema_version": version,
+        "user_version": conn.execute('PRAGMA user_version').fetchone()[0],
+        "bytes": conn.execute('PRAGMA page_count').fetchone()[0] * page_size,
+        "free_bytes": conn.execute('PRAGMA freelist_count').fetchone()[0] * page_size,
+    }
+    if version == SCHEMA_VERSION:
+        rows, oldest, newest = conn.execute('SELECT count(*), min(ts_us), max(ts_us) FROM user_emotions').fetchone()
+        texts, chars, body = conn.execute(
+            'SELECT count(*), coalesce(sum(chars), 0), coalesce(sum(length(body)), 0) FROM message_texts').fetchone()
+        out.update({
+            "rows": rows,
+            "oldest": format_ts(oldest) if oldest is not None else None,
+            "newest": format_ts(newest) if newest is not None else None,
+            "texts": texts,
+            "text_chars": chars,
+            "text_bytes": body,
+            "compressed_texts": conn.execute(
+                'SELECT count(*) FROM message_texts WHERE codec = ?', (CODEC_ZLIB,)).fetchone()[0],
+            "labels": {kind: conn.execute(f'SELECT count(*) FROM {table}').fetchone()[0]
+                       for kind, table in _LABEL_TABLES.items()},
+        })
+    elif version == 1:
+        table = "user_emotions_v1" if "timestamp" not in _columns(conn, "user_emotions") else "user_emotions"
+        out["v1_rows_left"] = conn.execute(f'SELECT count(*) FROM {table}').fetchone()[0]
+    return out
+
+
+# ------------------------------------
+# CLI
+# ------------------------------------
+def _main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="user_emotions storage schema tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_migrate = sub.add_parser("migrate", help="convert a v1 database to schema v2 in place")
+    p_migrate.add_argument("--db", default="user_data.db")
+    p_migrate.add_argument("--batch-size", type=int, default=1000)
+    p_migrate.add_argument("--pause-ms", type=float, default=0.0, help="sleep between batches (live databases)")
+    p_migrate.add_argument("--no-compress", action="store_true", help="store texts as plain UTF-8")
+    p_migrate.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to shrink the file")
+
+    p_info = sub.add_parser("info", help="schema version, row / text counts and size")
+    p_info.add_argument("--db", default="user_data.db")
+
+    args = parser.parse_args(argv)
+    conn = sqlite3.connect(args.db, timeout=30)
+    try:
+        if args.command == "info":
+            print(json.dumps(info(conn), indent=1))
+            return 0
+        before = info(conn)
+        report = migrate(conn, batch_size=args.batch_size, compress=False if args.no_compress else None,
+                         pause_ms=args.pause_ms) if before["schema_version"] == 1 else {"skipped": "not a v1 database"}
+        if before["schema_version"] in (0, SCHEMA_VERSION):
+            create_schema(conn)
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.commit()
+        if args.vacuum:
+            conn.execute('VACUUM')
+        print(json.dumps({"before": before, "migration": report, "after": info(conn)}, indent=1))
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
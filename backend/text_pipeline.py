@@ -0,0 +1,100 @@
+"""
+text_pipeline.py
+
+One tokenization per input, shared by every analysis stage.
+
+AnalysisDocument is built once per text (or per long-input window):
+- lower: lowercased text with typographic apostrophes folded to "'"
+  (same length, so offsets hold); app regexes and intent routing scan it
+- words + offsets: maximal [\\w'] runs and their positions in `lower`, from
+  a single regex pass
+- boundaries: clause (1) / sentence (2) punctuation seen before each word
+- chunks: whitespace-separated pieces of the original text (the sentiment
+  scorer's input, sentiment.py)
+- norm: the words joined by single spaces, identical to
+  EnhancedEmotionAnalyzer._normalize_text(text) without a second regex pass
+- stems / context weights / sentiment: computed on first use and cached on
+  the document, so a stage that needs them again gets the same object
+"""
+
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+_TOKEN_RE = re.compile(r"[\w']+|[.!?;:,]")
+CLAUSE, SENTENCE = 1, 2
+_SENTENCE_END = frozenset(".!?")
+
+
+class AnalysisDocument:
+    __slots__ = ("text", "lower", "words", "offsets", "boundaries", "_chunks", "_norm", "_norm_offsets", "cache")
+
+    def __init__(self, text: str):
+        self.text = text or ""
+        self.lower = self.text.lower().replace("’", "'")
+        words: List[str] = []
+        offsets: List[int] = []
+        boundaries: List[int] = []
+        pending = 0
+        for m in _TOKEN_RE.finditer(self.lower):
+            tok = m.group()
+            c = tok[0]
+            if c.isalnum() or c == "_" or c == "'":
+                words.append(tok)
+                offsets.append(m.start())
+                boundaries.append(pending)
+                pending = 0
+            else:
+                pending = SENTENCE if (c in _SENTENCE_END or pending == SENTENCE) else CLAUSE
+        self.words = words
+        self.offsets = offsets
+        self.boundaries = boundaries
+        self._chunks: Optional[List[str]] = None
+        self._norm: Optional[str] = None
+        self._norm_offsets: Optional[List[int]] = None
+        # per-document results keyed by stage (stems, context rules, sentiment, ...)
+        self.cache: Dict[Any, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    @property
+    def chunks(self) -> List[str]:
+        if self._chunks is None:
+            self._chunks = self.text.split()
+        return self._chunks
+
+    @property
+    def norm(self) -> str:
+        if self._norm is None:
+            self._norm = " ".join(self.words)
+        return self._norm
+
+    @property
+    def norm_offsets(self) -> List[int]:
+        """Start of each word in `norm`."""
+        if self._norm_offsets is None:
+            out, pos = [], 0
+            for w in self.words:
+                out.append(pos)
+                pos += len(w) + 1
+            self._norm_offsets = out
+        return self._norm_offsets
+
+    def stems(self, stem: Callable[[str], str]) -> List[str]:
+        key = ("stems", stem)
+        cached = self.cache.get(key)
+        if cached is None:
+            cached = self.cache[key] = [stem(w) for w in self.words]
+        return cached
+
+    def memo(self, key: Any, compute: Callable[["AnalysisDocument"], Any]) -> Any:
+        """Compute a stage result once per document."""
+        try:
+            return self.cache[key]
+        except KeyError:
+            value = self.cache[key] = compute(self)
+            return value
+
+
+def as_document(text_or_doc: Any) -> AnalysisDocument:
+    return text_or_doc if isinstance(text_or_doc, AnalysisDocument) else AnalysisDocument(text_or_doc)
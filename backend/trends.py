@@ -0,0 +1,308 @@
+"""
+trends.py
+
+Incremental per-user emotion trends for the dashboard.
+
+Each saved analysis updates a small, fixed-size state in O(1):
+- ring buffers of daily / weekly / monthly buckets (count, compound sum, per-emotion counts)
+- exponentially weighted mood averages of the VADER compound (fast + slow)
+- the current and longest run of consecutive active days
+
+The state is stored as one compact JSON row per user (emotion_trends), so a
+dashboard read costs the same however much history exists. A user without a
+stored state is backfilled once from user_emotions.
+"""
+
+import json
+import threading
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import storage
+
+POSITIVE_EMOTIONS = ("joy", "gratitude", "steadiness")
+NEGATIVE_EMOTIONS = ("sadness", "anger", "fear", "anxiety", "guilt", "shame")
+
+SCHEMA_VERSION = 1
+
+
+# ------------------------------------
+# Period helpers (proleptic ordinals; ordinal 1 is a Monday)
+# ------------------------------------
+def day_period(d: date) -> int:
+    return d.toordinal()
+
+
+def week_period(d: date) -> int:
+    return (d.toordinal() - 1) // 7
+
+
+def month_period(d: date) -> int:
+    return d.year * 12 + d.month - 1
+
+
+def _period_label(kind: str, period: int) -> str:
+    if kind == "daily":
+        return date.fromordinal(period).isoformat()
+    if kind == "weekly":
+        return date.fromordinal(period * 7 + 1).isoformat()  # Monday of that week
+    year, month = divmod(period, 12)
+    return f"{year:04d}-{month + 1:02d}"
+
+
+class BucketRing:
+    """
+    Fixed-size ring of period buckets. Slot i holds period p where
+    p % size == i, as [period, count, compound_sum, {emotion: count}];
+    a newer period overwrites the slot, so memory never grows.
+    """
+
+    __slots__ = ("size", "slots")
+
+    def __init__(self, size: int, slots: Optional[List[Optional[list]]] = None):
+        self.size = size
+        self.slots: List[Optional[list]] = slots if slots is not None and len(slots) == size else [None] * size
+
+    def add(self, period: int, emotion: str, compound: float):
+        i = period % self.size
+        slot = self.slots[i]
+        if slot is None or slot[0] < period:
+            slot = [period, 0, 0.0, {}]
+            self.slots[i] = slot
+        elif slot[0] > period:
+            return  # older than anything the ring still covers
+        slot[1] += 1
+        slot[2] += compound
+        slot[3][emotion] = slot[3].get(emotion, 0) + 1
+
+    def get(self, period: int) -> Optional[list]:
+        slot = self.slots[period % self.size]
+        return slot if slot is not None and slot[0] == period else None
+
+    def span(self, last_period: int, n: int) -> List[Tuple[int, Optional[list]]]:
+        """(period, slot-or-None) for the n periods ending at last_period, oldest first."""
+        n = min(n, self.size)
+        return [(p, self.get(p)) for p in range(last_period - n + 1, last_period + 1)]
+
+
+class TrendState:
+    """All trend aggregates for one user; every update is O(1)."""
+
+    def __init__(self, daily_size: int = 92, weekly_size: int = 53, monthly_size: int = 24,
+                 fast_alpha: float = 0.3, slow_alpha: float = 0.05):
+        self.daily = BucketRing(daily_size)
+        self.weekly = BucketRing(weekly_size)
+        self.monthly = BucketRing(monthly_size)
+        self.fast_alpha = fast_alpha
+        self.slow_alpha = slow_alpha
+        self.total = 0
+        self.mood_fast: Optional[float] = None
+        self.mood_slow: Optional[float] = None
+        self.last_day: Optional[int] = None
+        self.current_streak = 0
+        self.longest_streak = 0
+
+    def add(self, emotion: str, compound: float, ts: datetime):
+        d = ts.date()
+        day = day_period(d)
+        compound = float(compound or 0.0)
+        self.daily.add(day, emotion, compound)
+        self.weekly.add(week_period(d), emotion, compound)
+        self.monthly.add(month_period(d), emotion, compound)
+        self.total += 1
+
+        if self.mood_fast is None:
+            self.mood_fast = self.mood_slow = compound
+        else:
+            self.mood_fast += self.fast_alpha * (compound - self.mood_fast)
+            self.mood_slow += self.slow_alpha * (compound - self.mood_slow)
+
+        # streak of consecutive active days (rows arriving late for an older day are ignored)
+        if self.last_day is None or day > self.last_day + 1:
+            self.current_streak = 1
+        elif day == self.last_day + 1:
+            self.current_streak += 1
+        if self.last_day is None or day > self.last_day:
+            self.last_day = day
+        self.longest_streak = max(self.longest_streak, self.current_streak)
+
+    # -------- persistence --------
+    def to_json(self) -> str:
+        return json.dumps({
+            "v": SCHEMA_VERSION,
+            "sizes": [self.daily.size, self.weekly.size, self.monthly.size],
+            "alphas": [self.fast_alpha, self.slow_alpha],
+            "daily": self.daily.slots, "weekly": self.weekly.slots, "monthly": self.monthly.slots,
+            "total": self.total, "mood": [self.mood_fast, self.mood_slow],
+            "streak": [self.last_day, self.current_streak, self.longest_streak],
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, raw: str, sizes: Optional[List[int]] = None) -> "TrendState":
+        data = json.loads(raw)
+        if data.get("v") != SCHEMA_VERSION:
+            raise ValueError(f"unsupported trend state version {data.get('v')!r}")
+        # a changed ring size invalidates slot positions; the caller rebuilds in that case
+        if sizes is not None and list(sizes) != data["sizes"]:
+            raise ValueError("trend ring sizes changed")
+        sizes = data["sizes"]
+        state = cls(*sizes, *data["alphas"])
+        state.daily = BucketRing(sizes[0], data["daily"])
+        state.weekly = BucketRing(sizes[1], data["weekly"])
+        state.monthly = BucketRing(sizes[2], data["monthly"])
+        state.total = data["total"]
+        state.mood_fast, state.mood_slow = data["mood"]
+        state.last_day, state.current_streak, state.longest_streak = data["streak"]
+        return state
+
+    # -------- reads (fixed cost: bounded by ring sizes) --------
+    @staticmethod
+    def _bucket_summary(kind: str, period: int, slot: Optional[list]) -> Dict[str, Any]:
+        count = slot[1] if slot else 0
+        emotions = slot[3] if slot else {}
+        positive = sum(emotions.get(e, 0) for e in POSITIVE_EMOTIONS)
+        return {
+            "period": _period_label(kind, period),
+            "count": count,
+            "avg_compound": round(slot[2] / count, 4) if count else None,
+            "balance": round(positive / count * 100.0, 1) if count else None,
+            "top_emotion": max(emotions.items(), key=lambda kv: kv[1])[0] if emotions else None,
+        }
+
+    def window_counts(self, today: date, days: int) -> Dict[str, int]:
+        """Per-emotion counts over the last `days` days (today included)."""
+        out: Dict[str, int] = {}
+        for _p, slot in self.daily.span(day_period(today), days):
+            if slot:
+                for emo, n in slot[3].items():
+                    out[emo] = out.get(emo, 0) + n
+        return out
+
+    def streak(self, today: date) -> Dict[str, Any]:
+        t = day_period(today)
+        # still alive if the user was active today or yesterday
+        current = self.current_streak if self.last_day is not None and t - self.last_day <= 1 else 0
+        return {
+            "current": current,
+            "longest": self.longest_streak,
+            "last_active": date.fromordinal(self.last_day).isoformat() if self.last_day else None,
+        }
+
+    def mood(self) -> Dict[str, Any]:
+        if self.mood_fast is None:
+            return {"ewma_fast": None, "ewma_slow": None, "direction": "steady"}
+        delta = self.mood_fast - self.mood_slow
+        direction = "improving" if delta > 0.1 else "declining" if delta < -0.1 else "steady"
+        return {"ewma_fast": round(self.mood_fast, 4), "ewma_slow": round(self.mood_slow, 4),
+                "direction": direction}
+
+    def series(self, today: date, days: int = 14, weeks: int = 12, months: int = 12) -> Dict[str, List[Dict[str, Any]]]:
+        return {
+            "daily": [self._bucket_summary("daily", p, s) for p, s in self.daily.span(day_period(today), days)],
+            "weekly": [self._bucket_summary("weekly", p, s) for p, s in self.weekly.span(week_period(today), weeks)],
+            "monthly": [self._bucket_summary("monthly", p, s) for p, s in self.monthly.span(month_period(today), months)],
+        }
+
+
+class TrendEngine:
+    """
+    Keeps TrendState rows in SQLite. `record()` runs inside the caller's
+    write transaction (before its INSERT), so concurrent workers serialize on
+    SQLite's write lock and never lose an update. Parsed states are cached
+    per process and re-read only when the row's `seq` has moved on; a
+    rolled-back write leaves the cache one `seq` ahead, which forces a re-read.
+    """
+
+    def __init__(self, daily_size: int = 92, weekly_size: int = 53, monthly_size: int = 24,
+                 fast_alpha: float = 0.3, slow_alpha: float = 0.05):
+        self.sizes = [daily_size, weekly_size, monthly_size]
+        self.alphas = (fast_alpha, slow_alpha)
+        self._cache: Dict[str, Tuple[int, TrendState]] = {}
+        self._lock = threading.RLock()  # guards the cache and in-place state updates
+
+    @staticmethod
+    def init_schema(conn):
+        conn.execute('''CREATE TABLE IF NOT EXISTS emotion_trends
+                        (user_id TEXT PRIMARY KEY,
+                         seq INTEGER NOT NULL,
+                         state TEXT NOT NULL,
+                         updated_at DATETIME)''')
+
+    def _new_state(self) -> TrendState:
+        return TrendState(*self.sizes, *self.alphas)
+
+    def rebuild(self, conn, user_id: str = "default") -> TrendState:
+        """Replay user_emotions (in id order) into a fresh state."""
+        state = self._new_state()
+        if user_id != "default":
+            return state  # user_emotions rows are not attributed to other users
+        last_day, midnight = None, None
+        for rows in storage.iter_rows(conn):
+            for _, emotion, _, _, _, compound, ts_us in rows:
+                if not ts_us:  # the row had no timestamp
+                    continue
+                # add() only uses the date: convert once per day, not per row (ids are nearly chronological)
+                day = ts_us // storage.US_PER_DAY
+                if day != last_day:
+                    last_day, midnight = day, storage.from_us(day * storage.US_PER_DAY)
+                state.add(emotion, compound, midnight)
+        return state
+
+    def _store(self, conn, user_id: str, state: TrendState, seq: int):
+        conn.execute('''INSERT INTO emotion_trends (user_id, seq, state, updated_at) VALUES (?, ?, ?, ?)
+                        ON CONFLICT(user_id) DO UPDATE SET seq=excluded.seq, state=excluded.state,
+                                                          updated_at=excluded.updated_at''',
+                     (user_id, seq, state.to_json(), datetime.now()))
+        with self._lock:
+            self._cache[user_id] = (seq, state)
+
+    def _load(self, conn, user_id: str) -> Tuple[TrendState, int]:
+        row = conn.execute("SELECT seq FROM emotion_trends WHERE user_id = ?", (user_id,)).fetchone()
+        if row is not None:
+            with self._lock:
+                cached = self._cache.get(user_id)
+            if cached is not None and cached[0] == row[0]:
+                return cached[1], row[0]
+            raw = conn.execute("SELECT state FROM emotion_trends WHERE user_id = ?", (user_id,)).fetchone()[0]
+            try:
+                state = TrendState.from_json(raw, self.sizes)
+            except (ValueError, KeyError, TypeError):
+                state = self.rebuild(conn, user_id)
+            with self._lock:
+                self._cache[user_id] = (row[0], state)
+            return state, row[0]
+
+        state = self.rebuild(conn, user_id)
+        self._store(conn, user_id, state, 0)
+        return state, 0
+
+    def record(self, conn, emotion: str, compound: float, ts: datetime, user_id: str = "default"):
+        """Fold one new row into the user's state; the caller commits."""
+        with self._lock:
+            state, seq = self._load(conn, user_id)
+            state.add(emotion, compound, ts)
+            self._store(conn, user_id, state, seq + 1)
+
+    def summary(self, conn, user_id: str = "default", today: Optional[date] = None,
+                window_days: int = 30) -> Dict[str, Any]:
+        today = today or datetime.now().date()
+        with self._lock:
+            state, _seq = self._load(conn, user_id)
+            distribution = state.window_counts(today, window_days + 1)
+            streak, mood, series = state.streak(today), state.mood(), state.series(today)
+            all_time = state.total
+        total = sum(distribution.values())
+        positive = sum(distribution.get(e, 0) for e in POSITIVE_EMOTIONS)
+        negative = sum(distribution.get(e, 0) for e in NEGATIVE_EMOTIONS)
+        return {
+            "window_days": window_days,
+            "emotion_distribution": distribution,
+            "window_total": total,
+            "positive": positive,
+            "negative": negative,
+            "emotional_balance": round(positive / total * 100.0, 1) if total else 50.0,
+            "all_time_total": all_time,
+            "streak": streak,
+            "mood": mood,
+            "series": series,
+        }
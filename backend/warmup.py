@@ -0,0 +1,123 @@
+"""
+warmup.py
+
+Warm-up, readiness and fork-friendly preloading for multi-worker servers:
+- Readiness: this process's warm-up state; /ready answers 503 until the
+  warm-up inference has run (in this process, or in the master before it
+  forked this worker)
+- run() / start_background(): execute a warm-up function once, recording
+  its duration and any error
+- freeze_heap(): gc.collect() then gc.freeze(), moving every object built so
+  far into the permanent generation. Forked workers then never run the
+  collector over the preloaded lexicon / sentiment tables / shloka data, so
+  those pages are not written to and stay shared (no copy-on-write)
+- memory_usage(): Rss / Pss / shared / private KiB from /proc/self/smaps_rollup
+  (empty where unavailable)
+
+WARMUP_MODE selects when the app warms up (see app.py): "background"
+(default: a thread started at import), "sync" (during import), "preload"
+(gunicorn.conf.py does it in the master before forking) or "lazy" (on the
+first /ready probe).
+"""
+
+import gc
+import os
+import time
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+COLD, WARMING, READY, FAILED = "cold", "warming", "ready", "failed"
+WARMUP_MODES = ("background", "sync", "preload", "lazy")
+
+_SMAPS_FIELDS = {"Rss": "rss_kib", "Pss": "pss_kib", "Shared_Clean": "shared_clean_kib",
+                 "Shared_Dirty": "shared_dirty_kib", "Private_Clean": "private_clean_kib",
+                 "Private_Dirty": "private_dirty_kib"}
+
+
+def warmup_mode() -> str:
+    mode = os.environ.get("WARMUP_MODE", "background")
+    if mode not in WARMUP_MODES:
+        raise ValueError(f"WARMUP_MODE must be one of {', '.join(WARMUP_MODES)}")
+    return mode
+
+
+class Readiness:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = COLD
+        self.warmed_pid: Optional[int] = None
+        self.warmed_at: Optional[str] = None
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self.report: Dict[str, Any] = {}
+        self.frozen: Dict[str, Any] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    def run(self, warm_up: Callable[[], Dict[str, Any]]) -> bool:
+        """Run `warm_up` unless it already ran (or is running); True once ready."""
+        with self._lock:
+            if self.state in (WARMING, READY):
+                return self.state == READY
+            self.state = WARMING
+        t0 = time.perf_counter()
+        try:
+            report = warm_up() or {}
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = FAILED
+        else:
+            self.report = report
+            self.error = None
+            self.warmed_pid = os.getpid()
+            self.warmed_at = datetime.now().isoformat()
+            self.state = READY
+        self.duration_ms = round((time.perf_counter() - t0) * 1000, 2)
+        return self.ready
+
+    def start_background(self, warm_up: Callable[[], Dict[str, Any]]) -> threading.Thread:
+        t = threading.Thread(target=self.run, args=(warm_up,), name="warm-up", daemon=True)
+        t.start()
+        return t
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "state": self.state,
+            "pid": os.getpid(),
+            # a worker forked from a warmed master inherits its state
+            "inherited": self.warmed_pid is not None and self.warmed_pid != os.getpid(),
+            "warmed_at": self.warmed_at,
+            "duration_ms": self.duration_ms,
+            "error": self.error,
+            "warm_up": self.report,
+            "frozen": self.frozen,
+        }
+
+
+def freeze_heap() -> Dict[str, Any]:
+    """Collect, then freeze everything allocated so far (call in the master right before forking)."""
+    if not hasattr(gc, "freeze"):  # Python < 3.7
+        return {"frozen_objects": 0, "supported": False}
+    t0 = time.perf_counter()
+    gc.collect()
+    gc.freeze()
+    return {"frozen_objects": gc.get_freeze_count(), "supported": True,
+            "duration_ms": round((time.perf_counter() - t0) * 1000, 2)}
+
+
+def memory_usage(pid: Optional[int] = None) -> Dict[str, int]:
+    path = f"/proc/{pid or 'self'}/smaps_rollup"
+    out: Dict[str, int] = {}
+    try:
+        with open(path, encoding="ascii") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in _SMAPS_FIELDS:
+                    out[_SMAPS_FIELDS[key]] = int(rest.split()[0])
+    except (OSError, ValueError, IndexError):
+        return {}
+    return out
@@ -1863,6 +1863,8 @@ export const ChatInterface: React.FC = () => {
   const [inputMessage, setInputMessage] = useState("");
   const [isTyping, setIsTyping] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement | null>(null);
+  // server-side conversation id (returned by /api/chat, sent back with every message)
+  const conversationIdRef = useRef<string | null>(null);
 
   // auto-scroll to bottom on new messages
   useEffect(() => {
@@ -1876,7 +1878,10 @@ export const ChatInterface: React.FC = () => {
       const resp = await fetch("http://localhost:5000/api/chat", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ message: userMessage }),
+        body: JSON.stringify({
+          message: userMessage,
+          ...(conversationIdRef.current ? { conversation_id: conversationIdRef.current } : {}),
+        }),
       });
       if (!resp.ok) {
         console.warn("Backend returned non-OK status, falling back to local.");
@@ -1884,6 +1889,9 @@ export const ChatInterface: React.FC = () => {
         return local.response;
       }
       const data = await resp.json();
+      if (data && data.conversation && typeof data.conversation.id === "string") {
+        conversationIdRef.current = data.conversation.id;
+      }
       // backend expected to return { response: "...", ... } - otherwise fallback
       if (data && typeof data.response === "string") return data.response;
       if (data && typeof data.message === "string") return data.message;